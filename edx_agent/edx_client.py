@@ -0,0 +1,559 @@
+# -*- coding: utf-8 -*-
+'''
+EDX REST接口的Python客户端，供agent使用
+1. 同步EdxClient和异步AsyncEdxClient接口相同(异步版本的方法返回协程)，都按服务器维护keep-alive连接池，
+   max_connections同时也是对该服务器的并发上限，超出的请求在客户端排队
+2. 失败重试: 复用的空闲连接已被服务端关闭时直接重发；连接错误和502/503/504按指数退避重试，
+   execute_tcl等非幂等请求只在请求未发出时重试
+3. DesignCache: 本地缓存/design返回的列式数组，带ETag，之后只取变化cell的摆放(增量)，
+   design未变化时服务端返回304；可指定cache_path持久化，agent重启后仍可增量同步
+4. npz二进制响应直接解码为numpy数组(格式同edx_server/binary_codec.py)
+    client = EdxClient('http://localhost:5000')
+    design = client.design()                # 第一次全量，之后增量
+    client.place_cells(x, y, cell_ids=ids)  # npz请求体
+    async with AsyncEdxClient('http://localhost:5000', max_connections=4) as client:
+        timing, weights = await asyncio.gather(client.get_timing(20), client.timing_weights())
+'''
+import asyncio
+import http.client
+import io
+import json
+import logging
+import os
+import ssl
+import threading
+import time
+import urllib.parse
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STR_SUFFIX = '.str'
+# 重试的HTTP状态码
+RETRY_STATUSES = (502, 503, 504)
+# 复用的空闲连接已被服务端关闭时出现的异常，请求没有被处理，可以直接重发
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                           ConnectionAbortedError, asyncio.IncompleteReadError)
+
+
+def decode_arrays(data: bytes) -> Dict[str, object]:
+    """npz字节 -> {name: ndarray 或 list[str]}，key带'.str'后缀的是'\\n'拼接的utf-8字符串列表"""
+    result = {}
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        for name in npz.files:
+            if name.endswith(STR_SUFFIX):
+                raw = npz[name]
+                result[name[:-len(STR_SUFFIX)]] = raw.tobytes().decode('utf-8').split('\n') if len(raw) else []
+            else:
+                result[name] = npz[name]
+    return result
+
+
+def encode_arrays(arrays: Dict[str, object]) -> bytes:
+    """decode_arrays的逆过程"""
+    payload = {}
+    for name, value in arrays.items():
+        if isinstance(value, (list, tuple)) and (len(value) == 0 or isinstance(value[0], str)):
+            payload[name + STR_SUFFIX] = np.frombuffer('\n'.join(value).encode('utf-8'), dtype=np.uint8)
+        else:
+            payload[name] = np.asarray(value)
+    buffer = io.BytesIO()
+    np.savez(buffer, **payload)
+    return buffer.getvalue()
+
+
+class EdxError(Exception):
+    """服务端返回错误状态，message/data取自EdxResponse"""
+    def __init__(self, status: int, message: str, data=None):
+        super().__init__(f'HTTP {status}: {message}')
+        self.status = status
+        self.message = message
+        self.data = data
+
+
+class Response:
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes):
+        self.status = status
+        # header名统一为小写
+        self.headers = headers
+        self.body = body
+
+    def header(self, name: str, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def json(self):
+        return json.loads(self.body)
+
+    def arrays(self) -> Dict[str, object]:
+        return decode_arrays(self.body)
+
+    def raise_for_status(self):
+        if self.status < 400:
+            return
+        try:
+            payload = self.json()
+            raise EdxError(self.status, payload.get('message', ''), payload.get('data'))
+        except (ValueError, AttributeError):
+            raise EdxError(self.status, self.body[:200].decode('utf-8', 'replace'))
+
+
+class DesignCache:
+    """
+    /design返回的Design列式数组(与服务端DesignIndex一致): cell_names/x/y/width/height/orient/status、
+    pin_names/pin_cell、net_names/net_ptr/net_pins/net_pin_is_driver、core_width/core_height
+    etag为服务端缓存摆放的版本，增量响应只更新x/y/orient/status
+    """
+    PLACEMENT_FIELDS = ('x', 'y', 'orient', 'status')
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.etag: Optional[str] = None
+        self.arrays: Dict[str, object] = {}
+        # 服务端缓存的摆放是否与EDA一致
+        self.synced = True
+        self.full_updates = 0
+        self.delta_updates = 0
+        self._cell_ids = None
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def __getattr__(self, name):
+        arrays = self.__dict__.get('arrays') or {}
+        if name in arrays:
+            return arrays[name]
+        raise AttributeError(name)
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self.arrays)
+
+    @property
+    def num_cells(self) -> int:
+        return len(self.arrays.get('cell_names', ()))
+
+    def cell_id(self, name: str) -> int:
+        """cell名 -> 下标(place_cells的cell_id)，第一次调用时建索引"""
+        if self._cell_ids is None:
+            self._cell_ids = {cell: idx for idx, cell in enumerate(self.arrays['cell_names'])}
+        return self._cell_ids[name]
+
+    def apply(self, response: Response, since: Optional[str]) -> str:
+        """
+        应用/design的响应，返回'not_modified'、'delta'或'full'
+        并发请求的响应可能乱序到达: 增量只在基于当前etag时应用，同一epoch中更旧的全量不覆盖更新的缓存
+        """
+        etag = (response.header('etag') or '').strip('"')
+        with self._lock:
+            self.synced = response.header('x-placement-synced', '1') == '1'
+            if response.status == 304:
+                return 'not_modified'
+            if response.header('x-design-delta') == '1':
+                if since != self.etag:
+                    return 'not_modified'
+                delta = response.arrays()
+                ids = delta['cell_id']
+                for field in self.PLACEMENT_FIELDS:
+                    self.arrays[field][ids] = delta[field]
+                self.etag = etag
+                self.delta_updates += 1
+                logger.debug(f"design delta applied: {len(ids)} cells, etag {etag}")
+                self._save()
+                return 'delta'
+            if self._is_older(etag):
+                return 'not_modified'
+            arrays = response.arrays()
+            for field in ('core_width', 'core_height'):
+                arrays[field] = float(arrays[field])
+            if self.arrays.get('cell_names') != arrays['cell_names']:
+                self._cell_ids = None
+            self.arrays = arrays
+            self.etag = etag
+            self.full_updates += 1
+            logger.debug(f"design loaded: {self.num_cells} cells, etag {etag}")
+            self._save()
+            return 'full'
+
+    def _is_older(self, etag: str) -> bool:
+        if not self.etag:
+            return False
+        epoch, _, seq = etag.rpartition('-')
+        current_epoch, _, current_seq = self.etag.rpartition('-')
+        return epoch == current_epoch and seq.isdigit() and current_seq.isdigit() and int(seq) < int(current_seq)
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(encode_arrays(dict(self.arrays, etag=[self.etag])))
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                arrays = decode_arrays(f.read())
+            self.etag = arrays.pop('etag')[0]
+            for field in ('core_width', 'core_height'):
+                arrays[field] = float(arrays[field])
+            self.arrays = arrays
+        except Exception as e:
+            logger.warning(f"ignore design cache {self.path}: {e}")
+            self.etag, self.arrays = None, {}
+
+
+class _Call:
+    """一次接口调用: 请求内容 + 把Response转换为返回值的parse"""
+    def __init__(self, method: str, path: str, params: Optional[dict] = None, body: Optional[bytes] = None,
+                 content_type: Optional[str] = None, headers: Optional[dict] = None, parse=None,
+                 idempotent: Optional[bool] = None):
+        self.method = method
+        self.path = path
+        self.params = params
+        self.body = body
+        self.content_type = content_type
+        self.headers = headers or {}
+        self.parse = parse
+        self.idempotent = method in ('GET', 'HEAD', 'PUT', 'DELETE') if idempotent is None else idempotent
+
+
+def _json_data(response: Response):
+    response.raise_for_status()
+    return response.json().get('data')
+
+
+def _arrays(response: Response):
+    response.raise_for_status()
+    return response.arrays()
+
+
+class _ClientBase:
+    """
+    同步/异步客户端共用的接口定义，接口方法只构造_Call，由子类的_run执行:
+    同步客户端直接返回结果，异步客户端返回协程
+    :param base_url: 如 http://localhost:5000
+    :param tool: EDA工具名
+    :param max_connections: 连接池大小，也是对该服务器的最大并发请求数
+    :param retries: 连接错误/502/503/504的最大重试次数
+    :param backoff: 第n次重试前等待 backoff * 2**n 秒(最多10秒)
+    :param cache_path: DesignCache持久化文件，不提供时只在内存中缓存
+    """
+    def __init__(self, base_url: str, tool='leapr', max_connections=8, timeout=600.0, retries=3, backoff=0.2,
+                 cache_path: Optional[str] = None):
+        parsed = urllib.parse.urlsplit(base_url)
+        if parsed.scheme not in ('http', 'https'):
+            raise ValueError(f'unsupported url {base_url}')
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.prefix = parsed.path.rstrip('/')
+        self.tool = tool
+        self.max_connections = max(int(max_connections), 1)
+        self.timeout = timeout
+        self.retries = max(int(retries), 0)
+        self.backoff = backoff
+        self.design_cache = DesignCache(cache_path)
+
+    def _target(self, call: _Call) -> str:
+        query = urllib.parse.urlencode({k: v for k, v in (call.params or {}).items() if v is not None})
+        return self.prefix + call.path + ('?' + query if query else '')
+
+    def _headers(self, call: _Call) -> Dict[str, str]:
+        headers = {'Host': f'{self.host}:{self.port}', 'Accept-Encoding': 'identity', 'Connection': 'keep-alive',
+                   'Content-Length': str(len(call.body or b''))}
+        if call.content_type:
+            headers['Content-Type'] = call.content_type
+        headers.update(call.headers)
+        return headers
+
+    def _retry_delay(self, call: _Call, attempt: int, error: Optional[Exception] = None,
+                     response: Optional[Response] = None) -> Optional[float]:
+        """返回重试前的等待秒数，不重试时返回None"""
+        if attempt >= self.retries:
+            return None
+        if response is not None and (response.status not in RETRY_STATUSES or not call.idempotent):
+            return None
+        if error is not None and not call.idempotent:
+            return None
+        return min(self.backoff * (2 ** attempt), 10.0)
+
+    def _tool_path(self, name: str) -> str:
+        return f'/{self.tool}/{name}'
+
+    def _run(self, call: _Call):
+        raise NotImplementedError
+
+    # ---- 接口 ----
+    def request(self, method: str, path: str, params: Optional[dict] = None, json_body=None,
+                data: Optional[bytes] = None, content_type: Optional[str] = None):
+        """任意接口，返回Response(不检查状态码)"""
+        if json_body is not None:
+            data, content_type = json.dumps(json_body).encode(), 'application/json'
+        return self._run(_Call(method, path, params, data, content_type, parse=lambda response: response))
+
+    def healthz(self):
+        return self._run(_Call('GET', '/healthz', parse=_json_data))
+
+    def load_netlist(self):
+        """从EDA重新读取网表，返回JSON格式的Design(大设计建议用design())"""
+        return self._run(_Call('POST', self._tool_path('load_netlist'), parse=_json_data, idempotent=True))
+
+    def design(self, refresh=False):
+        """
+        返回本地DesignCache，先按ETag向服务端同步: 未变化时304，只有摆放变化时增量更新
+        :param refresh: True时服务端先从EDA重新读取网表
+        """
+        cache = self.design_cache
+        since = cache.etag if cache.loaded else None
+        headers = {'If-None-Match': f'"{since}"'} if since and not refresh else {}
+
+        def parse(response: Response):
+            response.raise_for_status()
+            cache.apply(response, since)
+            return cache
+
+        return self._run(_Call('GET', self._tool_path('design'),
+                               {'since': since, 'refresh': 1 if refresh else None}, headers=headers, parse=parse))
+
+    def get_timing(self, topn=10):
+        return self._run(_Call('GET', self._tool_path('get_timing'), {'topn': topn}, parse=_json_data))
+
+    def timing_query(self, query='summary', **params):
+        return self._run(_Call('GET', self._tool_path('timing_query'), dict(params, query=query), parse=_json_data))
+
+    def timing_weights(self, names=False):
+        """net权重和cell criticality的numpy数组"""
+        return self._run(_Call('GET', self._tool_path('timing_weights'), {'names': 1 if names else 0},
+                               parse=_arrays))
+
+    def execute_tcl(self, commands: List[str]):
+        body = json.dumps({'commands': list(commands)}).encode()
+        return self._run(_Call('POST', self._tool_path('execute_tcl'), body=body, content_type='application/json',
+                               parse=_json_data))
+
+    def place_cells(self, x, y, cell_ids=None, cell_names=None, orient=None, status=None, diff=True,
+                    validate=False):
+        """
+        批量摆放，npz列式请求体；cell_ids为DesignCache中的下标，或者给出cell_names
+        orient/status可以是字符串列表或编码后的整数数组(编码见edx_server/design_index.py)
+        """
+        if (cell_ids is None) == (cell_names is None):
+            raise ValueError('exactly one of cell_ids and cell_names is required')
+        columns = {'x': np.asarray(x, dtype=np.float64), 'y': np.asarray(y, dtype=np.float64)}
+        if cell_ids is not None:
+            columns['cell_id'] = np.asarray(cell_ids, dtype=np.int64)
+        else:
+            columns['cell_name'] = list(cell_names)
+        if orient is not None:
+            columns['orient'] = orient if isinstance(orient, np.ndarray) else list(orient)
+        if status is not None:
+            columns['place_status'] = status if isinstance(status, np.ndarray) else list(status)
+        # 位置是绝对值，重复发送结果相同，可以重试
+        return self._run(_Call('POST', self._tool_path('place_cells'),
+                               {'diff': 1 if diff else 0, 'validate': 1 if validate else None},
+                               encode_arrays(columns), 'application/octet-stream', parse=_json_data,
+                               idempotent=True))
+
+
+class EdxClient(_ClientBase):
+    """同步客户端，线程安全，多个线程共用一个实例即可共享连接池和DesignCache"""
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(base_url, **kwargs)
+        self._idle: List[http.client.HTTPConnection] = []
+        self._idle_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _send(self, call: _Call, target: str, headers: Dict[str, str]) -> Response:
+        """占用一个连接发送一次请求，复用的连接已失效时换新连接重发一次"""
+        with self._slots:
+            with self._idle_lock:
+                conn = self._idle.pop() if self._idle else None
+            reused = conn is not None
+            while True:
+                if conn is None:
+                    conn = self._connect()
+                try:
+                    conn.request(call.method, target, call.body, headers)
+                    raw = conn.getresponse()
+                    body = raw.read()
+                except STALE_CONNECTION_ERRORS:
+                    conn.close()
+                    if not reused:
+                        raise
+                    conn, reused = None, False
+                    continue
+                except BaseException:
+                    conn.close()
+                    raise
+                response = Response(raw.status, {k.lower(): v for k, v in raw.getheaders()}, body)
+                if raw.will_close:
+                    conn.close()
+                else:
+                    with self._idle_lock:
+                        self._idle.append(conn)
+                return response
+
+    def _run(self, call: _Call):
+        target, headers = self._target(call), self._headers(call)
+        attempt = 0
+        while True:
+            try:
+                response = self._send(call, target, headers)
+            except (OSError, http.client.HTTPException) as e:
+                delay = self._retry_delay(call, attempt, error=e)
+                if delay is None:
+                    raise
+                logger.warning(f"{call.method} {target} failed ({e}), retry in {delay:.1f}s")
+            else:
+                delay = self._retry_delay(call, attempt, response=response)
+                if delay is None:
+                    return call.parse(response) if call.parse else response
+                logger.warning(f"{call.method} {target} returned {response.status}, retry in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self):
+        with self._idle_lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _AsyncConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncEdxClient(_ClientBase):
+    """
+    asyncio客户端，基于asyncio streams实现HTTP/1.1 keep-alive，不依赖aiohttp
+    实例只能在创建它后第一次使用的事件循环中使用
+    """
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(base_url, **kwargs)
+        self._idle: List[_AsyncConnection] = []
+        self._slots = None
+
+    async def _connect(self) -> _AsyncConnection:
+        context = ssl.create_default_context() if self.scheme == 'https' else None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context, limit=1 << 20), self.timeout)
+        return _AsyncConnection(reader, writer)
+
+    @staticmethod
+    async def _read_response(conn: _AsyncConnection, method: str):
+        """读取一个响应，返回(Response, 连接是否可以复用)"""
+        reader = conn.reader
+        status_line = await reader.readline()
+        if not status_line:
+            raise http.client.RemoteDisconnected('connection closed without response')
+        version, status = status_line.split(None, 2)[:2]
+        status = int(status)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' and (version != b'HTTP/1.0' or connection == 'keep-alive')
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            body = b''
+        elif 'chunked' in headers.get('transfer-encoding', '').lower():
+            parts = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                parts.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(parts)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body, keep_alive = await reader.read(), False
+        return Response(status, headers, body), keep_alive
+
+    async def _send(self, call: _Call, target: str, headers: Dict[str, str]) -> Response:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_connections)
+        head = f'{call.method} {target} HTTP/1.1\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in headers.items())
+        request = head.encode('latin-1') + b'\r\n' + (call.body or b'')
+        async with self._slots:
+            conn = self._idle.pop() if self._idle else None
+            reused = conn is not None
+            while True:
+                if conn is None:
+                    conn = await self._connect()
+                try:
+                    conn.writer.write(request)
+                    await conn.writer.drain()
+                    response, keep_alive = await asyncio.wait_for(self._read_response(conn, call.method),
+                                                                  self.timeout)
+                except STALE_CONNECTION_ERRORS:
+                    conn.close()
+                    if not reused:
+                        raise
+                    conn, reused = None, False
+                    continue
+                except BaseException:
+                    conn.close()
+                    raise
+                if keep_alive:
+                    self._idle.append(conn)
+                else:
+                    conn.close()
+                return response
+
+    async def _execute(self, call: _Call):
+        target, headers = self._target(call), self._headers(call)
+        attempt = 0
+        while True:
+            try:
+                response = await self._send(call, target, headers)
+            except (OSError, EOFError, http.client.HTTPException, asyncio.TimeoutError) as e:
+                delay = self._retry_delay(call, attempt, error=e)
+                if delay is None:
+                    raise
+                logger.warning(f"{call.method} {target} failed ({e!r}), retry in {delay:.1f}s")
+            else:
+                delay = self._retry_delay(call, attempt, response=response)
+                if delay is None:
+                    return call.parse(response) if call.parse else response
+                logger.warning(f"{call.method} {target} returned {response.status}, retry in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _run(self, call: _Call):
+        return self._execute(call)
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
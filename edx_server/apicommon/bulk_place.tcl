@@ -0,0 +1,75 @@
+# 批量摆放加载器，由edx_server的bulk_place.py生成的数据文件驱动
+# 数据文件格式(小端):
+#   magic 'EDXP' | version int32 | count int32 |
+#   index int32[count] | x double[count] | y double[count] | orient int8[count] | status int8[count]
+# index是名表文件(每行一个cell名)中的下标，名表按token缓存，token不变时不重复读取
+# orient为-1表示不修改方向；status: 0 unplaced, 1 placed, 2 fixed, 3 cover
+# 执行结果写到 server_result.txt: 第一行 "placed <n> failed <m>"，之后每行一个失败的cell名
+# (命令出错或status无法识别)
+
+# 本文件通常在监听器的proc内被source，顶层变量需显式放到全局命名空间
+set ::edx_bulk_orient_names {R0 R90 R180 R270 MX MY MX90 MY90 N S E W FN FS FE FW}
+
+proc edx_bulk_load_names {names_file token} {
+    global edx_bulk_names edx_bulk_token
+    if {[info exists edx_bulk_token] && $edx_bulk_token eq $token} {
+        return
+    }
+    set f [open $names_file r]
+    fconfigure $f -encoding utf-8
+    set edx_bulk_names [split [read -nonewline $f] "\n"]
+    close $f
+    set edx_bulk_token $token
+}
+
+proc edx_bulk_place {names_file token data_file} {
+    global EDX_TMP edx_bulk_names edx_bulk_orient_names
+    edx_bulk_load_names $names_file $token
+
+    set f [open $data_file r]
+    fconfigure $f -translation binary
+    set data [read $f]
+    close $f
+    binary scan $data a4ii magic version count
+    if {$magic ne "EDXP"} {
+        error "invalid placement data file: $data_file"
+    }
+    # 一次binary scan取出所有列
+    binary scan $data x12i${count}q${count}q${count}c${count}c${count} idxs xs ys orients statuses
+
+    set placed 0
+    set failed [list]
+    foreach idx $idxs x $xs y $ys o $orients s $statuses {
+        set name [lindex $edx_bulk_names $idx]
+        switch -- $s {
+            0 {
+                set cmd [list set_cell_placement_status -name $name -status unplaced]
+            }
+            1 - 2 - 3 {
+                set cmd [list place_cell $name $x $y]
+                if {$o >= 0} {
+                    lappend cmd -orient [lindex $edx_bulk_orient_names $o]
+                }
+                lappend cmd [lindex {- -placed -fixed -cover} $s]
+            }
+            default {
+                # 无法识别的状态(包括encode_statuses对未知状态给出的-1)不摆放，按失败返回
+                lappend failed $name
+                continue
+            }
+        }
+        if {[catch $cmd]} {
+            lappend failed $name
+        } else {
+            incr placed
+        }
+    }
+
+    set fp [open [file join $EDX_TMP "server_result.txt"] w]
+    puts $fp "placed $placed failed [llength $failed]"
+    foreach name $failed {
+        puts $fp $name
+    }
+    close $fp
+    return $placed
+}
@@ -1,10 +1,24 @@
 # 这个脚本主要是EDA读取，用来后续AI工具给EDA工具喂命令的
 # 设置脚本交互目录
 puts "api dir is ${EDX_TMP}"
+source [file join [file dirname [file normalize [info script]]] "edx_execute.tcl"]
 
 # 全局变量用于控制监听器状态
 set listener_running 0
 set listener_id ""
+set listener_heartbeat 0
+
+# 每秒最多更新一次心跳文件，Python侧据此判断监听器是否存活(/readyz)
+proc edx_heartbeat {} {
+    global EDX_TMP listener_heartbeat
+    set now [clock seconds]
+    if {$now != $listener_heartbeat} {
+        set listener_heartbeat $now
+        set f [open [file join $EDX_TMP "listener_heartbeat"] w]
+        puts $f $now
+        close $f
+    }
+}
 
 # 写一个异步过程，使用after命令不断检查目录下是否有client_result文件
 proc monitor_client_result_async {} {
@@ -14,33 +28,21 @@ proc monitor_client_result_async {} {
     }
 
     set target_dir "${EDX_TMP}"
-    
+    edx_heartbeat
+
     set client_result_path [file join $target_dir "client_result_done"]
     # 检查 client_result 文件是否存在
     if {[file exists $client_result_path]} {
+        set detected [clock microseconds]
         puts "检测到 client_result_done 文件"
 
-        # 执行目录下的 command.tcl
-        set command_path [file join $target_dir "command.tcl"]
-        if {[file exists $command_path]} {
-            # 执行命令,添加异常保护
-            try {
-                puts "执行 command.tcl $command_path"
-                source $command_path
-            } on error {errorMsg options} {
-                puts "execute failed: $errorMsg"
-            } on ok {} {
-                puts "execute success"
-            }
-        } else {
-            puts "警告: command.tcl 文件不存在"
-        }
-        # 删除 client_result_done 文件
-        if {[file exists $client_result_path]} {
-            file delete $client_result_path
-            puts "已删除 client_result_done 文件"
+        # 执行目录下的 command.tcl，异常和耗时写到server_status.txt
+        puts "执行 command.tcl [file join $target_dir command.tcl]"
+        lassign [edx_execute_command $target_dir $detected] ok errorMsg
+        if {$ok} {
+            puts "execute success"
         } else {
-            puts "client_result_done 文件不存在，无需删除"
+            puts "execute failed: $errorMsg"
         }
         # 写server_result_done文件，告诉AI工具脚本执行完成
         set server_result_path [file join $target_dir "server_result_done"]
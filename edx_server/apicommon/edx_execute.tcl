@@ -0,0 +1,62 @@
+# 执行EDX_TMP下的command.tcl，并把执行情况写到server_status.txt，
+# Python侧(TCLSender)据此区分EDA执行时间与轮询/文件传输开销
+# 由eda_command_listener.tcl和pyc_placer.tcl共用
+# server_status.txt格式: 每行"键 值"，时间为clock microseconds；
+# 出错时最后是单独一行error_info，其后全部为errorInfo原文
+# command_owner是Python侧为该命令生成的token，执行期间可用edx_command_owner取得，
+# pyc_*把它带给插件守护线程，用来判断是否由持有通道锁的请求发出
+
+if {![info exists ::edx_active_owner]} {
+    set ::edx_active_owner ""
+}
+
+proc edx_command_owner {} {
+    return $::edx_active_owner
+}
+
+proc edx_execute_command {target_dir detected} {
+    set command_path [file join $target_dir "command.tcl"]
+    set owner_path [file join $target_dir "command_owner"]
+    set owner ""
+    if {[file exists $owner_path]} {
+        set f [open $owner_path r]
+        set owner [string trim [read $f]]
+        close $f
+    }
+    # 嵌套执行(pyc_*处理函数回调EDA)结束后恢复外层命令的owner
+    set outer_owner $::edx_active_owner
+    set ::edx_active_owner $owner
+    # 执行前取走client_result_done: command.tcl中调用pyc_*时，pyc_*的等待循环不会把同一条命令再执行一遍
+    file delete [file join $target_dir "client_result_done"]
+    set start 0
+    set end 0
+    set ok 0
+    set error_msg ""
+    set error_info ""
+    if {[file exists $command_path]} {
+        set start [clock microseconds]
+        # 在调用者的作用域中执行，与原来直接source一致
+        if {[catch {uplevel 1 [list source $command_path]} error_msg options]} {
+            set error_info [dict get $options -errorinfo]
+        } else {
+            set ok 1
+            set error_msg ""
+        }
+        set end [clock microseconds]
+    } else {
+        set error_msg "command.tcl not found"
+    }
+    set ::edx_active_owner $outer_owner
+    set f [open [file join $target_dir "server_status.txt"] w]
+    puts $f "detected $detected"
+    puts $f "start $start"
+    puts $f "end $end"
+    puts $f "ok $ok"
+    puts $f "error [string map {"\n" " "} $error_msg]"
+    if {$error_info ne ""} {
+        puts $f "error_info"
+        puts $f $error_info
+    }
+    close $f
+    return [list $ok $error_msg]
+}
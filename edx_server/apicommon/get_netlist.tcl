@@ -51,6 +51,14 @@ foreach cell_name $cell_names {
 
 # 获取核心尺寸
 set core_size [udm_get_prop [udm_get_obj -type floorplan] core_box_size]
+# core左下角坐标，取不到core_box时按(0, 0)
+set core_origin {0 0}
+if {![catch {udm_get_prop [udm_get_obj -type floorplan] core_box} core_box]} {
+    set core_box_flat [join $core_box]
+    if {[llength $core_box_flat] >= 2} {
+        set core_origin [lrange $core_box_flat 0 1]
+    }
+}
 
 # 初始化变量
 set net_map {}
@@ -58,7 +66,7 @@ set server_result_txt [file join $EDX_TMP "server_result.txt"]
 set fp [open "${server_result_txt}" w]
 
 puts $fp "=======design_info======="
-puts $fp "core_size: $core_size"
+puts $fp "core_size: $core_size core_origin: {$core_origin}"
 puts $fp "=======cell_info======="
 
 # 预先统计总数，用于进度显示（可选）
@@ -20,32 +20,37 @@ if {![info exists EDX_TMP]} {
 }
 
 log_info "api dir is ${EDX_TMP}"
+source [file join [file dirname [file normalize [info script]]] "edx_execute.tcl"]
+# 等待Python侧结果时的轮询间隔(毫秒)，从最小值开始，没有新文件时逐步加倍到最大值，有活动时回到最小值
+# Python侧插件守护线程用inotify监听，回复通常在几毫秒内到达，这里的间隔决定Leapr阻塞的时长
+if {![info exists pyc_poll_min_ms]} {
+    set pyc_poll_min_ms 5
+}
+if {![info exists pyc_poll_max_ms]} {
+    set pyc_poll_max_ms 100
+}
+
+proc pyc_next_delay {delay} {
+    global pyc_poll_max_ms
+    # 阻塞等待期间异步监听器不会运行，由这里继续更新心跳
+    if {[llength [info procs edx_heartbeat]]} {
+        edx_heartbeat
+    }
+    return [expr {min($delay * 2, $pyc_poll_max_ms)}]
+}
 # 写一个死循环，不断读取目录下是否有client_result文件
 proc monitor_client_result {} {
-    global EDX_TMP
+    global EDX_TMP pyc_poll_min_ms
     set target_dir "${EDX_TMP}"
+    set delay $pyc_poll_min_ms
     while {1} {
         set client_result_path [file join $target_dir "client_result_done"]
         # 检查 client_result 文件是否存在
         if {[file exists $client_result_path]} {
-            # 执行目录下的 command.tcl
-            set command_path [file join $target_dir "command.tcl"]
-            if {[file exists $command_path]} {
-                # 执行命令,添加异常保护
-                try {
-                    source $command_path
-                } on error {errorMsg options} {
-                    log_info "execute failed"
-                } on ok {} {
-                }
-            } else {
-                log_info "警告: command.tcl 文件不存在"
-            }
-            # 删除 client_result_done 文件
-            if {[file exists $client_result_path]} {
-                file delete $client_result_path
-            } else {
-                log_info "client_result_done 文件不存在，无需删除"
+            # 执行目录下的 command.tcl，异常和耗时写到server_status.txt
+            lassign [edx_execute_command $target_dir [clock microseconds]] ok errorMsg
+            if {!$ok} {
+                log_info "execute failed: $errorMsg"
             }
             # 写server_result_done文件，告诉AI工具脚本执行完成
             set server_result_path [file join $target_dir "server_result_done"]
@@ -71,35 +76,23 @@ proc monitor_client_result {} {
             break
         }
         # 短暂休眠，避免过度占用CPU
-        after 1000  ;# 休眠1秒
+        after $delay
+        set delay [pyc_next_delay $delay]
     }
 }
 
 proc monitor_client_result_plugin {} {
-    global EDX_TMP
+    global EDX_TMP pyc_poll_min_ms
     set target_dir "${EDX_TMP}"
+    set delay $pyc_poll_min_ms
     while {1} {
         set client_result_path [file join $target_dir "client_result_done"]
         # 检查 client_result 文件是否存在
         if {[file exists $client_result_path]} {
-            # 执行目录下的 command.tcl
-            set command_path [file join $target_dir "command.tcl"]
-            if {[file exists $command_path]} {
-                # 执行命令,添加异常保护
-                try {
-                    source $command_path
-                } on error {errorMsg options} {
-                    log_info "execute failed"
-                } on ok {} {
-                }
-            } else {
-                log_info "警告: command.tcl 文件不存在"
-            }
-            # 删除 client_result_done 文件
-            if {[file exists $client_result_path]} {
-                file delete $client_result_path
-            } else {
-                log_info "client_result_done 文件不存在，无需删除"
+            # 执行目录下的 command.tcl，异常和耗时写到server_status.txt
+            lassign [edx_execute_command $target_dir [clock microseconds]] ok errorMsg
+            if {!$ok} {
+                log_info "execute failed: $errorMsg"
             }
             # 写server_result_done文件，告诉AI工具脚本执行完成
             log_debug "write server_result_done"
@@ -112,9 +105,9 @@ proc monitor_client_result_plugin {} {
                 close $f
                 log_debug "==========create server result done111 $server_result_path"
             }
+            # 插件正在回调EDA，下一条命令或结果很快就会到
+            set delay $pyc_poll_min_ms
         }
-        # 短暂休眠，避免过度占用CPU
-        after 1000  ;# 休眠1秒
         # 检测插件是否执行完
         log_debug "==========waiting plugin_msg_done"
         # 如果EDX_TMP目录下有plugin_msg_done文件，则读取plugin_msg.txt文件,并将内容打印出来
@@ -132,6 +125,9 @@ proc monitor_client_result_plugin {} {
                 break
             }
         }
+        # 短暂休眠，避免过度占用CPU
+        after $delay
+        set delay [pyc_next_delay $delay]
     }
 }
 
@@ -145,6 +141,7 @@ proc pyc_reset {} {
     }
     set f [open $plugin_cmd_path w]
     puts $f "pyc_reset"
+    puts $f "owner [edx_command_owner]"
     close $f
     # 写一个plugin_cmd_done文件，告诉AI工具脚本执行完成
     set plugin_cmd_done_path [file join $target_dir "plugin_cmd_done"]
@@ -172,6 +169,7 @@ proc pyc_global_placement {{args ""}} {
     } else {
         puts $f "pyc_global_placement $args"
     }
+    puts $f "owner [edx_command_owner]"
     close $f
     # 写一个plugin_cmd_done文件，告诉AI工具脚本执行完成
     set plugin_cmd_done_path [file join $target_dir "plugin_cmd_done"]
@@ -199,6 +197,7 @@ proc pyc_increment_placement {{args ""}} {
     } else {
         puts $f "pyc_increment_placement $args"
     }
+    puts $f "owner [edx_command_owner]"
     close $f
     # 写一个plugin_cmd_done文件，告诉AI工具脚本执行完成
     set plugin_cmd_done_path [file join $target_dir "plugin_cmd_done"]
@@ -222,6 +221,7 @@ proc pyc_reset_only_increment {} {
     }
     set f [open $plugin_cmd_path w]
     puts $f "pyc_reset_only_increment"
+    puts $f "owner [edx_command_owner]"
     close $f
     # 写一个plugin_cmd_done文件，告诉AI工具脚本执行完成
     set plugin_cmd_done_path [file join $target_dir "plugin_cmd_done"]
@@ -249,6 +249,7 @@ proc pyc_get_cell {{args ""}} {
     } else {
         puts $f "pyc_get_cell $args"
     }
+    puts $f "owner [edx_command_owner]"
     close $f
     # 写一个plugin_cmd_done文件，告诉AI工具脚本执行完成
     set plugin_cmd_done_path [file join $target_dir "plugin_cmd_done"]
@@ -276,6 +277,7 @@ proc pyc_get_name {{args ""}} {
     } else {
         puts $f "pyc_get_name $args"
     }
+    puts $f "owner [edx_command_owner]"
     close $f
     # 写一个plugin_cmd_done文件，告诉AI工具脚本执行完成
     set plugin_cmd_done_path [file join $target_dir "plugin_cmd_done"]
@@ -300,6 +302,7 @@ proc pyc_refresh_timing {{args ""}} {
     }
     set f [open $plugin_cmd_path w]
     puts $f "pyc_refresh_timing"
+    puts $f "owner [edx_command_owner]"
     close $f
     # 写一个plugin_cmd_done文件，告诉AI工具脚本执行完成
     set plugin_cmd_done_path [file join $target_dir "plugin_cmd_done"]
@@ -327,6 +330,7 @@ proc pyc_report_timing {{args ""}} {
     } else {
         puts $f "pyc_report_timing $args"
     }
+    puts $f "owner [edx_command_owner]"
     close $f
     # 写一个plugin_cmd_done文件，告诉AI工具脚本执行完成
     set plugin_cmd_done_path [file join $target_dir "plugin_cmd_done"]
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+'''
+分组数组运算的公共函数
+数据按组连续存放(先按组排序)，groups为每个元素所属的组号，组内的扫描不跨组。
+基本技巧: 给每组加一个足够大的偏移，使后面组的值整体大于前面组，
+再对整个数组做一次np.maximum.accumulate，相当于每组各自做cummax。
+'''
+import numpy as np
+
+
+def group_starts(groups: np.ndarray) -> np.ndarray:
+    """已排序的组号数组中，每个元素所在组的起始下标"""
+    count = len(groups)
+    if count == 0:
+        return np.zeros(0, dtype=np.int64)
+    is_start = np.ones(count, dtype=bool)
+    is_start[1:] = groups[1:] != groups[:-1]
+    return np.maximum.accumulate(np.where(is_start, np.arange(count), 0))
+
+
+def grouped_cummax(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """组内前缀最大值，groups需已排序"""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return values.copy()
+    span = values.max() - values.min() + 1.0
+    rank = np.cumsum(np.concatenate(([0], groups[1:] != groups[:-1])))
+    offset = rank * span
+    return np.maximum.accumulate(values + offset) - offset
+
+
+def grouped_cummin_reverse(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """组内后缀最小值(从组尾向组头扫描)，groups需已排序"""
+    values = np.asarray(values, dtype=np.float64)
+    return -grouped_cummax(-values[::-1], groups[::-1])[::-1]
+
+
+def grouped_exclusive_cumsum(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """组内不含自身的前缀和，groups需已排序"""
+    values = np.asarray(values, dtype=np.float64)
+    total = np.cumsum(values) - values
+    return total - total[group_starts(groups)]
+
+
+def pack_1d(pos: np.ndarray, size: np.ndarray, groups: np.ndarray, lower, upper) -> np.ndarray:
+    """
+    一维无重叠打包: 每组内元素按pos排好序，求离原位置尽量近且互不重叠的新位置
+    先从左往右推开重叠(new_i = max(pos_i, new_{i-1} + size_{i-1}))，
+    再从右边界往回压(new_i = min(new_i, new_{i+1} - size_i))。
+    两步都化成带偏移的前缀扫描，整体是O(n)的向量化计算。
+    组内总长度超过[lower, upper]时右端压回后会越过lower，由调用方检查。
+    :param lower, upper: 每组的边界，标量或与pos等长的数组
+    """
+    pos = np.asarray(pos, dtype=np.float64)
+    size = np.asarray(size, dtype=np.float64)
+    if len(pos) == 0:
+        return pos.copy()
+    lower = np.broadcast_to(np.asarray(lower, dtype=np.float64), pos.shape)
+    upper = np.broadcast_to(np.asarray(upper, dtype=np.float64), pos.shape)
+    before = grouped_exclusive_cumsum(size, groups)
+    pushed = before + grouped_cummax(np.maximum(pos, lower + before) - before, groups)
+    # after_i: 组内i及其之后的总长度
+    after = grouped_exclusive_cumsum(size[::-1], groups[::-1])[::-1] + size
+    return np.minimum(pushed, upper - after)
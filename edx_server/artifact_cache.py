@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+'''
+download_file/download_netlist生成文件的缓存
+1. key = sha256(脚本内容 + 产物名 + 参数 + design版本)，脚本或design(摆放、执行TCL、重新读取网表)变化后自然不再命中
+2. 产物复制到EDX_TMP/artifact_cache下(EDA下次生成时会原地截断重写原文件，不能用硬链接)，
+   Linux上shutil.copyfile使用sendfile/copy_file_range，不经过用户态缓冲
+3. 按最近使用时间淘汰，条目数和总大小都有上限；写入新条目时顺带删除旧design版本的条目
+4. design版本只在进程内有效，启动时清空缓存目录
+'''
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactEntry:
+    def __init__(self, key: str, path: str, name: str, size: int, version: int):
+        self.key = key
+        self.path = path
+        self.name = name
+        self.size = size
+        self.version = version
+        self.created = time.time()
+
+    def to_dict(self) -> dict:
+        return {'key': self.key, 'name': self.name, 'size': self.size, 'version': self.version,
+                'created': self.created}
+
+
+class ArtifactCache:
+    """
+    :param directory: 缓存目录
+    :param max_bytes: 缓存文件总大小上限
+    :param max_entries: 条目数上限
+    """
+    def __init__(self, directory: str, max_bytes=2 << 30, max_entries=64):
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self.max_entries = int(max_entries)
+        self._entries: "OrderedDict[str, ArtifactEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(script_path: str, name: str, version: int, args: Optional[dict] = None) -> str:
+        digest = hashlib.sha256()
+        with open(script_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        digest.update(f'\0{name}\0{version}\0{sorted((args or {}).items())}'.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[ArtifactEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not os.path.exists(entry.path):
+                if entry is not None:
+                    self._remove(key)
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+    def put(self, key: str, source_path: str, name: str, version: int) -> ArtifactEntry:
+        """复制source_path到缓存目录，返回新条目"""
+        path = os.path.join(self.directory, f'{key}_{os.path.basename(name)}')
+        temp = path + '.tmp'
+        shutil.copyfile(source_path, temp)
+        os.replace(temp, path)
+        entry = ArtifactEntry(key, path, name, os.path.getsize(path), version)
+        with self._lock:
+            # 同一key的旧条目与新文件是同一路径，文件已被覆盖，只去掉记录
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old.size
+            for stale in [k for k, e in self._entries.items() if e.version != version]:
+                self._remove(stale)
+            self._entries[key] = entry
+            self.total_bytes += entry.size
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries
+                                              or self.total_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+        logger.info(f"artifact cached: {name}, {entry.size} bytes, {len(self._entries)} entries, "
+                    f"{self.total_bytes} bytes total")
+        return entry
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.size
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def info(self) -> dict:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), total_bytes=self.total_bytes,
+                        max_bytes=self.max_bytes, max_entries=self.max_entries)
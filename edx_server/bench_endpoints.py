@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+'''
+端到端性能基准: 用fake_leapr.py模拟Leapr，逐个接口测量延迟、吞吐和内存峰值，输出JSON供CI比较
+1. 默认在进程内用Flask test client访问main.app(不经过网络)，模拟Leapr在子进程中运行，
+   内存峰值用tracemalloc单独跑一次测得，不包含模拟Leapr生成网表的内存
+2. --url 访问已启动的服务(run_server.py)，此时只有延迟和吞吐，模拟Leapr使用服务的EDX_TMP
+3. --baseline 与之前的结果比较，p50延迟或内存峰值超过 (1 + --max-regression) 倍且绝对差超过阈值时返回非0
+
+    python bench_endpoints.py --cells 100000 --repeat 5 --output bench.json
+    python bench_endpoints.py --cells 100000 --baseline bench.json
+'''
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from config import DEFAULT_CONFIG
+from fake_leapr import SyntheticDesign
+
+logger = logging.getLogger(__name__)
+
+TOOL = 'leapr'
+# 单次place_cells/validate_placement请求的cell数上限
+PLACE_BATCH = 10000
+
+
+class Scenario:
+    """
+    一个被测接口
+    :param body: 返回(请求体, Content-Type)的函数，参数为第几次调用，None表示没有请求体
+    :param iterations: 覆盖--repeat，用于会改变状态或开销很大的接口
+    """
+    def __init__(self, name: str, method: str, path: str, body: Optional[Callable] = None, iterations=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.iterations = iterations
+
+
+def _json(value) -> Callable:
+    return lambda iteration: (json.dumps(value).encode(), 'application/json')
+
+
+def build_scenarios(design: SyntheticDesign, seed=1) -> List[Scenario]:
+    """按依赖顺序排列: 先load_netlist/get_timing，再用到缓存的计算接口，最后是会改变摆放的接口"""
+    rng = np.random.default_rng(seed)
+    count = min(PLACE_BATCH, design.num_cells)
+    cell_ids = np.sort(rng.choice(design.num_cells, count, replace=False))
+
+    def placement(iteration):
+        # 每次移动一个site，避免被差分发送跳过
+        x = np.round(design.x[cell_ids] + design.site_width * (iteration + 1), 4)
+        return json.dumps({'cell_id': cell_ids.tolist(), 'x': x.tolist(),
+                           'y': design.y[cell_ids].tolist()}).encode(), 'application/json'
+
+    upload = os.urandom(1 << 20)
+    prefix = f'/{TOOL}'
+    return [
+        Scenario('healthz', 'GET', '/healthz'),
+        Scenario('readyz', 'GET', '/readyz'),
+        Scenario('load_netlist', 'POST', f'{prefix}/load_netlist'),
+        Scenario('download_netlist', 'GET', f'{prefix}/download_netlist?refresh=1'),
+        Scenario('download_netlist_cached', 'GET', f'{prefix}/download_netlist'),
+        Scenario('get_timing', 'GET', f'{prefix}/get_timing?topn=1000'),
+        Scenario('timing_query', 'GET', f'{prefix}/timing_query?query=worst_cells&limit=100'),
+        Scenario('timing_weights', 'GET', f'{prefix}/timing_weights?format=npz'),
+        Scenario('hierarchy', 'GET', f'{prefix}/hierarchy?depth=2'),
+        Scenario('validate_placement', 'POST', f'{prefix}/validate_placement', placement),
+        Scenario('partition', 'POST', f'{prefix}/partition', _json({'num_parts': 4})),
+        Scenario('plan_ports', 'POST', f'{prefix}/plan_ports', _json({'write_tcl': False})),
+        Scenario('levelize', 'POST', f'{prefix}/levelize', _json({})),
+        Scenario('split_modules', 'POST', f'{prefix}/split_modules',
+                 _json({'modules': ['top/u_b0'], 'compress': False}), iterations=1),
+        Scenario('snapshot', 'POST', f'{prefix}/snapshot', _json({'name': 'bench'}), iterations=1),
+        Scenario('place_cells', 'POST', f'{prefix}/place_cells', placement),
+        Scenario('diff', 'GET', f'{prefix}/diff?name=bench&limit=100'),
+        Scenario('rollback', 'POST', f'{prefix}/rollback', _json({'name': 'bench'}), iterations=1),
+        Scenario('global_place', 'POST', f'{prefix}/global_place', _json({'max_iterations': 10}), iterations=1),
+        Scenario('execute_tcl', 'POST', f'{prefix}/execute_tcl',
+                 _json({'commands': [f'place_cell {design.cell_name(0)} 0 0 -placed']})),
+        Scenario('upload_file', 'POST', f'{prefix}/upload_file?name=bench_upload.bin',
+                 lambda iteration: (upload, 'application/octet-stream')),
+        Scenario('metrics', 'GET', '/metrics'),
+    ]
+
+
+class LocalClient:
+    """进程内访问main.app"""
+    def __init__(self):
+        from main import app
+        self._client = app.test_client()
+
+    def request(self, method: str, path: str, body=None, content_type=None):
+        response = self._client.open(path, method=method, data=body, content_type=content_type)
+        data = response.get_data()
+        return response.status_code, data, dict(response.headers)
+
+
+class HttpClient:
+    def __init__(self, url: str, timeout=3600):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method: str, path: str, body=None, content_type=None):
+        req = urllib.request.Request(self.url + path, data=body, method=method)
+        if content_type:
+            req.add_header('Content-Type', content_type)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return response.status, response.read(), dict(response.headers)
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), dict(e.headers)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def _rss_bytes() -> int:
+    # Linux上ru_maxrss单位为KB，macOS上为字节
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def run_scenario(client, scenario: Scenario, repeat: int, trace_memory: bool) -> dict:
+    iterations = scenario.iterations or repeat
+    latencies, eda_seconds = [], []
+    status, size, error = 200, 0, ''
+    wall_start = time.perf_counter()
+    for iteration in range(iterations):
+        body, content_type = scenario.body(iteration) if scenario.body else (None, None)
+        start = time.perf_counter()
+        status, data, headers = client.request(scenario.method, scenario.path, body, content_type)
+        latencies.append(time.perf_counter() - start)
+        eda_seconds.append(float(headers.get('X-EDA-Exec-Seconds', 0.0)))
+        size = len(data)
+        if status >= 400:
+            error = data[:300].decode('utf-8', 'replace')
+            break
+    wall = time.perf_counter() - wall_start
+    result = {
+        'status': status,
+        'iterations': len(latencies),
+        'latency_min': min(latencies),
+        'latency_p50': _percentile(latencies, 50),
+        'latency_p95': _percentile(latencies, 95),
+        'latency_max': max(latencies),
+        'throughput_rps': len(latencies) / wall if wall > 0 else 0.0,
+        'eda_exec_p50': _percentile(eda_seconds, 50),
+        'response_bytes': size,
+        'peak_alloc_bytes': None,
+    }
+    if error:
+        result['error'] = error
+    elif trace_memory and scenario.iterations is None:
+        # 单独再跑一次测内存，tracemalloc会拖慢执行，不计入延迟
+        body, content_type = scenario.body(iterations) if scenario.body else (None, None)
+        tracemalloc.start()
+        try:
+            client.request(scenario.method, scenario.path, body, content_type)
+            result['peak_alloc_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    if isinstance(client, LocalClient):
+        result['rss_max_bytes'] = _rss_bytes()
+    return result
+
+
+def start_listener_process(edx_tmp: str, script: str, args: List[str], timeout=600.0) -> subprocess.Popen:
+    """在子进程中启动模拟EDA(fake_leapr.py/tcl_replay.py)，等到心跳出现"""
+    heartbeat = os.path.join(edx_tmp, 'listener_heartbeat')
+    for name in ('listener_heartbeat', 'client_result_done', 'server_result_done', 'command_reader_stop'):
+        if os.path.exists(os.path.join(edx_tmp, name)):
+            os.remove(os.path.join(edx_tmp, name))
+    process = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), script),
+                                *args, '--edx-tmp', edx_tmp])
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(heartbeat):
+        if process.poll() is not None:
+            raise RuntimeError(f"{script} exited with code {process.returncode}")
+        if time.monotonic() > deadline:
+            process.kill()
+            raise TimeoutError(f"{script} did not start within {timeout}s")
+        time.sleep(0.05)
+    return process
+
+
+def stop_listener_process(process: subprocess.Popen, edx_tmp: str):
+    """与真实监听器一样通过command_reader_stop通知退出"""
+    stop_path = os.path.join(edx_tmp, 'command_reader_stop')
+    open(stop_path, 'w').close()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    os.remove(stop_path)
+
+
+def run_benchmark(cells=10000, seed=1, repeat=5, endpoints=None, url=None, poll_interval=0.01,
+                  trace_memory=True, fake=True) -> dict:
+    """
+    :param endpoints: 只测这些接口(Scenario.name)，默认全部
+    :param fake: 是否启动模拟Leapr，连接真实Leapr时为False
+    :return: {"meta": {...}, "endpoints": {接口名: 指标}}
+    """
+    edx_tmp = DEFAULT_CONFIG.get('edx_tmp')
+    design = SyntheticDesign(cells, seed)
+    scenarios = [s for s in build_scenarios(design, seed) if not endpoints or s.name in endpoints]
+    process = None
+    if fake:
+        process = start_listener_process(edx_tmp, 'fake_leapr.py', ['--cells', str(cells), '--seed', str(seed),
+                                                                    '--poll-interval', str(poll_interval)])
+    try:
+        client = HttpClient(url) if url else LocalClient()
+        results = {}
+        for scenario in scenarios:
+            result = run_scenario(client, scenario, repeat, trace_memory and url is None)
+            results[scenario.name] = result
+            logger.info(f"{scenario.name}: status {result['status']}, p50 {result['latency_p50'] * 1000:.1f}ms, "
+                        f"{result['throughput_rps']:.1f} req/s, peak alloc {result['peak_alloc_bytes']}")
+    finally:
+        if process is not None:
+            stop_listener_process(process, edx_tmp)
+    return {
+        'meta': {'cells': cells, 'seed': seed, 'repeat': repeat, 'mode': 'http' if url else 'local',
+                 'poll_interval': poll_interval if fake else None, 'python': platform.python_version(),
+                 'platform': platform.platform(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'endpoints': results,
+    }
+
+
+def compare(current: dict, baseline: dict, max_regression=0.2, min_latency_delta=0.02,
+            min_memory_delta=1 << 20) -> List[str]:
+    """返回超出阈值的回归描述，接口在两次结果中都存在且成功时才比较"""
+    regressions = []
+    for name, now in current['endpoints'].items():
+        old = baseline.get('endpoints', {}).get(name)
+        if old is None or old.get('status', 200) >= 400 or now['status'] >= 400:
+            continue
+        for key, floor in (('latency_p50', min_latency_delta), ('peak_alloc_bytes', min_memory_delta)):
+            before, after = old.get(key), now.get(key)
+            if before is None or after is None:
+                continue
+            if after > before * (1 + max_regression) and after - before > floor:
+                regressions.append(f"{name}.{key}: {before:.6g} -> {after:.6g} (+{(after / before - 1) * 100:.0f}%)"
+                                   if before else f"{name}.{key}: {before} -> {after}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EDX接口端到端性能基准')
+    parser.add_argument('--cells', type=int, default=10000, help='模拟设计的cell数量，默认10000')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5, help='每个接口的调用次数，默认5')
+    parser.add_argument('--endpoints', default='', help='只测这些接口，逗号分隔')
+    parser.add_argument('--url', default=None, help='访问已启动的服务，如 http://localhost:5000')
+    parser.add_argument('--poll-interval', type=float, default=0.01,
+                        help='模拟Leapr的轮询间隔，默认0.01；0.1与真实监听器相同')
+    parser.add_argument('--no-fake', action='store_true', help='不启动模拟Leapr(已连接真实Leapr)')
+    parser.add_argument('--no-memory', action='store_true', help='不测内存峰值')
+    parser.add_argument('--edx-tmp', default=None, help='握手目录，默认按EDX_TMP_BASE/EDX_INSTANCE_ID')
+    parser.add_argument('--output', default=None, help='结果JSON文件，默认输出到标准输出')
+    parser.add_argument('--baseline', default=None, help='与之前的结果JSON比较')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='允许的相对回归，默认0.2')
+    parser.add_argument('--min-latency-delta', type=float, default=0.02,
+                        help='延迟增加小于该值(秒)时不算回归，避免轮询间隔带来的抖动，默认0.02')
+    args = parser.parse_args()
+    if args.edx_tmp:
+        os.makedirs(args.edx_tmp, exist_ok=True)
+        DEFAULT_CONFIG['edx_tmp'] = args.edx_tmp
+
+    result = run_benchmark(args.cells, args.seed, args.repeat,
+                           [name for name in args.endpoints.split(',') if name], args.url,
+                           args.poll_interval, not args.no_memory, not args.no_fake)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    failed = [name for name, item in result['endpoints'].items() if item['status'] >= 400]
+    if failed:
+        print(f"failed endpoints: {failed}", file=sys.stderr)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(result, json.load(f), args.max_regression, args.min_latency_delta)
+        for line in regressions:
+            print(f"regression: {line}", file=sys.stderr)
+    sys.exit(1 if failed or regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+'''
+二进制数组编解码
+大数组通过JSON返回时序列化和解析都很慢，这里统一用numpy的npz格式(zip内每个数组一个.npy)传输。
+字符串列表不用numpy的定长unicode数组(会按最长名字补齐，百万级名字时体积膨胀)，
+而是用'\\n'拼接成utf-8字节数组，key加'.str'后缀，解码时还原成list[str]。
+'''
+import io
+from typing import Dict
+
+import numpy as np
+
+STR_SUFFIX = '.str'
+
+
+def encode_strings(names) -> np.ndarray:
+    return np.frombuffer('\n'.join(names).encode('utf-8'), dtype=np.uint8)
+
+
+def decode_strings(data: np.ndarray) -> list:
+    if len(data) == 0:
+        return []
+    return data.tobytes().decode('utf-8').split('\n')
+
+
+def encode_arrays(arrays: Dict[str, object], compress=False) -> bytes:
+    """
+    将{name: ndarray 或 list[str] 或 标量}编码为npz字节
+    :param compress: 是否使用zip压缩，数据在局域网传输时通常不压缩更快
+    """
+    payload = {}
+    for name, value in arrays.items():
+        if isinstance(value, (list, tuple)) and (len(value) == 0 or isinstance(value[0], str)):
+            payload[name + STR_SUFFIX] = encode_strings(value)
+        else:
+            payload[name] = np.asarray(value)
+    buffer = io.BytesIO()
+    if compress:
+        np.savez_compressed(buffer, **payload)
+    else:
+        np.savez(buffer, **payload)
+    return buffer.getvalue()
+
+
+def decode_arrays(data: bytes) -> Dict[str, object]:
+    """encode_arrays的逆过程"""
+    result = {}
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        for name in npz.files:
+            if name.endswith(STR_SUFFIX):
+                result[name[:-len(STR_SUFFIX)]] = decode_strings(npz[name])
+            else:
+                result[name] = npz[name]
+    return result
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+'''
+批量摆放通道
+原来的place_cells对每个cell生成一行 place_cell <name> x y -placed 写进command.tcl再source，
+十万级cell时Tcl逐行解析占了大部分时间，而且请求里的orient被丢掉了。
+这里改为:
+1. cell名表单独写成一个文本文件(每行一个名字)，Leapr侧按token缓存，名表不变时不会重复读取
+2. 每次摆放只写一个紧凑的二进制数据文件:
+       magic 'EDXP' | version int32 | count int32 |
+       index int32[count] | x float64[count] | y float64[count] | orient int8[count] | status int8[count]
+   (小端，index为名表下标，orient/status编码见design_index.ORIENTS/PLACE_STATUSES，orient为-1表示不改方向)
+3. command.tcl只包含两行: 按需source apicommon/bulk_place.tcl，然后调用固定的 edx_bulk_place 过程，
+   Tcl侧用一次 binary scan 取出所有列，逐cell只剩一次命令调用
+'''
+import logging
+import os
+import struct
+import uuid
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from binary_codec import decode_arrays
+from design_index import STATUS_CODES, DesignIndex, encode_orients, encode_statuses
+
+logger = logging.getLogger(__name__)
+
+PLACEMENT_MAGIC = b'EDXP'
+PLACEMENT_VERSION = 1
+# 坐标写入前的保留位数，ASAP7的site宽度是0.054，至少需要3位
+COORD_DECIMALS = 4
+
+
+class PlacementBatch:
+    """
+    一批摆放请求的列式表示
+    :param cell_names: cell名列表
+    :param x, y: 坐标
+    :param orient: 方向编码(int8)，-1表示保持原方向
+    :param status: 摆放状态编码(int8)，默认placed
+    :param cell_ids: 可选，cell在DesignIndex中的id，客户端按load_netlist顺序发送下标时直接使用
+    """
+    def __init__(self, cell_names: List[str], x, y, orient=None, status=None, cell_ids=None):
+        count = len(cell_names)
+        self.cell_names = cell_names
+        self.x = np.asarray(x, dtype=np.float64).reshape(count)
+        self.y = np.asarray(y, dtype=np.float64).reshape(count)
+        self.orient = (np.full(count, -1, dtype=np.int8) if orient is None
+                       else np.asarray(orient, dtype=np.int8).reshape(count))
+        self.status = (np.full(count, STATUS_CODES['placed'], dtype=np.int8) if status is None
+                       else np.asarray(status, dtype=np.int8).reshape(count))
+        self.cell_ids = None if cell_ids is None else np.asarray(cell_ids, dtype=np.int64).reshape(count)
+
+    def __len__(self):
+        return len(self.cell_names)
+
+    def subset(self, selector) -> 'PlacementBatch':
+        """按布尔掩码或下标数组取子集"""
+        picked = np.flatnonzero(selector) if np.asarray(selector).dtype == bool else np.asarray(selector)
+        return PlacementBatch([self.cell_names[i] for i in picked], self.x[picked], self.y[picked],
+                              self.orient[picked], self.status[picked],
+                              None if self.cell_ids is None else self.cell_ids[picked])
+
+    def resolve_ids(self, design_index: DesignIndex) -> np.ndarray:
+        """cell名 -> DesignIndex中的id，未知cell为-1，结果缓存在batch上"""
+        if self.cell_ids is None:
+            self.cell_ids = design_index.lookup_cells(self.cell_names)
+        return self.cell_ids
+
+    @classmethod
+    def from_cells(cls, cells) -> 'PlacementBatch':
+        """由Cell对象列表构造"""
+        return cls([cell.get_cell_name() for cell in cells],
+                   [float(cell.get_x()) for cell in cells],
+                   [float(cell.get_y()) for cell in cells],
+                   encode_orients(cell.get_orient() for cell in cells),
+                   encode_statuses(cell.place_status or 'placed' for cell in cells))
+
+    @classmethod
+    def from_records(cls, records: List[dict]) -> 'PlacementBatch':
+        """原有的JSON格式: [{"cell_name", "x", "y", "orient", "place_status"}, ...]"""
+        return cls([record['cell_name'] for record in records],
+                   [float(record['x']) for record in records],
+                   [float(record['y']) for record in records],
+                   encode_orients(record.get('orient', '') for record in records),
+                   encode_statuses(record.get('place_status') or 'placed' for record in records))
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, object], design_index: Optional[DesignIndex] = None) -> 'PlacementBatch':
+        """
+        列式格式: {"cell_name": [...] 或 "cell_id": [...], "x": [...], "y": [...],
+                   "orient": [...], "place_status": [...]}
+        orient/place_status可以是字符串列表也可以是编码后的整数数组；cell_id为load_netlist中cell的顺序下标
+        """
+        cell_ids = columns.get('cell_id')
+        if cell_ids is not None:
+            if design_index is None:
+                raise ValueError('cell_id requires a loaded netlist')
+            cell_ids = np.asarray(cell_ids, dtype=np.int64)
+            if len(cell_ids) and (cell_ids.min() < 0 or cell_ids.max() >= design_index.num_cells):
+                raise ValueError('cell_id out of range')
+            cell_names = [design_index.cell_names[i] for i in cell_ids]
+        else:
+            cell_names = list(columns['cell_name'])
+        count = len(cell_names)
+
+        def codes(key, encoder, default):
+            value = columns.get(key)
+            if value is None or len(value) == 0:
+                return np.full(count, default, dtype=np.int8)
+            if isinstance(value, np.ndarray) and value.dtype.kind in 'iu':
+                return value.astype(np.int8)
+            return encoder(value)
+
+        return cls(cell_names, columns['x'], columns['y'],
+                   codes('orient', encode_orients, -1),
+                   codes('place_status', encode_statuses, STATUS_CODES['placed']),
+                   cell_ids)
+
+    @classmethod
+    def from_request(cls, body: bytes, content_type: str, json_data=None,
+                     design_index: Optional[DesignIndex] = None) -> 'PlacementBatch':
+        """根据Content-Type解析请求体: application/octet-stream为npz列式数据，否则为JSON(记录列表或列式字典)"""
+        if content_type and content_type.startswith('application/octet-stream'):
+            return cls.from_columns(decode_arrays(body), design_index)
+        if isinstance(json_data, dict):
+            return cls.from_columns(json_data, design_index)
+        return cls.from_records(json_data or [])
+
+
+def write_placement_file(path: str, index: np.ndarray, batch: PlacementBatch):
+    """按模块说明中的格式写二进制摆放数据，先写临时文件再改名，避免Leapr读到半个文件"""
+    count = len(batch)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(PLACEMENT_MAGIC)
+        f.write(struct.pack('<ii', PLACEMENT_VERSION, count))
+        f.write(np.ascontiguousarray(index, dtype='<i4').tobytes())
+        f.write(np.round(batch.x, COORD_DECIMALS).astype('<f8').tobytes())
+        f.write(np.round(batch.y, COORD_DECIMALS).astype('<f8').tobytes())
+        f.write(batch.orient.astype(np.int8).tobytes())
+        f.write(batch.status.astype(np.int8).tobytes())
+    os.replace(tmp_path, path)
+
+
+class BulkPlacer:
+    """
+    维护与Leapr侧同步的cell名表，并为每批摆放生成数据文件和两行Tcl命令
+    名表优先使用DesignIndex的cell顺序，请求中出现新名字时追加到名表末尾并更换token
+    """
+    def __init__(self, work_dir: str, loader_path: str):
+        self.work_dir = work_dir
+        self.loader_path = loader_path
+        self._base_names = None
+        self._names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        self._token = ''
+
+    def use_design(self, design_index: DesignIndex):
+        """以DesignIndex的cell顺序作为名表，同一个DesignIndex只设置一次"""
+        if self._base_names is design_index.cell_names:
+            return
+        self._base_names = design_index.cell_names
+        self._names = list(design_index.cell_names)
+        self._name_ids = dict(design_index.cell_ids)
+        self._write_names()
+
+    def _write_names(self):
+        old_path = self.names_path()
+        self._token = uuid.uuid4().hex[:12]
+        if os.path.exists(old_path):
+            os.remove(old_path)
+        with open(self.names_path(), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self._names))
+        logger.info(f"bulk place name table updated: {len(self._names)} names, token {self._token}")
+
+    def names_path(self) -> str:
+        return os.path.join(self.work_dir, f'bulk_names_{self._token}.txt')
+
+    def data_path(self) -> str:
+        return os.path.join(self.work_dir, 'bulk_place.bin')
+
+    def _resolve(self, batch: PlacementBatch) -> np.ndarray:
+        # 名表以DesignIndex顺序开头，已解析出的design id可直接作为名表下标
+        if self._base_names is not None and batch.cell_ids is not None and (batch.cell_ids >= 0).all():
+            return batch.cell_ids
+        index = np.fromiter((self._name_ids.get(name, -1) for name in batch.cell_names),
+                            dtype=np.int64, count=len(batch))
+        missing = np.flatnonzero(index < 0)
+        if len(missing) > 0 or not self._token:
+            for i in missing:
+                name = batch.cell_names[i]
+                if name not in self._name_ids:
+                    self._name_ids[name] = len(self._names)
+                    self._names.append(name)
+                index[i] = self._name_ids[name]
+            self._write_names()
+        return index
+
+    def commands(self, batch: PlacementBatch) -> List[str]:
+        """写数据文件并返回发送给Leapr的Tcl命令"""
+        index = self._resolve(batch)
+        write_placement_file(self.data_path(), index, batch)
+        return [
+            f'if {{[info commands edx_bulk_place] eq ""}} {{source {{{self.loader_path}}}}}',
+            f'edx_bulk_place {{{self.names_path()}}} {self._token} {{{self.data_path()}}}',
+        ]
+
+    @staticmethod
+    def parse_result(result: List[str]) -> dict:
+        """
+        edx_bulk_place写回的结果: 第一行 "placed <n> failed <m>"，之后每行一个失败的cell名
+        """
+        if not result:
+            return {'placed': 0, 'failed': []}
+        fields = result[0].split()
+        placed = int(fields[1]) if len(fields) >= 2 and fields[0] == 'placed' else 0
+        return {'placed': placed, 'failed': [line for line in result[1:] if line]}
@@ -3,14 +3,61 @@ EDA工具配置文件
 定义不同EDA工具的默认参数和配置
 """
 import os
+from contextlib import contextmanager
+
+
+def resolve_edx_tmp() -> str:
+    """EDX_TMP根据环境变量EDX_TMP_BASE和EDX_INSTANCE_ID设置，目录不存在时创建"""
+    edx_tmp = os.environ.get('EDX_TMP_BASE', '')
+    if edx_tmp == '':
+        raise Exception('EDX_TMP环境变量未设置')
+    path = f'{edx_tmp}/tmp_{os.environ.get("EDX_INSTANCE_ID", "1")}'
+    os.makedirs(edx_tmp, exist_ok=True)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class LazyConfig(dict):
+    """
+    lazy中的配置项在第一次读取时才求值并缓存，
+    导入config(以及main)时不要求环境变量已设置，真正用到EDX_TMP时才报错
+    """
+    def __init__(self, values=None, lazy=None):
+        super().__init__(values or {})
+        self._lazy = dict(lazy or {})
+
+    def __getitem__(self, key):
+        if not dict.__contains__(self, key) and key in self._lazy:
+            self[key] = self._lazy[key]()
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self._lazy
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    @contextmanager
+    def override(self, key, value):
+        """
+        临时设置配置项，结束后恢复原值；惰性项还没有求值时恢复为未求值，期间不触发求值(例如测试中不要求EDX_TMP已设置)
+        """
+        resolved = dict.__contains__(self, key)
+        previous = dict.get(self, key)
+        self[key] = value
+        try:
+            yield value
+        finally:
+            if resolved:
+                self[key] = previous
+            else:
+                dict.pop(self, key, None)
+
 
 # 默认配置
-# EDX_TMP根据环境变量instance_id设置
-edx_tmp = os.environ.get('EDX_TMP_BASE', '')
-if edx_tmp == '':
-    raise Exception('EDX_TMP环境变量未设置')
-DEFAULT_CONFIG = {
-    'edx_tmp': f'{edx_tmp}/tmp_{os.environ.get("EDX_INSTANCE_ID", "1")}',
-}
-os.makedirs(edx_tmp, exist_ok=True)
-os.makedirs(DEFAULT_CONFIG.get('edx_tmp'), exist_ok=True)
\ No newline at end of file
+DEFAULT_CONFIG = LazyConfig(lazy={
+    'edx_tmp': resolve_edx_tmp,
+})
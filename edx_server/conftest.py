@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+测试共用的fixture
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import DEFAULT_CONFIG
+
+
+@pytest.fixture
+def edx_tmp(tmp_path):
+    """DEFAULT_CONFIG['edx_tmp']在测试期间指向tmp_path，不需要设置EDX_TMP_BASE，结束后恢复"""
+    with DEFAULT_CONFIG.override('edx_tmp', str(tmp_path)):
+        yield str(tmp_path)
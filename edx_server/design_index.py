@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+'''
+Design的列式视图
+Design里cells/pin_to_cell/nets都是字典，适合JSON返回，不适合做批量计算。
+DesignIndex把它们转成按id索引的numpy数组:
+- cell: cell_names + x/y/width/height/orient/status 数组，id即Design.cells中的顺序
+- pin: pin_names + pin_cell(所属cell id，端口等不在pin_to_cell中的pin为-1) + pin_net
+- net: CSR格式，net_ptr为偏移，net_pins为pin id，net_pin_is_driver标记驱动pin
+load_netlist返回的JSON字典与这里的id顺序一致，客户端可以直接按顺序对齐二进制数组。
+摆放成功后由apply_placement同步x/y/orient/status，作为place_cells做差分的基准。
+'''
+import logging
+from typing import Dict, List
+
+import numpy as np
+
+from plugin_data import Design
+
+logger = logging.getLogger(__name__)
+
+# 方向和摆放状态编码，未知取值编码为-1
+ORIENTS = ['R0', 'R90', 'R180', 'R270', 'MX', 'MY', 'MX90', 'MY90', 'N', 'S', 'E', 'W', 'FN', 'FS', 'FE', 'FW']
+PLACE_STATUSES = ['unplaced', 'placed', 'fixed', 'cover']
+ORIENT_CODES = {name: code for code, name in enumerate(ORIENTS)}
+STATUS_CODES = {name: code for code, name in enumerate(PLACE_STATUSES)}
+
+
+def encode_orients(orients) -> np.ndarray:
+    return np.fromiter((ORIENT_CODES.get(o, -1) for o in orients), dtype=np.int8)
+
+
+def encode_statuses(statuses) -> np.ndarray:
+    return np.fromiter((STATUS_CODES.get(s, -1) for s in statuses), dtype=np.int8)
+
+
+class DesignIndex:
+    """
+    Design的列式只读视图，构建一次后供各种向量化计算复用
+    """
+    def __init__(self, design: Design):
+        cells = design.cells
+        num_cells = len(cells)
+        self.core_width = float(design.core_width)
+        self.core_height = float(design.core_height)
+        # core左下角，坐标范围为[core_x, core_x + core_width]
+        self.core_x = float(design.core_x)
+        self.core_y = float(design.core_y)
+        self.cell_names: List[str] = list(cells.keys())
+        self.cell_ids: Dict[str, int] = {name: idx for idx, name in enumerate(self.cell_names)}
+        # load_netlist解析出的loc_x/loc_y是字符串，这里统一转成float
+        self.x = np.fromiter((float(c.x) for c in cells.values()), dtype=np.float64, count=num_cells)
+        self.y = np.fromiter((float(c.y) for c in cells.values()), dtype=np.float64, count=num_cells)
+        self.width = np.fromiter((float(c.width) for c in cells.values()), dtype=np.float64, count=num_cells)
+        self.height = np.fromiter((float(c.height) for c in cells.values()), dtype=np.float64, count=num_cells)
+        self.orient = encode_orients(c.orient for c in cells.values())
+        self.status = encode_statuses(c.place_status for c in cells.values())
+
+        # pin表: 先放pin_to_cell中的pin，net中出现但不属于任何cell的pin(端口等)追加在后面
+        self.pin_names: List[str] = list(design.pin_to_cell.keys())
+        self.pin_ids: Dict[str, int] = {name: idx for idx, name in enumerate(self.pin_names)}
+        pin_cell = [self.cell_ids.get(cell, -1) for cell in design.pin_to_cell.values()]
+
+        self.net_names: List[str] = list(design.nets.keys())
+        degrees = np.zeros(len(self.net_names), dtype=np.int64)
+        net_pins: List[int] = []
+        is_driver: List[bool] = []
+        for net_idx, (load_pins, driver_pins) in enumerate(design.nets.values()):
+            count = 0
+            for pins, driver in ((driver_pins, True), (load_pins, False)):
+                for pin in pins:
+                    if not pin:
+                        continue
+                    pin_id = self.pin_ids.get(pin)
+                    if pin_id is None:
+                        pin_id = len(self.pin_names)
+                        self.pin_ids[pin] = pin_id
+                        self.pin_names.append(pin)
+                        pin_cell.append(-1)
+                    net_pins.append(pin_id)
+                    is_driver.append(driver)
+                    count += 1
+            degrees[net_idx] = count
+
+        self.pin_cell = np.asarray(pin_cell, dtype=np.int32)
+        self.net_ptr = np.zeros(len(self.net_names) + 1, dtype=np.int64)
+        np.cumsum(degrees, out=self.net_ptr[1:])
+        self.net_pins = np.asarray(net_pins, dtype=np.int32)
+        self.net_pin_is_driver = np.asarray(is_driver, dtype=bool)
+        # net_pins中每个元素所属的net id
+        self.net_pin_net = np.repeat(np.arange(len(self.net_names), dtype=np.int32), degrees)
+        self.pin_net = np.full(len(self.pin_names), -1, dtype=np.int32)
+        self.pin_net[self.net_pins] = self.net_pin_net
+        self._cell_graph = None
+        self._cell_pins = None
+        logger.info(f"design index built: {num_cells} cells, {len(self.pin_names)} pins, "
+                    f"{len(self.net_names)} nets")
+
+    @property
+    def num_cells(self) -> int:
+        return len(self.cell_names)
+
+    @property
+    def num_nets(self) -> int:
+        return len(self.net_names)
+
+    def net_degrees(self) -> np.ndarray:
+        return np.diff(self.net_ptr)
+
+    def cell_centers(self):
+        """cell中心坐标，pin位置近似取所在cell中心"""
+        return self.x + self.width / 2, self.y + self.height / 2
+
+    def cell_pin_csr(self):
+        """cell -> pin的CSR(ptr, pins)，第一次调用时构建"""
+        if self._cell_pins is None:
+            on_cell = np.flatnonzero(self.pin_cell >= 0)
+            order = on_cell[np.argsort(self.pin_cell[on_cell], kind='stable')]
+            ptr = np.zeros(self.num_cells + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.pin_cell[on_cell], minlength=self.num_cells), out=ptr[1:])
+            self._cell_pins = (ptr, order)
+        return self._cell_pins
+
+    def lookup_cells(self, names) -> np.ndarray:
+        """cell名 -> id，不存在的为-1"""
+        return np.fromiter((self.cell_ids.get(name, -1) for name in names), dtype=np.int64)
+
+    def placement_changes(self, ids: np.ndarray, x: np.ndarray, y: np.ndarray, orient: np.ndarray,
+                          status: np.ndarray, tolerance: float) -> np.ndarray:
+        """
+        与当前缓存的摆放比较，返回需要发送的掩码
+        坐标差超过tolerance、orient(非-1时)或status不同、以及未知cell(id为-1，交给EDA报错)都需要发送
+        """
+        known = ids >= 0
+        safe_ids = np.where(known, ids, 0)
+        changed = (np.abs(x - self.x[safe_ids]) > tolerance) | (np.abs(y - self.y[safe_ids]) > tolerance)
+        changed |= (orient >= 0) & (orient != self.orient[safe_ids])
+        changed |= status != self.status[safe_ids]
+        return changed | ~known
+
+    def apply_placement(self, ids: np.ndarray, x: np.ndarray, y: np.ndarray, orient: np.ndarray,
+                        status: np.ndarray):
+        """把已成功执行的摆放写回缓存，ids中不能有-1"""
+        self.x[ids] = x
+        self.y[ids] = y
+        keep_orient = orient < 0
+        self.orient[ids] = np.where(keep_orient, self.orient[ids], orient)
+        self.status[ids] = status
@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+'''
+本地模拟的Leapr，用于没有EDA license时的联调和性能基准(见bench_endpoints.py)
+1. 在Python线程/进程中实现eda_command_listener.tcl的文件握手: 轮询client_result_done，执行command.tcl，
+   写server_status.txt(格式同apicommon/edx_execute.tcl)、server_result_done和listener_heartbeat
+2. 设计由SyntheticDesign按(cell数, seed)确定性生成，支持1k到5M cell: cell名、尺寸、pin和net都由下标计算，
+   只有摆放状态保存在numpy数组中
+3. 支持的命令: get_netlist.tcl(按脚本内容识别)、report_timing [-max_paths N] [> 文件]、
+   edx_bulk_place(bulk_place.py的二进制摆放文件)、place_cell、set_cell_placement_status；
+   其他命令按Tcl的方式报错 invalid command name
+单独运行: python fake_leapr.py --cells 100000，EDX_TMP取自环境变量EDX_TMP_BASE/EDX_INSTANCE_ID
+'''
+import argparse
+import logging
+import math
+import os
+import re
+import shlex
+import struct
+import threading
+import time
+import traceback
+
+import numpy as np
+
+from bulk_place import PLACEMENT_MAGIC
+from design_index import ORIENT_CODES, ORIENTS, PLACE_STATUSES, STATUS_CODES
+
+logger = logging.getLogger(__name__)
+
+# 每批生成的cell/net数，控制5M cell时的内存峰值
+GENERATE_CHUNK = 65536
+NETLIST_SCRIPT_MARKER = '=======cell_info======='
+COMB_WIDTHS = np.array([0.216, 0.27, 0.378, 0.486, 0.594])
+REG_WIDTH = 1.08
+
+
+class FakeCommandError(Exception):
+    pass
+
+
+def _mix(values, salt=0) -> np.ndarray:
+    """splitmix64，按下标生成确定的伪随机数，不需要保存随机状态"""
+    with np.errstate(over='ignore'):
+        z = np.asarray(values, dtype=np.uint64) + np.uint64((salt * 0x9E3779B97F4A7C15 + 0x632BE59BD9B4E019) % (1 << 64))
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+class SyntheticDesign:
+    """
+    确定性生成的设计
+    :param num_cells: cell数量
+    :param seed: 随机种子，相同(num_cells, seed)生成相同的网表和时序报告
+    :param modules: 叶子module数量，cell按下标连续分配到 top/u_b<i>/u_s<j> 下
+    :param reg_ratio: 寄存器比例，寄存器pin为D/CK/Q，组合单元为A/B/Y
+    :param locality: 每个net的load以该概率落在driver附近的下标窗口内(同一module)，其余随机分布在全设计
+    """
+    def __init__(self, num_cells: int, seed=1, modules=16, reg_ratio=0.125, utilization=0.6,
+                 row_height=0.27, site_width=0.054, locality=0.9, clock_period=0.5):
+        self.num_cells = int(num_cells)
+        self.seed = int(seed)
+        self.modules = max(1, min(int(modules), self.num_cells))
+        self.row_height = row_height
+        self.site_width = site_width
+        self.clock_period = clock_period
+        self.locality = locality
+        self.prefixes = [f'top/u_b{m // 4}/u_s{m % 4}' for m in range(self.modules)]
+        ids = np.arange(self.num_cells, dtype=np.uint64)
+        self.is_reg = (_mix(ids, self.seed) % np.uint64(1 << 16)) < np.uint64(int(reg_ratio * (1 << 16)))
+        widths = COMB_WIDTHS[(_mix(ids, self.seed + 1) % np.uint64(len(COMB_WIDTHS))).astype(np.int64)]
+        self.width = np.where(self.is_reg, REG_WIDTH, widths)
+        area = float(self.width.sum()) * row_height / utilization
+        self.num_rows = max(1, int(math.ceil(math.sqrt(area) / row_height)))
+        self.core_height = round(self.num_rows * row_height, 4)
+        self.core_width = round(math.ceil(area / self.core_height / site_width) * site_width, 4)
+        # 摆放状态: 初始为按site对齐的随机位置
+        sites = max(1, int((self.core_width - REG_WIDTH) / site_width))
+        self.x = np.round((_mix(ids, self.seed + 2) % np.uint64(sites)).astype(np.float64) * site_width, 4)
+        self.y = np.round((_mix(ids, self.seed + 3) % np.uint64(self.num_rows)).astype(np.float64) * row_height, 4)
+        self.orient = np.zeros(self.num_cells, dtype=np.int8)
+        self.status = np.full(self.num_cells, STATUS_CODES['placed'], dtype=np.int8)
+        self._net_text_path = None
+
+    # ---- 名字与连接关系 ----
+    def module_of(self, index: int) -> int:
+        return index * self.modules // self.num_cells
+
+    def cell_name(self, index: int) -> str:
+        return f'{self.prefixes[index * self.modules // self.num_cells]}/U{index}'
+
+    def cell_index(self, name: str) -> int:
+        """cell名 -> 下标，不存在时返回-1"""
+        prefix, sep, number = name.rpartition('/U')
+        if not sep or not number.isdigit():
+            return -1
+        index = int(number)
+        if index >= self.num_cells or prefix != self.prefixes[self.module_of(index)]:
+            return -1
+        return index
+
+    def pins(self, index: int):
+        return ('D', 'CK', 'Q') if self.is_reg[index] else ('A', 'B', 'Y')
+
+    def output_pin(self, index: int) -> str:
+        return 'Q' if self.is_reg[index] else 'Y'
+
+    def fanout(self, drivers: np.ndarray):
+        """
+        每个cell的输出驱动一个net n<下标>，返回(每个net的load数, 扁平的load cell下标, 扁平的load pin序号)
+        """
+        drivers = np.asarray(drivers, dtype=np.uint64)
+        counts = (1 + _mix(drivers, self.seed + 4) % np.uint64(4)).astype(np.int64)
+        owner = np.repeat(drivers, counts)
+        slot = np.arange(len(owner), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+        key = owner * np.uint64(8) + slot.astype(np.uint64)
+        n = self.num_cells
+        window = max(1, min(n // self.modules, 256))
+        local = (_mix(key, self.seed + 5) % np.uint64(1 << 16)) < np.uint64(int(self.locality * (1 << 16)))
+        near = (owner.astype(np.int64) + 1 + (_mix(key, self.seed + 6) % np.uint64(window)).astype(np.int64)) % n
+        far = (_mix(key, self.seed + 7) % np.uint64(n)).astype(np.int64)
+        loads = np.where(local, near, far)
+        return counts, loads, slot
+
+    def load_pin(self, load: int, slot: int) -> str:
+        return 'D' if self.is_reg[load] else ('A' if slot % 2 == 0 else 'B')
+
+    # ---- 网表 ----
+    def write_netlist(self, path: str):
+        """按get_netlist.tcl的输出格式写网表，net部分与摆放无关，第一次生成后缓存"""
+        with open(path, 'w') as f:
+            f.write('=======design_info=======\n')
+            f.write(f'core_size: {{{self.core_width} {self.core_height}}}\n')
+            f.write(f'{NETLIST_SCRIPT_MARKER}\n')
+            height = f'{self.row_height}'
+            for start in range(0, self.num_cells, GENERATE_CHUNK):
+                stop = min(start + GENERATE_CHUNK, self.num_cells)
+                lines = []
+                for i in range(start, stop):
+                    name = self.cell_name(i)
+                    lines.append(name)
+                    lines.append(f'{self.width[i]},{height},{ORIENTS[self.orient[i]]},'
+                                 f'{PLACE_STATUSES[self.status[i]]},{self.x[i]},{self.y[i]}')
+                    lines.append('|'.join(f'{name}/{pin}' for pin in self.pins(i)))
+                f.write('\n'.join(lines))
+                f.write('\n')
+            f.write('=======net_info=======\n')
+            with open(self._net_text(path), 'r') as nets:
+                while True:
+                    block = nets.read(1 << 20)
+                    if not block:
+                        break
+                    f.write(block)
+
+    def _net_text(self, netlist_path: str) -> str:
+        if self._net_text_path is None or not os.path.exists(self._net_text_path):
+            cache_dir = os.path.join(os.path.dirname(netlist_path), 'fake_leapr_cache')
+            os.makedirs(cache_dir, exist_ok=True)
+            path = os.path.join(cache_dir, f'nets_{self.num_cells}_{self.seed}.txt')
+            with open(path, 'w') as f:
+                for start in range(0, self.num_cells, GENERATE_CHUNK):
+                    drivers = np.arange(start, min(start + GENERATE_CHUNK, self.num_cells))
+                    counts, loads, slots = self.fanout(drivers)
+                    offset = 0
+                    lines = []
+                    for driver, count in zip(drivers.tolist(), counts.tolist()):
+                        load_pins = '|'.join(f'{self.cell_name(load)}/{self.load_pin(load, slot)}'
+                                             for load, slot in zip(loads[offset:offset + count].tolist(),
+                                                                   slots[offset:offset + count].tolist()))
+                        offset += count
+                        lines.append(f'n{driver},{load_pins},{self.cell_name(driver)}/{self.output_pin(driver)}')
+                    f.write('\n'.join(lines))
+                    f.write('\n')
+                regs = np.flatnonzero(self.is_reg)
+                if len(regs):
+                    f.write('clk,' + '|'.join(f'{self.cell_name(i)}/CK' for i in regs.tolist()) + ',clk\n')
+            self._net_text_path = path
+        return self._net_text_path
+
+    # ---- 时序报告 ----
+    def timing_paths(self, max_paths: int, max_depth=12) -> list:
+        """
+        从寄存器Q沿net的第一个load往后走，遇到寄存器D或达到max_depth为止，按slack从小到大排序
+        所有路径按深度同步推进，每一步只做一次向量化的fanout计算
+        """
+        regs = np.flatnonzero(self.is_reg)
+        if len(regs) == 0:
+            regs = np.arange(self.num_cells)
+        current = regs[(_mix(np.arange(max_paths), self.seed + 8) % np.uint64(len(regs))).astype(np.int64)]
+        points = [[(f'{self.cell_name(start)}/CK', 0.0), (f'{self.cell_name(start)}/Q', 0.05)]
+                  for start in current.tolist()]
+        active = np.arange(max_paths)
+        for depth in range(max_depth):
+            if len(active) == 0:
+                break
+            counts, loads, _ = self.fanout(current)
+            loads = loads[np.cumsum(counts) - counts]
+            wires = 0.002 + (_mix(current.astype(np.uint64) * np.uint64(64) + np.uint64(depth), self.seed + 9)
+                             % np.uint64(1000)).astype(np.float64) * 1e-5
+            delays = 0.01 + (_mix(loads, self.seed + 10) % np.uint64(1000)).astype(np.float64) * 4e-5
+            keep = []
+            for k, (number, load) in enumerate(zip(active.tolist(), loads.tolist())):
+                name = self.cell_name(load)
+                points[number].append((f'{name}/{self.load_pin(load, 0)}', float(wires[k])))
+                if not self.is_reg[load] and depth < max_depth - 1:
+                    points[number].append((f'{name}/Y', float(delays[k])))
+                    keep.append(k)
+            active, current = active[keep], loads[keep]
+        required = self.clock_period - 0.03
+        paths = [(required - sum(incr for _, incr in path), path, required) for path in points]
+        paths.sort(key=lambda item: item[0])
+        return paths
+
+    def write_timing_report(self, path: str, max_paths: int):
+        """按report_timing -path_type full的文本格式写报告，read_timing_report可以直接解析"""
+        with open(path, 'w') as f:
+            for slack, points, required in self.timing_paths(max_paths):
+                start = points[0][0].rsplit('/', 1)[0]
+                arrival = 0.0
+                lines = [f'  Startpoint: {start} (rising edge-triggered flip-flop clocked by clk)',
+                         f'  Endpoint: {points[-1][0]} (rising edge-triggered flip-flop clocked by clk)',
+                         '  Path Group: REG2REG', '  Scenario: func_tt', '  Path Type: max', '',
+                         f'  {"Point":<60}{"Incr":>10}{"Path":>10}', '  ' + '-' * 80,
+                         f'  {"clock clk (rise edge)":<60}{0.0:>10.4f}{0.0:>10.4f}',
+                         f'  {"clock network delay (ideal)":<60}{0.0:>10.4f}{0.0:>10.4f}']
+                for pin, incr in points:
+                    arrival += incr
+                    cell_type = 'DFFHQNx1' if pin.endswith(('/CK', '/Q', '/D')) else 'NAND2xp5'
+                    lines.append(f'  {pin + " (" + cell_type + ")":<60}{incr:>10.4f}{arrival:>10.4f} r')
+                lines += [f'  {"data arrival time":<70}{arrival:>10.4f}', '',
+                          f'  {"clock clk (rise edge)":<60}{self.clock_period:>10.4f}{self.clock_period:>10.4f}',
+                          f'  {"clock network delay (ideal)":<60}{0.0:>10.4f}{self.clock_period:>10.4f}',
+                          f'  {"library setup time":<60}{-0.03:>10.4f}{required:>10.4f}',
+                          f'  {"data required time":<70}{required:>10.4f}', '  ' + '-' * 80,
+                          f'  {"data required time":<70}{required:>10.4f}',
+                          f'  {"data arrival time":<70}{-arrival:>10.4f}', '  ' + '-' * 80,
+                          f'  slack ({"MET" if slack >= 0 else "VIOLATED"}){"":<55}{slack:>10.4f}', '', '']
+                f.write('\n'.join(lines))
+
+    # ---- 摆放 ----
+    def place(self, index: int, x: float, y: float, orient=-1, status=STATUS_CODES['placed']):
+        self.x[index] = round(x, 4)
+        self.y[index] = round(y, 4)
+        if orient >= 0:
+            self.orient[index] = orient
+        self.status[index] = status
+
+
+class FakeLeapr:
+    """
+    模拟eda_command_listener.tcl的监听器
+    :param edx_tmp: 握手目录
+    :param design: SyntheticDesign
+    :param poll_interval: 轮询client_result_done的间隔，真实监听器为0.1秒
+    :param exec_delay: 每条命令额外的模拟执行时间(秒)
+    """
+    def __init__(self, edx_tmp: str, design: SyntheticDesign, poll_interval=0.1, exec_delay=0.0):
+        self.edx_tmp = edx_tmp
+        self.design = design
+        self.poll_interval = poll_interval
+        self.exec_delay = exec_delay
+        self.commands_executed = 0
+        self._names_token = None
+        self._names = []
+        self._names_index = None
+        self._heartbeat = 0
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(edx_tmp, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.edx_tmp, name)
+
+    # ---- 监听循环 ----
+    def start(self) -> 'FakeLeapr':
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-leapr', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def serve_forever(self):
+        logger.info(f"{type(self).__name__} listening on {self.edx_tmp}")
+        while not self._stop.is_set():
+            self.poll_once()
+            if os.path.exists(self._path('command_reader_stop')):
+                break
+            self._stop.wait(self.poll_interval)
+
+    def poll_once(self) -> bool:
+        """检查一次client_result_done，有命令时执行并返回True"""
+        now = int(time.time())
+        if now != self._heartbeat:
+            self._heartbeat = now
+            with open(self._path('listener_heartbeat'), 'w') as f:
+                f.write(f'{now}\n')
+        client_done = self._path('client_result_done')
+        if not os.path.exists(client_done):
+            return False
+        detected = time.time_ns() // 1000
+        self.execute_command_file(detected)
+        with open(self._path('server_result_done'), 'w') as f:
+            f.write('done\n')
+        return True
+
+    def execute_command_file(self, detected: int):
+        """对应edx_execute_command: 执行command.tcl并写server_status.txt"""
+        start = end = 0
+        ok, error, error_info = 0, '', ''
+        command_path = self._path('command.tcl')
+        # 与edx_execute_command一致，执行前取走client_result_done
+        if os.path.exists(self._path('client_result_done')):
+            os.remove(self._path('client_result_done'))
+        if os.path.exists(command_path):
+            start = time.time_ns() // 1000
+            try:
+                with open(command_path, 'r', encoding='utf-8') as f:
+                    self.execute(f.read())
+                ok = 1
+            except Exception as e:
+                error = str(e)
+                error_info = f'{error}\n    while executing fake leapr command\n{traceback.format_exc()}'
+            end = time.time_ns() // 1000
+        else:
+            error = 'command.tcl not found'
+        with open(self._path('server_status.txt'), 'w') as f:
+            f.write(f'detected {detected}\nstart {start}\nend {end}\nok {ok}\nerror {error.replace(chr(10), " ")}\n')
+            if error_info:
+                f.write(f'error_info\n{error_info}\n')
+        self.commands_executed += 1
+
+    # ---- 命令 ----
+    def execute(self, script: str):
+        if NETLIST_SCRIPT_MARKER in script:
+            self.design.write_netlist(self._path('server_result.txt'))
+            return
+        for line in script.splitlines():
+            line = line.strip()
+            if not line or line.startswith('#') or line.startswith('if {[info commands edx_bulk_place]'):
+                continue
+            if self.exec_delay:
+                time.sleep(self.exec_delay)
+            words = shlex.split(line.replace('{', '"').replace('}', '"'))
+            handler = getattr(self, f'_cmd_{words[0]}', None)
+            if handler is None:
+                raise FakeCommandError(f'invalid command name "{words[0]}"')
+            handler(line, words[1:])
+
+    def _cmd_report_timing(self, line: str, args: list):
+        match = re.search(r'-max_paths\s+(\d+)', line)
+        redirect = re.search(r'>\s*(\S+)\s*$', line)
+        path = redirect.group(1) if redirect else self._path('server_result.txt')
+        self.design.write_timing_report(path, int(match.group(1)) if match else 1)
+
+    def _cmd_puts(self, line: str, args: list):
+        pass
+
+    def _cmd_place_cell(self, line: str, args: list):
+        if len(args) < 3:
+            raise FakeCommandError('wrong # args: should be "place_cell name x y ?-orient o? ?-placed|-fixed|-cover?"')
+        index = self._cell(args[0])
+        orient = ORIENT_CODES[args[args.index('-orient') + 1]] if '-orient' in args else -1
+        status = STATUS_CODES['placed']
+        for name in ('fixed', 'cover'):
+            if f'-{name}' in args:
+                status = STATUS_CODES[name]
+        self.design.place(index, float(args[1]), float(args[2]), orient, status)
+
+    def _cmd_set_cell_placement_status(self, line: str, args: list):
+        options = dict(zip(args[::2], args[1::2]))
+        self.design.status[self._cell(options.get('-name', ''))] = STATUS_CODES[options.get('-status', 'placed')]
+
+    def _cmd_edx_bulk_place(self, line: str, args: list):
+        """与apicommon/bulk_place.tcl的edx_bulk_place相同的输入输出"""
+        names_file, token, data_file = args
+        if token != self._names_token:
+            with open(names_file, 'r', encoding='utf-8') as f:
+                names = f.read().split('\n')
+            self._names_index = np.fromiter((self.design.cell_index(name) for name in names),
+                                            dtype=np.int64, count=len(names))
+            self._names_token = token
+            self._names = names
+        with open(data_file, 'rb') as f:
+            data = f.read()
+        if data[:4] != PLACEMENT_MAGIC:
+            raise FakeCommandError(f'invalid placement data file: {data_file}')
+        _, count = struct.unpack_from('<ii', data, 4)
+        offset = 12
+        idxs = np.frombuffer(data, '<i4', count, offset)
+        offset += 4 * count
+        xs = np.frombuffer(data, '<f8', count, offset)
+        offset += 8 * count
+        ys = np.frombuffer(data, '<f8', count, offset)
+        offset += 8 * count
+        orients = np.frombuffer(data, np.int8, count, offset)
+        statuses = np.frombuffer(data, np.int8, count, offset + count)
+        cells = self._names_index[idxs]
+        ok = (cells >= 0) & (statuses >= 0) & (statuses < len(PLACE_STATUSES))
+        target = cells[ok]
+        design = self.design
+        design.x[target] = np.round(xs[ok], 4)
+        design.y[target] = np.round(ys[ok], 4)
+        design.status[target] = statuses[ok]
+        change = ok & (orients >= 0)
+        design.orient[cells[change]] = orients[change]
+        failed = [self._names[i] for i in idxs[~ok].tolist()]
+        with open(self._path('server_result.txt'), 'w') as f:
+            f.write(f'placed {int(ok.sum())} failed {len(failed)}\n')
+            for name in failed:
+                f.write(f'{name}\n')
+
+    def _cell(self, name: str) -> int:
+        index = self.design.cell_index(name)
+        if index < 0:
+            raise FakeCommandError(f'cell {name} not found')
+        return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟Leapr的命令监听器')
+    parser.add_argument('--cells', type=int, default=10000, help='cell数量，默认10000')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子，默认1')
+    parser.add_argument('--modules', type=int, default=16, help='叶子module数量，默认16')
+    parser.add_argument('--poll-interval', type=float, default=0.1, help='轮询间隔(秒)，默认0.1，与真实监听器相同')
+    parser.add_argument('--exec-delay', type=float, default=0.0, help='每条命令额外的模拟执行时间(秒)')
+    parser.add_argument('--edx-tmp', default=None, help='握手目录，默认按EDX_TMP_BASE/EDX_INSTANCE_ID')
+    parser.add_argument('--write-netlist', default=None, help='只把网表写到指定文件后退出')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+    design = SyntheticDesign(args.cells, args.seed, args.modules)
+    if args.write_netlist:
+        design.write_netlist(args.write_netlist)
+        return
+    if args.edx_tmp is None:
+        from config import DEFAULT_CONFIG
+        args.edx_tmp = DEFAULT_CONFIG.get('edx_tmp')
+    FakeLeapr(args.edx_tmp, design, args.poll_interval, args.exec_delay).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+'''
+解析式全局布局
+基于DesignIndex的列式数组，pin位置近似取cell中心:
+1. Bound-to-Bound(B2B)线网模型: 每个net在每个方向上取坐标最小/最大的两个pin作为边界，
+   其余pin分别连到两个边界，边界之间再连一条边，权重 2 / ((p - 1) * 距离)，二次线长的最优解即HPWL的近似最优解
+2. x/y两个方向的二次规划互相独立，各自用Jacobi预条件共轭梯度(CG)求解，两个方向在线程池中并行；
+   稀疏矩阵不显式构建，矩阵向量乘用边表上的np.bincount完成，与固定cell之间的边并入对角和右端项
+3. 扩散: 把每条bin带换算到"累计容量"空间，cell按面积占长度用pack_1d消除重叠(拥挤处向两侧展开)，
+   得到满足bin密度的目标位置，再以逐轮增大的权重作为锚点加入下一次求解，直到求解结果的bin溢出率低于目标
+增量模式只移动指定的cell(一般为unplaced)，其余cell作为固定pin参与求解。
+结果为cell左下角坐标，交给place_batch走批量摆放通道，之后由EDA的place_legal做合法化。
+'''
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+from array_utils import pack_1d
+from bulk_place import PlacementBatch
+from design_index import DesignIndex, STATUS_CODES
+
+logger = logging.getLogger(__name__)
+
+
+def net_hpwl(design_index: DesignIndex, cx: np.ndarray, cy: np.ndarray, ignore: Optional[np.ndarray] = None) -> float:
+    """按cell中心计算的总半周长线长，ignore中的cell不计入"""
+    entry_cell = design_index.pin_cell[design_index.net_pins]
+    keep = entry_cell >= 0
+    if ignore is not None:
+        keep &= ~ignore[np.maximum(entry_cell, 0)]
+    cells, nets = entry_cell[keep], design_index.net_pin_net[keep]
+    if len(cells) == 0:
+        return 0.0
+    starts = np.flatnonzero(np.concatenate(([True], nets[1:] != nets[:-1])))
+    total = 0.0
+    for coord in (cx[cells], cy[cells]):
+        total += float(np.sum(np.maximum.reduceat(coord, starts) - np.minimum.reduceat(coord, starts)))
+    return total
+
+
+class GlobalPlaceResult:
+    """
+    cells: 被摆放的cell id，x/y为对应的左下角坐标
+    """
+    def __init__(self, design_index: DesignIndex, cells: np.ndarray, x: np.ndarray, y: np.ndarray,
+                 hpwl_before: float, hpwl_after: float, overflow: float, iterations: int, elapsed: float):
+        self.index = design_index
+        self.cells = cells
+        self.x = x
+        self.y = y
+        self.hpwl_before = hpwl_before
+        self.hpwl_after = hpwl_after
+        self.overflow = overflow
+        self.iterations = iterations
+        self.elapsed = elapsed
+
+    def __len__(self):
+        return len(self.cells)
+
+    def to_batch(self) -> PlacementBatch:
+        return PlacementBatch([self.index.cell_names[i] for i in self.cells], self.x, self.y,
+                              status=np.full(len(self.cells), STATUS_CODES['placed'], dtype=np.int8),
+                              cell_ids=self.cells)
+
+    def summary(self) -> dict:
+        return {
+            'cells': len(self.cells),
+            'hpwl_before': round(self.hpwl_before, 3),
+            'hpwl_after': round(self.hpwl_after, 3),
+            'overflow': round(self.overflow, 4),
+            'iterations': self.iterations,
+            'elapsed': round(self.elapsed, 3),
+        }
+
+    def to_arrays(self) -> dict:
+        return {'cells': self.cells, 'x': self.x, 'y': self.y}
+
+
+class GlobalPlacer:
+    """
+    :param design_index: Design的列式视图
+    :param target_density: bin面积利用率目标
+    :param max_net_degree: 度数超过该值的net(时钟、复位等)不参与线长模型
+    :param max_iterations: 扩散的最大轮数
+    :param target_overflow: bin溢出面积占可移动cell面积的比例低于该值时停止
+    :param cg_iterations / cg_tolerance: 每次CG求解的最大迭代次数和相对残差
+    :param threads: 求解x/y方向的线程数，1为串行，默认多核时为2
+    """
+    def __init__(self, design_index: DesignIndex, target_density=0.9, max_net_degree=1000, max_iterations=30,
+                 target_overflow=0.1, cg_iterations=100, cg_tolerance=1e-5, threads=None, seed=0):
+        self.index = design_index
+        self.target_density = float(target_density)
+        self.max_net_degree = int(max_net_degree)
+        self.max_iterations = int(max_iterations)
+        self.target_overflow = float(target_overflow)
+        self.cg_iterations = int(cg_iterations)
+        self.cg_tolerance = float(cg_tolerance)
+        self.threads = max(int(threads or min(os.cpu_count() or 1, 2)), 1)
+        self._rng = np.random.default_rng(seed)
+
+    def place(self, movable: np.ndarray, ignore: Optional[np.ndarray] = None) -> GlobalPlaceResult:
+        """
+        :param movable: cell掩码，需要摆放的cell
+        :param ignore: cell掩码，既不移动也不参与线长模型的cell(例如留给之后增量摆放的cell)
+        """
+        start = time.time()
+        index = self.index
+        movable = np.asarray(movable, dtype=bool)
+        ignore = np.zeros(index.num_cells, dtype=bool) if ignore is None else np.asarray(ignore, dtype=bool)
+        movable = movable & ~ignore
+        cells = np.flatnonzero(movable)
+        cx, cy = index.cell_centers()
+        cx, cy = cx.copy(), cy.copy()
+        hpwl_before = net_hpwl(index, cx, cy, ignore)
+        if len(cells) == 0:
+            return GlobalPlaceResult(index, cells, index.x[cells], index.y[cells], hpwl_before, hpwl_before,
+                                     0.0, 0, time.time() - start)
+
+        # 可移动cell从核心区中心附近出发(带一点扰动，避免B2B的距离全为0)
+        width, height = index.core_width, index.core_height
+        core_x, core_y = index.core_x, index.core_y
+        cx[cells] = core_x + width / 2 + self._rng.uniform(-0.01, 0.01, len(cells)) * width
+        cy[cells] = core_y + height / 2 + self._rng.uniform(-0.01, 0.01, len(cells)) * height
+        self._prepare(movable, ignore)
+
+        with ThreadPoolExecutor(max_workers=min(self.threads, 2)) as pool:
+            # 没有锚点的初始解，B2B模型按新位置重新线性化几次
+            for _ in range(3):
+                cx, cy = self._solve(pool, cx, cy)
+            # 扩散后的位置作为锚点，权重逐轮增大，求解结果的溢出率降到目标以下即停止
+            iterations, overflow = 0, self._overflow(cx, cy)
+            while iterations < self.max_iterations and overflow > self.target_overflow:
+                iterations += 1
+                anchor_x, anchor_y = self._spread(cx, cy)
+                weight = 0.01 * (1.6 ** iterations)
+                cx, cy = self._solve(pool, cx, cy, (anchor_x, anchor_y, weight))
+                overflow = self._overflow(cx, cy)
+            if overflow > self.target_overflow:
+                # 没有收敛时取扩散后的位置，至少密度是满足的
+                cx, cy = self._spread(cx, cy)
+                overflow = self._overflow(cx, cy)
+
+        x = np.clip(cx[cells] - index.width[cells] / 2, core_x,
+                    core_x + np.maximum(width - index.width[cells], 0.0))
+        y = np.clip(cy[cells] - index.height[cells] / 2, core_y,
+                    core_y + np.maximum(height - index.height[cells], 0.0))
+        final_x, final_y = index.cell_centers()
+        final_x, final_y = final_x.copy(), final_y.copy()
+        final_x[cells], final_y[cells] = x + index.width[cells] / 2, y + index.height[cells] / 2
+        result = GlobalPlaceResult(index, cells, x, y, hpwl_before, net_hpwl(index, final_x, final_y, ignore),
+                                   overflow, iterations, time.time() - start)
+        logger.info(f"global placed {len(cells)} cells: hpwl {hpwl_before:.1f} -> {result.hpwl_after:.1f}, "
+                    f"overflow {overflow:.3f}, {iterations} spreading iterations, {result.elapsed:.2f}s")
+        return result
+
+    def _prepare(self, movable: np.ndarray, ignore: np.ndarray):
+        """线长模型用到的net-pin表(只保留连接至少一个可移动cell、度数合适的net)和bin网格"""
+        index = self.index
+        entry_cell = index.pin_cell[index.net_pins].astype(np.int64)
+        entry_net = index.net_pin_net
+        keep = (entry_cell >= 0)
+        keep &= ~ignore[np.maximum(entry_cell, 0)]
+        cells, nets = entry_cell[keep], entry_net[keep]
+        degree = np.bincount(nets, minlength=index.num_nets)
+        has_movable = np.bincount(nets, weights=movable[cells], minlength=index.num_nets) > 0
+        useful = (degree >= 2) & (degree <= self.max_net_degree) & has_movable
+        keep = useful[nets]
+        self.entry_cell, self.entry_net = cells[keep], nets[keep]
+        self.entry_degree = degree[self.entry_net]
+        self.movable = movable
+        self.var = np.full(index.num_cells, -1, dtype=np.int64)
+        self.cells = np.flatnonzero(movable)
+        self.var[self.cells] = np.arange(len(self.cells))
+        starts = np.flatnonzero(np.concatenate(([True], self.entry_net[1:] != self.entry_net[:-1])))
+        self.net_starts = starts
+        self.net_sizes = np.diff(np.concatenate((starts, [len(self.entry_net)])))
+
+        # bin网格: 平均每个bin约8个可移动cell
+        area = index.width * index.height
+        self.area = area
+        bins = int(np.clip(np.sqrt(len(self.cells) / 8.0), 4, 512))
+        self.bins = bins
+        self.bin_w = max(index.core_width, 1e-9) / bins
+        self.bin_h = max(index.core_height, 1e-9) / bins
+        fixed = ~movable & ~ignore
+        fx, fy = index.cell_centers()
+        self.fixed_usage = self._bin_usage(fx[fixed], fy[fixed], area[fixed])
+        self.capacity = self.bin_w * self.bin_h * self.target_density
+
+    def _b2b_edges(self, coord: np.ndarray):
+        """按当前坐标生成一个方向的B2B边表 (a, b, w)"""
+        cells, starts, sizes = self.entry_cell, self.net_starts, self.net_sizes
+        entry_coord = coord[cells]
+        order = np.lexsort((entry_coord, self.entry_net))
+        sorted_cells = cells[order]
+        lo_cell = sorted_cells[starts]
+        hi_cell = sorted_cells[starts + sizes - 1]
+        net_of = np.repeat(np.arange(len(starts)), sizes)
+        weight = 2.0 / (sizes - 1)
+        position = np.arange(len(sorted_cells)) - np.repeat(starts, sizes)
+        interior = (position > 0) & (position < np.repeat(sizes, sizes) - 1)
+        inner_cells, inner_net = sorted_cells[interior], net_of[interior]
+        a = np.concatenate((lo_cell, inner_cells, inner_cells))
+        b = np.concatenate((hi_cell, lo_cell[inner_net], hi_cell[inner_net]))
+        w = np.concatenate((weight, weight[inner_net], weight[inner_net]))
+        distance = np.maximum(np.abs(coord[a] - coord[b]), 1e-3 * max(self.bin_w, self.bin_h))
+        w = w / distance
+        keep = a != b
+        return a[keep], b[keep], w[keep]
+
+    def _solve_axis(self, coord: np.ndarray, anchor=None) -> np.ndarray:
+        a, b, w = self._b2b_edges(coord)
+        var = self.var
+        n = len(self.cells)
+        va, vb = var[a], var[b]
+        diag = np.zeros(n)
+        rhs = np.zeros(n)
+        # 可移动-可移动的边进矩阵，可移动-固定的边并入对角和右端项
+        both = (va >= 0) & (vb >= 0)
+        a_only = (va >= 0) & (vb < 0)
+        b_only = (va < 0) & (vb >= 0)
+        ea, eb, ew = va[both], vb[both], w[both]
+        diag += np.bincount(ea, weights=ew, minlength=n) + np.bincount(eb, weights=ew, minlength=n)
+        diag += np.bincount(va[a_only], weights=w[a_only], minlength=n)
+        rhs += np.bincount(va[a_only], weights=w[a_only] * coord[b[a_only]], minlength=n)
+        diag += np.bincount(vb[b_only], weights=w[b_only], minlength=n)
+        rhs += np.bincount(vb[b_only], weights=w[b_only] * coord[a[b_only]], minlength=n)
+        x0 = coord[self.cells]
+        # 没有连接的cell用一个很弱的锚点固定在当前位置，保证矩阵正定
+        regular = 1e-6 * (diag.mean() if n and diag.any() else 1.0)
+        diag += regular
+        rhs += regular * x0
+        if anchor is not None:
+            target, weight = anchor
+            pseudo = weight * np.maximum(diag, regular)
+            diag += pseudo
+            rhs += pseudo * target[self.cells]
+
+        def matvec(v):
+            return diag * v - np.bincount(ea, weights=ew * v[eb], minlength=n) \
+                - np.bincount(eb, weights=ew * v[ea], minlength=n)
+
+        solution = conjugate_gradient(matvec, rhs, x0, 1.0 / diag, self.cg_iterations, self.cg_tolerance)
+        result = coord.copy()
+        result[self.cells] = solution
+        return result
+
+    def _solve(self, pool: ThreadPoolExecutor, cx, cy, anchors=None):
+        anchor_x = anchor_y = None
+        if anchors is not None:
+            anchor_x, anchor_y = (anchors[0], anchors[2]), (anchors[1], anchors[2])
+        if self.threads > 1:
+            fx = pool.submit(self._solve_axis, cx, anchor_x)
+            fy = pool.submit(self._solve_axis, cy, anchor_y)
+            cx, cy = fx.result(), fy.result()
+        else:
+            cx, cy = self._solve_axis(cx, anchor_x), self._solve_axis(cy, anchor_y)
+        index = self.index
+        cx = np.clip(cx, index.core_x, index.core_x + index.core_width)
+        cy = np.clip(cy, index.core_y, index.core_y + index.core_height)
+        return cx, cy
+
+    def _bin_of(self, cx, cy):
+        """bin网格从core左下角开始"""
+        bx = np.clip(((cx - self.index.core_x) / self.bin_w).astype(np.int64), 0, self.bins - 1)
+        by = np.clip(((cy - self.index.core_y) / self.bin_h).astype(np.int64), 0, self.bins - 1)
+        return bx, by
+
+    def _bin_usage(self, cx, cy, area) -> np.ndarray:
+        bx, by = self._bin_of(cx, cy)
+        return np.bincount(by * self.bins + bx, weights=area, minlength=self.bins * self.bins).reshape(
+            self.bins, self.bins)
+
+    def _overflow(self, cx, cy) -> float:
+        cells = self.cells
+        usage = self._bin_usage(cx[cells], cy[cells], self.area[cells]) + self.fixed_usage
+        total = float(self.area[cells].sum())
+        return float(np.maximum(usage - self.capacity, 0.0).sum()) / max(total, 1e-12)
+
+    def _spread(self, cx, cy, rounds=2):
+        """先沿x再沿y做容量打包，得到扩散后的中心坐标"""
+        cells = self.cells
+        x, y = cx[cells].copy(), cy[cells].copy()
+        for _ in range(rounds):
+            x = self._pack_axis(x, y, axis=0)
+            y = self._pack_axis(x, y, axis=1)
+        sx, sy = cx.copy(), cy.copy()
+        sx[cells], sy[cells] = x, y
+        return sx, sy
+
+    def _pack_axis(self, x, y, axis: int) -> np.ndarray:
+        """
+        沿一个方向的扩散: 每条bin带(axis=0时为一行bin)内，坐标换算到"累计容量"空间，
+        cell在该空间中的长度为面积(带内总面积超过容量时等比缩小)，用pack_1d消除重叠，
+        向右推和向左推(镜像)两种打包取平均，拥挤处向两侧对称展开，稀疏处不动，最后换算回坐标
+        """
+        bins, cells = self.bins, self.cells
+        capacity = np.maximum(self.capacity - self.fixed_usage, 1e-3 * self.capacity)
+        if axis == 1:
+            capacity = capacity.T
+        size = self.bin_w if axis == 0 else self.bin_h
+        origin = self.index.core_x if axis == 0 else self.index.core_y
+        bx, by = self._bin_of(x, y)
+        coord, col, stripe = (x, bx, by) if axis == 0 else (y, by, bx)
+        cumulative = np.zeros((bins, bins + 1))
+        np.cumsum(capacity, axis=1, out=cumulative[:, 1:])
+        fraction = np.clip((coord - origin) / size - col, 0.0, 1.0)
+        position = cumulative[stripe, col] + fraction * capacity[stripe, col]
+
+        area = self.area[cells]
+        supply = np.bincount(stripe, weights=area, minlength=bins)
+        total = cumulative[:, -1]
+        scale = np.minimum(1.0, total / np.maximum(supply, 1e-12))
+        order = np.lexsort((position, stripe))
+        groups = stripe[order]
+        length = (area * scale[stripe])[order]
+        upper = total[groups]
+        left = pack_1d(position[order] - length / 2, length, groups, 0.0, upper)
+        # 镜像后同样打包，得到向左推的结果
+        mirrored = pack_1d((upper - position[order] - length / 2)[::-1], length[::-1], groups[::-1], 0.0,
+                           upper[::-1])[::-1]
+        packed = np.empty_like(position)
+        packed[order] = (left + (upper - mirrored - length)) / 2 + length / 2
+
+        # 容量空间 -> 坐标
+        span = total.max() + 1.0
+        flat = (cumulative[:, 1:] + np.arange(bins)[:, None] * span).ravel()
+        target = np.searchsorted(flat, packed + stripe * span, side='right') - stripe * bins
+        target = np.clip(target, 0, bins - 1)
+        offset = (packed - cumulative[stripe, target]) / capacity[stripe, target]
+        return origin + (target + np.clip(offset, 0.0, 1.0)) * size
+
+
+def conjugate_gradient(matvec, rhs: np.ndarray, x0: np.ndarray, inv_diag: np.ndarray, max_iterations=100,
+                       tolerance=1e-5) -> np.ndarray:
+    """Jacobi预条件共轭梯度，matvec为对称正定矩阵的乘法"""
+    x = x0.copy()
+    r = rhs - matvec(x)
+    norm_b = max(float(np.linalg.norm(rhs)), 1e-30)
+    z = inv_diag * r
+    p = z.copy()
+    rz = float(r @ z)
+    for _ in range(max_iterations):
+        if float(np.linalg.norm(r)) <= tolerance * norm_b:
+            break
+        q = matvec(p)
+        alpha = rz / max(float(p @ q), 1e-300)
+        x += alpha * p
+        r -= alpha * q
+        z = inv_diag * r
+        rz_new = float(r @ z)
+        p = z + (rz_new / max(rz, 1e-300)) * p
+        rz = rz_new
+    return x
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+'''
+按module切分网表
+1. HierarchyTree: 由'/'分隔的cell名构建层次树。cell名排序后，任意module下的cell在排序结果中是连续的一段，
+   树的每个节点只记录这一段的[start, end)，按module取cell是一次字典查找加切片，代价只与子树大小有关
+2. extract_subdesign/extract_cells: 取若干module子树的并集(或任意cell集合)，生成自包含的子设计，
+   跨边界的net在子设计中变成以net名命名的端口(端口pin不在pin_to_cell中，与顶层端口的表示一致)，
+   区域内有驱动pin的为output端口，否则为input端口
+3. write_bundles: 每个子设计写成一个目录(netlist.txt与get_netlist.tcl输出格式相同，可直接用load_netlist的解析逻辑读取，
+   ports.txt为端口列表)，可选打包成tar.gz，格式化和压缩在进程池(spawn启动)中并行执行
+'''
+import gc
+import logging
+import multiprocessing
+import os
+import re
+import tarfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from design_index import DesignIndex, ORIENTS, PLACE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+
+class HierarchyTree:
+    """
+    :param cell_names: DesignIndex.cell_names
+    order: 按名字排序后的cell id，nodes[module] = (start, end) 为该module在order中的范围
+    """
+    def __init__(self, cell_names: List[str]):
+        self.order = np.asarray(sorted(range(len(cell_names)), key=cell_names.__getitem__), dtype=np.int64)
+        self.nodes: Dict[str, tuple] = {}
+        self.children: Dict[str, List[str]] = {'': []}
+        # 打开中的module栈: [(层次名, 完整路径, 起始位置)]，排序后同一module的cell连续，离开后不会再回来
+        stack: List[tuple] = []
+        for position, cell_id in enumerate(self.order):
+            parts = cell_names[cell_id].split('/')[:-1]
+            common = 0
+            while common < len(stack) and common < len(parts) and stack[common][0] == parts[common]:
+                common += 1
+            while len(stack) > common:
+                _, path, start = stack.pop()
+                self.nodes[path] = (start, position)
+            for depth in range(common, len(parts)):
+                parent = stack[-1][1] if stack else ''
+                path = f'{parent}/{parts[depth]}' if parent else parts[depth]
+                self.children[parent].append(path)
+                self.children[path] = []
+                stack.append((parts[depth], path, position))
+        while stack:
+            _, path, start = stack.pop()
+            self.nodes[path] = (start, len(self.order))
+        self.nodes[''] = (0, len(self.order))
+        logger.info(f"hierarchy tree built: {len(self.nodes) - 1} modules, {len(self.order)} cells")
+
+    def __contains__(self, module: str) -> bool:
+        return module.strip('/') in self.nodes
+
+    def cells(self, module: str) -> np.ndarray:
+        """module子树下所有cell的id，module不存在时抛KeyError"""
+        start, end = self.nodes[module.strip('/')]
+        return self.order[start:end]
+
+    def cell_count(self, module: str) -> int:
+        start, end = self.nodes[module.strip('/')]
+        return end - start
+
+    def to_dict(self, module='', depth=1) -> dict:
+        """module及其下depth层子module的cell数量"""
+        module = module.strip('/')
+        result = {'name': module, 'cells': self.cell_count(module)}
+        if depth > 0 and self.children[module]:
+            result['children'] = [self.to_dict(child, depth - 1) for child in self.children[module]]
+        return result
+
+
+class SubDesign:
+    """
+    自包含的子设计，数据都是普通的列表/元组，便于传给进程池
+    cells: [(name, width, height, orient, status, x, y, [pins])]
+    nets: [(name, [load_pins], [driver_pins])]
+    ports: [(name, direction)]
+    """
+    def __init__(self, name: str, core_size, cells: list, nets: list, ports: list):
+        self.name = name
+        self.core_size = core_size
+        self.cells = cells
+        self.nets = nets
+        self.ports = ports
+
+    def summary(self) -> dict:
+        return {'name': self.name, 'cells': len(self.cells), 'nets': len(self.nets), 'ports': len(self.ports)}
+
+
+def extract_subdesign(design_index: DesignIndex, tree: HierarchyTree, modules: List[str],
+                      name: Optional[str] = None) -> SubDesign:
+    """取modules子树并集中的cell组成子设计，跨边界的net变成端口"""
+    cell_ids = np.concatenate([tree.cells(module) for module in modules] + [np.zeros(0, dtype=np.int64)])
+    return extract_cells(design_index, cell_ids, name or '_'.join(modules))
+
+
+def extract_cells(design_index: DesignIndex, cell_ids: np.ndarray, name: str) -> SubDesign:
+    """
+    任意cell集合组成的子设计，按module、按流水级等切分方式共用
+    构建时会创建大量小列表，Design很大时分代GC反复扫描整个堆，占了一多半时间，这里临时关闭
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _extract_cells(design_index, np.unique(np.asarray(cell_ids, dtype=np.int64)), name)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _extract_cells(design_index: DesignIndex, cell_ids: np.ndarray, name: str) -> SubDesign:
+    inside = np.zeros(design_index.num_cells, dtype=bool)
+    inside[cell_ids] = True
+    pin_ptr, cell_pins = design_index.cell_pin_csr()
+    counts = pin_ptr[cell_ids + 1] - pin_ptr[cell_ids]
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    own_pins = cell_pins[np.repeat(pin_ptr[cell_ids], counts) + offsets]
+    nets = np.unique(design_index.pin_net[own_pins])
+    nets = nets[nets >= 0]
+
+    pin_names = design_index.pin_names
+    names = design_index.cell_names
+    own_pin_names = [pin_names[p] for p in own_pins.tolist()]
+    pin_bounds = np.concatenate(([0], np.cumsum(counts))).tolist()
+    orients, statuses = design_index.orient[cell_ids].tolist(), design_index.status[cell_ids].tolist()
+    cells = [(names[cell_id], width, height, ORIENTS[orient] if orient >= 0 else '',
+              PLACE_STATUSES[status] if status >= 0 else '', x, y, own_pin_names[pin_bounds[k]:pin_bounds[k + 1]])
+             for k, (cell_id, width, height, orient, status, x, y) in enumerate(zip(
+                 cell_ids.tolist(), design_index.width[cell_ids].tolist(), design_index.height[cell_ids].tolist(),
+                 orients, statuses, design_index.x[cell_ids].tolist(), design_index.y[cell_ids].tolist()))]
+
+    # 选中net的全部pin一次取出，只保留子设计内的pin，按(net, 是否驱动)排序后每个net的load/driver各是一段
+    net_start, net_end = design_index.net_ptr[nets], design_index.net_ptr[nets + 1]
+    net_size = net_end - net_start
+    entries = np.repeat(net_start, net_size) + (np.arange(net_size.sum()) - np.repeat(np.cumsum(net_size) - net_size,
+                                                                                     net_size))
+    entry_pin = design_index.net_pins[entries]
+    entry_cell = design_index.pin_cell[entry_pin]
+    entry_inside = (entry_cell >= 0) & inside[np.maximum(entry_cell, 0)]
+    entry_local = np.repeat(np.arange(len(nets)), net_size)
+    crossing = (np.bincount(entry_local[~entry_inside], minlength=len(nets)) > 0).tolist()
+    kept_local = entry_local[entry_inside]
+    kept_driver = design_index.net_pin_is_driver[entries][entry_inside]
+    order = np.lexsort((kept_driver, kept_local))
+    kept_names = [pin_names[p] for p in entry_pin[entry_inside][order].tolist()]
+    group = kept_local[order] * 2 + kept_driver[order]
+    bounds = np.searchsorted(group, np.arange(2 * len(nets) + 1)).tolist()
+
+    net_names = design_index.net_names
+    net_list, ports = [], []
+    for local, net in enumerate(nets.tolist()):
+        loads = kept_names[bounds[2 * local]:bounds[2 * local + 1]]
+        drivers = kept_names[bounds[2 * local + 1]:bounds[2 * local + 2]]
+        net_name = net_names[net]
+        if crossing[local]:
+            # 跨边界: 外部pin用一个同名端口代替
+            if drivers:
+                loads.append(net_name)
+                ports.append((net_name, 'output'))
+            else:
+                drivers.append(net_name)
+                ports.append((net_name, 'input'))
+        net_list.append((net_name, loads, drivers))
+    core_size = (design_index.core_width, design_index.core_height)
+    return SubDesign(name, core_size, cells, net_list, ports)
+
+
+def format_netlist(sub_design: SubDesign) -> str:
+    """按get_netlist.tcl的输出格式生成网表文本"""
+    lines = ['=======design_info=======',
+             f'core_size: {{{sub_design.core_size[0]} {sub_design.core_size[1]}}}',
+             '=======cell_info=======']
+    for name, width, height, orient, status, x, y, pins in sub_design.cells:
+        lines.append(name)
+        lines.append(f'{width},{height},{orient},{status},{x},{y}')
+        lines.append('|'.join(pins))
+    lines.append('=======net_info=======')
+    for name, loads, drivers in sub_design.nets:
+        lines.append(f"{name},{'|'.join(loads)},{'|'.join(drivers)}")
+    return '\n'.join(lines) + '\n'
+
+
+def safe_bundle_name(name: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', name.strip('/')) or 'top'
+
+
+def write_bundle(sub_design: SubDesign, directory: str, compress=True) -> dict:
+    """写一个子设计目录，进程池中执行"""
+    bundle_dir = os.path.join(directory, safe_bundle_name(sub_design.name))
+    os.makedirs(bundle_dir, exist_ok=True)
+    netlist_path = os.path.join(bundle_dir, 'netlist.txt')
+    ports_path = os.path.join(bundle_dir, 'ports.txt')
+    with open(netlist_path, 'w') as f:
+        f.write(format_netlist(sub_design))
+    with open(ports_path, 'w') as f:
+        f.writelines(f'{name},{direction}\n' for name, direction in sub_design.ports)
+    result = sub_design.summary()
+    result['path'] = bundle_dir
+    if compress:
+        archive = bundle_dir + '.tar.gz'
+        with tarfile.open(archive, 'w:gz') as tar:
+            tar.add(netlist_path, arcname='netlist.txt')
+            tar.add(ports_path, arcname='ports.txt')
+        result['archive'] = archive
+    return result
+
+
+def write_bundles(sub_designs: List[SubDesign], directory: str, compress=True, workers: Optional[int] = None) -> list:
+    """
+    并行写出多个子设计，workers为1或只有一个子设计时在当前进程执行
+    服务是多线程的，fork出的子进程会继承其他线程当时持有的锁(日志队列、缓存锁等)而可能死锁，进程池用spawn启动
+    """
+    os.makedirs(directory, exist_ok=True)
+    if workers == 1 or len(sub_designs) <= 1:
+        return [write_bundle(sub_design, directory, compress) for sub_design in sub_designs]
+    workers = min(workers or os.cpu_count() or 1, len(sub_designs))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(write_bundle, sub_design, directory, compress) for sub_design in sub_designs]
+        return [future.result() for future in futures]
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+'''
+按寄存器级(Cycle)切分设计
+1. 由net的driver/load关系构建cell级有向图(CSR)，驱动pin所在cell指向负载pin所在cell，
+   接到时钟pin的边不算(否则时钟树会把所有寄存器连成一级)
+2. 有时钟pin的cell视为时序cell
+3. 0-1 BFS: 进入时序cell的边权为1，进入组合cell的边权为0，
+   stage = 从输入(没有驱动cell的cell，一般由端口驱动)出发经过的寄存器数量。
+   每一级先沿0权边把组合逻辑扩展到底，再把遇到的寄存器作为下一级的起点，
+   每次扩展都是整个frontier一次CSR gather，总代价与边数成线性
+stage为k的cell = 第k级寄存器 + 它们驱动的组合逻辑锥，即一个流水级。
+从输入不可达的寄存器(例如网表中没有端口信息、或只在状态机环路中)作为补充起点再做一轮，stage从0开始计，
+之后仍不可达的cell(没有寄存器的组合环)stage为-1。
+'''
+import logging
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from design_index import DesignIndex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLOCK_PINS = ['CLK', 'CK', 'CP', 'CPN', 'CKN', 'CLKN', 'GCLK']
+
+
+def clock_pin_mask(design_index: DesignIndex, clock_pins: Optional[List[str]] = None) -> np.ndarray:
+    """pin名最后一级为时钟pin名的pin"""
+    suffixes = tuple('/' + name for name in (clock_pins or DEFAULT_CLOCK_PINS))
+    return np.fromiter((name.endswith(suffixes) for name in design_index.pin_names), dtype=bool,
+                       count=len(design_index.pin_names))
+
+
+def build_cell_graph(design_index: DesignIndex, skip_load_pin: Optional[np.ndarray] = None):
+    """
+    cell级有向图的CSR: (ptr, targets)，targets[ptr[c]:ptr[c+1]]为cell c驱动的cell
+    :param skip_load_pin: pin掩码，负载pin在掩码中的边不加入
+    """
+    entry_cell = design_index.pin_cell[design_index.net_pins]
+    entry_net = design_index.net_pin_net
+    is_driver = design_index.net_pin_is_driver
+    on_cell = entry_cell >= 0
+    drivers = np.flatnonzero(on_cell & is_driver)
+    loads = on_cell & ~is_driver
+    if skip_load_pin is not None:
+        loads &= ~skip_load_pin[design_index.net_pins]
+    loads = np.flatnonzero(loads)
+
+    # 每个负载与所在net的每个驱动配对，绝大多数net只有一个驱动
+    num_nets = design_index.num_nets
+    driver_count = np.bincount(entry_net[drivers], minlength=num_nets)
+    driver_ptr = np.concatenate(([0], np.cumsum(driver_count)))
+    load_net = entry_net[loads]
+    repeat = driver_count[load_net]
+    dst = np.repeat(entry_cell[loads], repeat)
+    offsets = np.arange(repeat.sum()) - np.repeat(np.cumsum(repeat) - repeat, repeat)
+    src = entry_cell[drivers][np.repeat(driver_ptr[load_net], repeat) + offsets]
+    keep = src != dst
+    src, dst = src[keep].astype(np.int64), dst[keep].astype(np.int64)
+
+    order = np.argsort(src, kind='stable')
+    ptr = np.zeros(design_index.num_cells + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=design_index.num_cells), out=ptr[1:])
+    return ptr, dst[order]
+
+
+def gather_neighbors(ptr: np.ndarray, targets: np.ndarray, frontier: np.ndarray) -> np.ndarray:
+    """frontier中所有cell的出边终点"""
+    counts = ptr[frontier + 1] - ptr[frontier]
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return targets[np.repeat(ptr[frontier], counts) + offsets]
+
+
+class LevelizeResult:
+    """
+    stage: 每个cell的流水级，-1为从输入不可达
+    is_sequential: 每个cell是否为时序cell
+    """
+    def __init__(self, design_index: DesignIndex, stage: np.ndarray, is_sequential: np.ndarray, elapsed: float):
+        self.index = design_index
+        self.stage = stage
+        self.is_sequential = is_sequential
+        self.elapsed = elapsed
+        # 从输入不可达、作为补充起点的寄存器数量
+        self.extra_sources = 0
+
+    @property
+    def num_stages(self) -> int:
+        return int(self.stage.max()) + 1 if len(self.stage) else 0
+
+    def stage_cells(self, stages) -> np.ndarray:
+        """若干stage的cell id"""
+        return np.flatnonzero(np.isin(self.stage, np.asarray(stages)))
+
+    def group_stages(self, stages_per_group: int) -> List[List[int]]:
+        """相邻stage每stages_per_group个一组"""
+        step = max(int(stages_per_group), 1)
+        return [list(range(start, min(start + step, self.num_stages))) for start in range(0, self.num_stages, step)]
+
+    def summary(self) -> dict:
+        size = self.num_stages + 1
+        registers = np.bincount(self.stage[self.is_sequential] + 1, minlength=size)
+        total = np.bincount(self.stage + 1, minlength=size)
+        return {
+            'num_stages': self.num_stages,
+            'sequential_cells': int(np.count_nonzero(self.is_sequential)),
+            'unreached_cells': int(total[0]),
+            'extra_sources': self.extra_sources,
+            'elapsed': round(self.elapsed, 3),
+            'stages': [{'stage': k, 'registers': int(registers[k + 1]), 'combinational': int(total[k + 1] - registers[k + 1])}
+                       for k in range(self.num_stages)],
+        }
+
+    def to_arrays(self) -> dict:
+        return {'stage': self.stage, 'is_sequential': self.is_sequential}
+
+
+def _bfs(ptr: np.ndarray, targets: np.ndarray, is_sequential: np.ndarray, stage: np.ndarray, sources: np.ndarray):
+    """从sources(stage 0)出发的0-1 BFS，只写stage仍为-1的cell"""
+    current = sources
+    stage[current] = 0
+    level = 0
+    while len(current) > 0:
+        frontier = current
+        registers = []
+        while len(frontier) > 0:
+            reached = gather_neighbors(ptr, targets, frontier)
+            reached = np.unique(reached[stage[reached] < 0])
+            if len(reached) == 0:
+                break
+            sequential = is_sequential[reached]
+            # 寄存器属于下一级，此时标记即可，之后不会有更短的路径
+            stage[reached[sequential]] = level + 1
+            registers.append(reached[sequential])
+            frontier = reached[~sequential]
+            stage[frontier] = level
+        current = np.concatenate(registers) if registers else np.zeros(0, dtype=np.int64)
+        level += 1
+
+
+def levelize(design_index: DesignIndex, clock_pins: Optional[List[str]] = None) -> LevelizeResult:
+    start = time.time()
+    num_cells = design_index.num_cells
+    clock_pin = clock_pin_mask(design_index, clock_pins)
+    is_sequential = np.zeros(num_cells, dtype=bool)
+    clock_cells = design_index.pin_cell[clock_pin]
+    is_sequential[clock_cells[clock_cells >= 0]] = True
+    ptr, targets = build_cell_graph(design_index, clock_pin)
+
+    stage = np.full(num_cells, -1, dtype=np.int32)
+    fanin = np.bincount(targets, minlength=num_cells)
+    sources = np.flatnonzero(fanin == 0)
+    _bfs(ptr, targets, is_sequential, stage, sources)
+    unreached = np.flatnonzero((stage < 0) & is_sequential)
+    if len(unreached) > 0:
+        logger.info(f"{len(unreached)} registers unreachable from inputs, used as extra sources")
+        _bfs(ptr, targets, is_sequential, stage, unreached)
+
+    result = LevelizeResult(design_index, stage, is_sequential, time.time() - start)
+    result.extra_sources = len(unreached)
+    logger.info(f"levelized {num_cells} cells into {result.num_stages} stages, "
+                f"{int(np.count_nonzero(is_sequential))} sequential, {result.elapsed:.2f}s")
+    return result
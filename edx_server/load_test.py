@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+'''
+REST接口并发压测: 模拟多个agent同时访问execute_tcl/place_cells/get_timing等接口
+1. 客户端模式: thread(每个客户端一个线程)、process(每个客户端一个进程，客户端本身不受GIL影响)、
+   asyncio(单线程协程，适合上百个客户端)
+2. 请求比例 --mix execute_tcl=5,place_cells=3,get_timing=2，请求大小 --tcl-lines/--place-cells/--topn
+3. 到达方式: --rate 0 为闭环(每个客户端收到响应后立即发下一个，可加--think)，
+   --rate R 为开环泊松到达(全部客户端合计每秒R个)，延迟从计划发送时间算起，不会因服务变慢而少算排队时间
+4. 报告每种请求及总体的p50/p95/p99延迟、错误率和吞吐，结果JSON可用 --compare 对比不同服务模式
+    python load_test.py --url http://localhost:5000 --clients 50 --duration 60 --label waitress --output waitress.json
+    python load_test.py --start-server werkzeug --fake-cells 100000 --clients 50 --mode asyncio --output werkzeug.json
+    python load_test.py --compare waitress.json werkzeug.json
+'''
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from bench_endpoints import HttpClient, start_listener_process, stop_listener_process
+from config import DEFAULT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+TOOL = 'leapr'
+DEFAULT_MIX = 'execute_tcl=5,place_cells=3,get_timing=2'
+# 每个样本: (请求类型, 发送时间(相对开始), 延迟秒数, HTTP状态，0表示连接错误/超时)
+Sample = Tuple[str, float, float, int]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """"execute_tcl=5,place_cells=3" -> {请求类型: 权重}"""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip():
+            if name.strip() not in REQUEST_BUILDERS:
+                raise ValueError(f"unknown request type '{name.strip()}', supported: {list(REQUEST_BUILDERS)}")
+            mix[name.strip()] = float(weight or 1)
+    if not mix:
+        raise ValueError('empty request mix')
+    return mix
+
+
+# ---- 请求构造 ----
+def _execute_tcl(setup: dict, config: dict, rng: random.Random):
+    names = setup['cell_names']
+    lines = []
+    for _ in range(config['tcl_lines']):
+        name = names[rng.randrange(len(names))]
+        x = round(rng.uniform(0, setup['core_width'] * 0.95), 3)
+        y = round(rng.uniform(0, setup['core_height'] * 0.95), 3)
+        lines.append(f'place_cell {name} {x} {y} -placed')
+    return 'POST', f'/{TOOL}/execute_tcl', json.dumps({'commands': lines}).encode(), 'application/json'
+
+
+def _place_cells(setup: dict, config: dict, rng: random.Random):
+    names = setup['cell_names']
+    count = min(config['place_cells'], len(names))
+    picked = rng.sample(range(len(names)), count)
+    body = {'cell_name': [names[i] for i in picked],
+            'x': [round(rng.uniform(0, setup['core_width'] * 0.95), 3) for _ in picked],
+            'y': [round(rng.uniform(0, setup['core_height'] * 0.95), 3) for _ in picked]}
+    return 'POST', f'/{TOOL}/place_cells', json.dumps(body).encode(), 'application/json'
+
+
+def _get_timing(setup: dict, config: dict, rng: random.Random):
+    return 'GET', f'/{TOOL}/get_timing?topn={config["topn"]}', None, None
+
+
+def _timing_query(setup: dict, config: dict, rng: random.Random):
+    return 'GET', f'/{TOOL}/timing_query?query=summary', None, None
+
+
+def _load_netlist(setup: dict, config: dict, rng: random.Random):
+    return 'POST', f'/{TOOL}/load_netlist', None, None
+
+
+REQUEST_BUILDERS = {
+    'execute_tcl': _execute_tcl,
+    'place_cells': _place_cells,
+    'get_timing': _get_timing,
+    'timing_query': _timing_query,
+    'load_netlist': _load_netlist,
+}
+
+
+def prepare(url: str, timeout: float) -> dict:
+    """读取一次网表，取cell名和core大小用于构造摆放/TCL请求"""
+    status, data, _ = HttpClient(url, timeout).request('POST', f'/{TOOL}/load_netlist')
+    if status != 200:
+        raise RuntimeError(f"load_netlist failed with status {status}: {data[:300]!r}")
+    design = json.loads(data)['data']
+    names = list(design['cells'])
+    if not names:
+        raise RuntimeError('design has no cells')
+    return {'cell_names': names, 'core_width': float(design['core_width'] or 1.0),
+            'core_height': float(design['core_height'] or 1.0)}
+
+
+# ---- 客户端 ----
+class _Schedule:
+    """一个客户端的发送计划: 闭环按think时间，开环按泊松到达"""
+    def __init__(self, config: dict, client_id: int):
+        self.rng = random.Random(config['seed'] * 100003 + client_id)
+        self.names = list(config['mix'])
+        self.weights = [config['mix'][name] for name in self.names]
+        self.rate = config['rate'] / config['clients'] if config['rate'] > 0 else 0.0
+        self.think = config['think']
+        self.limit = config['requests_per_client']
+        self.deadline = config['duration']
+        self.sent = 0
+        self.next_at = self.rng.expovariate(self.rate) if self.rate else 0.0
+
+    def next(self, now: float):
+        """返回(请求类型, 计划发送时间)，结束时返回None"""
+        if (self.limit and self.sent >= self.limit) or (self.deadline and now >= self.deadline):
+            return None
+        self.sent += 1
+        name = self.rng.choices(self.names, self.weights)[0]
+        if self.rate:
+            scheduled = self.next_at
+            self.next_at += self.rng.expovariate(self.rate)
+            return name, scheduled
+        return name, now
+
+    def after_response(self, now: float) -> float:
+        return now + self.think if not self.rate else self.next_at
+
+
+def client_loop(client_id: int, config: dict, setup: dict, start: float) -> List[Sample]:
+    """同步客户端(thread/process模式)，start为各客户端共同的开始时间(time.time())"""
+    client = HttpClient(config['url'], config['timeout'])
+    schedule = _Schedule(config, client_id)
+    samples = []
+    while True:
+        item = schedule.next(time.time() - start)
+        if item is None:
+            return samples
+        name, scheduled = item
+        wait = scheduled - (time.time() - start)
+        if wait > 0:
+            time.sleep(wait)
+        method, path, body, content_type = REQUEST_BUILDERS[name](setup, config, schedule.rng)
+        try:
+            status = client.request(method, path, body, content_type)[0]
+        except Exception:
+            status = 0
+        samples.append((name, scheduled, time.time() - start - scheduled, status))
+        if config['think'] and not schedule.rate:
+            time.sleep(config['think'])
+
+
+async def _async_request(host: str, port: int, method: str, path: str, body, content_type, timeout: float) -> int:
+    """最简单的HTTP/1.1客户端(Connection: close)，只取状态码，不依赖aiohttp"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        body = body or b''
+        head = [f'{method} {path} HTTP/1.1', f'Host: {host}:{port}', 'Connection: close',
+                f'Content-Length: {len(body)}']
+        if content_type:
+            head.append(f'Content-Type: {content_type}')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        # 读完响应，延迟包含传输时间
+        while await asyncio.wait_for(reader.read(1 << 16), timeout):
+            pass
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def _async_client(client_id: int, config: dict, setup: dict, start: float) -> List[Sample]:
+    parsed = urllib.parse.urlsplit(config['url'])
+    host, port = parsed.hostname, parsed.port or 80
+    schedule = _Schedule(config, client_id)
+    samples = []
+    while True:
+        item = schedule.next(time.time() - start)
+        if item is None:
+            return samples
+        name, scheduled = item
+        wait = scheduled - (time.time() - start)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        method, path, body, content_type = REQUEST_BUILDERS[name](setup, config, schedule.rng)
+        try:
+            status = await _async_request(host, port, method, path, body, content_type, config['timeout'])
+        except Exception:
+            status = 0
+        samples.append((name, scheduled, time.time() - start - scheduled, status))
+        if config['think'] and not schedule.rate:
+            await asyncio.sleep(config['think'])
+
+
+async def _run_async(config: dict, setup: dict, start: float) -> List[Sample]:
+    results = await asyncio.gather(*[_async_client(i, config, setup, start) for i in range(config['clients'])])
+    return [sample for samples in results for sample in samples]
+
+
+def run_clients(config: dict, setup: dict) -> Tuple[List[Sample], float]:
+    """按config['mode']运行全部客户端，返回(全部样本, 总耗时)"""
+    start = time.time() + 0.2
+    mode = config['mode']
+    if mode == 'asyncio':
+        samples = asyncio.run(_run_async(config, setup, start))
+    elif mode == 'process':
+        with multiprocessing.Pool(config['clients']) as pool:
+            results = pool.starmap(client_loop, [(i, config, setup, start) for i in range(config['clients'])])
+        samples = [sample for items in results for sample in items]
+    else:
+        results = [[] for _ in range(config['clients'])]
+
+        def run(client_id):
+            results[client_id] = client_loop(client_id, config, setup, start)
+
+        threads = [threading.Thread(target=run, args=(i,), daemon=True) for i in range(config['clients'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        samples = [sample for items in results for sample in items]
+    return samples, max(time.time() - start, 1e-9)
+
+
+def summarize_samples(samples: List[Sample], elapsed: float) -> dict:
+    """每种请求和总体(all)的延迟分位数、错误率、吞吐"""
+    groups: Dict[str, list] = {'all': samples}
+    for sample in samples:
+        groups.setdefault(sample[0], []).append(sample)
+    summary = {}
+    for name, items in groups.items():
+        latencies = np.array([item[2] for item in items]) if items else np.zeros(1)
+        errors = sum(1 for item in items if item[3] == 0 or item[3] >= 400)
+        codes: Dict[str, int] = {}
+        for item in items:
+            codes[str(item[3])] = codes.get(str(item[3]), 0) + 1
+        summary[name] = {
+            'count': len(items),
+            'errors': errors,
+            'error_rate': errors / len(items) if items else 0.0,
+            'status_codes': codes,
+            'throughput_rps': len(items) / elapsed,
+            'latency_p50': float(np.percentile(latencies, 50)),
+            'latency_p95': float(np.percentile(latencies, 95)),
+            'latency_p99': float(np.percentile(latencies, 99)),
+            'latency_max': float(latencies.max()),
+        }
+    return summary
+
+
+def start_server(server: str, port: int, threads: int) -> subprocess.Popen:
+    """以run_server.py启动被测服务，等到/healthz可用"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run_server.py')
+    process = subprocess.Popen([sys.executable, script, '--server', server, '--port', str(port),
+                                '--threads', str(threads), '--no-plugin-daemon', '--log-level', 'WARNING'])
+    client = HttpClient(f'http://127.0.0.1:{port}', 1.0)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"run_server.py exited with code {process.returncode}")
+        try:
+            if client.request('GET', '/healthz')[0] == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise TimeoutError('server did not become healthy within 60s')
+
+
+def print_comparison(paths: List[str]):
+    results = []
+    for path in paths:
+        with open(path, 'r') as f:
+            results.append(json.load(f))
+    names = sorted({name for result in results for name in result['summary']}, key=lambda n: (n != 'all', n))
+    header = f"{'label':<20}{'request':<16}{'count':>8}{'err%':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    for name in names:
+        for result in results:
+            item = result['summary'].get(name)
+            if item is None:
+                continue
+            print(f"{result['meta']['label']:<20}{name:<16}{item['count']:>8}{item['error_rate'] * 100:>8.2f}"
+                  f"{item['throughput_rps']:>10.1f}{item['latency_p50'] * 1000:>10.1f}"
+                  f"{item['latency_p95'] * 1000:>10.1f}{item['latency_p99'] * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EDX REST接口并发压测')
+    parser.add_argument('--url', default=None, help='被测服务地址，如 http://localhost:5000')
+    parser.add_argument('--start-server', default=None, choices=['werkzeug', 'waitress'],
+                        help='用run_server.py启动被测服务(使用本进程的EDX_TMP)')
+    parser.add_argument('--port', type=int, default=5055, help='--start-server时的端口，默认5055')
+    parser.add_argument('--server-threads', type=int, default=16, help='--start-server时的服务线程数')
+    parser.add_argument('--fake-cells', type=int, default=0, help='大于0时启动fake_leapr.py模拟Leapr')
+    parser.add_argument('--fake-poll-interval', type=float, default=0.1, help='模拟Leapr的轮询间隔，默认0.1')
+    parser.add_argument('--mode', default='thread', choices=['thread', 'process', 'asyncio'], help='客户端模式')
+    parser.add_argument('--clients', type=int, default=50, help='客户端数量，默认50')
+    parser.add_argument('--duration', type=float, default=30.0, help='压测时长(秒)，默认30；0表示只按--requests')
+    parser.add_argument('--requests', type=int, default=0, help='每个客户端最多发送的请求数，默认不限')
+    parser.add_argument('--rate', type=float, default=0.0, help='开环到达率(全部客户端合计，请求/秒)，0为闭环')
+    parser.add_argument('--think', type=float, default=0.0, help='闭环模式下两次请求之间的间隔(秒)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'请求比例，默认 {DEFAULT_MIX}，'
+                                                         f'可选 {",".join(REQUEST_BUILDERS)}')
+    parser.add_argument('--tcl-lines', type=int, default=10, help='每个execute_tcl请求的命令行数，默认10')
+    parser.add_argument('--place-cells', type=int, default=100, help='每个place_cells请求的cell数，默认100')
+    parser.add_argument('--topn', type=int, default=10, help='get_timing的topn，默认10')
+    parser.add_argument('--timeout', type=float, default=300.0, help='单个请求的超时(秒)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--label', default=None, help='结果标签，如服务模式，默认为mode/clients')
+    parser.add_argument('--output', default=None, help='结果JSON文件，默认输出到标准输出')
+    parser.add_argument('--compare', nargs='+', default=None, help='对比多个结果JSON后退出')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+
+    if args.compare:
+        print_comparison(args.compare)
+        return
+    if not args.url and not args.start_server:
+        parser.error('--url or --start-server is required')
+    if args.duration <= 0 and args.requests <= 0:
+        parser.error('--duration or --requests must be positive')
+
+    edx_tmp = DEFAULT_CONFIG.get('edx_tmp')
+    fake = server = None
+    try:
+        if args.fake_cells > 0:
+            fake = start_listener_process(edx_tmp, 'fake_leapr.py', ['--cells', str(args.fake_cells), '--seed',
+                                                                     str(args.seed), '--poll-interval',
+                                                                     str(args.fake_poll_interval)])
+        if args.start_server:
+            server = start_server(args.start_server, args.port, args.server_threads)
+            args.url = f'http://127.0.0.1:{args.port}'
+        config = {
+            'url': args.url, 'mode': args.mode, 'clients': args.clients, 'duration': args.duration,
+            'requests_per_client': args.requests, 'rate': args.rate, 'think': args.think,
+            'mix': parse_mix(args.mix), 'tcl_lines': args.tcl_lines, 'place_cells': args.place_cells,
+            'topn': args.topn, 'timeout': args.timeout, 'seed': args.seed,
+        }
+        setup = prepare(args.url, args.timeout)
+        logger.info(f"load test: {args.clients} {args.mode} clients, mix {config['mix']}, "
+                    f"{'rate ' + str(args.rate) + '/s' if args.rate else 'closed loop'}")
+        samples, elapsed = run_clients(config, setup)
+    finally:
+        if fake is not None:
+            stop_listener_process(fake, edx_tmp)
+        if server is not None:
+            server.terminate()
+            server.wait(10)
+
+    result = {
+        'meta': dict({key: value for key, value in config.items()},
+                     label=args.label or f'{args.mode}/{args.clients}', server=args.start_server,
+                     elapsed=elapsed, time=time.strftime('%Y-%m-%dT%H:%M:%S')),
+        'summary': summarize_samples(samples, elapsed),
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    overall = result['summary']['all']
+    logger.info(f"{overall['count']} requests in {elapsed:.1f}s, {overall['throughput_rps']:.1f} req/s, "
+                f"p50 {overall['latency_p50'] * 1000:.1f}ms p99 {overall['latency_p99'] * 1000:.1f}ms, "
+                f"error rate {overall['error_rate'] * 100:.2f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+'''
+日志配置
+1. 异步输出: 根logger只挂一个QueueHandler，写文件/控制台在QueueListener线程中完成，请求线程不等待磁盘和终端IO；
+   队列满时丢弃并计数，不阻塞请求
+2. 按子系统设置级别: 环境变量 EDX_LOG_LEVELS="tcl_sender=DEBUG,plugin_daemon=WARNING" 或 run_server.py --log-levels
+3. summarize() 把大列表/长字符串缩成摘要，LogSampler 限制高频日志的输出频率
+'''
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s [%(filename)s:%(lineno)d] %(message)s'
+# 队列中最多缓存的日志条数
+QUEUE_SIZE = 10000
+
+_listener: Optional[QueueListener] = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """队列满时丢弃日志而不是阻塞或报错"""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_levels(text: str) -> Dict[str, int]:
+    """"tcl_sender=DEBUG,plugin_daemon=WARNING" -> {logger名: 级别}"""
+    levels = {}
+    for item in (text or '').split(','):
+        name, _, level = item.partition('=')
+        name, level = name.strip(), level.strip().upper()
+        if name and level:
+            value = logging.getLevelName(level)
+            if not isinstance(value, int):
+                raise ValueError(f"unknown log level '{level}' for {name}")
+            levels[name] = value
+    return levels
+
+
+def apply_levels(levels: Dict[str, int]):
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+
+def setup_logging(log_file: Optional[str] = None, level=logging.INFO, levels: Optional[Dict[str, int]] = None,
+                  stream=None) -> bool:
+    """
+    配置根logger，进程内只生效一次(与logging.basicConfig一致)，之后的调用只更新各子系统级别
+    :param log_file: 日志文件路径，None时只输出到控制台
+    :param levels: 各子系统(logger名)的级别，覆盖EDX_LOG_LEVELS中的同名设置
+    :return: 本次是否完成了配置
+    """
+    global _listener, _queue_handler
+    levels = {**parse_levels(os.environ.get('EDX_LOG_LEVELS', '')), **(levels or {})}
+    with _setup_lock:
+        if _listener is not None:
+            apply_levels(levels)
+            return False
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers = []
+        if log_file:
+            os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+            handlers.append(logging.FileHandler(log_file))
+        handlers.append(logging.StreamHandler(stream or sys.stderr))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        log_queue = queue.Queue(QUEUE_SIZE)
+        _queue_handler = DroppingQueueHandler(log_queue)
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        root = logging.getLogger()
+        root.addHandler(_queue_handler)
+        root.setLevel(level)
+        apply_levels(levels)
+        atexit.register(shutdown_logging)
+        return True
+
+
+def shutdown_logging():
+    """输出队列中剩余的日志并停止后台线程"""
+    global _listener
+    with _setup_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+        if _queue_handler.dropped:
+            sys.stderr.write(f"{_queue_handler.dropped} log records dropped because the log queue was full\n")
+
+
+def dropped_records() -> int:
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def summarize(value, max_items=5, max_chars=300) -> str:
+    """列表只保留前max_items项并注明总数，字符串截断到max_chars，用于可能很大的命令/结果"""
+    if isinstance(value, (list, tuple)):
+        if len(value) > max_items:
+            text = f"{len(value)} items: {list(value[:max_items])!r} ... (+{len(value) - max_items} more)"
+        else:
+            text = repr(list(value))
+    else:
+        text = str(value)
+    if len(text) > max_chars:
+        text = f"{text[:max_chars]}... ({len(text)} chars)"
+    return text
+
+
+class LogSampler:
+    """
+    interval秒内最多放行一次，用于每次往返都会打印的日志:
+        suppressed = sampler.allow()
+        if suppressed is not None:
+            logger.info(f"... (+{suppressed} similar suppressed)")
+    """
+    def __init__(self, interval=1.0):
+        self.interval = float(interval)
+        self._last = 0.0
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> Optional[int]:
+        """放行时返回上次放行后被抑制的次数，否则返回None"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last >= self.interval:
+                suppressed, self._suppressed, self._last = self._suppressed, 0, now
+                return suppressed
+            self._suppressed += 1
+            return None
@@ -1,30 +1,124 @@
 import re
-from flask import Flask, request, jsonify, send_file
+import functools
+import itertools
+import threading
+import time
+from flask import Flask, request, jsonify, send_file, Response
+from flask.json.provider import DefaultJSONProvider
 import os
 import logging
 from plugin_data import *
 from tcl_sender import *
+from timing_stitch import TimingStitcher
+from timing_store import TimingStore
+from design_index import DesignIndex, ORIENTS, PLACE_STATUSES, STATUS_CODES
+from timing_weights import TimingWeights
+from binary_codec import encode_arrays
+from bulk_place import BulkPlacer, PlacementBatch
+from placement_check import PlacementChecker
+from placement_snapshot import PlacementLog, SnapshotStore, placement_diff
+from partitioner import PartitionResult, Partitioner
+from port_planner import PortPlan, plan_ports
+from hierarchy import HierarchyTree, extract_cells, extract_subdesign, write_bundles
+from levelize import LevelizeResult, levelize
+from plugin_daemon import PluginDaemon
+from global_placer import GlobalPlacer, GlobalPlaceResult
+from upload_store import OffsetMismatch, UploadStore, safe_file_name
+from artifact_cache import ArtifactCache, ArtifactEntry
+from single_flight import SingleFlight
+import metrics
+import tcl_recorder
+from log_config import setup_logging, summarize
 import json
+import numpy as np
 
 # 创建tmp目录
 tmp_dir = os.path.join(os.path.dirname(__file__), 'tmp')
 os.makedirs(tmp_dir, exist_ok=True)
 
-# 配置日志
+# 配置日志(异步输出，run_server.py已配置时不重复配置)
 log_file_path = os.path.join(tmp_dir, 'edx_plugin.log')
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(name)s [%(filename)s:%(lineno)d] %(message)s',
-    handlers=[
-        logging.FileHandler(log_file_path),
-        logging.StreamHandler()
-    ]
-)
+setup_logging(log_file_path, logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
 
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify的序列化耗时计入json_encode阶段"""
+    def response(self, *args, **kwargs):
+        with metrics.phase('json_encode'):
+            return super().response(*args, **kwargs)
+
+
+app.json = TimedJSONProvider(app)
+
+
+@app.before_request
+def _metrics_before_request():
+    request.environ['edx.request_start'] = time.perf_counter()
+    endpoint = request.endpoint or 'unknown'
+    metrics.set_endpoint(endpoint)
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    if request.content_length:
+        metrics.REQUEST_BYTES.observe(request.content_length, endpoint)
+
+
+@app.after_request
+def _metrics_after_request(response):
+    endpoint = metrics.current_endpoint()
+    start = request.environ.get('edx.request_start')
+    if start is not None:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, request.method, response.status_code)
+    if response.content_length is not None:
+        metrics.RESPONSE_BYTES.observe(response.content_length, endpoint)
+    eda_seconds = metrics.eda_seconds()
+    if eda_seconds > 0:
+        # 本次请求中EDA执行command.tcl的时间，总耗时减去它即为服务端与传输开销
+        response.headers['X-EDA-Exec-Seconds'] = f'{eda_seconds:.6f}'
+    recorder = tcl_recorder.active_recorder()
+    if recorder is not None and start is not None:
+        _record_request(recorder, response, time.perf_counter() - start, endpoint)
+    return response
+
+
+def _record_request(recorder, response, seconds, endpoint):
+    """录制HTTP请求，供tcl_replay.py回放；流式上传的请求体已被读走，只能记录为不完整"""
+    try:
+        body = b'' if request.mimetype == 'multipart/form-data' else request.get_data(cache=True)
+        recorder.record_http(request.method, request.full_path.rstrip('?'), request.content_type, body,
+                             len(body) == (request.content_length or 0), response.status_code, seconds, endpoint)
+    except Exception as e:
+        logger.warning(f"failed to record request: {e}")
+
+
+@app.teardown_request
+def _metrics_teardown_request(exc):
+    metrics.REQUESTS_IN_FLIGHT.dec()
+    metrics.set_endpoint(None)
+
+
+def single_flight(operation):
+    """
+    访问EDA的方法: 参数和design版本都相同的并发调用合并为一次EDA执行，所有调用者得到同一个结果
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            key = (operation, args, tuple(sorted(kwargs.items())), self.design_version)
+            result, shared = self._flights.do(key, lambda: method(self, *args, **kwargs))
+            if shared:
+                metrics.SINGLE_FLIGHT_SHARED.inc(1, operation)
+                logger.info(f"[{self.tool_name}] {operation}{args} 与正在执行的相同请求合并")
+            return result
+        return wrapper
+    return decorator
+
+
+# get_timing_info的报告文件编号
+_report_ids = itertools.count(1)
+
+
 # 定义EDA工具抽象基类
 class BaseEDA_Tool:
     def __init__(self, tool_name):
@@ -33,9 +127,307 @@ class BaseEDA_Tool:
         self.current_design = None
         self.timing_data = {}
         self.cell_placement = {}
+        self.current_sta = None
+        self._timing_store = None
+        self._design_index = None
+        self._timing_weights = None
+        # DesignIndex中的摆放是否与EDA一致，执行任意TCL后无法确认，place_cells不再做差分
+        self._placement_synced = False
         self.config = DEFAULT_CONFIG.get(tool_name, {})
+        self._snapshots = SnapshotStore(self.config.get('max_snapshots', 8))
+        # 缓存摆放的变化记录，/design按ETag增量同步
+        self._placement_log = PlacementLog(self.config.get('placement_log_entries', 256))
+        self.current_partition = None
+        self._hierarchy = None
+        self._levels = None
+        self._upload_store = None
+        self._artifact_cache = None
+        # EDA中design可能发生变化(重新读取网表、摆放、执行任意TCL)时加1，作为生成文件缓存key的一部分
+        self.design_version = 0
+        # 正在执行的EDA请求，相同请求合并执行，见single_flight
+        self._flights = SingleFlight()
+        # warm_up预先取好的结果，对应接口第一次请求直接返回缓存: 'netlist'、('timing', topn)
+        self._warm = set()
+        # 保护缓存的Design及由它派生的索引/时序存储等，避免并发请求构建出与当前Design不一致的缓存
+        self._cache_lock = threading.RLock()
         logger.info(f"[{self.tool_name}] 初始化工具实例")
 
+    def _set_design(self, design: Design):
+        """更新缓存的Design，依赖Design的索引、时序存储和权重一并失效"""
+        with self._cache_lock:
+            self.current_design = design
+            self.design_loaded = True
+            self._design_index = None
+            self._timing_store = None
+            self._timing_weights = None
+            self._placement_synced = True
+            self._snapshots.clear()
+            self._placement_log.reset()
+            self.current_partition = None
+            self._hierarchy = None
+            self._levels = None
+            self._warm.clear()
+            self.design_version += 1
+
+    def mark_placement_dirty(self):
+        """EDA中的摆放可能被place_cells以外的方式修改，重新load_netlist之前不做差分"""
+        with self._cache_lock:
+            self._warm.clear()
+            self.design_version += 1
+            if self._placement_synced:
+                logger.info(f"[{self.tool_name}] 缓存的摆放可能已过期，place_cells差分暂停直到重新load_netlist")
+            self._placement_synced = False
+
+    @property
+    def placement_synced(self) -> bool:
+        """缓存的摆放是否与EDA一致"""
+        return self._placement_synced
+
+    def _set_timing(self, sta: STA):
+        """更新缓存的时序结果，已启用的net权重随之增量更新"""
+        with self._cache_lock:
+            self.current_sta = sta
+            self._timing_store = None
+            self._warm = {key for key in self._warm if not isinstance(key, tuple)}
+            if self._timing_weights is not None:
+                self._timing_weights.update(self.get_timing_store())
+
+    def warm_up(self, topn=10):
+        """
+        服务启动后在后台预先读取网表和时序，构建索引和时序存储，
+        之后第一次load_netlist/get_timing(相同topn)直接返回这里的结果，不再等EDA
+        """
+        start = time.time()
+        design = self.load_netlist()
+        self.get_design_index()
+        sta = self.get_timing_info(topn)
+        self.get_timing_store()
+        with self._cache_lock:
+            # 期间有其他请求更新了缓存时不标记，以免返回过期结果
+            if self.current_design is design and self.current_sta is sta:
+                self._warm = {'netlist', ('timing', topn)}
+        logger.info(f"[{self.tool_name}] warm-up done in {time.time() - start:.2f}s: "
+                    f"{len(design.cells)} cells, {len(sta.timing_paths)} timing paths")
+
+    def consume_warm(self, key) -> bool:
+        """key对应的预热结果可用时返回True并标记为已使用，只能使用一次，之后的请求照常访问EDA"""
+        with self._cache_lock:
+            if key in self._warm:
+                self._warm.discard(key)
+                return True
+            return False
+
+    def get_upload_store(self) -> UploadStore:
+        """EDX_TMP/uploads下的内容寻址上传存储，首次使用时创建"""
+        with self._cache_lock:
+            if self._upload_store is None:
+                self._upload_store = UploadStore(os.path.join(DEFAULT_CONFIG.get("edx_tmp"), "uploads"),
+                                                 self.config.get('upload_chunk_size', 64 << 20))
+            return self._upload_store
+
+    def get_artifact_cache(self) -> ArtifactCache:
+        """EDX_TMP/artifact_cache下的生成文件缓存，首次使用时创建"""
+        with self._cache_lock:
+            if self._artifact_cache is None:
+                self._artifact_cache = ArtifactCache(os.path.join(DEFAULT_CONFIG.get("edx_tmp"), "artifact_cache"),
+                                                     self.config.get('artifact_cache_bytes', 2 << 30),
+                                                     self.config.get('artifact_cache_entries', 64))
+            return self._artifact_cache
+
+    def cached_artifact(self, script_path: str, name: str, produce, refresh=False):
+        """
+        script_path生成的文件name: 脚本内容和design版本都未变化时直接返回缓存，否则调用produce()在EDA中重新生成
+        :param produce: 无参数函数，返回生成的文件路径，失败时返回空字符串
+        :return: (ArtifactEntry或None, 是否命中缓存)
+        """
+        cache = self.get_artifact_cache()
+        version = self.design_version
+        key = cache.make_key(script_path, name, version)
+        if not refresh:
+            entry = cache.get(key)
+            if entry is not None:
+                metrics.ARTIFACT_CACHE.inc(1, 'hit')
+                return entry, True
+        metrics.ARTIFACT_CACHE.inc(1, 'miss')
+
+        def generate():
+            output_path = produce()
+            if not output_path or not os.path.exists(output_path):
+                return None
+            # 生成期间design被修改时，结果对应哪个版本无法确定，不缓存
+            if self.design_version != version:
+                return ArtifactEntry(key, output_path, name, os.path.getsize(output_path), version)
+            return cache.put(key, output_path, name, version)
+
+        # 同时到达的相同下载请求只生成一次
+        entry, shared = self._flights.do(('artifact', key, refresh), generate)
+        if shared:
+            metrics.SINGLE_FLIGHT_SHARED.inc(1, 'artifact')
+        return entry, False
+
+    def get_design_index(self) -> DesignIndex:
+        """缓存Design的列式视图，Design更新前只构建一次"""
+        with self._cache_lock:
+            if self.current_design is None:
+                return None
+            if self._design_index is None:
+                self._design_index = DesignIndex(self.current_design)
+            return self._design_index
+
+    def get_timing_weights(self) -> TimingWeights:
+        """首次调用时创建net权重服务，之后每次get_timing_info都会增量更新"""
+        with self._cache_lock:
+            if self._timing_weights is None:
+                design_index = self.get_design_index()
+                if design_index is None:
+                    return None
+                self._timing_weights = TimingWeights(design_index,
+                                                     alpha=self.config.get('net_weight_alpha', 4.0),
+                                                     exponent=self.config.get('net_weight_exponent', 2.0),
+                                                     smoothing=self.config.get('net_weight_smoothing', 0.5))
+                if self.current_sta is not None:
+                    self._timing_weights.update(self.get_timing_store())
+            return self._timing_weights
+
+    def get_timing_store(self) -> TimingStore:
+        """由最近一次get_timing_info的结果构建列式时序存储，时序结果更新前只构建一次"""
+        with self._cache_lock:
+            if self.current_sta is None:
+                return None
+            if self._timing_store is None:
+                design = self.current_design
+                self._timing_store = TimingStore(self.current_sta,
+                                                 design.pin_to_cell if design is not None else None,
+                                                 design.cells if design is not None else None)
+            return self._timing_store
+
+    def get_placement_checker(self, site_width=None) -> PlacementChecker:
+        """基于缓存Design的摆放预检查器，row高度/site宽度可在工具配置中指定(row_height/site_width)"""
+        design_index = self.get_design_index()
+        if design_index is None:
+            return None
+        return PlacementChecker(design_index,
+                                row_height=self.config.get('row_height'),
+                                site_width=site_width or self.config.get('site_width'))
+
+    def partition(self, num_parts: int, imbalance=0.1, max_net_degree=1000, max_aspect=2.0,
+                  timing_driven=False) -> PartitionResult:
+        """
+        按缓存的摆放把Design切成num_parts个SubAPR区域，结果保存在current_partition供端口规划使用
+        :param timing_driven: 使用时序net权重，关键net尽量不被切断
+        """
+        design_index = self.get_design_index()
+        if design_index is None:
+            raise RuntimeError("Netlist not loaded, call load_netlist first")
+        net_weight = None
+        if timing_driven:
+            net_weight = self.get_timing_weights().net_weight
+        partitioner = Partitioner(design_index, imbalance=imbalance, max_net_degree=max_net_degree,
+                                  max_aspect=max_aspect, net_weight=net_weight,
+                                  row_height=self.config.get('row_height'),
+                                  site_width=self.config.get('site_width'))
+        self.current_partition = partitioner.partition(num_parts)
+        return self.current_partition
+
+    def plan_ports(self, pitch=None) -> PortPlan:
+        """为最近一次partition的所有cut net规划SubAPR边界端口"""
+        if self.current_partition is None:
+            raise RuntimeError("No partition, call partition first")
+        return plan_ports(self.get_design_index(), self.current_partition,
+                          pitch=pitch or self.config.get('port_pitch', 0.1))
+
+    def get_hierarchy(self) -> HierarchyTree:
+        """由cell名构建的层次树，Design更新前只构建一次"""
+        with self._cache_lock:
+            design_index = self.get_design_index()
+            if design_index is None:
+                return None
+            if self._hierarchy is None:
+                self._hierarchy = HierarchyTree(design_index.cell_names)
+            return self._hierarchy
+
+    def split_modules(self, bundles: dict, compress=True, workers=None) -> list:
+        """
+        按module切分网表，每个bundle写成edx_tmp/module_bundles下的一个子设计目录
+        :param bundles: {bundle名: [module路径, ...]}
+        """
+        tree = self.get_hierarchy()
+        if tree is None:
+            raise RuntimeError("Netlist not loaded, call load_netlist first")
+        unknown = [module for modules in bundles.values() for module in modules if module not in tree]
+        if unknown:
+            raise KeyError(f"unknown modules: {unknown[:10]}")
+        design_index = self.get_design_index()
+        sub_designs = [extract_subdesign(design_index, tree, modules, name) for name, modules in bundles.items()]
+        output_dir = os.path.join(DEFAULT_CONFIG.get("edx_tmp"), "module_bundles")
+        return write_bundles(sub_designs, output_dir, compress=compress,
+                             workers=workers or self.config.get('split_workers'))
+
+    def levelize(self, clock_pins=None) -> LevelizeResult:
+        """
+        按寄存器级划分流水级，时钟pin名可在工具配置中指定(clock_pins)
+        默认时钟pin名的结果在Design更新前只计算一次
+        """
+        design_index = self.get_design_index()
+        if design_index is None:
+            raise RuntimeError("Netlist not loaded, call load_netlist first")
+        if clock_pins:
+            return levelize(design_index, clock_pins)
+        with self._cache_lock:
+            if self._levels is None or self._levels.index is not design_index:
+                self._levels = levelize(design_index, self.config.get('clock_pins'))
+            return self._levels
+
+    def split_stages(self, levels: LevelizeResult, stages_per_bundle=1, compress=True, workers=None) -> list:
+        """相邻stages_per_bundle个流水级组成一个子设计，写到edx_tmp/stage_bundles下"""
+        design_index = self.get_design_index()
+        sub_designs = [extract_cells(design_index, levels.stage_cells(stages), f'stage_{stages[0]}_{stages[-1]}')
+                       for stages in levels.group_stages(stages_per_bundle)]
+        output_dir = os.path.join(DEFAULT_CONFIG.get("edx_tmp"), "stage_bundles")
+        return write_bundles(sub_designs, output_dir, compress=compress,
+                             workers=workers or self.config.get('split_workers'))
+
+    def global_place(self, incremental=False, fraction=1.0, prefixes=None, target_density=None,
+                     max_iterations=30, target_overflow=None, send=True):
+        """
+        解析式全局布局，结果经place_batch批量摆放
+        :param incremental: True时只摆放unplaced的cell，其余cell作为固定pin；False时摆放所有非fixed/cover的cell
+        :param fraction: 全局模式下摆放的cell比例，pin数最少的其余cell不参与，留给之后的增量摆放
+        :param prefixes: 只摆放名字以这些module路径开头的cell
+        :param max_iterations / target_overflow: 扩散轮数上限和停止的溢出率，大设计上每轮扩散是主要耗时
+        :return: (GlobalPlaceResult, place_batch的结果，send为False时为None)
+        """
+        design_index = self.get_design_index()
+        if design_index is None:
+            raise RuntimeError("Netlist not loaded, call load_netlist first")
+        status = design_index.status
+        if incremental:
+            candidates = status == STATUS_CODES['unplaced']
+        else:
+            candidates = (status != STATUS_CODES['fixed']) & (status != STATUS_CODES['cover'])
+        if prefixes:
+            prefixes = tuple(prefixes)
+            candidates &= np.fromiter((name.startswith(prefixes) for name in design_index.cell_names), dtype=bool,
+                                      count=design_index.num_cells)
+        # 增量模式下未选中的unplaced cell位置无意义，不参与线长模型
+        ignore = (status == STATUS_CODES['unplaced']) & ~candidates
+        if not incremental and fraction < 1.0:
+            ids = np.flatnonzero(candidates)
+            pin_ptr, _ = design_index.cell_pin_csr()
+            pins = (pin_ptr[ids + 1] - pin_ptr[ids])
+            deferred = ids[np.argsort(-pins, kind='stable')[int(round(len(ids) * max(fraction, 0.0))):]]
+            candidates[deferred] = False
+            ignore[deferred] = True
+        placer = GlobalPlacer(design_index,
+                              target_density=target_density or self.config.get('target_density', 0.9),
+                              max_net_degree=self.config.get('max_net_degree', 1000),
+                              max_iterations=max_iterations,
+                              target_overflow=target_overflow or self.config.get('target_overflow', 0.1),
+                              threads=self.config.get('placer_threads'))
+        result = placer.place(candidates, ignore)
+        placement = self.place_batch(result.to_batch()) if send and len(result) else None
+        return result, placement
+
     def load_netlist(self) -> Design:
         raise NotImplementedError("Subclasses must implement this method")
 
@@ -51,13 +443,158 @@ class BaseEDA_Tool:
     def place_cells(self, cells: list[Cell]) -> list[str]:
         raise NotImplementedError("Subclasses must implement this method")
 
+    def place_batch(self, batch: PlacementBatch, diff=True) -> dict:
+        """
+        摆放一批cell
+        缓存的Design与EDA同步时，先与缓存比较，只把位置/方向/状态有变化的cell交给_send_placement，
+        成功摆放的cell写回缓存
+        :param diff: False时不做差分，全部发送
+        :return: {"placed": 成功数量, "failed": 失败的cell名列表(含未知cell), "skipped": 未变化而跳过的数量,
+                  "unknown": 不在Design中、没有发送的cell数量}
+        """
+        design_index = self.get_design_index()
+        skipped = 0
+        unknown_names = []
+        with self._cache_lock:
+            self._warm.clear()
+        if design_index is not None:
+            ids = batch.resolve_ids(design_index)
+            if (ids < 0).any():
+                # 不在缓存Design中的cell不发送给EDA，缓存的摆放、变化记录和差分只涉及已知cell
+                unknown_names = [batch.cell_names[i] for i in np.flatnonzero(ids < 0)]
+                logger.warning(f"[{self.tool_name}] {len(unknown_names)} unknown cells not sent, "
+                               f"e.g. {unknown_names[:5]}")
+                batch = batch.subset(ids >= 0)
+                ids = batch.cell_ids
+            if diff and self._placement_synced and len(batch) > 0:
+                changed = design_index.placement_changes(ids, batch.x, batch.y, batch.orient, batch.status,
+                                                         self.config.get('place_diff_tolerance', 1e-4))
+                skipped = len(batch) - int(np.count_nonzero(changed))
+                if skipped:
+                    batch = batch.subset(changed)
+        if len(batch) == 0:
+            result = {'placed': 0, 'failed': []}
+        else:
+            send_start = time.perf_counter()
+            with self._cache_lock:
+                self.design_version += 1
+            result = self._send_placement(batch)
+            metrics.CELLS_PLACED.inc(result['placed'], self.tool_name)
+            metrics.PLACE_CELLS_PER_SECOND.set(
+                round(result['placed'] / max(time.perf_counter() - send_start, 1e-9)), self.tool_name)
+        if design_index is not None and len(batch) > 0:
+            done = batch.cell_ids >= 0
+            if result['failed']:
+                failed = set(result['failed'])
+                done &= np.fromiter((name not in failed for name in batch.cell_names), dtype=bool, count=len(batch))
+            with self._cache_lock:
+                design_index.apply_placement(batch.cell_ids[done], batch.x[done], batch.y[done],
+                                             batch.orient[done], batch.status[done])
+                if design_index is self._design_index:
+                    self._placement_log.record(batch.cell_ids[done])
+        if unknown_names:
+            result['failed'] = unknown_names + list(result['failed'])
+        result['unknown'] = len(unknown_names)
+        result['skipped'] = skipped
+        if skipped:
+            logger.info(f"[{self.tool_name}] place_cells差分: {skipped} cells unchanged, {len(batch)} sent")
+        return result
+
+    def _send_placement(self, batch: PlacementBatch) -> dict:
+        raise NotImplementedError("Subclasses must implement this method")
+
+    def snapshot(self, name=None) -> dict:
+        """保存当前缓存摆放的快照"""
+        design_index = self.get_design_index()
+        if design_index is None:
+            raise RuntimeError("Netlist not loaded, call load_netlist first")
+        if not self._placement_synced:
+            logger.warning(f"[{self.tool_name}] 缓存的摆放可能与EDA不一致，快照基于缓存创建")
+        snapshot = self._snapshots.create(design_index, name)
+        logger.info(f"[{self.tool_name}] 创建摆放快照 {snapshot.name}")
+        return snapshot.info()
+
+    def list_snapshots(self) -> list:
+        return self._snapshots.list()
+
+    def rollback(self, name=None) -> dict:
+        """
+        回滚到快照: 只发送与快照不同的cell(逆向差分)，一次批量摆放完成
+        缓存与EDA不同步时无法判断哪些cell变了，发送快照中的全部cell
+        """
+        design_index = self.get_design_index()
+        if design_index is None:
+            raise RuntimeError("Netlist not loaded, call load_netlist first")
+        snapshot = self._snapshots.get(name, design_index)
+        if self._placement_synced:
+            cell_ids = snapshot.changed_cells(design_index.x, design_index.y, design_index.orient,
+                                              design_index.status, self.config.get('place_diff_tolerance', 1e-4))
+        else:
+            cell_ids = np.arange(design_index.num_cells)
+        logger.info(f"[{self.tool_name}] 回滚到快照 {snapshot.name}: {len(cell_ids)} cells")
+        result = self.place_batch(snapshot.to_batch(cell_ids), diff=False)
+        if not result['failed']:
+            self._placement_synced = True
+        result['snapshot'] = snapshot.name
+        return result
+
+    def design_arrays(self, since=None):
+        """
+        缓存Design的列式数组，供/design返回
+        :param since: 客户端缓存的ETag，仍可增量同步且变化的cell不超过一半时只返回这些cell的摆放
+        :return: (ETag, 数组字典, 是否为增量)，网表未加载时返回(None, None, False)
+        """
+        design_index = self.get_design_index()
+        if design_index is None:
+            return None, None, False
+        with self._cache_lock:
+            if design_index is not self._design_index:
+                # 期间重新读取了网表
+                return self.design_arrays(since)
+            etag = self._placement_log.etag
+            changed = self._placement_log.changes_since(since) if since else None
+            if changed is not None and len(changed) <= design_index.num_cells // 2:
+                return etag, {'cell_id': changed, 'x': design_index.x[changed], 'y': design_index.y[changed],
+                              'orient': design_index.orient[changed],
+                              'status': design_index.status[changed]}, True
+            # 摆放数组会被apply_placement原地修改，拷贝后在锁外编码
+            placement = {name: getattr(design_index, name).copy() for name in ('x', 'y', 'orient', 'status')}
+        arrays = {
+            'cell_names': design_index.cell_names, 'width': design_index.width, 'height': design_index.height,
+            'pin_names': design_index.pin_names, 'pin_cell': design_index.pin_cell,
+            'net_names': design_index.net_names, 'net_ptr': design_index.net_ptr, 'net_pins': design_index.net_pins,
+            'net_pin_is_driver': design_index.net_pin_is_driver,
+            'core_width': design_index.core_width, 'core_height': design_index.core_height,
+        }
+        arrays.update(placement)
+        return etag, arrays, False
+
+    def diff_snapshot(self, name=None, to=None, limit=None) -> dict:
+        """快照name与快照to(为空时为当前缓存)之间的差异"""
+        design_index = self.get_design_index()
+        if design_index is None:
+            raise RuntimeError("Netlist not loaded, call load_netlist first")
+        snapshot = self._snapshots.get(name, design_index)
+        target = self._snapshots.get(to, design_index) if to else design_index
+        after = (target.x, target.y, target.orient, target.status)
+        cell_ids = snapshot.changed_cells(*after, self.config.get('place_diff_tolerance', 1e-4))
+        result = placement_diff(design_index.cell_names, cell_ids,
+                                (snapshot.x, snapshot.y, snapshot.orient, snapshot.status), after, limit)
+        result['from'] = snapshot.name
+        result['to'] = to or 'current'
+        return result
+
 
 # 不同EDA工具的具体实现
 class Leapr_Tool(BaseEDA_Tool):
     def __init__(self):
         super().__init__("leapr")
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        self._bulk_placer = BulkPlacer(DEFAULT_CONFIG.get("edx_tmp"),
+                                       os.path.join(current_dir, "apicommon", "bulk_place.tcl"))
         logger.info("[Leapr] Leapr begin init...")
 
+    @single_flight('load_netlist')
     def load_netlist(self) -> Design:
         """
             Leapr特有的读取网表功能
@@ -68,9 +605,11 @@ class Leapr_Tool(BaseEDA_Tool):
         netlist_file_path = os.path.join(current_dir, "apicommon", "get_netlist.tcl")
         tcl_sender = TCLSender()
         result = tcl_sender.send_tcl_file(netlist_file_path)
+        parse_start = time.perf_counter()
         my_design = Design()
         '''
-            result列表中第2行design的core长宽，格式为：core_size: {78.12 69.192}，之后每4行一组，格式为
+            result列表中第2行design的core长宽和左下角，格式为：core_size: {78.12 69.192} core_origin: {0 0}，
+            core_origin可以没有(按(0, 0))，之后每4行一组，格式为
             u_macc_top/macc[0].u_macc/adder_out_reg[15] --cell name
             4.32 -- cell width
             1.08 --cell height
@@ -81,6 +620,10 @@ class Leapr_Tool(BaseEDA_Tool):
         if match:
             my_design.core_width = float(match.group(1))
             my_design.core_height = float(match.group(2))
+        match = re.search(r'core_origin:\s*\{\s*(-?[\d.]+)\s+(-?[\d.]+)\s*\}', core_line)
+        if match:
+            my_design.core_x = float(match.group(1))
+            my_design.core_y = float(match.group(2))
         row_counter = 3
         for row_index in range(3, len(result), 3):
             row_counter = row_index
@@ -116,7 +659,11 @@ class Leapr_Tool(BaseEDA_Tool):
             driver_pins = split[2].split('|')
             my_design.nets[net_name] = [load_pins, driver_pins]
 
+        parse_seconds = time.perf_counter() - parse_start
+        metrics.observe_phase('parse', parse_seconds)
+        metrics.CELLS_PARSED_PER_SECOND.set(round(len(my_design.cells) / max(parse_seconds, 1e-9)), self.tool_name)
         logger.info(f"[Leapr] begin loading netlist: {netlist_file_path}")
+        self._set_design(my_design)
         return my_design
 
     def download_netlist(self) -> str:
@@ -130,7 +677,7 @@ class Leapr_Tool(BaseEDA_Tool):
         tcl_sender = TCLSender()
         result = tcl_sender.send_tcl_file(netlist_file_path, return_result=False)
         if len(result) != 1:
-            logger.error(f"[Leapr] generate_compressed_netlist error: {result}")
+            logger.error(f"[Leapr] generate_compressed_netlist error: {summarize(result)}")
             return ""
         server_result_txt = result[0]
         # 判断server_result_txt文件是否存在
@@ -139,14 +686,25 @@ class Leapr_Tool(BaseEDA_Tool):
             return ""
         return result[0]
 
+    @single_flight('get_timing_info')
     def get_timing_info(self, topn=10) -> STA:
         """Leapr特有的时序分析功能
         :param topn:
         """
         tcl_sender = TCLSender()
         api_dir = DEFAULT_CONFIG.get("edx_tmp")
-        tcl_sender.send_tcl([f'report_timing -group REG2REG -max_paths {topn} -path_type full > {api_dir}/report'])
-        report_file = os.path.join(api_dir, "report")
+        # 报告在通道锁释放后才解析，每个请求写自己的文件，避免topn不同的并发请求互相覆盖
+        report_file = os.path.join(api_dir, f"report_{os.getpid()}_{next(_report_ids)}")
+        tcl_sender.send_tcl([f'report_timing -group REG2REG -max_paths {topn} -path_type full > {report_file}'])
+        try:
+            return self.read_timing_report(report_file)
+        finally:
+            if os.path.exists(report_file):
+                os.remove(report_file)
+
+    def read_timing_report(self, report_file) -> STA:
+        """解析report_timing输出的报告文件，结果作为当前时序缓存"""
+        parse_start = time.perf_counter()
         sta = STA()
         with open(report_file, 'r', encoding='utf-8') as f:
             # 文本格式是注释的样子，文件有很多这种路径，读取文件，解析成STA对象
@@ -188,7 +746,6 @@ class Leapr_Tool(BaseEDA_Tool):
                     # 将line按空白字符分割，空白字符包括空格、制表符、换行符等
                     point_incr_path = line.split()
                     pin_name = point_incr_path[0]
-                    logger.debug(f'line is {line}')
                     if '(' in point_incr_path[1]:
                         incr = point_incr_path[2]
                         path_delay = point_incr_path[3]
@@ -204,31 +761,237 @@ class Leapr_Tool(BaseEDA_Tool):
                     timing_path.data_arrival_time = float(line.split()[3])
                     continue
                 if 'slack (' in line:
-                    logger.info(f'slack: {line}')
                     timing_path.slack = float(line.split()[2])
                     sta.timing_paths.append(timing_path)
-                    logger.info(f'path cell num is {len(timing_path.path)}')
                     timing_path = None  # 重置timing_path为None，准备下一个路径
 
+        parse_seconds = time.perf_counter() - parse_start
+        metrics.observe_phase('parse', parse_seconds)
+        # 每条路径的slack不再逐行打印，只输出摘要
+        slacks = [path.slack for path in sta.timing_paths if path.slack is not None]
+        logger.info(f"[{self.tool_name}] parsed {len(sta.timing_paths)} timing paths "
+                    f"({sum(len(path.path) for path in sta.timing_paths)} points) in {parse_seconds:.3f}s, "
+                    f"worst slack {min(slacks, default=None)}")
+        self._set_timing(sta)
         return sta
 
     def execute_tcl_command(self, tcl_commands) -> list[str]:
         """Leapr特有的TCL命令执行"""
-        logger.info(f"[Leapr] 执行TCL命令: {tcl_commands}")
+        logger.info(f"[Leapr] 执行TCL命令: {summarize(tcl_commands)}")
+        self.mark_placement_dirty()
         return TCLSender().send_tcl(tcl_commands)
 
     def place_cells(self, cells: list[Cell]):
-        tcl_cmds = []
-        for cell in cells:
-            tcl_cmds.append(f'place_cell {cell.get_cell_name()} {cell.get_x():.2f} {cell.get_y():.2f} -placed')
-        tcl_sender = TCLSender()
-        tcl_sender.send_tcl(tcl_cmds)
+        return self.place_batch(PlacementBatch.from_cells(cells))
+
+    def _send_placement(self, batch: PlacementBatch) -> dict:
+        """
+        批量摆放: 写二进制数据文件，由apicommon/bulk_place.tcl中的edx_bulk_place一次性加载执行
+        :return: {"placed": 成功数量, "failed": 失败的cell名列表}
+        """
+        design_index = self.get_design_index()
+        if design_index is not None:
+            self._bulk_placer.use_design(design_index)
+        tcl_cmds = self._bulk_placer.commands(batch)
+        eda_resp = TCLSender().send_tcl(tcl_cmds)
+        if not eda_resp:
+            raise RuntimeError("edx_bulk_place returned no result, check Leapr console for errors")
+        result = self._bulk_placer.parse_result(eda_resp)
+        if result['failed']:
+            logger.warning(f"[Leapr] bulk place failed for {len(result['failed'])} cells, "
+                           f"first: {result['failed'][:5]}")
+        logger.info(f"[Leapr] bulk placed {result['placed']}/{len(batch)} cells")
+        return result
+
+
+# 只读缓存、纯计算的请求可以并发执行(与EDA交互的请求在TCLSender的通道锁上串行)，
+# 同时执行的计算请求数由compute_slots限制，避免多个大计算抢占CPU和内存
+compute_workers = max(os.cpu_count() or 1, 2)
+compute_slots = threading.BoundedSemaphore(compute_workers)
+
+
+def configure_workers(workers=None):
+    """设置计算请求的并发上限(信号量，计算在请求线程中执行)，服务启动前调用"""
+    global compute_workers, compute_slots
+    compute_workers = max(int(workers or os.cpu_count() or 1), 1)
+    compute_slots = threading.BoundedSemaphore(compute_workers)
+    logger.info(f"compute workers: {compute_workers}")
+
+
+def compute_bound(view):
+    """计算类接口: 在compute_slots限制的并发数内执行，不占用EDA通道"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        metrics.COMPUTE_QUEUE_DEPTH.inc()
+        try:
+            with compute_slots:
+                return view(*args, **kwargs)
+        finally:
+            metrics.COMPUTE_QUEUE_DEPTH.dec()
+    return wrapper
+
+
+class ToolRegistry:
+    """
+    EDA工具实例的字典，实例在第一次使用时才创建，
+    导入main时不要求EDX_TMP已设置，也不做任何文件操作，/healthz可以立即响应
+    """
+    def __init__(self, factories: dict):
+        self._factories = dict(factories)
+        self._tools = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, tool_name) -> bool:
+        return tool_name in self._factories
+
+    def __getitem__(self, tool_name) -> BaseEDA_Tool:
+        tool = self._tools.get(tool_name)
+        if tool is None:
+            with self._lock:
+                tool = self._tools.get(tool_name)
+                if tool is None:
+                    tool = self._tools[tool_name] = self._factories[tool_name]()
+        return tool
+
+    def keys(self):
+        return self._factories.keys()
+
+    def values(self):
+        return [self[tool_name] for tool_name in self._factories]
+
+    def created(self) -> dict:
+        """已经创建的实例"""
+        return dict(self._tools)
 
 
 # 创建EDA工具实例的字典
-eda_tools = {
-    "leapr": Leapr_Tool(),
-}
+eda_tools = ToolRegistry({
+    "leapr": Leapr_Tool,
+})
+
+# 录制的TCL往返中记录各工具当时的design版本
+tcl_recorder.design_version_provider = lambda: {name: tool.design_version
+                                                 for name, tool in eda_tools.created().items()}
+
+plugin_daemon = None
+# 后台预热状态: disabled / waiting(等待监听器心跳) / running / done / failed
+warmup_state = {'state': 'disabled', 'error': None, 'elapsed': None}
+
+
+def create_plugin_daemon(tool: BaseEDA_Tool) -> PluginDaemon:
+    """
+    响应apicommon/pyc_placer.tcl中pyc_*命令的守护线程，处理函数可以继续通过TCLSender回调EDA
+    新的pyc_*命令用 plugin_daemon.register(名字, 处理函数) 注册
+    """
+    daemon = PluginDaemon(DEFAULT_CONFIG.get("edx_tmp"),
+                          workers=tool.config.get('plugin_workers', 2),
+                          rescan_interval=tool.config.get('plugin_rescan_interval', 1.0))
+
+    @daemon.register('pyc_reset')
+    def pyc_reset(args):
+        """从EDA重新读取网表，缓存的Design、索引和快照全部重建"""
+        design = tool.load_netlist()
+        return f"pyc_reset: {len(design.cells)} cells, {len(design.nets)} nets loaded"
+
+    @daemon.register('pyc_refresh_timing')
+    def pyc_refresh_timing(args):
+        """pyc_refresh_timing已经把report_timing写到EDX_TMP/report，这里只需解析"""
+        sta = tool.read_timing_report(os.path.join(DEFAULT_CONFIG.get("edx_tmp"), "report"))
+        worst = min((path.slack for path in sta.timing_paths), default=None)
+        return f"pyc_refresh_timing: {len(sta.timing_paths)} paths, worst slack {worst}"
+
+    @daemon.register('pyc_global_placement')
+    def pyc_global_placement(args):
+        """pyc_global_placement [摆放比例] [-iterations 轮数] [-overflow 溢出率]"""
+        args, options = parse_placer_options(args)
+        fraction = float(args[0]) if args else 1.0
+        result, placement = tool.global_place(fraction=fraction, **options)
+        return f"pyc_global_placement: {format_global_place(result, placement)}"
+
+    @daemon.register('pyc_increment_placement')
+    def pyc_increment_placement(args):
+        """pyc_increment_placement [module路径 ...] [-iterations 轮数] [-overflow 溢出率]，只摆放unplaced的cell"""
+        args, options = parse_placer_options(args)
+        result, placement = tool.global_place(incremental=True, prefixes=args or None, **options)
+        return f"pyc_increment_placement: {format_global_place(result, placement)}"
+
+    @daemon.register('pyc_get_cell')
+    def pyc_get_cell(args):
+        """按缓存的Design输出cell位置: 名字 x y 方向 摆放状态"""
+        design_index = tool.get_design_index()
+        if design_index is None:
+            raise RuntimeError("Netlist not loaded, call pyc_reset or load_netlist first")
+        lines = []
+        for name, cell_id in zip(args, design_index.lookup_cells(args).tolist()):
+            if cell_id < 0:
+                lines.append(f"{name} not found")
+                continue
+            orient, status = int(design_index.orient[cell_id]), int(design_index.status[cell_id])
+            lines.append(f"{name} {design_index.x[cell_id]} {design_index.y[cell_id]} "
+                         f"{ORIENTS[orient] if orient >= 0 else ''} {PLACE_STATUSES[status] if status >= 0 else ''}")
+        return lines
+
+    return daemon
+
+
+def parse_placer_options(args):
+    """pyc_*布局命令参数中的 -iterations n / -overflow v -> (其余参数, global_place的关键字参数)"""
+    names = {'-iterations': ('max_iterations', int), '-overflow': ('target_overflow', float)}
+    rest, options = [], {}
+    i = 0
+    while i < len(args):
+        if args[i] in names:
+            if i + 1 >= len(args):
+                raise ValueError(f"missing value for {args[i]}")
+            key, convert = names[args[i]]
+            options[key] = convert(args[i + 1])
+            i += 2
+        else:
+            rest.append(args[i])
+            i += 1
+    return rest, options
+
+
+def format_global_place(result: GlobalPlaceResult, placement) -> str:
+    text = (f"{len(result)} cells, hpwl {result.hpwl_before:.1f} -> {result.hpwl_after:.1f}, "
+            f"overflow {result.overflow:.3f}, {result.iterations} iterations, {result.elapsed:.2f}s")
+    if placement is not None:
+        text += f", placed {placement['placed']}, failed {len(placement['failed'])}"
+    return text
+
+
+def start_warmup(tool_name="leapr", topn=10, wait_timeout=None, poll_interval=0.5) -> threading.Thread:
+    """
+    后台线程: 等EDA侧监听器心跳出现后执行warm_up，服务启动不被阻塞
+    :param wait_timeout: 等待心跳的最长时间(秒)，None为一直等待
+    """
+    def run():
+        warmup_state.update(state='waiting', error=None, elapsed=None)
+        deadline = None if wait_timeout is None else time.time() + wait_timeout
+        try:
+            while not listener_status()['alive']:
+                if deadline is not None and time.time() > deadline:
+                    raise TimeoutError(f"EDA listener heartbeat not seen within {wait_timeout}s")
+                time.sleep(poll_interval)
+            warmup_state['state'] = 'running'
+            start = time.time()
+            eda_tools[tool_name].warm_up(topn)
+            warmup_state.update(state='done', elapsed=round(time.time() - start, 3))
+        except Exception as e:
+            logger.error(f"[{tool_name}] warm-up failed: {e}")
+            warmup_state.update(state='failed', error=str(e))
+
+    thread = threading.Thread(target=run, name='edx-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def start_plugin_daemon(tool_name="leapr") -> PluginDaemon:
+    global plugin_daemon
+    if plugin_daemon is None:
+        plugin_daemon = create_plugin_daemon(eda_tools[tool_name])
+        plugin_daemon.start()
+    return plugin_daemon
 
 
 @app.route('/')
@@ -241,18 +1004,70 @@ def home():
         "config_info": {tool: {"version": "1.0", "features": list(config.keys()) if isinstance(config, dict) else []}
                         for tool, config in DEFAULT_CONFIG.items()},
         "endpoints": [
+            "/healthz",
+            "/readyz",
+            "/metrics",
             "/<tool_name>/load_netlist",
             "/<tool_name>/download_netlist",
+            "/<tool_name>/design",
             "/<tool_name>/get_timing",
+            "/<tool_name>/stitch_timing",
+            "/<tool_name>/timing_query",
+            "/<tool_name>/timing_weights",
+            "/<tool_name>/partition",
+            "/<tool_name>/plan_ports",
+            "/<tool_name>/hierarchy",
+            "/<tool_name>/split_modules",
+            "/<tool_name>/levelize",
+            "/<tool_name>/global_place",
             "/<tool_name>/execute_tcl",
             "/<tool_name>/place_cells",
-            "/<tool_name>/upload_file"  # 添加上传文件接口
+            "/<tool_name>/validate_placement",
+            "/<tool_name>/snapshot",
+            "/<tool_name>/rollback",
+            "/<tool_name>/diff",
+            "/<tool_name>/upload_file",  # 添加上传文件接口
+            "/<tool_name>/upload_session"
         ]
     }
     logger.info("主页请求处理完成")
     return jsonify(EdxResponse(200, "Home page", response_data).to_dict())
 
 
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """存活探针: 进程能处理请求即返回200，不访问EDA和文件系统"""
+    return jsonify(EdxResponse(200, "alive", {'pid': os.getpid()}).to_dict()), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus文本格式的运行指标，见metrics.py"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    就绪探针: EDX_TMP可用、EDA侧监听器有心跳(或正在执行命令)且后台预热没有在进行时返回200，否则503
+    查询参数:
+    - max_age: 心跳最长间隔(秒)，默认5
+    """
+    max_age = request.args.get('max_age', default=5.0, type=float)
+    data = {'edx_tmp': None, 'listener': None, 'warmup': dict(warmup_state)}
+    try:
+        data['edx_tmp'] = DEFAULT_CONFIG["edx_tmp"]
+        data['listener'] = listener_status(max_age)
+    except Exception as e:
+        data['error'] = str(e)
+    listener = data['listener']
+    ready = (listener is not None and (listener['alive'] or listener['busy'])
+             and warmup_state['state'] not in ('waiting', 'running'))
+    if ready:
+        return jsonify(EdxResponse(200, "ready", data).to_dict()), 200
+    return jsonify(EdxResponse(503, "not ready", data).to_dict()), 503
+
+
 @app.route('/<tool_name>/load_netlist', methods=['POST'])
 def load_netlist(tool_name):
     """
@@ -266,7 +1081,12 @@ def load_netlist(tool_name):
             error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
             logger.error(error_msg)
             return jsonify(EdxResponse(400, error_msg).to_dict()), 400
-        design = eda_tools[tool_name].load_netlist()
+        tool = eda_tools[tool_name]
+        if tool.consume_warm('netlist'):
+            design = tool.current_design
+            logger.info(f"[{tool_name}] 使用预热时读取的网表")
+        else:
+            design = tool.load_netlist()
         logger.info(f"[{tool_name}] 网表加载成功, cell number is {len(design.cells)}")
         return jsonify(EdxResponse(200, 'success', design).to_dict()), 200
     except Exception as e:
@@ -279,6 +1099,8 @@ def load_netlist(tool_name):
 def download_netlist(tool_name):
     """
     下载网表文件 - 返回压缩的网表文件
+    查询参数:
+    - refresh: true时忽略缓存重新从EDA导出
     """
     logger.info(f"接收到[{tool_name}]的下载网表请求")
     try:
@@ -287,16 +1109,19 @@ def download_netlist(tool_name):
             logger.error(error_msg)
             return jsonify(EdxResponse(400, error_msg).to_dict()), 400
 
-        # 生成压缩的网表文件
-        compressed_file_path = eda_tools[tool_name].download_netlist()
-        if len(compressed_file_path) < 1:
+        # 生成压缩的网表文件，design未变化时直接返回缓存
+        tool = eda_tools[tool_name]
+        script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "apicommon", "get_netlist.tcl")
+        refresh = request.args.get('refresh', default='false').lower() in ('1', 'true', 'yes')
+        entry, hit = tool.cached_artifact(script_path, 'netlist.gz', tool.download_netlist, refresh)
+        if entry is None:
             error_msg = f"[{tool_name}] 网表文件生成失败"
             logger.error(error_msg)
             return jsonify(EdxResponse(500, error_msg).to_dict()), 500
 
         # 返回文件供下载
-        logger.info(f"[{tool_name}] 网表文件生成成功，准备返回下载: {compressed_file_path}")
-        return send_file(compressed_file_path, as_attachment=True, download_name=os.path.basename(compressed_file_path))
+        logger.info(f"[{tool_name}] 网表文件{'命中缓存' if hit else '生成成功'}，准备返回下载: {entry.path}")
+        return send_artifact(entry, hit, tool)
 
     except Exception as e:
         error_msg = str(e)
@@ -304,6 +1129,48 @@ def download_netlist(tool_name):
         return jsonify(EdxResponse(500, "Internal server error").to_dict()), 500
 
 
+@app.route('/<tool_name>/design', methods=['GET'])
+def get_design(tool_name):
+    """
+    获取缓存Design的npz列式数组(cell/pin/net及摆放，顺序与load_netlist一致，见DesignIndex)，网表未加载时先读取
+    响应头ETag标识缓存摆放的版本，客户端据此增量同步:
+    - If-None-Match与当前ETag相同时返回304
+    - 查询参数since为客户端缓存的ETag，仍可增量时只返回变化cell的cell_id/x/y/orient/status，
+      响应头X-Design-Delta为1
+    其他查询参数:
+    - refresh: 1表示先从EDA重新读取网表(ETag随之改变，返回全量)
+    """
+    logger.info(f"接收到[{tool_name}]的获取Design请求")
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, "Unsupported EDA tool", None).to_dict()), 400
+
+        tool = eda_tools[tool_name]
+        if tool.current_design is None or request.args.get('refresh', default=0, type=int) == 1:
+            tool.load_netlist()
+        since = request.args.get('since', default='', type=str)
+        etag, arrays, delta = tool.design_arrays(since)
+        if arrays is None:
+            return jsonify(EdxResponse(400, "Netlist not loaded, call load_netlist first", None).to_dict()), 400
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = binary_response(arrays, f"{tool_name}_design{'_delta' if delta else ''}.npz")
+            logger.info(f"[{tool_name}] 返回Design{'增量: ' + str(len(arrays['cell_id'])) + ' cells' if delta else ''}")
+        response.set_etag(etag)
+        response.headers['X-Design-Delta'] = '1' if delta else '0'
+        response.headers['X-Design-Version'] = str(tool.design_version)
+        # 执行任意TCL后缓存的摆放可能与EDA不一致，需要refresh
+        response.headers['X-Placement-Synced'] = '1' if tool.placement_synced else '0'
+        return response
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"[{tool_name}] 获取Design时发生未预期异常: {error_msg}")
+        return jsonify(EdxResponse(500, "Internal server error", None).to_dict()), 500
+
+
 @app.route('/<tool_name>/get_timing', methods=['GET'])
 def get_timing(tool_name):
     """
@@ -320,7 +1187,12 @@ def get_timing(tool_name):
 
         # 获取查询参数topn，默认值为10
         topn = request.args.get('topn', default=10, type=int)
-        sta = eda_tools[tool_name].get_timing_info(topn)
+        tool = eda_tools[tool_name]
+        if tool.consume_warm(('timing', topn)):
+            sta = tool.current_sta
+            logger.info(f"[{tool_name}] 使用预热时读取的时序信息")
+        else:
+            sta = tool.get_timing_info(topn)
 
         response_data = EdxResponse(200, "success", sta)
         return jsonify(response_data.to_dict()), 200
@@ -330,6 +1202,391 @@ def get_timing(tool_name):
         return jsonify(EdxResponse(500, "Internal server error").to_dict()), 500
 
 
+@app.route('/<tool_name>/stitch_timing', methods=['POST'])
+@compute_bound
+def stitch_timing(tool_name):
+    """
+    跨SubAPR时序拼接
+    请求体参数:
+    {
+        "partitions": {"sub1": {"timing_paths": [...]}, "sub2": {...}},  -- 各SubAPR get_timing返回的data
+        "topn": 100,            -- 返回全局最差的N条拼接路径，默认100
+        "max_hops": 4,          -- 最多穿过的中间SubAPR数量，默认4
+        "port_map": {"sub1": {"local_port": "global_port"}}  -- 可选，端口名映射
+    }
+    """
+    logger.info(f"接收到[{tool_name}]的跨SubAPR时序拼接请求")
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, "Unsupported EDA tool", None).to_dict()), 400
+
+        data = request.get_json()
+        partitions = data.get('partitions') if isinstance(data, dict) else None
+        if not partitions:
+            logger.error(f"[{tool_name}] 时序拼接请求中未包含partitions")
+            return jsonify(EdxResponse(400, "Missing partitions", None).to_dict()), 400
+
+        sta_map = {name: STA.from_dict(sta_data) for name, sta_data in partitions.items()}
+        stitcher = TimingStitcher(data.get('topn', 100), data.get('max_hops', 4), data.get('port_map'))
+        sta = stitcher.stitch(sta_map)
+        logger.info(f"[{tool_name}] 时序拼接完成, stitched path number is {len(sta.timing_paths)}")
+        return jsonify(EdxResponse(200, "success", sta).to_dict()), 200
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"[{tool_name}] 时序拼接时发生未预期异常: {error_msg}")
+        return jsonify(EdxResponse(500, "Internal server error", None).to_dict()), 500
+
+
+@app.route('/<tool_name>/timing_query', methods=['GET'])
+@compute_bound
+def timing_query(tool_name):
+    """
+    基于最近一次get_timing结果的索引查询，不再与EDA交互
+    查询参数:
+    - query: summary | worst_cells | worst_paths | slack_histogram | paths_from | paths_to |
+             paths_through_cell | paths_through_module，默认summary
+    - name: 起点/终点/cell/module名，paths_*类查询必需，slack_histogram可选(按module过滤)
+    - limit: 返回的路径/cell数量，默认100
+    - bins: 直方图分箱数，默认20
+    """
+    logger.info(f"接收到[{tool_name}]的时序查询请求")
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, "Unsupported EDA tool", None).to_dict()), 400
+
+        store = eda_tools[tool_name].get_timing_store()
+        if store is None:
+            logger.error(f"[{tool_name}] 时序数据未加载")
+            return jsonify(EdxResponse(400, "Timing not loaded, call get_timing first", None).to_dict()), 400
+
+        query = request.args.get('query', default='summary', type=str)
+        name = request.args.get('name', default='', type=str)
+        limit = request.args.get('limit', default=100, type=int)
+        path_queries = {
+            'paths_from': store.paths_from,
+            'paths_to': store.paths_to,
+            'paths_through_cell': store.paths_through_cell,
+            'paths_through_module': store.paths_through_module,
+        }
+        if query == 'summary':
+            response_data = store.summary()
+        elif query == 'worst_cells':
+            response_data = [{'cell_name': cell, 'slack': slack} for cell, slack in store.worst_cells(limit)]
+        elif query == 'worst_paths':
+            response_data = store.to_sta(store.worst_paths(limit))
+        elif query == 'slack_histogram':
+            path_ids = store.paths_through_module(name) if name else None
+            response_data = store.slack_histogram(request.args.get('bins', default=20, type=int), path_ids)
+        elif query in path_queries:
+            if not name:
+                return jsonify(EdxResponse(400, "Missing name parameter", None).to_dict()), 400
+            path_ids = path_queries[query](name)
+            response_data = {'path_count': len(path_ids), 'paths': store.to_sta(path_ids[:limit]).to_dict()['timing_paths']}
+        else:
+            return jsonify(EdxResponse(400, f"Unsupported query: {query}", None).to_dict()), 400
+        logger.info(f"[{tool_name}] 时序查询{query}完成")
+        return jsonify(EdxResponse(200, "success", response_data).to_dict()), 200
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"[{tool_name}] 时序查询时发生未预期异常: {error_msg}")
+        return jsonify(EdxResponse(500, "Internal server error", None).to_dict()), 500
+
+
+def binary_response(arrays: dict, download_name: str):
+    """以npz二进制格式返回数组，见binary_codec"""
+    return Response(encode_arrays(arrays), mimetype='application/octet-stream',
+                    headers={'Content-Disposition': f'attachment; filename={download_name}'})
+
+
+@app.route('/<tool_name>/timing_weights', methods=['GET'])
+@compute_bound
+def timing_weights(tool_name):
+    """
+    获取时序驱动的net权重和cell criticality，需先调用load_netlist，get_timing后自动增量更新
+    查询参数:
+    - format: npz | json，默认npz；npz中数组顺序与load_netlist返回的cells/nets顺序一致
+    - names: 1表示npz中附带cell_names/net_names，默认0
+    """
+    logger.info(f"接收到[{tool_name}]的获取net权重请求")
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, "Unsupported EDA tool", None).to_dict()), 400
+
+        weights = eda_tools[tool_name].get_timing_weights()
+        if weights is None:
+            logger.error(f"[{tool_name}] 网表未加载，无法计算net权重")
+            return jsonify(EdxResponse(400, "Netlist not loaded, call load_netlist first", None).to_dict()), 400
+
+        if request.args.get('format', default='npz', type=str) == 'json':
+            return jsonify(EdxResponse(200, "success", weights).to_dict()), 200
+        with_names = request.args.get('names', default=0, type=int) == 1
+        return binary_response(weights.to_arrays(with_names), f"{tool_name}_timing_weights.npz")
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"[{tool_name}] 获取net权重时发生未预期异常: {error_msg}")
+        return jsonify(EdxResponse(500, "Internal server error", None).to_dict()), 500
+
+
+@app.route('/<tool_name>/partition', methods=['POST'])
+@compute_bound
+def partition(tool_name):
+    """
+    布局切割，按load_netlist缓存的摆放和连接关系把Design切成多个SubAPR区域
+    请求体参数:
+    {
+        "num_parts": 4,           -- 区域数量
+        "imbalance": 0.1,         -- 区域面积相对平均值允许的偏差，默认0.1
+        "max_net_degree": 1000,   -- 度数超过该值的net不参与cut计算，默认1000
+        "max_aspect": 2.0,        -- 区域长宽比超过该值时只沿长边切，默认2.0
+        "timing_driven": false,   -- 是否使用时序net权重，默认false
+        "assignment": false       -- JSON返回时是否附带每个cell的区域id，默认false
+    }
+    查询参数:
+    - format: json | npz，默认json；npz包含assignment(按cells顺序的区域id)、bbox、cut_nets
+    """
+    logger.info(f"接收到[{tool_name}]的布局切割请求")
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, "Unsupported EDA tool", None).to_dict()), 400
+
+        tool = eda_tools[tool_name]
+        if tool.current_design is None:
+            return jsonify(EdxResponse(400, "Netlist not loaded, call load_netlist first", None).to_dict()), 400
+        data = request.get_json(silent=True) or {}
+        num_parts = int(data.get('num_parts', 0))
+        if num_parts < 1:
+            return jsonify(EdxResponse(400, "num_parts must be a positive integer", None).to_dict()), 400
+        result = tool.partition(num_parts,
+                                imbalance=float(data.get('imbalance', 0.1)),
+                                max_net_degree=int(data.get('max_net_degree', 1000)),
+                                max_aspect=float(data.get('max_aspect', 2.0)),
+                                timing_driven=bool(data.get('timing_driven', False)))
+        logger.info(f"[{tool_name}] 布局切割完成: {result.num_parts} regions, {len(result.cut_nets)} cut nets")
+        if request.args.get('format', default='json', type=str) == 'npz':
+            return binary_response(result.to_arrays(), f"{tool_name}_partition.npz")
+        return jsonify(EdxResponse(200, "success", result.to_dict(bool(data.get('assignment', False)))).to_dict()), 200
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"[{tool_name}] 布局切割时发生未预期异常: {error_msg}")
+        return jsonify(EdxResponse(500, "Internal server error", None).to_dict()), 500
+
+
+@app.route('/<tool_name>/plan_ports', methods=['POST'])
+@compute_bound
+def plan_ports_api(tool_name):
+    """
+    SubAPR边界端口规划，基于最近一次partition的结果
+    请求体参数:
+    {
+        "pitch": 0.1,           -- 同一条边上端口的最小间距，默认取配置port_pitch(0.1)
+        "write_tcl": true,      -- 是否在edx_tmp/subapr_ports下为每个区域生成创建端口的Tcl，默认true
+        "relative": false,      -- Tcl中的坐标是否相对区域左下角，默认false
+        "limit": 1000           -- JSON中最多返回多少个端口，默认1000
+    }
+    查询参数:
+    - format: json | npz，默认json；npz包含net/region/x/y/side/direction和names
+    """
+    logger.info(f"接收到[{tool_name}]的端口规划请求")
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, "Unsupported EDA tool", None).to_dict()), 400
+
+        tool = eda_tools[tool_name]
+        if tool.current_partition is None:
+            return jsonify(EdxResponse(400, "No partition, call partition first", None).to_dict()), 400
+        data = request.get_json(silent=True) or {}
+        plan = tool.plan_ports(data.get('pitch'))
+        if request.args.get('format', default='json', type=str) == 'npz':
+            return binary_response(plan.to_arrays(with_names=True), f"{tool_name}_ports.npz")
+        result = plan.to_dict(limit=int(data.get('limit', 1000)))
+        if data.get('write_tcl', True):
+            port_dir = os.path.join(DEFAULT_CONFIG.get("edx_tmp"), "subapr_ports")
+            os.makedirs(port_dir, exist_ok=True)
+            paths = plan.write_tcl(port_dir, tool.config.get('port_tcl_templates'), bool(data.get('relative', False)))
+            result['tcl_files'] = {str(region): path for region, path in paths.items()}
+        logger.info(f"[{tool_name}] 端口规划完成: {len(plan)} ports")
+        return jsonify(EdxResponse(200, "success", result).to_dict()), 200
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"[{tool_name}] 端口规划时发生未预期异常: {error_msg}")
+        return jsonify(EdxResponse(500, "Internal server error", None).to_dict()), 500
+
+
+@app.route('/<tool_name>/hierarchy', methods=['GET'])
+@compute_bound
+def hierarchy(tool_name):
+    """
+    查看设计层次
+    查询参数:
+    - module: module路径，默认为顶层
+    - depth: 展开的子module层数，默认1
+    """
+    logger.info(f"接收到[{tool_name}]的设计层次请求")
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, "Unsupported EDA tool", None).to_dict()), 400
+
+        tree = eda_tools[tool_name].get_hierarchy()
+        if tree is None:
+            return jsonify(EdxResponse(400, "Netlist not loaded, call load_netlist first", None).to_dict()), 400
+        module = request.args.get('module', default='', type=str)
+        if module not in tree:
+            return jsonify(EdxResponse(404, f"Module {module} not found", None).to_dict()), 404
+        result = tree.to_dict(module, request.args.get('depth', default=1, type=int))
+        return jsonify(EdxResponse(200, "success", result).to_dict()), 200
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"[{tool_name}] 获取设计层次时发生未预期异常: {error_msg}")
+        return jsonify(EdxResponse(500, "Internal server error", None).to_dict()), 500
+
+
+@app.route('/<tool_name>/split_modules', methods=['POST'])
+@compute_bound
+def split_modules(tool_name):
+    """
+    按module切分网表为自包含的子设计，跨边界的net变成端口
+    请求体参数:
+    {
+        "bundles": {"sub1": ["top/u_cpu"], "sub2": ["top/u_mem0", "top/u_mem1"]},  -- 每个子设计包含的module
+        "modules": ["top/u_cpu"],   -- 也可以只给module列表，每个module一个子设计
+        "compress": true,           -- 是否同时打包为tar.gz，默认true
+        "workers": null             -- 写文件的进程数，默认取配置split_workers或CPU数
+    }
+    子设计写在edx_tmp/module_bundles/<名字>/下: netlist.txt(get_netlist格式)和ports.txt(端口名,方向)
+    """
+    logger.info(f"接收到[{tool_name}]的按module切分请求")
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, "Unsupported EDA tool", None).to_dict()), 400
+
+        tool = eda_tools[tool_name]
+        if tool.current_design is None:
+            return jsonify(EdxResponse(400, "Netlist not loaded, call load_netlist first", None).to_dict()), 400
+        data = request.get_json(silent=True) or {}
+        bundles = data.get('bundles') or {module: [module] for module in data.get('modules', [])}
+        if not bundles:
+            return jsonify(EdxResponse(400, "Missing bundles or modules", None).to_dict()), 400
+        try:
+            result = tool.split_modules(bundles, compress=bool(data.get('compress', True)),
+                                        workers=data.get('workers'))
+        except KeyError as e:
+            return jsonify(EdxResponse(400, str(e.args[0]), None).to_dict()), 400
+        logger.info(f"[{tool_name}] 按module切分完成: {len(result)} bundles")
+        return jsonify(EdxResponse(200, "success", result).to_dict()), 200
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"[{tool_name}] 按module切分时发生未预期异常: {error_msg}")
+        return jsonify(EdxResponse(500, "Internal server error", None).to_dict()), 500
+
+
+@app.route('/<tool_name>/levelize', methods=['POST'])
+@compute_bound
+def levelize_api(tool_name):
+    """
+    按寄存器级(Cycle)划分流水级，可选按流水级切分网表
+    请求体参数:
+    {
+        "clock_pins": ["CK", "CLK"],  -- 时钟pin名(pin名最后一级)，默认取配置clock_pins或常见时钟pin名
+        "stages_per_bundle": 0,       -- 每个子设计包含的相邻流水级数，0为不切分，默认0
+        "compress": true,             -- 切分时是否同时打包为tar.gz，默认true
+        "workers": null               -- 写文件的进程数，默认取配置split_workers或CPU数
+    }
+    子设计写在edx_tmp/stage_bundles/stage_<起始级>_<结束级>/下，格式同split_modules
+    查询参数:
+    - format: json | npz，默认json；npz包含stage(按cells顺序的流水级，-1为不可达)和is_sequential
+    """
+    logger.info(f"接收到[{tool_name}]的流水级划分请求")
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, "Unsupported EDA tool", None).to_dict()), 400
+
+        tool = eda_tools[tool_name]
+        if tool.current_design is None:
+            return jsonify(EdxResponse(400, "Netlist not loaded, call load_netlist first", None).to_dict()), 400
+        data = request.get_json(silent=True) or {}
+        levels = tool.levelize(data.get('clock_pins'))
+        logger.info(f"[{tool_name}] 流水级划分完成: {levels.num_stages} stages")
+        if request.args.get('format', default='json', type=str) == 'npz':
+            return binary_response(levels.to_arrays(), f"{tool_name}_stages.npz")
+        result = levels.summary()
+        stages_per_bundle = int(data.get('stages_per_bundle', 0))
+        if stages_per_bundle > 0:
+            result['bundles'] = tool.split_stages(levels, stages_per_bundle,
+                                                  compress=bool(data.get('compress', True)),
+                                                  workers=data.get('workers'))
+            logger.info(f"[{tool_name}] 按流水级切分完成: {len(result['bundles'])} bundles")
+        return jsonify(EdxResponse(200, "success", result).to_dict()), 200
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"[{tool_name}] 流水级划分时发生未预期异常: {error_msg}")
+        return jsonify(EdxResponse(500, "Internal server error", None).to_dict()), 500
+
+
+@app.route('/<tool_name>/global_place', methods=['POST'])
+@compute_bound
+def global_place(tool_name):
+    """
+    解析式全局布局(B2B线网模型 + 共轭梯度求解 + 密度扩散)，结果通过批量摆放通道发送给EDA
+    请求体参数:
+    {
+        "incremental": false,     -- true时只摆放unplaced的cell，默认false
+        "fraction": 1.0,          -- 全局模式下摆放的cell比例，pin数最少的其余cell留给增量摆放，默认1.0
+        "prefixes": ["top/u_cpu"],-- 只摆放这些module下的cell，默认全部
+        "target_density": 0.9,    -- bin面积利用率目标，默认取配置target_density(0.9)
+        "max_iterations": 30,     -- 密度扩散的最大轮数，默认30
+        "target_overflow": 0.1,   -- bin溢出率低于该值时停止扩散，默认取配置target_overflow(0.1)
+        "place": true             -- 是否发送给EDA摆放，默认true
+    }
+    查询参数:
+    - format: json | npz，默认json；npz包含cells(cell id)、x、y
+    """
+    logger.info(f"接收到[{tool_name}]的全局布局请求")
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, "Unsupported EDA tool", None).to_dict()), 400
+
+        tool = eda_tools[tool_name]
+        if tool.current_design is None:
+            return jsonify(EdxResponse(400, "Netlist not loaded, call load_netlist first", None).to_dict()), 400
+        data = request.get_json(silent=True) or {}
+        result, placement = tool.global_place(incremental=bool(data.get('incremental', False)),
+                                              fraction=float(data.get('fraction', 1.0)),
+                                              prefixes=data.get('prefixes'),
+                                              target_density=data.get('target_density'),
+                                              max_iterations=int(data.get('max_iterations', 30)),
+                                              target_overflow=data.get('target_overflow'),
+                                              send=bool(data.get('place', True)))
+        logger.info(f"[{tool_name}] 全局布局完成: {format_global_place(result, placement)}")
+        if request.args.get('format', default='json', type=str) == 'npz':
+            return binary_response(result.to_arrays(), f"{tool_name}_global_place.npz")
+        response = result.summary()
+        if placement is not None:
+            response['placement'] = placement
+        return jsonify(EdxResponse(200, "success", response).to_dict()), 200
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"[{tool_name}] 全局布局时发生未预期异常: {error_msg}")
+        return jsonify(EdxResponse(500, "Internal server error", None).to_dict()), 500
+
+
 @app.route('/<tool_name>/execute_tcl', methods=['POST'])
 def execute_tcl(tool_name):
     """
@@ -350,8 +1607,10 @@ def execute_tcl(tool_name):
         # 如果result为None，将其设为空列表
         if eda_resp is None:
             eda_resp = []
-        logger.info(f"[{tool_name}] TCL命令执行完成, result is {eda_resp}")
-        return jsonify(EdxResponse(200, "success", eda_resp).to_dict()), 200
+        logger.info(f"[{tool_name}] TCL命令执行完成, result is {summarize(eda_resp)}")
+        status = last_exec_status()
+        message = "success" if status is None or status.ok else f"execute failed: {status.error}"
+        return jsonify(EdxResponse(200, message, eda_resp).to_dict()), 200
     except Exception as e:
         error_msg = str(e)
         logger.error(f"[{tool_name}] 执行TCL命令时发生未预期异常: {error_msg}")
@@ -362,7 +1621,8 @@ def execute_tcl(tool_name):
 def place_cells(tool_name):
     """
     执行cell摆放
-    请求体参数:
+    请求体参数(三种格式任选其一):
+    1. JSON记录列表
     [
         {
             "cell_name": xx,
@@ -374,6 +1634,16 @@ def place_cells(tool_name):
             "place_status": "placed"
         }
     ]
+    2. JSON列式: {"cell_name": [...] 或 "cell_id": [...], "x": [...], "y": [...], "orient": [...], "place_status": [...]}
+    3. Content-Type: application/octet-stream，npz格式的列式数据，字段同2，见binary_codec
+    cell_id为load_netlist返回的cells中的顺序下标；orient/place_status可省略
+    网表已加载时，名字不在Design中的cell不发送给EDA，列在返回的failed中，unknown为其数量
+    查询参数:
+    - validate: 1表示发送前先做预检查(见validate_placement)，坐标按检查结果截断/对齐，
+      存在未知cell或重叠时不发送，返回400和诊断信息
+    - legalize: validate=1时是否先做局部合法化，默认0
+    - site_width: site宽度，覆盖配置
+    - diff: 默认1，与缓存的Design比较，只发送有变化的cell；0表示全部发送
     """
     logger.info(f"接收到[{tool_name}]的执行cell摆放请求")
     try:
@@ -382,33 +1652,181 @@ def place_cells(tool_name):
             logger.error(error_msg)
             return jsonify(EdxResponse(400, "Unsupported EDA tool", {}).to_dict()), 400
 
-        data = request.get_json()
-        # 直接使用请求体数据作为cell列表，根据注释中的格式进行解析
-        cell_list = []
-        for cell_data in data:
-            cell = Cell(
-                cell_data["cell_name"],
-                cell_data["x"],
-                cell_data["y"],
-                cell_data.get("width", 0.0),  # 使用get方法，如果没有宽度则默认为0
-                cell_data.get("height", 0.0),  # 使用get方法，如果没有高度则默认为0
-                cell_data.get("orient", ""),  # 使用get方法，如果没有方向则默认为空字符串
-                place_status=cell_data.get("place_status", "")  # 使用get方法，如果没有放置状态则默认为空字符串
-            )
-            cell_list.append(cell)
-        eda_tools[tool_name].place_cells(cell_list)
-        logger.info(f"[{tool_name}] 执行cell摆放请求处理完成")
-        return jsonify(EdxResponse(200, "success", {}).to_dict()), 200
+        tool = eda_tools[tool_name]
+        is_binary = (request.content_type or '').startswith('application/octet-stream')
+        try:
+            batch = PlacementBatch.from_request(request.get_data() if is_binary else b'', request.content_type,
+                                                None if is_binary else request.get_json(),
+                                                tool.get_design_index())
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f"[{tool_name}] cell摆放请求格式错误: {e}")
+            return jsonify(EdxResponse(400, f"Invalid place_cells request: {e}", {}).to_dict()), 400
+        if request.args.get('validate', default=0, type=int) == 1:
+            checker = tool.get_placement_checker(request.args.get('site_width', type=float))
+            if checker is None:
+                return jsonify(EdxResponse(400, "Netlist not loaded, call load_netlist first", {}).to_dict()), 400
+            report = checker.check(batch, legalize=request.args.get('legalize', default=0, type=int) == 1)
+            if not report.ok:
+                logger.error(f"[{tool_name}] cell摆放预检查未通过: {report.counts()}")
+                return jsonify(EdxResponse(400, "Placement validation failed",
+                                           report.to_dict(limit=100)).to_dict()), 400
+            batch = report.batch
+        result = tool.place_batch(batch, diff=request.args.get('diff', default=1, type=int) == 1)
+        logger.info(f"[{tool_name}] 执行cell摆放请求处理完成, cell number is {len(batch)}, "
+                    f"skipped {result['skipped']}")
+        return jsonify(EdxResponse(200, "success", result).to_dict()), 200
     except Exception as e:
         error_msg = str(e)
         logger.error(f"[{tool_name}] 执行cell摆放时发生未预期异常: {error_msg}")
         return jsonify(EdxResponse(500, "Internal server error", {}).to_dict()), 500
 
 
+@app.route('/<tool_name>/validate_placement', methods=['POST'])
+@compute_bound
+def validate_placement(tool_name):
+    """
+    摆放请求预检查，不发送给EDA工具
+    请求体与place_cells相同
+    查询参数:
+    - legalize: 1表示对本批单行高cell做局部合法化，默认0
+    - snap: 是否对齐row/site，默认1
+    - site_width: site宽度，覆盖配置
+    - limit: 最多返回多少条逐cell诊断，默认1000
+    - positions: 1表示返回位置有修正的cell的列式坐标
+    """
+    logger.info(f"接收到[{tool_name}]的摆放预检查请求")
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, "Unsupported EDA tool", {}).to_dict()), 400
+
+        tool = eda_tools[tool_name]
+        checker = tool.get_placement_checker(request.args.get('site_width', type=float))
+        if checker is None:
+            return jsonify(EdxResponse(400, "Netlist not loaded, call load_netlist first", {}).to_dict()), 400
+        is_binary = (request.content_type or '').startswith('application/octet-stream')
+        try:
+            batch = PlacementBatch.from_request(request.get_data() if is_binary else b'', request.content_type,
+                                                None if is_binary else request.get_json(),
+                                                tool.get_design_index())
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f"[{tool_name}] 摆放预检查请求格式错误: {e}")
+            return jsonify(EdxResponse(400, f"Invalid placement request: {e}", {}).to_dict()), 400
+        report = checker.check(batch,
+                               snap=request.args.get('snap', default=1, type=int) == 1,
+                               legalize=request.args.get('legalize', default=0, type=int) == 1)
+        result = report.to_dict(limit=request.args.get('limit', default=1000, type=int),
+                                with_positions=request.args.get('positions', default=0, type=int) == 1)
+        logger.info(f"[{tool_name}] 摆放预检查完成: {result['counts']}")
+        return jsonify(EdxResponse(200, "success", result).to_dict()), 200
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"[{tool_name}] 摆放预检查时发生未预期异常: {error_msg}")
+        return jsonify(EdxResponse(500, "Internal server error", {}).to_dict()), 500
+
+
+@app.route('/<tool_name>/snapshot', methods=['GET', 'POST'])
+@compute_bound
+def snapshot(tool_name):
+    """
+    摆放快照
+    POST: 创建快照，请求体可选 {"name": "before_swap"}，不提供时自动命名
+    GET: 列出已有快照
+    """
+    logger.info(f"接收到[{tool_name}]的摆放快照请求")
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, "Unsupported EDA tool", None).to_dict()), 400
+
+        tool = eda_tools[tool_name]
+        if request.method == 'GET':
+            return jsonify(EdxResponse(200, "success", tool.list_snapshots()).to_dict()), 200
+        if tool.current_design is None:
+            return jsonify(EdxResponse(400, "Netlist not loaded, call load_netlist first", None).to_dict()), 400
+        data = request.get_json(silent=True) or {}
+        result = tool.snapshot(data.get('name'))
+        return jsonify(EdxResponse(200, "success", result).to_dict()), 200
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"[{tool_name}] 摆放快照时发生未预期异常: {error_msg}")
+        return jsonify(EdxResponse(500, "Internal server error", None).to_dict()), 500
+
+
+@app.route('/<tool_name>/rollback', methods=['POST'])
+def rollback(tool_name):
+    """
+    回滚到快照，只发送与快照不同的cell
+    请求体可选 {"name": "before_swap"}，不提供时回滚到最近的快照
+    """
+    logger.info(f"接收到[{tool_name}]的摆放回滚请求")
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, "Unsupported EDA tool", None).to_dict()), 400
+
+        tool = eda_tools[tool_name]
+        if tool.current_design is None:
+            return jsonify(EdxResponse(400, "Netlist not loaded, call load_netlist first", None).to_dict()), 400
+        data = request.get_json(silent=True) or {}
+        try:
+            result = tool.rollback(data.get('name'))
+        except KeyError as e:
+            return jsonify(EdxResponse(404, f"Snapshot not available: {e.args[0]}", None).to_dict()), 404
+        logger.info(f"[{tool_name}] 摆放回滚完成: {result['placed']} placed")
+        return jsonify(EdxResponse(200, "success", result).to_dict()), 200
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"[{tool_name}] 摆放回滚时发生未预期异常: {error_msg}")
+        return jsonify(EdxResponse(500, "Internal server error", None).to_dict()), 500
+
+
+@app.route('/<tool_name>/diff', methods=['GET'])
+@compute_bound
+def diff(tool_name):
+    """
+    比较快照与当前摆放(或另一个快照)
+    查询参数:
+    - name: 快照名，不提供时为最近的快照
+    - to: 另一个快照名，不提供时与当前缓存的摆放比较
+    - limit: 最多返回多少个cell，默认1000
+    """
+    logger.info(f"接收到[{tool_name}]的摆放差异请求")
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, "Unsupported EDA tool", None).to_dict()), 400
+
+        tool = eda_tools[tool_name]
+        if tool.current_design is None:
+            return jsonify(EdxResponse(400, "Netlist not loaded, call load_netlist first", None).to_dict()), 400
+        try:
+            result = tool.diff_snapshot(request.args.get('name'), request.args.get('to'),
+                                        request.args.get('limit', default=1000, type=int))
+        except KeyError as e:
+            return jsonify(EdxResponse(404, f"Snapshot not available: {e.args[0]}", None).to_dict()), 404
+        return jsonify(EdxResponse(200, "success", result).to_dict()), 200
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"[{tool_name}] 摆放差异比较时发生未预期异常: {error_msg}")
+        return jsonify(EdxResponse(500, "Internal server error", None).to_dict()), 500
+
+
 @app.route('/<tool_name>/upload_file', methods=['POST'])
 def upload_file(tool_name):
     """
     上传文件到edx_tmp目录
+    两种方式:
+    1. multipart表单，文件字段为file
+    2. 请求体为文件内容(application/octet-stream)，文件名由查询参数name指定，不经过表单解析，直接流式写入
+    可选参数(表单字段或查询参数):
+    - sha256: 文件的sha256，不一致时返回400
+    - decompress: true时按后缀解压(.gz/.bz2/.xz/.tar/.tar.gz/.tgz等)到edx_tmp
+    大文件建议使用upload_session分块续传，内容已存在时不必重复上传
     """
     logger.info(f"接收到[{tool_name}]的上传文件请求")
     try:
@@ -417,42 +1835,49 @@ def upload_file(tool_name):
             logger.error(error_msg)
             return jsonify(EdxResponse(400, error_msg).to_dict()), 400
 
-        # 检查请求中是否包含文件
-        if 'file' not in request.files:
-            logger.error(f"[{tool_name}] 上传文件请求中未包含文件")
-            return jsonify(EdxResponse(400, "No file part in request").to_dict()), 400
+        # 获取edx_tmp目录
+        edx_tmp_dir = DEFAULT_CONFIG.get("edx_tmp")
+        if not edx_tmp_dir or edx_tmp_dir == "":
+            logger.error(f"[{tool_name}] edx_tmp配置未设置")
+            return jsonify(EdxResponse(500, "edx_tmp directory not configured").to_dict()), 500
 
-        file = request.files['file']
-        
-        # 检查是否选择了文件
-        if file.filename == '':
-            logger.error(f"[{tool_name}] 未选择文件进行上传")
-            return jsonify(EdxResponse(400, "No file selected").to_dict()), 400
-
-        if file:
-            # 获取edx_tmp目录
-            edx_tmp_dir = DEFAULT_CONFIG.get("edx_tmp")
-            if not edx_tmp_dir or edx_tmp_dir == "":
-                logger.error(f"[{tool_name}] edx_tmp配置未设置")
-                return jsonify(EdxResponse(500, "edx_tmp directory not configured").to_dict()), 500
-
-            # 确保目录存在
-            os.makedirs(edx_tmp_dir, exist_ok=True)
-
-            # 保存文件到edx_tmp目录
-            file_path = os.path.join(edx_tmp_dir, file.filename)
-            file.save(file_path)
-
-            logger.info(f"[{tool_name}] 文件上传成功: {file_path}")
-            response_data = {
-                "file_path": file_path,
-                "file_name": file.filename,
-                "file_size": os.path.getsize(file_path)
-            }
-            return jsonify(EdxResponse(200, "File uploaded successfully", response_data).to_dict()), 200
+        if request.mimetype == 'multipart/form-data':
+            # 检查请求中是否包含文件
+            if 'file' not in request.files:
+                logger.error(f"[{tool_name}] 上传文件请求中未包含文件")
+                return jsonify(EdxResponse(400, "No file part in request").to_dict()), 400
+            file = request.files['file']
+            # 检查是否选择了文件
+            if file.filename == '':
+                logger.error(f"[{tool_name}] 未选择文件进行上传")
+                return jsonify(EdxResponse(400, "No file selected").to_dict()), 400
+            file_name, stream = file.filename, file.stream
         else:
-            logger.error(f"[{tool_name}] 上传的文件无效")
-            return jsonify(EdxResponse(400, "Invalid file").to_dict()), 400
+            file_name, stream = request.args.get('name', ''), request.stream
+            if file_name == '':
+                return jsonify(EdxResponse(400, "Query parameter 'name' is required for raw uploads").to_dict()), 400
+
+        options = {**request.args.to_dict(), **request.form.to_dict()}
+        decompress = str(options.get('decompress', '')).lower() in ('1', 'true', 'yes')
+        try:
+            file_name = safe_file_name(file_name)
+            store = eda_tools[tool_name].get_upload_store()
+            stored = store.ingest_stream(stream, options.get('sha256'))
+        except ValueError as e:
+            logger.error(f"[{tool_name}] 上传文件校验失败: {e}")
+            return jsonify(EdxResponse(400, str(e)).to_dict()), 400
+        placed = store.materialize(stored['sha256'], edx_tmp_dir, file_name, decompress)
+
+        logger.info(f"[{tool_name}] 文件上传成功: {placed['file_path']}, sha256 {stored['sha256']}")
+        response_data = {
+            "file_path": placed['file_path'],
+            "file_name": file_name,
+            "file_size": placed['file_size'],
+            "files": placed['files'],
+            "sha256": stored['sha256'],
+            "deduplicated": stored['deduplicated']
+        }
+        return jsonify(EdxResponse(200, "File uploaded successfully", response_data).to_dict()), 200
 
     except Exception as e:
         error_msg = str(e)
@@ -460,12 +1885,113 @@ def upload_file(tool_name):
         return jsonify(EdxResponse(500, "Internal server error").to_dict()), 500
 
 
+@app.route('/<tool_name>/upload_session', methods=['POST'])
+def create_upload_session(tool_name):
+    """
+    创建可续传的上传会话
+    请求体参数:
+    - name: 文件名
+    - size: 文件大小(字节)
+    - sha256: 文件的sha256，可选，提供时服务端已有相同内容则直接放到edx_tmp，不必上传(data.exists为true)
+    - decompress: 上传完成后是否按后缀解压，默认false
+    返回session_id、offset(已收到的字节数)和建议的分块大小chunk_size
+    """
+    logger.info(f"接收到[{tool_name}]的创建上传会话请求")
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, error_msg).to_dict()), 400
+        data = request.get_json(silent=True) or {}
+        if 'name' not in data or 'size' not in data:
+            return jsonify(EdxResponse(400, "Both 'name' and 'size' are required").to_dict()), 400
+        store = eda_tools[tool_name].get_upload_store()
+        try:
+            session = store.create_session(data['name'], data['size'], data.get('sha256'),
+                                           bool(data.get('decompress', False)))
+        except (TypeError, ValueError) as e:
+            return jsonify(EdxResponse(400, str(e)).to_dict()), 400
+        if session['exists']:
+            placed = store.materialize(session['sha256'], DEFAULT_CONFIG.get("edx_tmp"), session['name'],
+                                       bool(data.get('decompress', False)))
+            session.update(placed)
+            logger.info(f"[{tool_name}] {session['name']} 内容已存在，跳过上传: {placed['file_path']}")
+            return jsonify(EdxResponse(200, "File already exists", session).to_dict()), 200
+        return jsonify(EdxResponse(200, "success", session).to_dict()), 200
+    except Exception as e:
+        logger.error(f"[{tool_name}] 创建上传会话时发生未预期异常: {e}")
+        return jsonify(EdxResponse(500, "Internal server error").to_dict()), 500
+
+
+@app.route('/<tool_name>/upload_session/<session_id>', methods=['GET', 'PUT', 'DELETE'])
+def upload_session(tool_name, session_id):
+    """
+    GET: 查询会话已收到的字节数(offset)，断点续传时从offset继续
+    PUT: 上传一块数据，请求体为原始字节
+      查询参数:
+      - offset: 这一块在文件中的起始位置，必须等于已收到的字节数，否则返回409和当前offset
+      收齐后校验sha256并放到edx_tmp，data.complete为true
+    DELETE: 放弃会话
+    """
+    try:
+        if tool_name not in eda_tools:
+            error_msg = f"Unsupported EDA tool: {tool_name}. Supported tools: {list(eda_tools.keys())}"
+            logger.error(error_msg)
+            return jsonify(EdxResponse(400, error_msg).to_dict()), 400
+        store = eda_tools[tool_name].get_upload_store()
+        try:
+            if request.method == 'GET':
+                return jsonify(EdxResponse(200, "success", store.session_info(session_id)).to_dict()), 200
+            if request.method == 'DELETE':
+                store.abort_session(session_id)
+                return jsonify(EdxResponse(200, "Upload session aborted").to_dict()), 200
+            offset = request.args.get('offset', default=None, type=int)
+            if offset is None:
+                return jsonify(EdxResponse(400, "Query parameter 'offset' is required").to_dict()), 400
+            result = store.write_chunk(session_id, offset, request.stream, request.content_length)
+        except KeyError:
+            return jsonify(EdxResponse(404, f"Upload session {session_id} not found").to_dict()), 404
+        except OffsetMismatch as e:
+            return jsonify(EdxResponse(409, str(e), {'offset': e.offset}).to_dict()), 409
+        except ValueError as e:
+            logger.error(f"[{tool_name}] 上传会话{session_id}校验失败: {e}")
+            return jsonify(EdxResponse(400, str(e)).to_dict()), 400
+        if result['complete']:
+            placed = store.materialize(result['sha256'], DEFAULT_CONFIG.get("edx_tmp"), result['name'],
+                                       result['decompress'])
+            result.update(placed)
+            logger.info(f"[{tool_name}] 分块上传完成: {placed['file_path']}, sha256 {result['sha256']}")
+        return jsonify(EdxResponse(200, "success", result).to_dict()), 200
+    except Exception as e:
+        logger.error(f"[{tool_name}] 处理上传会话时发生未预期异常: {e}")
+        return jsonify(EdxResponse(500, "Internal server error").to_dict()), 500
+
+
+# download_file中只读取design的脚本，结果可以按design版本缓存
+READ_ONLY_SCRIPTS = {'get_netlist', 'get_unplace_cells', 'place_report'}
+
+
+def send_artifact(entry: ArtifactEntry, hit: bool, tool: BaseEDA_Tool):
+    """
+    发送缓存的生成文件: conditional=True时支持Range(断点续传/分段下载，返回206)和If-None-Match(返回304)，
+    文件内容由WSGI服务的wsgi.file_wrapper发送(支持时使用sendfile)
+    """
+    response = send_file(entry.path, as_attachment=True, download_name=os.path.basename(entry.name),
+                         conditional=True, etag=entry.key, max_age=0)
+    response.headers['X-Artifact-Cache'] = 'hit' if hit else 'miss'
+    response.headers['X-Design-Version'] = str(tool.design_version)
+    return response
+
+
 @app.route('/<tool_name>/download_file', methods=['GET'])
 def download_file(tool_name):
     """
     下载文件接口
     查询参数:
     - script_name: TCL脚本名称（如get_netlist）
+    - refresh: true时忽略缓存重新执行脚本
+    脚本内容和design版本都未变化时直接返回缓存的文件，不访问EDA；支持Range请求。
+    READ_ONLY_SCRIPTS以外的脚本可能修改design，执行后按mark_placement_dirty处理，结果不缓存
     """
     logger.info(f"接收到[{tool_name}]的下载文件请求")
     try:
@@ -487,8 +2013,10 @@ def download_file(tool_name):
             logger.error(f"[{tool_name}] edx_tmp配置未设置")
             return jsonify(EdxResponse(500, "edx_tmp directory not configured").to_dict()), 500
 
-        # 根据script_name确定TCL脚本路径
+        # 根据script_name确定TCL脚本路径，只允许apicommon下的脚本
         current_dir = os.path.dirname(os.path.abspath(__file__))
+        if os.path.basename(script_name) != script_name:
+            return jsonify(EdxResponse(400, f"Invalid script_name: {script_name}").to_dict()), 400
         tcl_script_path = os.path.join(current_dir, "apicommon", f"{script_name}.tcl")
         
         # 检查TCL脚本是否存在
@@ -496,20 +2024,32 @@ def download_file(tool_name):
             logger.error(f"[{tool_name}] TCL脚本不存在: {tcl_script_path}")
             return jsonify(EdxResponse(400, f"TCL script {script_name}.tcl not found").to_dict()), 400
 
-        # 执行TCL脚本
-        tcl_sender = TCLSender()
-        result = tcl_sender.send_tcl_file(tcl_script_path, return_result=False)
-        
         # 生成预期的输出文件路径 (script_name.tar.gz)
         output_file_path = os.path.join(edx_tmp_dir, f"{script_name}.tar.gz")
-        
+
+        def produce():
+            # 先删除上次的输出，脚本执行失败时不会把旧文件当作新结果缓存
+            if os.path.exists(output_file_path):
+                os.remove(output_file_path)
+            # 执行TCL脚本
+            try:
+                TCLSender().send_tcl_file(tcl_script_path, return_result=False)
+            finally:
+                if script_name not in READ_ONLY_SCRIPTS:
+                    tool.mark_placement_dirty()
+            return output_file_path if os.path.exists(output_file_path) else ''
+
+        tool = eda_tools[tool_name]
+        refresh = request.args.get('refresh', default='false').lower() in ('1', 'true', 'yes')
+        entry, hit = tool.cached_artifact(tcl_script_path, f"{script_name}.tar.gz", produce, refresh)
+
         # 检查输出文件是否存在
-        if not os.path.exists(output_file_path):
+        if entry is None:
             logger.error(f"[{tool_name}] 输出文件不存在: {output_file_path}")
             return jsonify(EdxResponse(404, f"Generated file {script_name}.tar.gz not found in edx_tmp directory").to_dict()), 404
 
-        logger.info(f"[{tool_name}] 准备返回下载文件: {output_file_path}")
-        return send_file(output_file_path, as_attachment=True, download_name=os.path.basename(output_file_path))
+        logger.info(f"[{tool_name}] 准备返回下载文件{'(命中缓存)' if hit else ''}: {entry.path}")
+        return send_artifact(entry, hit, tool)
 
     except Exception as e:
         error_msg = str(e)
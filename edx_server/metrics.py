@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+'''
+Prometheus格式的运行指标，/metrics接口输出
+1. 不依赖prometheus_client，Counter/Gauge/Histogram只实现本服务用到的部分，
+   一次observe是一次bisect加一次加锁累加，热路径上的开销在微秒级
+2. 每个线程记录当前处理的接口(Flask请求或pyc_*命令)，TCLSender各阶段耗时按接口分别统计，
+   可以看出某个接口慢在排队、写command.tcl、等待EDA、读结果、解析还是JSON编码
+3. 指标在模块导入时创建，其他模块直接使用下面的全局对象
+'''
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+# 耗时桶(秒)，覆盖从微秒级的缓存读取到分钟级的EDA命令
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# 数据量桶(字节)，256B到256MB
+SIZE_BUCKETS = tuple(256 * 4 ** k for k in range(11))
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple, object] = {}
+
+    def _key(self, label_values) -> Tuple:
+        if len(label_values) != len(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {label_values}")
+        return tuple(str(value) for value in label_values)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            series = sorted(self._series.items())
+            lines.extend(self._render_series(key, value) for key, value in series)
+        return lines
+
+    def _render_series(self, key, value) -> str:
+        return f'{self.name}{_label_text(self.labels, key)} {_format_value(value)}'
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, *label_values):
+        key = self._key(label_values)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        if not self.labels:
+            self._series[()] = 0
+
+    def set(self, value, *label_values):
+        key = self._key(label_values)
+        with self._lock:
+            self._series[key] = value
+
+    def inc(self, amount=1, *label_values):
+        key = self._key(label_values)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount=1, *label_values):
+        self.inc(-amount, *label_values)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *label_values):
+        key = self._key(label_values)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [各桶计数(最后一个为+Inf), 总和, 次数]
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            series = sorted((key, [list(value[0]), value[1], value[2]]) for key, value in self._series.items())
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_label_text(self.labels, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_label_text(self.labels, key)} {_format_value(float(total))}')
+            lines.append(f'{self.name}_count{_label_text(self.labels, key)} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labels=()) -> Counter:
+        return self._register(Counter, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()) -> Gauge:
+        return self._register(Gauge, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=DURATION_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labels, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# HTTP请求
+REQUEST_SECONDS = REGISTRY.histogram('edx_http_request_duration_seconds', 'HTTP request latency',
+                                     ('endpoint', 'method', 'status'))
+REQUEST_BYTES = REGISTRY.histogram('edx_http_request_size_bytes', 'HTTP request body size',
+                                   ('endpoint',), SIZE_BUCKETS)
+RESPONSE_BYTES = REGISTRY.histogram('edx_http_response_size_bytes', 'HTTP response body size',
+                                    ('endpoint',), SIZE_BUCKETS)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge('edx_http_requests_in_flight', 'HTTP requests being served')
+
+# 各阶段耗时: tcl_queue(等待EDA通道) tcl_write tcl_wait(监听器轮询+EDA执行) tcl_read parse json_encode，
+# tcl_wait按EDA侧的server_status.txt再拆为eda_exec、eda_overhead和eda_detect
+PHASE_SECONDS = REGISTRY.histogram('edx_phase_duration_seconds', 'Duration of one phase of a request',
+                                   ('endpoint', 'phase'))
+TCL_PAYLOAD_BYTES = REGISTRY.histogram('edx_tcl_payload_bytes', 'Size of command.tcl / server_result.txt',
+                                       ('endpoint', 'direction'), SIZE_BUCKETS)
+TCL_ROUND_TRIPS = REGISTRY.counter('edx_tcl_round_trips_total', 'TCL round trips to the EDA tool', ('endpoint',))
+TCL_QUEUE_DEPTH = REGISTRY.gauge('edx_tcl_queue_depth', 'Threads waiting for or holding the EDA channel')
+COMPUTE_QUEUE_DEPTH = REGISTRY.gauge('edx_compute_queue_depth', 'Compute requests waiting for or holding a slot')
+
+# 吞吐
+CELLS_PLACED = REGISTRY.counter('edx_cells_placed_total', 'Cells placed in the EDA tool', ('tool',))
+PLACE_CELLS_PER_SECOND = REGISTRY.gauge('edx_place_cells_per_second', 'Throughput of the last placement batch',
+                                        ('tool',))
+CELLS_PARSED_PER_SECOND = REGISTRY.gauge('edx_netlist_parse_cells_per_second',
+                                         'Throughput of the last netlist parse', ('tool',))
+EDA_ERRORS = REGISTRY.counter('edx_eda_errors_total', 'command.tcl executions that raised an error in the EDA tool',
+                              ('endpoint',))
+ARTIFACT_CACHE = REGISTRY.counter('edx_artifact_cache_requests_total', 'download_file/download_netlist cache lookups',
+                                  ('result',))
+SINGLE_FLIGHT_SHARED = REGISTRY.counter('edx_single_flight_shared_total',
+                                       'Calls that reused the result of an identical in-flight EDA request',
+                                       ('operation',))
+PLUGIN_COMMAND_SECONDS = REGISTRY.histogram('edx_plugin_command_duration_seconds', 'pyc_* command latency',
+                                            ('command',))
+
+_context = threading.local()
+
+
+def set_endpoint(endpoint: str):
+    """当前线程处理的接口，作为阶段耗时的标签，同时清零本次请求累计的EDA执行时间"""
+    _context.endpoint = endpoint
+    _context.eda_seconds = 0.0
+
+
+def add_eda_seconds(seconds: float):
+    _context.eda_seconds = getattr(_context, 'eda_seconds', 0.0) + seconds
+
+
+def eda_seconds() -> float:
+    """当前请求中EDA执行command.tcl的累计时间"""
+    return getattr(_context, 'eda_seconds', 0.0)
+
+
+def current_endpoint() -> str:
+    return getattr(_context, 'endpoint', None) or 'other'
+
+
+@contextmanager
+def endpoint_context(endpoint: str):
+    previous = getattr(_context, 'endpoint', None)
+    _context.endpoint = endpoint
+    try:
+        yield
+    finally:
+        _context.endpoint = previous
+
+
+def observe_phase(phase: str, seconds: float):
+    PHASE_SECONDS.observe(seconds, current_endpoint(), phase)
+
+
+@contextmanager
+def phase(name: str):
+    """with phase('parse'): ... 记录一段代码的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_phase(name, time.perf_counter() - start)
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+'''
+布局切割: 把Flatten布局切成多个SubAPR区域
+递归二分，每次在当前区域内沿x或y方向找一条切线:
+1. 区域内cell按中心坐标排序，面积累计比例落在 目标比例±允许偏差 之内的位置都是候选切线
+2. 每个net在区域内的pin坐标范围[lo, hi]，切线c切断的net权重 = W(lo < c) - W(hi < c)，
+   lo/hi排序后用searchsorted一次算出所有候选切线的cut值
+3. 两个方向都评估，取cut最小的切线(区域长宽比超过max_aspect时只切长边)，同cut时取最接近目标比例的
+每层的偏差会逐层累乘，单次二分允许的相对偏差取 imbalance / 层数，使最终区域面积偏差大致不超过imbalance。
+num_parts不是2的幂时按 floor(k/2) : ceil(k/2) 的面积比例切分。
+同一层的所有区域共用一次按区域排序的net-pin表，整个过程只有O(log k)层，每层的计算都是向量化的。
+'''
+import logging
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from design_index import DesignIndex
+
+logger = logging.getLogger(__name__)
+
+
+class Region:
+    """切割得到的一个矩形区域"""
+    def __init__(self, cells: np.ndarray, bbox, parts: int):
+        self.cells = cells
+        self.bbox = bbox  # (x0, y0, x1, y1)
+        self.parts = parts
+
+    def to_dict(self, region_id: int, area: float) -> dict:
+        x0, y0, x1, y1 = self.bbox
+        return {'id': region_id, 'bbox': [float(x0), float(y0), float(x1), float(y1)],
+                'cells': int(len(self.cells)), 'cell_area': float(area)}
+
+
+class PartitionResult:
+    """
+    assignment: 每个cell所属区域id，顺序与DesignIndex.cell_names一致
+    regions: 区域列表，区域id即下标
+    """
+    def __init__(self, design_index: DesignIndex, assignment: np.ndarray, regions: List[Region],
+                 cut_nets: np.ndarray, elapsed: float):
+        self.index = design_index
+        self.assignment = assignment
+        self.regions = regions
+        self.cut_nets = cut_nets
+        self.elapsed = elapsed
+
+    @property
+    def num_parts(self) -> int:
+        return len(self.regions)
+
+    def bboxes(self) -> np.ndarray:
+        return np.asarray([region.bbox for region in self.regions], dtype=np.float64).reshape(-1, 4)
+
+    def summary(self) -> dict:
+        area = np.bincount(self.assignment, weights=self.index.width * self.index.height,
+                           minlength=self.num_parts)
+        return {
+            'num_parts': self.num_parts,
+            'cut_nets': int(len(self.cut_nets)),
+            'elapsed': round(self.elapsed, 3),
+            'regions': [region.to_dict(i, area[i]) for i, region in enumerate(self.regions)],
+        }
+
+    def to_dict(self, with_assignment=False) -> dict:
+        result = self.summary()
+        if with_assignment:
+            result['assignment'] = {name: int(part) for name, part in zip(self.index.cell_names, self.assignment)}
+        return result
+
+    def to_arrays(self) -> dict:
+        return {
+            'assignment': self.assignment,
+            'bbox': self.bboxes(),
+            'cut_nets': self.cut_nets,
+        }
+
+
+def find_cut_nets(design_index: DesignIndex, assignment: np.ndarray) -> np.ndarray:
+    """连接到多个区域的net id(只看属于cell的pin)"""
+    entry_cell = design_index.pin_cell[design_index.net_pins]
+    valid = entry_cell >= 0
+    nets = design_index.net_pin_net[valid]
+    parts = assignment[entry_cell[valid]]
+    if len(nets) == 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate(([True], nets[1:] != nets[:-1])))
+    lo = np.minimum.reduceat(parts, starts)
+    hi = np.maximum.reduceat(parts, starts)
+    return nets[starts[lo != hi]].astype(np.int64)
+
+
+class Partitioner:
+    """
+    :param design_index: Design的列式视图
+    :param imbalance: 最终区域面积相对平均值允许的偏差
+    :param max_net_degree: 度数超过该值的net(时钟、复位等)不参与cut计算
+    :param max_aspect: 区域长宽比超过该值时只沿长边切
+    :param net_weight: 可选的net权重(如TimingWeights.net_weight)，关键net更不容易被切断
+    :param row_height: 提供时y方向切线对齐到row
+    :param site_width: 提供时x方向切线对齐到site
+    """
+    def __init__(self, design_index: DesignIndex, imbalance=0.1, max_net_degree=1000, max_aspect=2.0,
+                 net_weight: Optional[np.ndarray] = None, row_height: Optional[float] = None,
+                 site_width: Optional[float] = None):
+        self.index = design_index
+        self.imbalance = float(imbalance)
+        self._tolerance = self.imbalance
+        self._origin = (design_index.core_x, design_index.core_y)
+        self.max_aspect = float(max_aspect)
+        self.grid = (float(site_width or 0.0), float(row_height or 0.0))
+        cx, cy = design_index.cell_centers()
+        self.centers = (cx, cy)
+        self.area = np.maximum(design_index.width * design_index.height, 1e-12)
+
+        degrees = design_index.net_degrees()
+        weight = np.ones(design_index.num_nets) if net_weight is None else np.asarray(net_weight, dtype=np.float64)
+        weight = np.where(degrees <= max_net_degree, weight, 0.0)
+        entry_cell = design_index.pin_cell[design_index.net_pins]
+        keep = (entry_cell >= 0) & (weight[design_index.net_pin_net] > 0)
+        self.entry_cell = entry_cell[keep].astype(np.int64)
+        self.entry_net = design_index.net_pin_net[keep].astype(np.int64)
+        self.net_weight = weight
+
+    def partition(self, num_parts: int, bbox=None) -> PartitionResult:
+        start = time.time()
+        index = self.index
+        if bbox is None:
+            bbox = (index.core_x, index.core_y, index.core_x + index.core_width, index.core_y + index.core_height)
+        # site/row从整个区域的左下角开始计
+        self._origin = (float(bbox[0]), float(bbox[1]))
+        num_parts = max(int(num_parts), 1)
+        levels = max(int(np.ceil(np.log2(num_parts))), 1)
+        self._tolerance = self.imbalance / levels
+        regions = [Region(np.arange(index.num_cells), tuple(bbox), num_parts)]
+        label = np.zeros(index.num_cells, dtype=np.int64)
+        while any(region.parts > 1 for region in regions):
+            # 按区域排序的net-pin表，稳定排序保证每个区域内仍按net有序
+            entry_order = np.argsort(label[self.entry_cell], kind='stable')
+            entry_region = label[self.entry_cell][entry_order]
+            bounds = np.searchsorted(entry_region, np.arange(len(regions) + 1))
+            next_regions = []
+            for region_id, region in enumerate(regions):
+                if region.parts == 1:
+                    next_regions.append(region)
+                    continue
+                entries = entry_order[bounds[region_id]:bounds[region_id + 1]]
+                next_regions.extend(self._split(region, entries))
+            regions = next_regions
+            for region_id, region in enumerate(regions):
+                label[region.cells] = region_id
+
+        cut_nets = find_cut_nets(index, label)
+        result = PartitionResult(index, label.astype(np.int32), regions, cut_nets, time.time() - start)
+        logger.info(f"partitioned {index.num_cells} cells into {len(regions)} regions, "
+                    f"{len(cut_nets)} cut nets, {result.elapsed:.2f}s")
+        return result
+
+    def _split(self, region: Region, entries: np.ndarray) -> List[Region]:
+        x0, y0, x1, y1 = region.bbox
+        left_parts = region.parts // 2
+        target = left_parts / region.parts
+        width, height = x1 - x0, y1 - y0
+        if width > self.max_aspect * height:
+            axes = [0]
+        elif height > self.max_aspect * width:
+            axes = [1]
+        else:
+            axes = [0, 1] if width >= height else [1, 0]
+
+        best = None
+        for axis in axes:
+            candidate = self._best_cut(region, entries, axis, target)
+            if candidate is not None and (best is None or candidate[:2] < best[:2]):
+                best = candidate
+        if best is None:
+            # 区域内cell不足以切分，按面积目标比例切几何区域
+            axis = axes[0]
+            lo, hi = (x0, x1) if axis == 0 else (y0, y1)
+            cut = lo + (hi - lo) * target
+            coord = self.centers[axis][region.cells]
+            left_mask = coord < cut
+        else:
+            _, _, axis, cut = best
+            cut = self._snap(cut, axis, region.bbox)
+            coord = self.centers[axis][region.cells]
+            left_mask = coord < cut
+        left_cells, right_cells = region.cells[left_mask], region.cells[~left_mask]
+        if axis == 0:
+            left_box, right_box = (x0, y0, cut, y1), (cut, y0, x1, y1)
+        else:
+            left_box, right_box = (x0, y0, x1, cut), (x0, cut, x1, y1)
+        return [Region(left_cells, left_box, left_parts), Region(right_cells, right_box, region.parts - left_parts)]
+
+    def _best_cut(self, region: Region, entries: np.ndarray, axis: int, target: float):
+        """返回(cut权重, 偏离目标比例, axis, 切线坐标)，没有可用切线时返回None"""
+        cells = region.cells
+        if len(cells) < 2:
+            return None
+        coord = self.centers[axis][cells]
+        order = np.argsort(coord, kind='stable')
+        sorted_coord = coord[order]
+        frac = np.cumsum(self.area[cells][order])
+        frac /= frac[-1]
+        # 候选: 在第i个cell之后切，要求两侧坐标不同
+        distinct = sorted_coord[1:] > sorted_coord[:-1]
+        deviation = np.abs(frac[:-1] - target)
+        candidates = np.flatnonzero(distinct & (deviation <= self._tolerance * min(target, 1 - target)))
+        if len(candidates) == 0:
+            candidates = np.flatnonzero(distinct)
+            if len(candidates) == 0:
+                return None
+            candidates = candidates[[np.argmin(deviation[candidates])]]
+        cuts = (sorted_coord[candidates] + sorted_coord[candidates + 1]) / 2
+
+        cost = np.zeros(len(candidates))
+        if len(entries) > 0:
+            entry_coord = self.centers[axis][self.entry_cell[entries]]
+            nets = self.entry_net[entries]
+            starts = np.flatnonzero(np.concatenate(([True], nets[1:] != nets[:-1])))
+            lo = np.minimum.reduceat(entry_coord, starts)
+            hi = np.maximum.reduceat(entry_coord, starts)
+            weight = self.net_weight[nets[starts]]
+            spanning = lo < hi
+            lo, hi, weight = lo[spanning], hi[spanning], weight[spanning]
+            lo_order, hi_order = np.argsort(lo), np.argsort(hi)
+            lo_weight = np.concatenate(([0.0], np.cumsum(weight[lo_order])))
+            hi_weight = np.concatenate(([0.0], np.cumsum(weight[hi_order])))
+            cost = (lo_weight[np.searchsorted(lo[lo_order], cuts, side='left')]
+                    - hi_weight[np.searchsorted(hi[hi_order], cuts, side='left')])
+        pick = np.lexsort((deviation[candidates], cost))[0]
+        return float(cost[pick]), float(deviation[candidates][pick]), axis, float(cuts[pick])
+
+    def _snap(self, cut: float, axis: int, bbox) -> float:
+        """切线对齐到site/row(从partition区域的左下角起算)，对齐后落到区域外时保持原值"""
+        grid = self.grid[axis]
+        if grid <= 0:
+            return cut
+        origin = self._origin[axis]
+        snapped = origin + round((cut - origin) / grid) * grid
+        lo, hi = (bbox[0], bbox[2]) if axis == 0 else (bbox[1], bbox[3])
+        return snapped if lo < snapped < hi else cut
+
+
+def partition_design(design_index: DesignIndex, num_parts: int, **kwargs) -> PartitionResult:
+    """库调用入口，参数同Partitioner"""
+    return Partitioner(design_index, **kwargs).partition(num_parts)
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+'''
+摆放请求的预检查和局部合法化
+摆放请求里不合法的位置(越界、不在row/site上、互相重叠)原来要等Leapr执行完再place_legal才能发现，
+这里在发送前用缓存的DesignIndex做一遍向量化检查:
+1. 名字不在Design中的cell直接拒绝，同一批中重复出现的cell也视为错误
+2. 越出core边界的坐标截断到边界内
+3. y对齐到最近的row，x对齐到最近的site(提供site宽度时)
+4. 按row展开(多行高cell占多行)后按x排序，用分组前缀最大值做扫描线检测重叠，
+   缓存中不在本批的已摆放(placed/fixed/cover) cell作为障碍参与检测
+5. 可选的局部合法化: 每个row内按x顺序推开重叠的单行高cell(array_utils.pack_1d)，
+   多行高cell和障碍不移动，合法化后重新检测，剩余重叠仍然报告
+core范围为[core_x, core_x + core_width] x [core_y, core_y + core_height]，row和site从core左下角起算。
+'''
+import logging
+from typing import Optional
+
+import numpy as np
+
+from array_utils import grouped_cummax, grouped_cummin_reverse, pack_1d
+from bulk_place import PlacementBatch
+from design_index import STATUS_CODES, DesignIndex
+
+logger = logging.getLogger(__name__)
+
+# 逐cell诊断标志位
+FLAG_UNKNOWN = 1
+FLAG_DUPLICATE = 2
+FLAG_CLIPPED = 4
+FLAG_SNAPPED = 8
+FLAG_OVERLAP = 16
+FLAG_LEGALIZED = 32
+FLAG_ROW_OVERFLOW = 64
+FLAG_NAMES = {
+    FLAG_UNKNOWN: 'unknown_cell',
+    FLAG_DUPLICATE: 'duplicate',
+    FLAG_CLIPPED: 'clipped',
+    FLAG_SNAPPED: 'snapped',
+    FLAG_OVERLAP: 'overlap',
+    FLAG_LEGALIZED: 'legalized',
+    FLAG_ROW_OVERFLOW: 'row_overflow',
+}
+# 出现这些标志的批次不应发送给Leapr
+ERROR_FLAGS = FLAG_UNKNOWN | FLAG_DUPLICATE | FLAG_OVERLAP | FLAG_ROW_OVERFLOW
+# 坐标比较容差
+EPS = 1e-6
+# 参与重叠检测的缓存cell状态
+OBSTACLE_STATUSES = [STATUS_CODES['placed'], STATUS_CODES['fixed'], STATUS_CODES['cover']]
+
+
+def infer_row_height(design_index: DesignIndex) -> float:
+    """未配置row高度时，取Design中出现次数最多的cell高度(标准单元高度)"""
+    heights = design_index.height[design_index.height > 0]
+    if len(heights) == 0:
+        return 0.0
+    values, counts = np.unique(np.round(heights, 6), return_counts=True)
+    return float(values[np.argmax(counts)])
+
+
+def flag_names(flags: int) -> list:
+    return [name for bit, name in FLAG_NAMES.items() if flags & bit]
+
+
+class PlacementReport:
+    """
+    预检查结果
+    batch: 修正(截断/对齐/合法化)后的摆放批次，与输入一一对应
+    flags: 每个cell的诊断标志位
+    """
+    def __init__(self, batch: PlacementBatch, flags: np.ndarray, dx: np.ndarray, dy: np.ndarray):
+        self.batch = batch
+        self.flags = flags
+        self.dx = dx
+        self.dy = dy
+
+    @property
+    def ok(self) -> bool:
+        return not (self.flags & ERROR_FLAGS).any()
+
+    def accepted(self) -> PlacementBatch:
+        """去掉未知cell和重复cell后的批次"""
+        return self.batch.subset((self.flags & (FLAG_UNKNOWN | FLAG_DUPLICATE)) == 0)
+
+    def counts(self) -> dict:
+        return {name: int(np.count_nonzero(self.flags & bit)) for bit, name in FLAG_NAMES.items()}
+
+    def to_dict(self, limit: Optional[int] = None, with_positions=False) -> dict:
+        """
+        :param limit: 最多返回多少个有诊断的cell，错误优先
+        :param with_positions: 是否附带修正后位置有变化的cell的列式坐标
+        """
+        flagged = np.flatnonzero(self.flags)
+        is_error = (self.flags[flagged] & ERROR_FLAGS) != 0
+        flagged = flagged[np.argsort(~is_error, kind='stable')]
+        if limit is not None:
+            flagged = flagged[:limit]
+        result = {
+            'ok': self.ok,
+            'total': len(self.batch),
+            'counts': self.counts(),
+            'diagnostics': [{
+                'cell_name': self.batch.cell_names[i],
+                'issues': flag_names(int(self.flags[i])),
+                'x': float(self.batch.x[i]),
+                'y': float(self.batch.y[i]),
+                'dx': float(self.dx[i]),
+                'dy': float(self.dy[i]),
+            } for i in flagged],
+        }
+        if with_positions:
+            moved = np.flatnonzero((np.abs(self.dx) > EPS) | (np.abs(self.dy) > EPS))
+            result['positions'] = {
+                'cell_name': [self.batch.cell_names[i] for i in moved],
+                'x': self.batch.x[moved].tolist(),
+                'y': self.batch.y[moved].tolist(),
+            }
+        return result
+
+
+class PlacementChecker:
+    """
+    :param design_index: Design的列式视图
+    :param row_height: row高度，None时由infer_row_height推断
+    :param site_width: site宽度，None或0时x不做site对齐
+    """
+    def __init__(self, design_index: DesignIndex, row_height: Optional[float] = None,
+                 site_width: Optional[float] = None):
+        self.index = design_index
+        self.row_height = float(row_height) if row_height else infer_row_height(design_index)
+        self.site_width = float(site_width) if site_width else 0.0
+        self.num_rows = int(np.floor(design_index.core_height / self.row_height + EPS)) if self.row_height > 0 else 0
+
+    def check(self, batch: PlacementBatch, snap=True, legalize=False) -> PlacementReport:
+        index = self.index
+        count = len(batch)
+        ids = batch.resolve_ids(index)
+        flags = np.zeros(count, dtype=np.int32)
+        flags[ids < 0] |= FLAG_UNKNOWN
+        # 同一cell出现多次时只保留最后一次，其余标记为重复
+        known = np.flatnonzero(ids >= 0)
+        _, last = np.unique(ids[known][::-1], return_index=True)
+        keep = np.zeros(count, dtype=bool)
+        keep[known[len(known) - 1 - last]] = True
+        flags[(ids >= 0) & ~keep] |= FLAG_DUPLICATE
+
+        safe_ids = np.where(ids >= 0, ids, 0)
+        width = np.where(ids >= 0, index.width[safe_ids], 0.0)
+        height = np.where(ids >= 0, index.height[safe_ids], 0.0)
+        x0, y0 = batch.x.copy(), batch.y.copy()
+        core_x, core_y = index.core_x, index.core_y
+        x = np.clip(x0, core_x, core_x + np.maximum(index.core_width - width, 0.0))
+        y = np.clip(y0, core_y, core_y + np.maximum(index.core_height - height, 0.0))
+        flags[(np.abs(x - x0) > EPS) | (np.abs(y - y0) > EPS)] |= FLAG_CLIPPED
+
+        unplace = batch.status == STATUS_CODES['unplaced']
+        rows_spanned = np.ones(count, dtype=np.int64)
+        if self.row_height > 0:
+            rows_spanned = np.maximum(np.round(height / self.row_height).astype(np.int64), 1)
+        if snap:
+            before_x, before_y = x.copy(), y.copy()
+            if self.row_height > 0:
+                max_row = np.maximum(self.num_rows - rows_spanned, 0)
+                y = core_y + np.clip(np.round((y - core_y) / self.row_height), 0, max_row) * self.row_height
+            if self.site_width > 0:
+                max_site = np.floor((index.core_width - width) / self.site_width + EPS)
+                x = core_x + np.clip(np.round((x - core_x) / self.site_width), 0,
+                                     np.maximum(max_site, 0)) * self.site_width
+            flags[(np.abs(x - before_x) > EPS) | (np.abs(y - before_y) > EPS)] |= FLAG_SNAPPED
+
+        # 取消摆放的cell和未知cell不关心坐标
+        ignored = unplace | (ids < 0)
+        x, y = np.where(ignored, x0, x), np.where(ignored, y0, y)
+        flags[ignored] &= ~(FLAG_CLIPPED | FLAG_SNAPPED)
+        active = ((flags & (FLAG_UNKNOWN | FLAG_DUPLICATE)) == 0) & ~unplace
+        if legalize and self.row_height > 0:
+            x = self._legalize(x, y, width, rows_spanned, active, flags)
+        flags[self._overlaps(x, y, width, height, active, ids)] |= FLAG_OVERLAP
+
+        checked = PlacementBatch(batch.cell_names, x, y, batch.orient, batch.status, ids)
+        report = PlacementReport(checked, flags, x - x0, y - y0)
+        logger.info(f"placement check: {count} cells, {report.counts()}")
+        return report
+
+    def _row_of(self, y: np.ndarray) -> np.ndarray:
+        if self.row_height <= 0:
+            return np.zeros(len(y), dtype=np.int64)
+        return np.round((y - self.index.core_y) / self.row_height).astype(np.int64)
+
+    def _legalize(self, x, y, width, rows_spanned, active, flags) -> np.ndarray:
+        """每个row内推开本批单行高cell之间的重叠"""
+        movable = np.flatnonzero(active & (rows_spanned == 1))
+        if len(movable) == 0:
+            return x
+        rows = self._row_of(y[movable])
+        order = np.lexsort((x[movable], rows))
+        cells, rows = movable[order], rows[order]
+        # 在以core左下角为原点的坐标中打包
+        core_x = self.index.core_x
+        lower = 0.0
+        upper = self.index.core_width
+        size = width[cells]
+        if self.site_width > 0:
+            # 宽度和右边界都取整到site，打包结果自然落在site上
+            site = self.site_width
+            size = np.ceil(size / site - EPS) * site
+            upper = np.floor(upper / site + EPS) * site
+        packed = pack_1d(x[cells] - core_x, size, rows, lower, upper) + core_x
+        new_x = x.copy()
+        new_x[cells] = packed
+        flags[cells[np.abs(packed - x[cells]) > EPS]] |= FLAG_LEGALIZED
+        # 整行宽度放不下时压回后会越过左边界
+        flags[cells[packed < core_x + lower - EPS]] |= FLAG_ROW_OVERFLOW
+        return new_x
+
+    def _overlaps(self, x, y, width, height, active, ids) -> np.ndarray:
+        """按row扫描检测重叠，返回本批中存在重叠的cell掩码"""
+        index = self.index
+        batch_cells = np.flatnonzero(active)
+        # 缓存中不在本批的已摆放cell都是障碍，本批中的cell以新位置参与检测
+        obstacle = np.isin(index.status, OBSTACLE_STATUSES)
+        obstacle[ids[ids >= 0]] = False
+        obstacles = np.flatnonzero(obstacle)
+
+        all_x = np.concatenate((x[batch_cells], index.x[obstacles]))
+        all_y = np.concatenate((y[batch_cells], index.y[obstacles]))
+        all_w = np.concatenate((width[batch_cells], index.width[obstacles]))
+        all_h = np.concatenate((height[batch_cells], index.height[obstacles]))
+        owner = np.concatenate((batch_cells, np.full(len(obstacles), -1, dtype=np.int64)))
+        if self.row_height > 0:
+            rel_y = all_y - index.core_y
+            first_row = np.floor(rel_y / self.row_height + EPS).astype(np.int64)
+            spans = np.maximum(np.ceil((rel_y + all_h) / self.row_height - EPS).astype(np.int64) - first_row, 1)
+        else:
+            first_row = np.zeros(len(all_y), dtype=np.int64)
+            spans = np.ones(len(all_y), dtype=np.int64)
+        # 多行高cell展开到它占据的每个row
+        item = np.repeat(np.arange(len(all_x)), spans)
+        row = first_row[item] + (np.arange(len(item)) - np.repeat(np.cumsum(spans) - spans, spans))
+        order = np.lexsort((all_x[item], row))
+        item, row = item[order], row[order]
+        left = all_x[item]
+        right = left + all_w[item]
+
+        hit = np.zeros(len(item), dtype=bool)
+        if len(item) > 1:
+            same_prev = row[1:] == row[:-1]
+            # 左边: 本row前面cell的最大右边界超过自己的左边界
+            prev_right = grouped_cummax(right, row)
+            hit[1:] |= same_prev & (left[1:] < prev_right[:-1] - EPS)
+            # 右边: 本row后面cell的最小左边界小于自己的右边界
+            next_left = grouped_cummin_reverse(left, row)
+            hit[:-1] |= same_prev & (next_left[1:] < right[:-1] - EPS)
+
+        mask = np.zeros(len(x), dtype=bool)
+        cells = owner[item[hit]]
+        mask[cells[cells >= 0]] = True
+        return mask
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+'''
+摆放快照
+快照只保存DesignIndex中x/y/orient/status四个数组的拷贝(每个cell 18字节)，百万级cell也只有十几MB。
+回滚时与当前缓存比较，只把有差异的cell按快照中的值组成一批，通过place_batch一次发送。
+快照绑定创建它的DesignIndex，重新load_netlist后旧快照失效。
+PlacementLog记录每次写回缓存的cell id，客户端可以按ETag只取变化的cell(/design?since=)。
+'''
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Optional
+
+import numpy as np
+
+from bulk_place import PlacementBatch
+from design_index import DesignIndex, ORIENTS, PLACE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+
+class PlacementSnapshot:
+    def __init__(self, name: str, design_index: DesignIndex):
+        self.name = name
+        self.index = design_index
+        self.x = design_index.x.copy()
+        self.y = design_index.y.copy()
+        self.orient = design_index.orient.copy()
+        self.status = design_index.status.copy()
+        self.created = time.time()
+
+    def changed_cells(self, x, y, orient, status, tolerance: float) -> np.ndarray:
+        """与给定摆放相比有差异的cell id"""
+        changed = (np.abs(self.x - x) > tolerance) | (np.abs(self.y - y) > tolerance)
+        changed |= (self.orient != orient) | (self.status != status)
+        return np.flatnonzero(changed)
+
+    def to_batch(self, cell_ids: np.ndarray) -> PlacementBatch:
+        """按快照中的值构造回滚批次"""
+        return PlacementBatch([self.index.cell_names[i] for i in cell_ids],
+                              self.x[cell_ids], self.y[cell_ids],
+                              self.orient[cell_ids], self.status[cell_ids], cell_ids)
+
+    def info(self) -> dict:
+        return {'name': self.name, 'cells': len(self.x), 'created': self.created}
+
+
+class SnapshotStore:
+    """
+    按名字保存快照，超过max_snapshots时淘汰最早的
+    """
+    def __init__(self, max_snapshots=8):
+        self.max_snapshots = max(int(max_snapshots), 1)
+        self._snapshots: 'OrderedDict[str, PlacementSnapshot]' = OrderedDict()
+        self._counter = 0
+
+    def create(self, design_index: DesignIndex, name: Optional[str] = None) -> PlacementSnapshot:
+        if not name:
+            self._counter += 1
+            name = f'snap_{self._counter}'
+        self._snapshots.pop(name, None)
+        snapshot = PlacementSnapshot(name, design_index)
+        self._snapshots[name] = snapshot
+        while len(self._snapshots) > self.max_snapshots:
+            evicted, _ = self._snapshots.popitem(last=False)
+            logger.info(f"snapshot {evicted} evicted")
+        return snapshot
+
+    def get(self, name: Optional[str], design_index: DesignIndex) -> PlacementSnapshot:
+        """name为空时取最近的快照；快照不存在或属于旧Design时抛KeyError"""
+        if not name:
+            if not self._snapshots:
+                raise KeyError('no snapshot')
+            name = next(reversed(self._snapshots))
+        snapshot = self._snapshots.get(name)
+        if snapshot is None:
+            raise KeyError(f'snapshot {name} not found')
+        if snapshot.index is not design_index:
+            raise KeyError(f'snapshot {name} belongs to a previous netlist')
+        return snapshot
+
+    def delete(self, name: str) -> bool:
+        return self._snapshots.pop(name, None) is not None
+
+    def clear(self):
+        self._snapshots.clear()
+
+    def list(self) -> list:
+        return [snapshot.info() for snapshot in self._snapshots.values()]
+
+
+class PlacementLog:
+    """
+    缓存摆放的变化记录: 每次apply_placement后record一次，seq加1；重新load_netlist时reset，换一个epoch
+    ETag为"<epoch>-<seq>"，最多保留max_entries次、共max_cells个cell id，更早的ETag只能全量同步
+    调用者负责加锁(BaseEDA_Tool._cache_lock)
+    """
+    def __init__(self, max_entries=256, max_cells=16 << 20):
+        self.max_entries = max(int(max_entries), 1)
+        self.max_cells = max(int(max_cells), 1)
+        self.reset()
+
+    def reset(self):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seq = 0
+        # 可以增量同步的最早seq
+        self._base = 0
+        self._entries = deque()
+        self._cells = 0
+
+    @property
+    def etag(self) -> str:
+        return f'{self.epoch}-{self.seq}'
+
+    def record(self, cell_ids: np.ndarray):
+        self.seq += 1
+        cell_ids = np.asarray(cell_ids, dtype=np.int64).copy()
+        self._entries.append((self.seq, cell_ids))
+        self._cells += len(cell_ids)
+        while len(self._entries) > self.max_entries or (self._cells > self.max_cells and len(self._entries) > 1):
+            seq, dropped = self._entries.popleft()
+            self._base = seq
+            self._cells -= len(dropped)
+        if self._cells > self.max_cells:
+            # 单次变化就超过上限，不保留
+            self._entries.clear()
+            self._base = self.seq
+            self._cells = 0
+
+    def changes_since(self, etag: Optional[str]) -> Optional[np.ndarray]:
+        """etag之后变化过的cell id(升序去重)，etag不属于当前epoch或已超出保留范围时返回None"""
+        epoch, _, seq = (etag or '').strip().strip('"').rpartition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq < self._base or seq > self.seq:
+            return None
+        parts = [cell_ids for entry_seq, cell_ids in self._entries if entry_seq > seq]
+        return np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+
+def placement_diff(cell_names, cell_ids, before, after, limit: Optional[int] = None) -> dict:
+    """
+    两组摆放(x, y, orient, status)之间的差异，供/diff返回
+    :param before, after: (x, y, orient, status)数组元组
+    """
+    shown = cell_ids if limit is None else cell_ids[:limit]
+
+    def label(names, code):
+        return names[code] if 0 <= code < len(names) else ''
+
+    return {
+        'changed': len(cell_ids),
+        'cells': [{
+            'cell_name': cell_names[i],
+            'from': {'x': float(before[0][i]), 'y': float(before[1][i]),
+                     'orient': label(ORIENTS, before[2][i]), 'place_status': label(PLACE_STATUSES, before[3][i])},
+            'to': {'x': float(after[0][i]), 'y': float(after[1][i]),
+                   'orient': label(ORIENTS, after[2][i]), 'place_status': label(PLACE_STATUSES, after[3][i])},
+        } for i in shown],
+    }
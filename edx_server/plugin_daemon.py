@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+'''
+pyc_* 插件命令守护线程
+apicommon/pyc_placer.tcl中的pyc_*命令在EDX_TMP下写plugin_cmd.txt和plugin_cmd_done，
+然后阻塞在monitor_client_result_plugin中:
+- 期间仍会执行client_result_done/command.tcl，所以处理函数可以用TCLSender回调EDA
+- 出现plugin_msg_done时打印plugin_msg.txt并返回
+这里的守护线程:
+1. 用inotify监听EDX_TMP(通过ctypes调用libc，不可用时退化为短间隔轮询)，plugin_cmd_done一写完立即唤醒，
+   inotify模式下仍每隔rescan_interval检查一次，防止漏掉事件(例如EDA在另一台机器上通过NFS写文件)
+2. 命令名在handler注册表中查找，在线程池中执行，监听线程不被长时间的处理函数阻塞
+3. 处理结果先写临时文件再rename为plugin_msg.txt，最后创建plugin_msg_done，EDA不会读到写了一半的消息
+4. 处理函数在tcl_sender.plugin_channel中执行。pyc_*在owner行带回EDA当时正在执行的command.tcl的token，
+   它属于持有通道锁的请求时处理函数借用通道、不等锁(否则两边互相等待)，控制台直接调用等其他情况照常等锁
+'''
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import shlex
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Union
+
+import metrics
+from tcl_sender import plugin_channel
+
+logger = logging.getLogger(__name__)
+
+PLUGIN_CMD = 'plugin_cmd.txt'
+PLUGIN_CMD_DONE = 'plugin_cmd_done'
+PLUGIN_MSG = 'plugin_msg.txt'
+PLUGIN_MSG_DONE = 'plugin_msg_done'
+
+# inotify事件，定义见<sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+_EVENT_HEADER = struct.Struct('iIII')
+
+# 处理函数: 参数为命令后面的参数列表，返回要打印到EDA控制台的文本(字符串或行列表)
+PluginHandler = Callable[[List[str]], Union[str, List[str], None]]
+
+
+class DirectoryWatcher:
+    """
+    监听目录下文件的写入，wait()在有文件写完/移入或超时后返回
+    inotify不可用(非Linux)时wait()只是sleep(poll_interval)
+    """
+    def __init__(self, directory: str, poll_interval=0.02):
+        self.directory = directory
+        self.poll_interval = float(poll_interval)
+        self._fd = -1
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+            if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+            self._fd = fd
+        except (OSError, AttributeError) as e:
+            logger.info(f"inotify unavailable ({e}), polling {directory} every {self.poll_interval}s")
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._fd >= 0
+
+    def wait(self, timeout: float) -> List[str]:
+        """返回期间写完的文件名，轮询模式下返回空列表"""
+        if self._fd < 0:
+            time.sleep(min(timeout, self.poll_interval))
+            return []
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return []
+        names, offset = [], 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            names.append(data[offset:offset + length].rstrip(b'\0').decode(errors='replace'))
+            offset += length
+        return names
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def parse_plugin_command(text: str):
+    """plugin_cmd.txt内容 -> (命令名, 参数列表, owner token)"""
+    owner = ''
+    lines = []
+    for line in text.splitlines():
+        if line.startswith('owner '):
+            owner = line[len('owner '):].strip()
+        else:
+            lines.append(line)
+    text = '\n'.join(lines).strip()
+    try:
+        parts = shlex.split(text)
+    except ValueError:
+        parts = text.split()
+    if not parts:
+        return '', [], owner
+    return parts[0], parts[1:], owner
+
+
+class PluginDaemon:
+    """
+    :param directory: EDX_TMP目录
+    :param workers: 执行处理函数的线程数
+    :param rescan_interval: inotify模式下的兜底检查间隔(秒)
+    """
+    def __init__(self, directory: str, workers=2, rescan_interval=1.0, poll_interval=0.02):
+        self.directory = directory
+        self.rescan_interval = float(rescan_interval)
+        self.poll_interval = float(poll_interval)
+        self.handlers: Dict[str, PluginHandler] = {}
+        self._workers = max(int(workers), 1)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {'commands': 0, 'errors': 0, 'unknown': 0, 'last_command': None, 'last_latency': None}
+
+    def register(self, name: str, handler: Optional[PluginHandler] = None):
+        """注册处理函数，可作为装饰器使用: @daemon.register('pyc_reset')"""
+        if handler is None:
+            def decorator(func):
+                self.handlers[name] = func
+                return func
+            return decorator
+        self.handlers[name] = handler
+        return handler
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='pyc')
+        self._thread = threading.Thread(target=self._run, name='pyc-watcher', daemon=True)
+        self._thread.start()
+        logger.info(f"plugin daemon watching {self.directory}, handlers: {sorted(self.handlers)}")
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def _run(self):
+        watcher = DirectoryWatcher(self.directory, self.poll_interval)
+        timeout = self.rescan_interval if watcher.uses_inotify else self.poll_interval
+        # 第一轮检查启动前已经到达的命令
+        names = []
+        try:
+            while not self._stop.is_set():
+                try:
+                    if not watcher.uses_inotify or not names or PLUGIN_CMD_DONE in names:
+                        self._poll_command()
+                    names = watcher.wait(timeout)
+                except Exception as e:
+                    # 单次读写或解析失败不结束监听，否则之后的pyc_*都要等到超时
+                    logger.error(f"plugin daemon cycle failed: {e}")
+                    with self._lock:
+                        self.stats['errors'] += 1
+                    names = []
+                    self._stop.wait(timeout)
+        finally:
+            watcher.close()
+
+    def _poll_command(self):
+        """plugin_cmd_done存在时取走命令并交给线程池"""
+        done_path = os.path.join(self.directory, PLUGIN_CMD_DONE)
+        if not os.path.exists(done_path):
+            return
+        received = time.time()
+        cmd_path = os.path.join(self.directory, PLUGIN_CMD)
+        try:
+            with open(cmd_path, 'r') as f:
+                text = f.read()
+        except FileNotFoundError:
+            text = ''
+        os.remove(done_path)
+        name, args, owner = parse_plugin_command(text)
+        logger.info(f"plugin command received: {name} {' '.join(args)} (owner: {owner or '-'})")
+        self._pool.submit(self._execute, name, args, received, owner)
+
+    def _execute(self, name: str, args: List[str], received: float, owner: str = ''):
+        handler = self.handlers.get(name)
+        try:
+            if handler is None:
+                with self._lock:
+                    self.stats['unknown'] += 1
+                reply = f"ERROR: unsupported plugin command '{name}', supported: {sorted(self.handlers)}"
+            else:
+                with plugin_channel(owner), metrics.endpoint_context(f'plugin:{name}'):
+                    reply = handler(args)
+        except Exception as e:
+            logger.error(f"plugin command {name} failed: {e}")
+            with self._lock:
+                self.stats['errors'] += 1
+            reply = f"ERROR: {name} failed: {e}"
+        self.reply(reply)
+        latency = time.time() - received
+        metrics.PLUGIN_COMMAND_SECONDS.observe(latency, name if handler is not None else 'unknown')
+        with self._lock:
+            self.stats['commands'] += 1
+            self.stats['last_command'] = name
+            self.stats['last_latency'] = round(latency, 4)
+        logger.info(f"plugin command {name} replied in {latency:.3f}s")
+
+    def reply(self, message: Union[str, List[str], None]):
+        """写plugin_msg.txt(原子替换)和plugin_msg_done，EDA侧打印消息后结束等待"""
+        if message is None:
+            lines = []
+        elif isinstance(message, str):
+            lines = [message]
+        else:
+            lines = list(message)
+        msg_path = os.path.join(self.directory, PLUGIN_MSG)
+        tmp_path = msg_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.writelines(f'{line}\n' for line in lines)
+        os.replace(tmp_path, msg_path)
+        with open(os.path.join(self.directory, PLUGIN_MSG_DONE), 'w') as f:
+            f.write('done')
+
+    def info(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats['running'] = self._thread is not None and self._thread.is_alive()
+        stats['handlers'] = sorted(self.handlers)
+        return stats
@@ -116,6 +116,9 @@ class Design:
         self._name: str = ""
         self._core_width: float = 0.0
         self._core_height: float = 0.0
+        # core左下角坐标
+        self._core_x: float = 0.0
+        self._core_y: float = 0.0
         self._pin_to_cell: Dict[str, str] = {}
         self._nets: Dict[str, list[list[str]]] = {}
 
@@ -151,6 +154,22 @@ class Design:
     def core_height(self, core_height: float):
         self._core_height = core_height
 
+    @property
+    def core_x(self) -> float:
+        return self._core_x
+
+    @core_x.setter
+    def core_x(self, core_x: float):
+        self._core_x = core_x
+
+    @property
+    def core_y(self) -> float:
+        return self._core_y
+
+    @core_y.setter
+    def core_y(self, core_y: float):
+        self._core_y = core_y
+
     @property
     def pin_to_cell(self) -> Dict[str, str]:
         return self._pin_to_cell
@@ -174,6 +193,8 @@ class Design:
             'name': self._name,
             'core_width': self._core_width,
             'core_height': self._core_height,
+            'core_x': self._core_x,
+            'core_y': self._core_y,
             'pin_to_cell': self._pin_to_cell,
             'nets': self._nets
         }
@@ -288,6 +309,21 @@ class TimingPath:
         """将对象转换为JSON字符串"""
         return json.dumps(self.to_dict())
 
+    @classmethod
+    def from_dict(cls, data: dict):
+        """由to_dict格式的字典还原对象"""
+        timing_path = cls()
+        timing_path.start_point = data.get('start_point', '')
+        timing_path.end_point = data.get('end_point', '')
+        timing_path.scenario = data.get('scenario', '')
+        timing_path.path_group = data.get('path_group', '')
+        timing_path.path_type = data.get('path_type', '')
+        timing_path.path = [(point[0], float(point[1]), float(point[2])) for point in data.get('path', [])]
+        timing_path.data_required_time = float(data.get('data_required_time', 0.0))
+        timing_path.data_arrival_time = float(data.get('data_arrival_time', 0.0))
+        timing_path.slack = float(data.get('slack', 0.0))
+        return timing_path
+
 
 class STA:
     """
@@ -314,12 +350,19 @@ class STA:
         """将对象转换为JSON字符串"""
         return json.dumps(self.to_dict())
 
+    @classmethod
+    def from_dict(cls, data: dict):
+        """由to_dict格式的字典还原对象"""
+        sta = cls()
+        sta.timing_paths = [TimingPath.from_dict(tp) for tp in data.get('timing_paths', [])]
+        return sta
+
 
 class EdxResponse:
     """
     Response class for EdxPlugin
     """
-    def __init__(self, status: int, message: str, data: object):
+    def __init__(self, status: int, message: str, data: object = None):
         self.status = status
         self.message = message
         self.data = data
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+'''
+SubAPR边界端口规划
+布局切割后，每个被切断的net在它连接到的每个区域上都需要一个边界端口:
+1. 端口名取net名，方向由区域内是否有该net的驱动pin决定(有为output，否则input)，
+   与timing_stitch中port_map的默认约定一致
+2. 位置: 取该net在区域外的pin中心的平均位置，截断到区域边界框内，再投影到最近的一条边上，
+   即端口开在net离开区域的方向上
+3. 同一区域同一条边上的端口按边上坐标排序后用array_utils.pack_1d推开，间距为pitch，
+   端口太多放不下时该边的间距自动缩小
+所有(net, 区域)对一次向量化计算，几十万cut net也只需要排序级别的开销。
+Tcl命令由模板生成，模板可以在工具配置中用port_tcl_templates覆盖。
+'''
+import logging
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from array_utils import pack_1d
+from design_index import DesignIndex
+from partitioner import PartitionResult
+
+logger = logging.getLogger(__name__)
+
+SIDES = ['left', 'bottom', 'right', 'top']
+DIRECTIONS = ['input', 'output']
+# 每个端口生成的Tcl命令模板，可用字段: name direction x y side region
+DEFAULT_PORT_TCL_TEMPLATES = [
+    'create_port -name {{{name}}} -direction {direction}',
+    'place_port -name {{{name}}} -x {x} -y {y} -side {side}',
+]
+
+
+class PortPlan:
+    """
+    端口规划结果，每个端口一行:
+    net: net id, region: 区域id, x/y: 端口坐标, side: SIDES下标, direction: DIRECTIONS下标
+    """
+    def __init__(self, design_index: DesignIndex, partition: PartitionResult, net, region, x, y, side,
+                 direction, squeezed_edges: int):
+        self.index = design_index
+        self.partition = partition
+        self.net = net
+        self.region = region
+        self.x = x
+        self.y = y
+        self.side = side
+        self.direction = direction
+        self.squeezed_edges = squeezed_edges
+
+    def __len__(self):
+        return len(self.net)
+
+    def port_names(self, rows=None) -> List[str]:
+        nets = self.net if rows is None else self.net[rows]
+        return [self.index.net_names[i] for i in nets]
+
+    def region_rows(self, region: int) -> np.ndarray:
+        return np.flatnonzero(self.region == region)
+
+    def tcl(self, region: int, templates: Optional[List[str]] = None, relative=False) -> List[str]:
+        """
+        生成在某个SubAPR中创建端口的Tcl命令
+        :param relative: True时坐标相对区域左下角
+        """
+        templates = templates or DEFAULT_PORT_TCL_TEMPLATES
+        rows = self.region_rows(region)
+        x0, y0 = self.partition.regions[region].bbox[:2] if relative else (0.0, 0.0)
+        lines = []
+        for name, x, y, side, direction in zip(self.port_names(rows), self.x[rows] - x0, self.y[rows] - y0,
+                                               self.side[rows], self.direction[rows]):
+            fields = {'name': name, 'direction': DIRECTIONS[direction], 'x': round(float(x), 4),
+                      'y': round(float(y), 4), 'side': SIDES[side], 'region': region}
+            lines.extend(template.format(**fields) for template in templates)
+        return lines
+
+    def write_tcl(self, directory: str, templates: Optional[List[str]] = None, relative=False) -> Dict[int, str]:
+        """每个区域写一个 subapr_<id>_ports.tcl，返回 {区域id: 文件路径}"""
+        paths = {}
+        for region in range(self.partition.num_parts):
+            path = os.path.join(directory, f'subapr_{region}_ports.tcl')
+            with open(path, 'w') as f:
+                f.write('\n'.join(self.tcl(region, templates, relative)))
+                f.write('\n')
+            paths[region] = path
+        return paths
+
+    def summary(self) -> dict:
+        counts = np.bincount(self.region, minlength=self.partition.num_parts)
+        outputs = np.bincount(self.region, weights=self.direction, minlength=self.partition.num_parts)
+        return {
+            'ports': len(self),
+            'cut_nets': int(len(np.unique(self.net))),
+            'squeezed_edges': self.squeezed_edges,
+            'regions': [{'id': i, 'ports': int(counts[i]), 'outputs': int(outputs[i]),
+                         'inputs': int(counts[i] - outputs[i])} for i in range(self.partition.num_parts)],
+        }
+
+    def to_dict(self, limit: Optional[int] = None) -> dict:
+        result = self.summary()
+        rows = np.arange(len(self)) if limit is None else np.arange(min(limit, len(self)))
+        result['port_list'] = [{
+            'name': name, 'region': int(self.region[i]), 'x': float(self.x[i]), 'y': float(self.y[i]),
+            'side': SIDES[self.side[i]], 'direction': DIRECTIONS[self.direction[i]],
+        } for name, i in zip(self.port_names(rows), rows)]
+        return result
+
+    def to_arrays(self, with_names=False) -> dict:
+        arrays = {'net': self.net, 'region': self.region, 'x': self.x, 'y': self.y,
+                  'side': self.side, 'direction': self.direction}
+        if with_names:
+            arrays['names'] = self.port_names()
+        return arrays
+
+
+def plan_ports(design_index: DesignIndex, partition: PartitionResult, pitch=0.1) -> PortPlan:
+    """
+    为partition中的所有cut net规划边界端口
+    :param pitch: 同一条边上相邻端口的最小间距
+    """
+    assignment = partition.assignment
+    num_parts = partition.num_parts
+    is_cut = np.zeros(design_index.num_nets, dtype=bool)
+    is_cut[partition.cut_nets] = True
+
+    entry_cell = design_index.pin_cell[design_index.net_pins]
+    keep = (entry_cell >= 0) & is_cut[design_index.net_pin_net]
+    e_net = design_index.net_pin_net[keep].astype(np.int64)
+    e_cell = entry_cell[keep]
+    e_region = assignment[e_cell].astype(np.int64)
+    e_driver = design_index.net_pin_is_driver[keep]
+    cx, cy = design_index.cell_centers()
+    e_x, e_y = cx[e_cell], cy[e_cell]
+
+    # 每个net的pin坐标总和，减去区域内部分即得区域外的pin中心
+    net_count = np.bincount(e_net, minlength=design_index.num_nets)
+    net_sx = np.bincount(e_net, weights=e_x, minlength=design_index.num_nets)
+    net_sy = np.bincount(e_net, weights=e_y, minlength=design_index.num_nets)
+    pair_key, pair_inv = np.unique(e_net * num_parts + e_region, return_inverse=True)
+    pair_net, pair_region = pair_key // num_parts, pair_key % num_parts
+    in_count = np.bincount(pair_inv)
+    out_count = net_count[pair_net] - in_count
+    out_x = (net_sx[pair_net] - np.bincount(pair_inv, weights=e_x)) / out_count
+    out_y = (net_sy[pair_net] - np.bincount(pair_inv, weights=e_y)) / out_count
+    direction = (np.bincount(pair_inv, weights=e_driver) > 0).astype(np.int8)
+
+    # 截断到区域边界框，再投影到最近的边
+    bbox = partition.bboxes()[pair_region]
+    x = np.clip(out_x, bbox[:, 0], bbox[:, 2])
+    y = np.clip(out_y, bbox[:, 1], bbox[:, 3])
+    distance = np.stack((x - bbox[:, 0], y - bbox[:, 1], bbox[:, 2] - x, bbox[:, 3] - y), axis=1)
+    side = np.argmin(distance, axis=1).astype(np.int8)
+    x = np.where(side == 0, bbox[:, 0], np.where(side == 2, bbox[:, 2], x))
+    y = np.where(side == 1, bbox[:, 1], np.where(side == 3, bbox[:, 3], y))
+
+    # 同一条边上的端口沿边展开
+    horizontal = (side == 1) | (side == 3)
+    along = np.where(horizontal, x, y)
+    edge_lo = np.where(horizontal, bbox[:, 0], bbox[:, 1])
+    edge_hi = np.where(horizontal, bbox[:, 2], bbox[:, 3])
+    edge = pair_region * 4 + side
+    order = np.lexsort((along, edge))
+    edge_sorted = edge[order]
+    edge_count = np.bincount(edge_sorted, minlength=num_parts * 4)[edge_sorted]
+    edge_len = (edge_hi - edge_lo)[order]
+    step = np.minimum(float(pitch), edge_len / np.maximum(edge_count, 1))
+    squeezed = int(len(np.unique(edge_sorted[step < pitch])))
+    packed = pack_1d(along[order] - step / 2, step, edge_sorted, edge_lo[order], edge_hi[order]) + step / 2
+    along_new = np.empty_like(along)
+    along_new[order] = packed
+    x = np.where(horizontal, along_new, x)
+    y = np.where(horizontal, y, along_new)
+
+    plan = PortPlan(design_index, partition, pair_net, pair_region.astype(np.int32), x, y, side, direction,
+                    squeezed)
+    logger.info(f"planned {len(plan)} ports for {len(partition.cut_nets)} cut nets, "
+                f"{squeezed} edges with reduced pitch")
+    return plan
@@ -14,22 +14,15 @@ import threading
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from config import *
+import log_config
 
-def setup_logging(log_level=logging.INFO):
-    """设置日志记录"""
+def setup_logging(log_level=logging.INFO, log_levels=''):
+    """设置日志记录，文件和控制台输出在后台线程中完成，见log_config"""
     # 创建tmp目录
     tmp_dir = os.path.join(DEFAULT_CONFIG.get('edx_tmp'), 'logs')
     os.makedirs(tmp_dir, exist_ok=True)
     log_file_path = os.path.join(tmp_dir, 'server_startup.log')
-
-    logging.basicConfig(
-        level=log_level,
-        format='%(asctime)s %(levelname)s %(name)s [%(filename)s:%(lineno)d] %(message)s',
-        handlers=[
-            logging.FileHandler(log_file_path),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+    log_config.setup_logging(log_file_path, log_level, log_config.parse_levels(log_levels), stream=sys.stdout)
 
 def check_dependencies():
     """检查必要的依赖"""
@@ -53,18 +46,47 @@ def check_dependencies():
 
     return True
 
-def start_server(host='0.0.0.0', port=5000, debug=False):
-    """启动服务器"""
+def start_server(host='0.0.0.0', port=5000, debug=False, plugin_daemon=True, server='auto', threads=16,
+                 compute_workers=None, warmup=False, warmup_topn=10, record=None):
+    """
+    启动服务器
+    :param server: waitress | werkzeug | auto(安装了waitress时使用waitress)，两者都是多线程服务，
+                   与EDA交互的请求在EDA通道上串行，读缓存/纯计算的请求并发执行
+    :param threads: 处理请求的线程数
+    :param compute_workers: 计算类请求的并发上限(信号量，不另起线程)，默认CPU数
+    :param warmup: 监听器心跳出现后在后台读取网表和时序，第一次load_netlist/get_timing直接返回缓存
+    :param record: 录制文件路径，录制所有TCL往返和HTTP请求，供tcl_replay.py回放
+    """
     logger = logging.getLogger(__name__)
     logger.info(f"准备启动服务器 - 主机: {host}, 端口: {port}, 调试模式: {debug}")
 
     try:
-        from main import app
+        from main import app, start_plugin_daemon, configure_workers, start_warmup
         logger.info("Flask应用加载成功")
-
+        configure_workers(compute_workers)
+        if record:
+            import tcl_recorder
+            tcl_recorder.start_recording(record)
+        if plugin_daemon:
+            # 响应pyc_placer.tcl中的pyc_*命令
+            start_plugin_daemon()
+        if warmup:
+            start_warmup(topn=warmup_topn)
+
+        if server == 'auto':
+            try:
+                import waitress  # noqa: F401
+                server = 'werkzeug' if debug else 'waitress'
+            except ImportError:
+                server = 'werkzeug'
         # 启动服务器
-        logger.info(f"正在启动服务器，地址: {host}:{port}")
-        app.run(host=host, port=port, debug=debug)
+        logger.info(f"正在启动服务器，地址: {host}:{port}，服务: {server}，线程数: {threads}")
+        if server == 'waitress':
+            from waitress import serve
+            serve(app, host=host, port=port, threads=threads)
+        else:
+            # 在非主线程中运行，不能使用reloader
+            app.run(host=host, port=port, debug=debug, threaded=True, use_reloader=False)
 
     except Exception as e:
         logger.error(f"启动服务器时出错: {e}")
@@ -81,12 +103,24 @@ def main():
     parser.add_argument('--debug', action='store_true', help='启用调试模式')
     parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
                        help='日志级别 (默认: INFO)')
+    parser.add_argument('--log-levels', default='',
+                        help='各子系统的日志级别，如 tcl_sender=DEBUG,plugin_daemon=WARNING (也可用环境变量EDX_LOG_LEVELS)')
+    parser.add_argument('--no-plugin-daemon', action='store_true', help='不启动pyc_*插件命令守护线程')
+    parser.add_argument('--server', default='auto', choices=['auto', 'waitress', 'werkzeug'],
+                        help='HTTP服务 (默认: auto，安装了waitress时使用waitress)')
+    parser.add_argument('--threads', type=int, default=16, help='处理请求的线程数 (默认: 16，waitress有效)')
+    parser.add_argument('--compute-workers', type=int, default=None,
+                        help='计算类请求的并发上限，在请求线程中执行、超出时排队，不是独立的线程池 (默认: CPU数)')
+    parser.add_argument('--warmup', action='store_true', help='启动后在后台预先读取网表和时序')
+    parser.add_argument('--warmup-topn', type=int, default=10, help='预热时读取的时序路径数 (默认: 10)')
+    parser.add_argument('--record', default=os.environ.get('EDX_RECORD') or None,
+                        help='录制TCL往返和HTTP请求到该文件，供tcl_replay.py回放 (也可用环境变量EDX_RECORD)')
 
     args = parser.parse_args()
 
     # 设置日志
     log_level = getattr(logging, args.log_level.upper())
-    setup_logging(log_level)
+    setup_logging(log_level, args.log_levels)
     logger = logging.getLogger(__name__)
 
     logger.info("=" * 50)
@@ -104,7 +138,10 @@ def main():
     # 启动服务器
     logger.info("开始启动服务器...")
     # 使用县城运行start_server
-    flask_thread = threading.Thread(target=start_server, args=(args.host, args.port, args.debug), daemon=True)
+    flask_thread = threading.Thread(target=start_server,
+                                    args=(args.host, args.port, args.debug, not args.no_plugin_daemon,
+                                          args.server, args.threads, args.compute_workers,
+                                          args.warmup, args.warmup_topn, args.record), daemon=True)
     flask_thread.start()
     logger.info("服务器启动完成...")
     # edx_tmp目录下如果有command_reader_stop文件，则进程退出
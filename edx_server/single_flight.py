@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+'''
+相同请求合并执行(single flight)
+多个agent同时启动时会同时请求load_netlist、get_timing等，每个请求都在EDA中完整执行一遍，
+而且在EDA通道锁上排队，后面的请求要等前面全部执行完。
+这里对key相同的并发调用只执行一次: 第一个调用者执行，执行期间到达的相同调用等待并共享结果(或异常)，
+执行结束后key即移除，之后的调用重新执行
+'''
+import threading
+from typing import Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.shared = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, func: Callable) -> Tuple[object, bool]:
+        """
+        执行func()或等待正在执行的相同调用
+        :return: (结果, 是否共享了其他调用的结果)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> list:
+        with self._lock:
+            return list(self._calls)
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+'''
+TCL往返的录制，用于离线复现线上会话的性能问题(回放见tcl_replay.py)
+1. 每次TCLSender往返记录: 命令、各阶段耗时、EDA执行状态、design版本，以及EDA在EDX_TMP下写出或改动的文件
+   (server_result.txt、report_timing重定向的报告、download_file的产物等)；每个HTTP请求记录方法、路径、请求体、耗时
+2. 录制文件是一个gzip流，由若干帧组成: 一行JSON头，type为blob时其后紧跟size字节的内容
+       {"type": "meta", ...}
+       {"type": "blob", "sha256": ..., "size": N} + N字节    -- 内容相同的文件/请求体只保存一次
+       {"type": "tcl", ...} / {"type": "http", ...}
+   每条tcl/http记录后flush(Z_SYNC_FLUSH)，进程异常退出时已写的记录仍可读取
+3. 默认关闭，run_server.py --record <文件> 或环境变量EDX_RECORD开启；录制在请求线程中同步写，会增加往返耗时
+'''
+import atexit
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+# 握手文件不作为EDA的输出记录
+HANDSHAKE_FILES = {'command.tcl', 'client_result_done', 'server_result_done', 'server_status.txt',
+                   'listener_heartbeat', 'command_reader_stop', 'command_owner'}
+# 单个输出文件/请求体超过该大小时只记录大小和sha256，不保存内容
+DEFAULT_MAX_PAYLOAD = 1 << 30
+
+_recorder = None
+# main设置，返回各工具当前的design版本
+design_version_provider: Optional[Callable[[], dict]] = None
+
+
+def _file_state(entry: os.DirEntry):
+    stat = entry.stat()
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def snapshot_dir(directory: str) -> Dict[str, tuple]:
+    """EDX_TMP顶层文件的(mtime, size, inode)，往返后与之比较找出EDA写过的文件"""
+    states = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False) and entry.name not in HANDSHAKE_FILES:
+                    states[entry.name] = _file_state(entry)
+    except FileNotFoundError:
+        pass
+    return states
+
+
+class TclRecorder:
+    """
+    :param path: 录制文件
+    :param compress_level: gzip压缩级别，默认1，大网表也能较快写完
+    :param max_payload: 单个文件内容的大小上限
+    """
+    def __init__(self, path: str, compress_level=1, max_payload=DEFAULT_MAX_PAYLOAD):
+        self.path = path
+        self.max_payload = int(max_payload)
+        self._lock = threading.Lock()
+        self._blobs = set()
+        self._seq = 0
+        self._started = time.time()
+        self.records = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = gzip.open(path, 'wb', compresslevel=compress_level)
+        self._write({'type': 'meta', 'version': FORMAT_VERSION, 'started': self._started, 'pid': os.getpid()})
+
+    def _write(self, header: dict, payload: bytes = b''):
+        self._file.write(json.dumps(header, separators=(',', ':')).encode() + b'\n')
+        if payload:
+            self._file.write(payload)
+
+    def _blob_from_file(self, path: str) -> Optional[dict]:
+        """保存文件内容(已保存过相同内容时只返回引用)，调用者持有锁"""
+        size = os.path.getsize(path)
+        if size > self.max_payload:
+            return {'size': size, 'sha256': None}
+        with open(path, 'rb') as f:
+            return self._blob(f.read())
+
+    def _blob(self, data: bytes) -> dict:
+        sha256 = hashlib.sha256(data).hexdigest()
+        if sha256 not in self._blobs:
+            self._write({'type': 'blob', 'sha256': sha256, 'size': len(data)}, data)
+            self._blobs.add(sha256)
+        return {'size': len(data), 'sha256': sha256}
+
+    def _offset(self) -> float:
+        return round(time.time() - self._started, 6)
+
+    def record_tcl(self, commands, return_result: bool, edx_tmp: str, before: Dict[str, tuple], status,
+                   timings: dict, endpoint: str):
+        """
+        在TCLSender读取结果之前调用，before为写command.tcl之前的snapshot_dir
+        :param status: EdaExecStatus或None
+        :param timings: 各阶段耗时，如 {"write": .., "wait": ..}
+        """
+        after = snapshot_dir(edx_tmp)
+        changed = sorted(name for name, state in after.items() if before.get(name) != state)
+        versions = design_version_provider() if design_version_provider else {}
+        with self._lock:
+            outputs = {}
+            for name in changed:
+                try:
+                    outputs[name] = self._blob_from_file(os.path.join(edx_tmp, name))
+                except FileNotFoundError:
+                    continue
+            self._seq += 1
+            self._write({
+                'type': 'tcl', 'seq': self._seq, 'offset': self._offset(), 'thread': threading.current_thread().name,
+                'endpoint': endpoint, 'design_version': versions,
+                'commands': [line.rstrip('\n') for line in commands], 'return_result': return_result,
+                'timings': timings, 'status': status.to_dict() if status is not None else None,
+                'outputs': outputs,
+            })
+            self._file.flush()
+            self.records += 1
+
+    def record_http(self, method: str, path: str, content_type: Optional[str], body: bytes, body_complete: bool,
+                    status_code: int, seconds: float, endpoint: str):
+        with self._lock:
+            self._seq += 1
+            self._write({
+                'type': 'http', 'seq': self._seq, 'offset': round(self._offset() - seconds, 6),
+                'thread': threading.current_thread().name, 'endpoint': endpoint, 'method': method, 'path': path,
+                'content_type': content_type, 'body': self._blob(body) if body else None,
+                'body_complete': body_complete, 'status': status_code, 'seconds': round(seconds, 6),
+            })
+            self._file.flush()
+            self.records += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def start_recording(path: str, **kwargs) -> TclRecorder:
+    global _recorder
+    stop_recording()
+    _recorder = TclRecorder(path, **kwargs)
+    logger.info(f"recording TCL transactions to {path}")
+    return _recorder
+
+
+def stop_recording():
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.close()
+        logger.info(f"TCL recording stopped: {recorder.records} records in {recorder.path}")
+
+
+atexit.register(stop_recording)
+
+
+def active_recorder() -> Optional[TclRecorder]:
+    return _recorder
+
+
+def read_recording(path: str, blob_dir: Optional[str] = None) -> Iterator[dict]:
+    """
+    依次返回meta/tcl/http记录；blob内容写到blob_dir/<sha256>(已存在时跳过)，不提供blob_dir时丢弃
+    文件末尾不完整(录制进程异常退出)时读到最后一条完整记录为止
+    """
+    if blob_dir:
+        os.makedirs(blob_dir, exist_ok=True)
+    with gzip.open(path, 'rb') as f:
+        while True:
+            try:
+                line = f.readline()
+            except EOFError:
+                return
+            if not line:
+                return
+            try:
+                header = json.loads(line)
+            except ValueError:
+                logger.warning(f"truncated record in {path}")
+                return
+            if header['type'] != 'blob':
+                yield header
+                continue
+            target = os.path.join(blob_dir, header['sha256']) if blob_dir else None
+            remaining = header['size']
+            out = open(target + '.tmp', 'wb') if target and not os.path.exists(target) else None
+            try:
+                while remaining > 0:
+                    block = f.read(min(remaining, 1 << 20))
+                    if not block:
+                        return
+                    if out:
+                        out.write(block)
+                    remaining -= len(block)
+            except EOFError:
+                return
+            finally:
+                if out:
+                    out.close()
+                    if remaining == 0:
+                        os.replace(target + '.tmp', target)
+                    else:
+                        os.remove(target + '.tmp')
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+'''
+回放tcl_recorder.py录制的会话
+1. ReplayLeapr: 模拟EDA，按录制的顺序响应command.tcl: 命令文本相同的事务优先，否则取下一条未使用的事务
+   (摆放的名表token等每次不同)；按录制的EDA执行时间(可用--speed缩放)等待后写回录制的输出文件和错误
+2. replay_http: 把录制的HTTP请求重新发给服务，original按录制时的到达时间和并发回放，fast按顺序逐个发送；
+   文件流式上传等请求体没有完整录制的请求跳过
+3. 结果按接口比较录制与回放的延迟，可用 --profile 对fast模式下的服务端代码做cProfile
+    python tcl_replay.py run session.edxrec --pace fast --profile replay.prof
+    python tcl_replay.py eda session.edxrec      # 只启动模拟EDA，配合单独启动的run_server.py
+'''
+import argparse
+import cProfile
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import DEFAULT_CONFIG
+from fake_leapr import FakeCommandError, FakeLeapr
+from tcl_recorder import read_recording
+
+logger = logging.getLogger(__name__)
+
+
+def _command_key(lines) -> str:
+    text = '\n'.join(line.rstrip('\n') for line in lines).strip()
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class RecordedSession:
+    """录制文件中的记录，blob内容解压到blob_dir"""
+    def __init__(self, path: str, blob_dir: str):
+        self.path = path
+        self.blob_dir = blob_dir
+        self.meta = {}
+        self.tcl: List[dict] = []
+        self.http: List[dict] = []
+        for record in read_recording(path, blob_dir):
+            if record['type'] == 'meta':
+                self.meta = record
+            elif record['type'] == 'tcl':
+                self.tcl.append(record)
+            elif record['type'] == 'http':
+                self.http.append(record)
+        logger.info(f"loaded {path}: {len(self.tcl)} TCL transactions, {len(self.http)} HTTP requests")
+
+    def blob_path(self, ref: Optional[dict]) -> Optional[str]:
+        if not ref or not ref.get('sha256'):
+            return None
+        return os.path.join(self.blob_dir, ref['sha256'])
+
+
+class ReplayLeapr(FakeLeapr):
+    """
+    :param speed: 录制的EDA执行时间除以speed，2表示EDA快一倍，0表示不等待
+    """
+    def __init__(self, edx_tmp: str, session: RecordedSession, poll_interval=0.1, speed=1.0):
+        super().__init__(edx_tmp, None, poll_interval)
+        self.session = session
+        self.speed = speed
+        self._pending = list(session.tcl)
+        self._keys = [_command_key(record['commands']) for record in self._pending]
+        self.matched = 0
+        self.unmatched = 0
+
+    def _take(self, script: str) -> dict:
+        if not self._pending:
+            raise FakeCommandError('no recorded TCL transaction left to replay')
+        key = _command_key(script.splitlines())
+        try:
+            index = self._keys.index(key)
+            self.matched += 1
+        except ValueError:
+            index = 0
+            self.unmatched += 1
+        self._keys.pop(index)
+        return self._pending.pop(index)
+
+    def execute(self, script: str):
+        start = time.perf_counter()
+        record = self._take(script)
+        for name, ref in record['outputs'].items():
+            source = self.session.blob_path(ref)
+            if source is None:
+                logger.warning(f"output {name} of transaction {record['seq']} was not recorded "
+                               f"({ref.get('size')} bytes), skipped")
+                continue
+            shutil.copyfile(source, self._path(name))
+        status = record.get('status') or {}
+        exec_seconds = status.get('exec_seconds') or 0.0
+        if self.speed > 0:
+            remaining = exec_seconds / self.speed - (time.perf_counter() - start)
+            if remaining > 0:
+                time.sleep(remaining)
+        if status and not status.get('ok', True):
+            raise FakeCommandError(status.get('error') or 'recorded EDA error')
+
+
+def replay_http(session: RecordedSession, client, pace='original', speed=1.0, threads=16,
+                skip_endpoints=('metrics_endpoint', 'healthz', 'readyz')) -> dict:
+    """
+    :param pace: original按录制的到达时间(除以speed)在线程池中并发发送，fast按录制顺序逐个发送
+    :return: {"requests": 回放数, "skipped": 跳过数, "endpoints": {接口: 延迟比较}}
+    """
+    requests = [record for record in session.http if record['endpoint'] not in skip_endpoints]
+    playable = [record for record in requests if record['body_complete']]
+    results = []
+    lock = threading.Lock()
+
+    def send(record):
+        body = None
+        if record['body']:
+            with open(session.blob_path(record['body']), 'rb') as f:
+                body = f.read()
+        start = time.perf_counter()
+        status, _, _ = client.request(record['method'], record['path'], body, record['content_type'])
+        with lock:
+            results.append((record, status, time.perf_counter() - start))
+
+    wall_start = time.perf_counter()
+    if pace == 'fast':
+        for record in playable:
+            send(record)
+    else:
+        base = playable[0]['offset'] if playable else 0.0
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for record in playable:
+                delay = (record['offset'] - base) / speed - (time.perf_counter() - wall_start) if speed > 0 else 0
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(send, record)
+    wall = time.perf_counter() - wall_start
+
+    endpoints: Dict[str, dict] = {}
+    for record, status, seconds in results:
+        item = endpoints.setdefault(record['endpoint'], {'recorded': [], 'replayed': [], 'status_mismatch': 0})
+        item['recorded'].append(record['seconds'])
+        item['replayed'].append(seconds)
+        item['status_mismatch'] += int(status != record['status'])
+    summary = {}
+    for name, item in endpoints.items():
+        recorded, replayed = np.array(item['recorded']), np.array(item['replayed'])
+        summary[name] = {
+            'count': len(replayed),
+            'recorded_p50': float(np.percentile(recorded, 50)),
+            'replayed_p50': float(np.percentile(replayed, 50)),
+            'recorded_total': float(recorded.sum()),
+            'replayed_total': float(replayed.sum()),
+            'status_mismatch': item['status_mismatch'],
+        }
+    return {'requests': len(results), 'skipped': len(requests) - len(playable), 'wall_seconds': wall,
+            'endpoints': summary}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回放录制的TCL往返和HTTP请求')
+    parser.add_argument('mode', choices=['run', 'eda'], help='run: 模拟EDA并回放HTTP请求; eda: 只启动模拟EDA')
+    parser.add_argument('recording', help='tcl_recorder录制的文件')
+    parser.add_argument('--edx-tmp', default=None, help='握手目录，默认按EDX_TMP_BASE/EDX_INSTANCE_ID')
+    parser.add_argument('--url', default=None, help='回放到已启动的服务，默认在进程内访问main.app')
+    parser.add_argument('--pace', default='original', choices=['original', 'fast'],
+                        help='original: 按录制的到达时间和并发; fast: 顺序逐个发送')
+    parser.add_argument('--speed', type=float, default=1.0, help='时间缩放: 请求间隔和EDA执行时间都除以该值')
+    parser.add_argument('--poll-interval', type=float, default=0.1, help='模拟EDA的轮询间隔，默认0.1')
+    parser.add_argument('--threads', type=int, default=16, help='original模式的并发线程数')
+    parser.add_argument('--profile', default=None, help='fast模式下把服务端的cProfile结果写到该文件')
+    parser.add_argument('--output', default=None, help='结果JSON文件，默认输出到标准输出')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+    if args.edx_tmp:
+        os.makedirs(args.edx_tmp, exist_ok=True)
+        DEFAULT_CONFIG['edx_tmp'] = args.edx_tmp
+    edx_tmp = DEFAULT_CONFIG.get('edx_tmp')
+    blob_dir = os.path.join(edx_tmp, 'replay_blobs')
+
+    if args.mode == 'eda':
+        session = RecordedSession(args.recording, blob_dir)
+        replay = ReplayLeapr(edx_tmp, session, args.poll_interval, args.speed)
+        replay.serve_forever()
+        logger.info(f"replay EDA stopped: {replay.matched} matched, {replay.unmatched} taken in order, "
+                    f"{len(replay._pending)} left")
+        return
+
+    from bench_endpoints import HttpClient, LocalClient, start_listener_process, stop_listener_process
+    session = RecordedSession(args.recording, blob_dir)
+    process = start_listener_process(edx_tmp, 'tcl_replay.py',
+                                     ['eda', args.recording, '--poll-interval', str(args.poll_interval),
+                                      '--speed', str(args.speed)])
+    try:
+        client = HttpClient(args.url) if args.url else LocalClient()
+        profiler = cProfile.Profile() if args.profile and args.pace == 'fast' and not args.url else None
+        if profiler:
+            profiler.enable()
+        result = replay_http(session, client, args.pace, args.speed, args.threads)
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+    finally:
+        stop_listener_process(process, edx_tmp)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    sys.exit(1 if any(item['status_mismatch'] for item in result['endpoints'].values()) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,26 +6,168 @@ import time
 import os
 import logging
 import gzip
+import itertools
 import shutil
+import threading
+from contextlib import contextmanager
 
 from config import DEFAULT_CONFIG
+import metrics
+import tcl_recorder
+from log_config import LogSampler, summarize
 
-# 配置日志
+# 日志由log_config统一配置，级别可用EDX_LOG_LEVELS="tcl_sender=DEBUG"单独调整
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-# 如果没有处理器，添加一个控制台处理器
-if not logger.handlers:
-    ch = logging.StreamHandler()
-    ch.setLevel(logging.DEBUG)
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s')
-    ch.setFormatter(formatter)
-    logger.addHandler(ch)
+# 每次往返的摘要日志每秒最多一条
+_round_trip_sampler = LogSampler(1.0)
+
+
+# EDX_TMP下的握手文件只有一套，同一时刻只能有一个线程与EDA交互
+eda_channel_lock = threading.Lock()
+_plugin_state = threading.local()
+# 每条command.tcl的owner token写在该文件中，EDA执行期间调用pyc_*时原样带回(见edx_execute.tcl)
+OWNER_FILE = 'command_owner'
+_owner_tokens = itertools.count(1)
+
+
+class _ChannelState:
+    """
+    owner: 持有通道锁的线程正在等待的command.tcl的token
+    lent: 借用通道的pyc_*处理函数数量，大于0时持有者不检查server_result_done
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.owner = None
+        self.lent = 0
+
+
+_channel = _ChannelState()
+
+
+HEARTBEAT_FILE = 'listener_heartbeat'
+# apicommon/edx_execute.tcl写的执行状态
+SERVER_STATUS_FILE = 'server_status.txt'
+# 等待server_result_done的轮询间隔(秒): 从最小值开始逐步加倍，短命令不必多等，长命令不频繁访问文件系统
+WAIT_POLL_MIN = 0.005
+WAIT_POLL_MAX = 0.1
+_exec_state = threading.local()
+
+
+class EdaExecStatus:
+    """
+    EDA侧执行一次command.tcl的情况，时间为EDA侧的clock microseconds
+    detected: 监听器发现client_result_done的时间
+    start/end: source command.tcl的开始/结束时间
+    """
+    def __init__(self, detected=0, start=0, end=0, ok=True, error='', error_info=''):
+        self.detected = detected
+        self.start = start
+        self.end = end
+        self.ok = ok
+        self.error = error
+        self.error_info = error_info
+
+    @property
+    def exec_seconds(self):
+        if self.start <= 0 or self.end < self.start:
+            return None
+        return (self.end - self.start) / 1e6
+
+    def to_dict(self) -> dict:
+        return {'ok': self.ok, 'error': self.error, 'error_info': self.error_info,
+                'detected': self.detected, 'start': self.start, 'end': self.end,
+                'exec_seconds': self.exec_seconds}
+
+
+def read_exec_status(path: str):
+    """解析server_status.txt，文件不存在时(旧版本的监听器)返回None"""
+    try:
+        with open(path, 'r', errors='replace') as f:
+            lines = f.read().split('\n')
+    except FileNotFoundError:
+        return None
+    values = {}
+    for index, line in enumerate(lines):
+        if line == 'error_info':
+            values['error_info'] = '\n'.join(lines[index + 1:]).rstrip('\n')
+            break
+        key, _, value = line.partition(' ')
+        if key:
+            values[key] = value
+    try:
+        return EdaExecStatus(int(values.get('detected') or 0), int(values.get('start') or 0),
+                             int(values.get('end') or 0), values.get('ok', '1') == '1',
+                             values.get('error', ''), values.get('error_info', ''))
+    except ValueError:
+        logger.warning(f"malformed {path}: {values}")
+        return None
+
+
+def last_exec_status():
+    """当前线程最近一次send_tcl的EDA执行状态"""
+    return getattr(_exec_state, 'last', None)
+
+
+def listener_status(max_age=5.0) -> dict:
+    """
+    EDA侧监听器状态: eda_command_listener.tcl每秒更新一次心跳文件
+    EDA执行长命令期间心跳会停，此时通道锁被占用(busy)，不算监听器失联
+    """
+    path = os.path.join(DEFAULT_CONFIG.get("edx_tmp"), HEARTBEAT_FILE)
+    try:
+        age = max(time.time() - os.path.getmtime(path), 0.0)
+    except OSError:
+        age = None
+    return {
+        'alive': age is not None and age <= max_age,
+        'heartbeat_age': None if age is None else round(age, 3),
+        'busy': eda_channel_lock.locked(),
+    }
+
+
+@contextmanager
+def plugin_channel(owner: str = ''):
+    """
+    pyc_*处理函数的EDA通道
+    owner为调用pyc_*时EDA正在执行的command.tcl的token，控制台直接执行时为空。
+    它正是持有通道锁的线程在等待的命令时，持有者在pyc_*返回前不会完成，处理函数借用通道(不等锁，否则两边互相等待)，
+    借用期间持有者暂停检查server_result_done，以免取走处理函数往返的结果；
+    其他情况下锁可能被任意请求线程持有，处理函数与普通请求一样等锁
+    :return: 是否借用了通道
+    """
+    with _channel.lock:
+        borrowed = bool(owner) and owner == _channel.owner
+        if borrowed:
+            _channel.lent += 1
+    _plugin_state.active = borrowed
+    try:
+        yield borrowed
+    finally:
+        _plugin_state.active = False
+        if borrowed:
+            with _channel.lock:
+                _channel.lent -= 1
 
 
 class TCLSender:
+    # 最近一次send_tcl的EDA执行状态(EdaExecStatus)，监听器没有写状态时为None
+    last_status = None
 
-    # 输入是tcl命令列表，将命令列表写到command.tcl文件里
     def send_tcl(self, tcl_command_list, return_result=True) -> list[str]:
+        """发送tcl命令并等待结果，多个线程的调用在通道锁上串行执行，借用通道的pyc_*处理函数除外"""
+        if getattr(_plugin_state, 'active', False):
+            return self._send_tcl(tcl_command_list, return_result, borrowed=True)
+        metrics.TCL_QUEUE_DEPTH.inc()
+        try:
+            queued = time.perf_counter()
+            with eda_channel_lock:
+                metrics.observe_phase('tcl_queue', time.perf_counter() - queued)
+                return self._send_tcl(tcl_command_list, return_result)
+        finally:
+            metrics.TCL_QUEUE_DEPTH.dec()
+
+    # 输入是tcl命令列表，将命令列表写到command.tcl文件里
+    def _send_tcl(self, tcl_command_list, return_result=True, borrowed=False) -> list[str]:
         # 如果是windows环境，直接返回edx_tmp目录下的server_result.txt文件--用于本地调试
         if tcl_command_list is None:
             logger.info("not send any command...")
@@ -40,44 +182,84 @@ class TCLSender:
                 logger.warning(f"Server result file does not exist: {server_result_path}, returning empty list")
                 return []
         # 1. 写命令
+        endpoint = metrics.current_endpoint()
+        metrics.TCL_ROUND_TRIPS.inc(1, endpoint)
+        phase_start = time.perf_counter()
+        # 录制时先记下EDX_TMP中的文件状态，往返后据此找出EDA写出的文件
+        recorder = tcl_recorder.active_recorder()
+        files_before = tcl_recorder.snapshot_dir(DEFAULT_CONFIG.get("edx_tmp")) if recorder is not None else None
         command_tcl_path = os.path.join(DEFAULT_CONFIG.get("edx_tmp"), "command.tcl")
-        logger.info(f"Writing TCL commands to {command_tcl_path}")
+        logger.debug(f"Writing TCL commands to {command_tcl_path}")
         with open(command_tcl_path, "w") as f:
             f.writelines([line + '\n' for line in tcl_command_list])
+            metrics.TCL_PAYLOAD_BYTES.observe(f.tell(), endpoint, 'command')
         # 如果server_result_done存在，则删除server_result_done文件
         server_result_done_path = os.path.join(DEFAULT_CONFIG.get("edx_tmp"), "server_result_done")
         if os.path.exists(server_result_done_path):
             logger.debug("Deleting existing server_result_done file")
             os.remove(server_result_done_path)
+        server_status_path = os.path.join(DEFAULT_CONFIG.get("edx_tmp"), SERVER_STATUS_FILE)
+        if os.path.exists(server_status_path):
+            os.remove(server_status_path)
+        owner = f'{os.getpid()}-{next(_owner_tokens)}'
+        with open(os.path.join(DEFAULT_CONFIG.get("edx_tmp"), OWNER_FILE), "w") as owner_file:
+            owner_file.write(owner)
+        if not borrowed:
+            _channel.owner = owner
         # 2. 创建client_result_done文件 --告诉EDA工具命令发送完成
-        logger.info("Creating client_result_done file to signal command transmission complete")
-        client_file = open(os.path.join(DEFAULT_CONFIG.get("edx_tmp"), "client_result_done"), "w")
-        client_file.write('done')
+        logger.debug("Creating client_result_done file to signal command transmission complete")
+        with open(os.path.join(DEFAULT_CONFIG.get("edx_tmp"), "client_result_done"), "w") as client_file:
+            client_file.write('done')
+        signaled = time.time()
+        now = time.perf_counter()
+        write_seconds = now - phase_start
+        metrics.observe_phase('tcl_write', write_seconds)
+        phase_start = now
         # 3. 等待EDA工具返回结果
-        logger.info("Waiting for EDA tool to return results")
-        while True:
-            if os.path.exists(server_result_done_path):
-                logger.debug("Server result done file detected, removing it")
-                os.remove(server_result_done_path)
-                break
-            logger.debug("Waiting for server result done file...")
-            time.sleep(1)
+        logger.debug("Waiting for EDA tool to return results")
+        delay = WAIT_POLL_MIN
+        try:
+            while True:
+                # 通道借给pyc_*处理函数期间，server_result_done属于处理函数的往返
+                if (borrowed or _channel.lent == 0) and os.path.exists(server_result_done_path):
+                    logger.debug("Server result done file detected, removing it")
+                    os.remove(server_result_done_path)
+                    break
+                time.sleep(delay)
+                delay = min(delay * 2, WAIT_POLL_MAX)
+        finally:
+            if not borrowed:
+                _channel.owner = None
+        now = time.perf_counter()
+        wait_seconds = now - phase_start
+        metrics.observe_phase('tcl_wait', wait_seconds)
+        phase_start = now
+        self._record_exec_status(server_status_path, endpoint, signaled, wait_seconds)
+        if recorder is not None:
+            try:
+                recorder.record_tcl(tcl_command_list, return_result, DEFAULT_CONFIG.get("edx_tmp"), files_before,
+                                    self.last_status, {'write': write_seconds, 'wait': wait_seconds}, endpoint)
+            except Exception as e:
+                logger.warning(f"failed to record TCL transaction: {e}")
         # 4. 读取EDA工具返回结果, 规定结果文件为server_result.txt，按行读取存到list中返回
         if return_result:
-            logger.info("Reading results from EDA tool")
+            logger.debug("Reading results from EDA tool")
             server_result_txt_path = os.path.join(DEFAULT_CONFIG.get("edx_tmp"), "server_result.txt")
             if not os.path.exists(server_result_txt_path):
                 logger.warning("Server result file does not exist, returning empty list")
                 return []
-            server_file = open(server_result_txt_path, "r")
-            eda_resp = [s.rstrip('\n') for s in server_file.readlines()]
+            metrics.TCL_PAYLOAD_BYTES.observe(os.path.getsize(server_result_txt_path), endpoint, 'result')
+            with open(server_result_txt_path, "r") as server_file:
+                eda_resp = [s.rstrip('\n') for s in server_file]
             os.remove(server_result_txt_path)
-            logger.info(f"Successfully read {len(eda_resp)} lines from server result")
+            metrics.observe_phase('tcl_read', time.perf_counter() - phase_start)
+            self._log_round_trip(tcl_command_list, len(eda_resp), wait_seconds)
             return eda_resp
         else:
             # 将server_result.txt文件压缩成gz格式，也放在edx_tmp目录下
             server_result_path = os.path.join(DEFAULT_CONFIG.get("edx_tmp"), "server_result.txt")
             archive_path = os.path.join(DEFAULT_CONFIG.get("edx_tmp"), "netlist.gz")
+            metrics.TCL_PAYLOAD_BYTES.observe(os.path.getsize(server_result_path), endpoint, 'result')
 
             # 使用gzip压缩server_result.txt到netlist.gz
             with open(server_result_path, 'rb') as f_in:
@@ -86,16 +268,48 @@ class TCLSender:
 
             # 删除原始的server_result.txt文件
             os.remove(server_result_path)
+            metrics.observe_phase('tcl_read', time.perf_counter() - phase_start)
 
             return [archive_path]
 
+    def _record_exec_status(self, server_status_path, endpoint, signaled, wait_seconds):
+        """
+        读取EDA侧写的执行状态，等待时间拆分为eda_exec(source耗时)和eda_overhead(监听器轮询与文件传输)，
+        两者同在一台机器上时另记eda_detect(写client_result_done到监听器发现的时间)
+        """
+        status = read_exec_status(server_status_path)
+        _exec_state.last = self.last_status = status
+        if status is None:
+            return
+        os.remove(server_status_path)
+        exec_seconds = status.exec_seconds
+        if exec_seconds is not None:
+            metrics.observe_phase('eda_exec', exec_seconds)
+            metrics.observe_phase('eda_overhead', max(wait_seconds - exec_seconds, 0.0))
+            metrics.add_eda_seconds(exec_seconds)
+        detect_seconds = status.detected / 1e6 - signaled
+        if 0 <= detect_seconds <= wait_seconds:
+            metrics.observe_phase('eda_detect', detect_seconds)
+        if not status.ok:
+            metrics.EDA_ERRORS.inc(1, endpoint)
+            logger.warning(f"EDA execute failed: {status.error}\n{summarize(status.error_info, max_chars=2000)}")
+
+    def _log_round_trip(self, tcl_command_list, result_lines, wait_seconds):
+        suppressed = _round_trip_sampler.allow()
+        if suppressed is None:
+            return
+        status = self.last_status
+        exec_text = f", eda exec {status.exec_seconds:.3f}s" if status and status.exec_seconds is not None else ''
+        logger.info(f"TCL round trip: {len(tcl_command_list)} command lines, {result_lines} result lines, "
+                    f"wait {wait_seconds:.3f}s{exec_text}" + (f" (+{suppressed} similar suppressed)" if suppressed else ''))
+
     # 发送tcl脚本
     def send_tcl_file(self, tcl_file_path, return_result=True) -> list[str]:
         logger.info(f"Sending TCL file: {tcl_file_path}")
         # 1. 读取tcl文件
         with open(tcl_file_path, "r", encoding="utf-8") as f:
             tcl_command_list = f.readlines()
-        logger.info(f"Loaded {len(tcl_command_list)} commands from TCL file")
+        logger.debug(f"Loaded {len(tcl_command_list)} commands from TCL file")
         # 2. 发送tcl命令
         eda_resp = self.send_tcl(tcl_command_list, return_result)
         logger.info(f"TCL file execution completed, received {len(eda_resp)} lines of result")
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+分组扫描函数与逐元素循环的结果一致；pack_1d在每组内无重叠且不越过边界
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from array_utils import grouped_cummax, grouped_cummin_reverse, grouped_exclusive_cumsum, pack_1d
+
+
+def random_groups(rng, count, num_groups):
+    return np.sort(rng.integers(0, num_groups, count))
+
+
+def loop_pack(pos, size, groups, lower, upper):
+    """pack_1d的逐元素参考实现"""
+    out = np.empty(len(pos))
+    for g in np.unique(groups):
+        idx = np.flatnonzero(groups == g)
+        edge = lower
+        for i in idx:
+            out[i] = max(pos[i], edge)
+            edge = out[i] + size[i]
+        edge = upper
+        for i in idx[::-1]:
+            out[i] = min(out[i], edge - size[i])
+            edge = out[i]
+    return out
+
+
+def test_grouped_scans_match_loop():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=200) * 50
+    groups = random_groups(rng, 200, 7)
+    cummax = grouped_cummax(values, groups)
+    cummin = grouped_cummin_reverse(values, groups)
+    cumsum = grouped_exclusive_cumsum(values, groups)
+    for g in np.unique(groups):
+        idx = np.flatnonzero(groups == g)
+        np.testing.assert_allclose(cummax[idx], np.maximum.accumulate(values[idx]))
+        np.testing.assert_allclose(cummin[idx], np.minimum.accumulate(values[idx][::-1])[::-1])
+        np.testing.assert_allclose(cumsum[idx], np.cumsum(values[idx]) - values[idx], atol=1e-9)
+    assert len(grouped_cummax(np.zeros(0), np.zeros(0, dtype=np.int64))) == 0
+
+
+def test_pack_1d_small_case():
+    # 组0: 两个宽2的元素重叠，右边的被推开；组1: 越过右边界的元素压回
+    pos = np.array([0.0, 1.0, 7.5, 9.0])
+    size = np.array([2.0, 2.0, 1.0, 2.0])
+    groups = np.array([0, 0, 1, 1])
+    np.testing.assert_allclose(pack_1d(pos, size, groups, 0.0, 10.0), [0.0, 2.0, 7.0, 8.0])
+
+
+def test_pack_1d_random_matches_loop():
+    rng = np.random.default_rng(1)
+    count = 300
+    groups = random_groups(rng, count, 10)
+    pos = rng.uniform(-5, 105, count)
+    order = np.lexsort((pos, groups))
+    pos, groups = pos[order], groups[order]
+    size = rng.uniform(0.1, 2.0, count)
+    packed = pack_1d(pos, size, groups, 0.0, 100.0)
+    np.testing.assert_allclose(packed, loop_pack(pos, size, groups, 0.0, 100.0), atol=1e-9)
+    same_group = groups[1:] == groups[:-1]
+    assert np.all(packed[1:][same_group] >= packed[:-1][same_group] + size[:-1][same_group] - 1e-9)
+    assert packed.min() >= -1e-9 and np.all(packed + size <= 100.0 + 1e-9)
+
+
+def test_pack_1d_per_element_bounds():
+    pos = np.array([0.0, 0.5, 20.0])
+    size = np.ones(3)
+    groups = np.array([0, 0, 1])
+    packed = pack_1d(pos, size, groups, np.array([1.0, 1.0, 10.0]), np.array([5.0, 5.0, 15.0]))
+    np.testing.assert_allclose(packed, [1.0, 2.0, 14.0])
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+ArtifactCache的LRU/总大小淘汰和版本失效，以及download_file对缓存文件的Range/If-None-Match支持
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from artifact_cache import ArtifactCache
+
+
+def write(path, size, fill=b'x') -> str:
+    with open(path, 'wb') as f:
+        f.write(fill * size)
+    return str(path)
+
+
+def test_lru_entry_limit(tmp_path):
+    cache = ArtifactCache(str(tmp_path / 'cache'), max_entries=2)
+    source = write(tmp_path / 'out.bin', 10)
+    for key in ('a', 'b'):
+        cache.put(key, source, f'{key}.bin', 1)
+    # 访问a之后b是最久未使用的
+    assert cache.get('a') is not None
+    cache.put('c', source, 'c.bin', 1)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.info()['evictions'] == 1
+    assert sorted(os.listdir(tmp_path / 'cache')) == ['a_a.bin', 'c_c.bin']
+
+
+def test_size_limit_and_versions(tmp_path):
+    cache = ArtifactCache(str(tmp_path / 'cache'), max_bytes=25)
+    cache.put('a', write(tmp_path / 'a', 10), 'a', 1)
+    cache.put('b', write(tmp_path / 'b', 10), 'b', 1)
+    cache.put('c', write(tmp_path / 'c', 10), 'c', 1)
+    assert cache.get('a') is None and cache.total_bytes == 20
+    # 单个条目超过上限时仍保留最新的一个
+    cache.put('big', write(tmp_path / 'big', 40), 'big', 1)
+    assert cache.info()['entries'] == 1 and cache.get('big') is not None
+    # 新版本的条目写入时删除旧版本
+    cache.put('d', write(tmp_path / 'd', 5), 'd', 2)
+    assert cache.get('big') is None and cache.total_bytes == 5
+
+
+def test_same_key_overwrite_and_missing_file(tmp_path):
+    cache = ArtifactCache(str(tmp_path / 'cache'))
+    cache.put('a', write(tmp_path / 'a', 10), 'a', 1)
+    entry = cache.put('a', write(tmp_path / 'a', 4, b'y'), 'a', 1)
+    assert cache.total_bytes == 4
+    with open(entry.path, 'rb') as f:
+        assert f.read() == b'yyyy'
+    os.remove(entry.path)
+    assert cache.get('a') is None and cache.total_bytes == 0
+
+
+def test_make_key(tmp_path):
+    script = write(tmp_path / 's.tcl', 3)
+    key = ArtifactCache.make_key(script, 'out.tar.gz', 1)
+    assert key == ArtifactCache.make_key(script, 'out.tar.gz', 1)
+    assert key != ArtifactCache.make_key(script, 'out.tar.gz', 2)
+    assert key != ArtifactCache.make_key(script, 'out.tar.gz', 1, {'topn': 10})
+    write(script, 3, b'z')
+    assert key != ArtifactCache.make_key(script, 'out.tar.gz', 1)
+
+
+def test_download_range_and_etag(tmp_path, edx_tmp, monkeypatch):
+    import main
+
+    content = bytes(range(200))
+    runs = []
+
+    def send_tcl_file(self, script_path, return_result=True):
+        runs.append(script_path)
+        write(tmp_path / 'get_unplace_cells.tar.gz', 1, content)
+
+    monkeypatch.setattr(main.TCLSender, 'send_tcl_file', send_tcl_file)
+    # 新的工具实例，不影响其他测试使用的全局实例
+    tool = main.Leapr_Tool()
+    monkeypatch.setitem(main.eda_tools._tools, 'leapr', tool)
+    client = main.app.test_client()
+    url = '/leapr/download_file?script_name=get_unplace_cells'
+
+    full = client.get(url)
+    assert full.status_code == 200 and full.data == content
+    assert full.headers['X-Artifact-Cache'] == 'miss'
+    part = client.get(url, headers={'Range': 'bytes=10-19'})
+    assert part.status_code == 206 and part.data == content[10:20]
+    assert part.headers['Content-Range'] == f'bytes 10-19/{len(content)}'
+    assert part.headers['X-Artifact-Cache'] == 'hit'
+    assert client.get(url, headers={'If-None-Match': full.headers['ETag']}).status_code == 304
+    assert len(runs) == 1
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+冒烟测试: 用fake_leapr模拟Leapr，所有接口在1k cell的设计上各调用一次都应成功
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import main
+from bench_endpoints import run_benchmark
+
+
+def test_all_endpoints_against_fake_leapr(edx_tmp, monkeypatch):
+    # 工具实例在测试期间新建，结束后恢复，摆放和缓存状态不带到其他测试
+    monkeypatch.setattr(main.eda_tools, '_tools', {})
+    result = run_benchmark(cells=1000, repeat=1, trace_memory=False)
+    failed = {name: item.get('error') for name, item in result['endpoints'].items() if item['status'] >= 400}
+    assert not failed
+    assert result['endpoints']['load_netlist']['response_bytes'] > 0
+    assert result['endpoints']['place_cells']['eda_exec_p50'] > 0
+
+
+def test_concurrent_timing_reports_do_not_mix(tmp_path, edx_tmp, monkeypatch):
+    import threading
+    from fake_leapr import FakeLeapr, SyntheticDesign
+
+    tool = main.Leapr_Tool()
+    parse = main.Leapr_Tool.read_timing_report
+    # 两个请求的report_timing都执行完之后才开始解析
+    both_sent = threading.Barrier(2, timeout=10)
+
+    def read_timing_report(self, report_file):
+        both_sent.wait()
+        return parse(self, report_file)
+
+    monkeypatch.setattr(main.Leapr_Tool, 'read_timing_report', read_timing_report)
+    results = {}
+    with FakeLeapr(str(tmp_path), SyntheticDesign(500), poll_interval=0.01):
+        threads = [threading.Thread(target=lambda n=n: results.setdefault(n, tool.get_timing_info(topn=n)))
+                   for n in (2, 5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+    assert {n: len(sta.timing_paths) for n, sta in results.items()} == {2: 2, 5: 5}
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('report')]
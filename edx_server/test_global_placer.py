@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+GlobalPlacer增量模式: 只移动unplaced的cell，已摆放的cell作为固定pin把它们拉到连接关系决定的位置
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from design_index import DesignIndex, STATUS_CODES
+from global_placer import GlobalPlacer
+from plugin_data import Cell, Design
+
+
+def make_index(cells, edges, origin=(0.0, 0.0)) -> DesignIndex:
+    """
+    cells: [(name, x, y, status)]，1x1的cell，坐标相对core左下角origin；edges: [(驱动cell, 负载cell)]，每条边一个net
+    """
+    design = Design()
+    design.core_width = design.core_height = 20.0
+    design.core_x, design.core_y = origin
+    for name, x, y, status in cells:
+        design.cells[name] = Cell(name, origin[0] + x, origin[1] + y, 1.0, 1.0, 'R0', status)
+    for k, (driver, load) in enumerate(edges):
+        design.pin_to_cell[f'{driver}/Y{k}'] = driver
+        design.pin_to_cell[f'{load}/A{k}'] = load
+        design.nets[f'n{k}'] = [[f'{load}/A{k}'], [f'{driver}/Y{k}']]
+    return DesignIndex(design)
+
+
+CELLS = [('p0', 2.0, 10.0, 'placed'), ('p1', 16.0, 10.0, 'fixed'), ('p2', 9.0, 2.0, 'placed'),
+         ('u0', 0.0, 0.0, 'unplaced'), ('u1', 0.0, 0.0, 'unplaced'), ('u2', 0.0, 0.0, 'unplaced')]
+EDGES = [('p0', 'u0'), ('u0', 'p1'), ('p2', 'u1'), ('u1', 'u0'), ('u2', 'u0')]
+
+
+def place_incremental(index, ignore=None, **kwargs):
+    movable = index.status == STATUS_CODES['unplaced']
+    if ignore is not None:
+        movable &= ~ignore
+    return GlobalPlacer(index, **kwargs).place(movable, ignore)
+
+
+def test_only_unplaced_cells_move():
+    index = make_index(CELLS, EDGES)
+    result = place_incremental(index)
+    names = [index.cell_names[c] for c in result.cells]
+    assert names == ['u0', 'u1', 'u2']
+    # 固定pin不在结果中，DesignIndex中的坐标不变
+    np.testing.assert_allclose(index.x[:3], [2.0, 16.0, 9.0])
+    assert np.all((result.x >= 0) & (result.x <= 19.0) & (result.y >= 0) & (result.y <= 19.0))
+    batch = result.to_batch()
+    assert batch.cell_names == names
+
+
+def test_fixed_pins_pull_cells():
+    index = make_index(CELLS, EDGES)
+    result = place_incremental(index)
+    center = dict(zip((index.cell_names[c] for c in result.cells), zip(result.x + 0.5, result.y + 0.5)))
+    # u0连到p0/p1(中心(2.5, 10.5)和(16.5, 10.5))，x方向停在两者中点
+    assert abs(center['u0'][0] - 9.5) < 0.5
+    assert abs(center['u0'][1] - 10.5) < 3.0
+    # u1在p2与u0之间
+    assert center['u1'][1] < center['u0'][1]
+    assert result.hpwl_after < result.hpwl_before
+
+
+def test_ignored_cells_do_not_move_or_count():
+    index = make_index(CELLS, EDGES)
+    ignore = np.array([name == 'u2' for name in index.cell_names])
+    result = place_incremental(index, ignore=ignore)
+    assert [index.cell_names[c] for c in result.cells] == ['u0', 'u1']
+
+
+def test_deterministic_and_thread_independent():
+    index = make_index(CELLS, EDGES)
+    first = place_incremental(index, threads=1)
+    second = place_incremental(index, threads=2)
+    np.testing.assert_allclose(first.x, second.x)
+    np.testing.assert_allclose(first.y, second.y)
+    assert first.iterations <= 30 and first.overflow <= 0.1
+
+
+def test_nothing_to_place():
+    index = make_index(CELLS[:3], EDGES[:0])
+    result = place_incremental(index)
+    assert len(result) == 0 and result.iterations == 0
+
+
+def test_core_origin():
+    origin = (1.08, 3.5)
+    shifted = place_incremental(make_index(CELLS, EDGES, origin))
+    # 与core在(0, 0)时的结果只差一个平移，所有cell在core内
+    base = place_incremental(make_index(CELLS, EDGES))
+    np.testing.assert_allclose(shifted.x, base.x + origin[0], atol=1e-6)
+    np.testing.assert_allclose(shifted.y, base.y + origin[1], atol=1e-6)
+    assert np.all((shifted.x >= origin[0]) & (shifted.x + 1.0 <= origin[0] + 20.0))
+    assert np.all((shifted.y >= origin[1]) & (shifted.y + 1.0 <= origin[1] + 20.0))
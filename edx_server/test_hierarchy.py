@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+HierarchyTree的module范围，extract_subdesign把跨边界的net变成端口，以及write_bundles并行写出
+"""
+import os
+import sys
+import tarfile
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from design_index import DesignIndex
+from hierarchy import HierarchyTree, extract_cells, extract_subdesign, format_netlist, write_bundles
+from plugin_data import Cell, Design
+
+
+@pytest.fixture
+def index() -> DesignIndex:
+    design = Design()
+    design.core_width = design.core_height = 10.0
+    # top/u_ab、top/u_a-b与top/u_a有相同的字符串前缀，但不属于top/u_a
+    for i, name in enumerate(['top/u_a/c1', 'top/u_a/c2', 'top/u_b/c3', 'top/u_ab/c4', 'top/u_a-b/c5']):
+        design.cells[name] = Cell(name, float(i), 0.0, 1.0, 1.0, 'R0', 'placed')
+    pins = {'top/u_a/c1': ['A', 'Y', 'Y2'], 'top/u_a/c2': ['A', 'B'], 'top/u_b/c3': ['A', 'B', 'Y'],
+            'top/u_ab/c4': ['Y'], 'top/u_a-b/c5': ['A']}
+    for cell, names in pins.items():
+        for pin in names:
+            design.pin_to_cell[f'{cell}/{pin}'] = cell
+    design.nets = {
+        'n_int': [['top/u_a/c2/A'], ['top/u_a/c1/Y']],
+        'n_out': [['top/u_b/c3/A', 'top/u_a-b/c5/A'], ['top/u_a/c1/Y2']],
+        'n_in': [['top/u_a/c2/B'], ['top/u_b/c3/Y']],
+        # in_port是顶层端口，不属于任何cell
+        'n_top': [['top/u_a/c1/A'], ['in_port']],
+        'n_ab': [['top/u_b/c3/B'], ['top/u_ab/c4/Y']],
+    }
+    return DesignIndex(design)
+
+
+def names_of(index, cell_ids):
+    return sorted(index.cell_names[c] for c in cell_ids)
+
+
+def test_tree_ranges(index):
+    tree = HierarchyTree(index.cell_names)
+    assert names_of(index, tree.cells('top/u_a')) == ['top/u_a/c1', 'top/u_a/c2']
+    assert names_of(index, tree.cells('/top/u_ab/')) == ['top/u_ab/c4']
+    assert names_of(index, tree.cells('top/u_a-b')) == ['top/u_a-b/c5']
+    assert tree.cell_count('top') == 5 and tree.cell_count('') == 5
+    assert 'top/u_b' in tree and 'top/u_c' not in tree
+    assert sorted(tree.children['top']) == ['top/u_a', 'top/u_a-b', 'top/u_ab', 'top/u_b']
+    with pytest.raises(KeyError):
+        tree.cells('top/u_c')
+
+
+def test_boundary_ports(index):
+    tree = HierarchyTree(index.cell_names)
+    sub = extract_subdesign(index, tree, ['top/u_a'])
+    assert sorted(cell[0] for cell in sub.cells) == ['top/u_a/c1', 'top/u_a/c2']
+    assert sorted(sub.ports) == [('n_in', 'input'), ('n_out', 'output'), ('n_top', 'input')]
+    nets = {name: (sorted(loads), sorted(drivers)) for name, loads, drivers in sub.nets}
+    assert nets == {
+        'n_int': (['top/u_a/c2/A'], ['top/u_a/c1/Y']),
+        # 外部的load用同名端口代替
+        'n_out': (['n_out'], ['top/u_a/c1/Y2']),
+        'n_in': (['top/u_a/c2/B'], ['n_in']),
+        'n_top': (['top/u_a/c1/A'], ['n_top']),
+    }
+    text = format_netlist(sub)
+    assert 'n_out,n_out,top/u_a/c1/Y2' in text and 'n_ab' not in text
+
+
+def test_union_of_modules_has_no_internal_ports(index):
+    tree = HierarchyTree(index.cell_names)
+    sub = extract_subdesign(index, tree, ['top/u_a', 'top/u_b'])
+    assert sorted(sub.ports) == [('n_ab', 'input'), ('n_out', 'output'), ('n_top', 'input')]
+    # 任意cell集合与按module取的结果一致，重复的cell只取一次
+    same = extract_cells(index, list(tree.cells('top/u_b')) + list(tree.cells('top/u_a')) * 2, 'same')
+    assert sorted(same.ports) == sorted(sub.ports)
+    assert len(same.cells) == 3
+
+
+def test_write_bundles_in_process_pool(index, tmp_path):
+    tree = HierarchyTree(index.cell_names)
+    subs = [extract_subdesign(index, tree, [module]) for module in ('top/u_a', 'top/u_b')]
+    parallel = write_bundles(subs, str(tmp_path / 'parallel'), workers=2)
+    serial = write_bundles(subs, str(tmp_path / 'serial'), workers=1)
+    assert [result['cells'] for result in parallel] == [result['cells'] for result in serial] == [2, 1]
+    for p, s in zip(parallel, serial):
+        for name in ('netlist.txt', 'ports.txt'):
+            with open(os.path.join(p['path'], name)) as a, open(os.path.join(s['path'], name)) as b:
+                assert a.read() == b.read()
+        with tarfile.open(p['archive']) as tar:
+            assert sorted(tar.getnames()) == ['netlist.txt', 'ports.txt']
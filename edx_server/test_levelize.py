@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+levelize: stage = 从输入出发经过的寄存器数量，时钟pin上的边不计入，不可达的寄存器作为补充起点
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from design_index import DesignIndex
+from levelize import levelize
+from plugin_data import Cell, Design
+
+
+def make_index(edges, clock_pin='CK') -> DesignIndex:
+    """
+    edges: [(驱动cell, 负载cell, 负载pin名)]，每条边一个net；负载pin为clock_pin的cell是寄存器
+    """
+    design = Design()
+    design.core_width = design.core_height = 10.0
+    for k, (driver, load, pin) in enumerate(edges):
+        for cell in (driver, load):
+            if cell not in design.cells:
+                design.cells[cell] = Cell(cell, 0.0, 0.0, 1.0, 1.0, 'R0', 'placed')
+        design.pin_to_cell[f'{driver}/Y{k}'] = driver
+        design.pin_to_cell[f'{load}/{pin}'] = load
+        design.nets[f'n{k}'] = [[f'{load}/{pin}'], [f'{driver}/Y{k}']]
+    return DesignIndex(design)
+
+
+def stages(result):
+    return {name: int(stage) for name, stage in zip(result.index.cell_names, result.stage)}
+
+
+PIPELINE = [('in0', 'g1', 'A'), ('g1', 'r1', 'D'), ('r1', 'g2', 'A'), ('g2', 'r2', 'D'), ('r2', 'g3', 'A'),
+            ('clkbuf', 'r1', 'CK'), ('clkbuf', 'r2', 'CK')]
+
+
+def test_pipeline_stages():
+    result = levelize(make_index(PIPELINE))
+    # 时钟buffer没有扇入，是输入；时钟边不把寄存器连到同一级
+    assert stages(result) == {'in0': 0, 'g1': 0, 'r1': 1, 'g2': 1, 'r2': 2, 'g3': 2, 'clkbuf': 0}
+    assert result.num_stages == 3
+    assert sorted(result.index.cell_names[c] for c in np.flatnonzero(result.is_sequential)) == ['r1', 'r2']
+    assert result.group_stages(2) == [[0, 1], [2]]
+    assert sorted(result.index.cell_names[c] for c in result.stage_cells([2])) == ['g3', 'r2']
+    summary = result.summary()
+    assert [(s['registers'], s['combinational']) for s in summary['stages']] == [(0, 3), (1, 1), (1, 1)]
+    assert summary['unreached_cells'] == 0 and summary['extra_sources'] == 0
+
+
+def test_reconvergence_takes_fewest_registers():
+    # g1同时经过r1和直接驱动r2，r2取经过寄存器最少的路径
+    result = levelize(make_index(PIPELINE + [('g1', 'r2', 'D2')]))
+    assert stages(result)['r2'] == 1 and stages(result)['g3'] == 1
+
+
+def test_unreachable_registers_and_combinational_loops():
+    edges = PIPELINE + [('rA', 'gA', 'A'), ('gA', 'rA', 'D'), ('clkbuf', 'rA', 'CK'),
+                        ('cL1', 'cL2', 'A'), ('cL2', 'cL1', 'A')]
+    result = levelize(make_index(edges))
+    got = stages(result)
+    # 状态机环路中的寄存器从输入不可达，作为补充起点；没有寄存器的组合环不可达
+    assert got['rA'] == 0 and got['gA'] == 0
+    assert got['cL1'] == -1 and got['cL2'] == -1
+    assert result.extra_sources == 1
+    assert result.summary()['unreached_cells'] == 2
+
+
+def test_custom_clock_pins():
+    edges = [(driver, load, 'GCK' if pin == 'CK' else pin) for driver, load, pin in PIPELINE]
+    assert levelize(make_index(edges)).num_stages == 1
+    result = levelize(make_index(edges), clock_pins=['GCK'])
+    assert stages(result)['r2'] == 2
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Partitioner: 切线选在cut最小的位置，区域面积在允许偏差内，区域拼起来覆盖整个core
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from design_index import DesignIndex
+from partitioner import Partitioner, find_cut_nets
+from plugin_data import Cell, Design
+
+
+def make_grid_design(size=4, origin=(0.0, 0.0)) -> DesignIndex:
+    """
+    size x size个1x1的cell均匀分布在(2*size)见方、左下角为origin的core中，左右两半各自用链状net连起来，
+    两半之间只有一个net: 最优切线是x = origin_x + size的竖线，cut为1
+    """
+    design = Design()
+    design.core_width = design.core_height = 2.0 * size
+    design.core_x, design.core_y = origin
+    left, right = [], []
+    for i in range(size):
+        for j in range(size):
+            name = f'c{i}_{j}'
+            design.cells[name] = Cell(name, origin[0] + 2 * i + 0.5, origin[1] + 2 * j + 0.5, 1.0, 1.0, 'R0', 'placed')
+            design.pin_to_cell[f'{name}/A'] = name
+            design.pin_to_cell[f'{name}/Y'] = name
+            (left if i < size // 2 else right).append(name)
+    for group in (left, right):
+        for a, b in zip(group[:-1], group[1:]):
+            design.nets[f'n_{a}_{b}'] = [[f'{b}/A'], [f'{a}/Y']]
+    design.nets['cross'] = [[f'{right[0]}/A'], [f'{left[-1]}/Y']]
+    return DesignIndex(design)
+
+
+def test_bisection_finds_min_cut():
+    index = make_grid_design()
+    result = Partitioner(index, imbalance=0.1).partition(2)
+    assert result.num_parts == 2
+    assert [index.net_names[n] for n in result.cut_nets] == ['cross']
+    left = np.array([name.startswith(('c0_', 'c1_')) for name in index.cell_names])
+    assert len(set(result.assignment[left])) == 1 and len(set(result.assignment[~left])) == 1
+    assert result.assignment[left][0] != result.assignment[~left][0]
+    np.testing.assert_array_equal(np.sort(find_cut_nets(index, result.assignment)), np.sort(result.cut_nets))
+
+
+def test_balance_and_coverage():
+    index = make_grid_design(size=8)
+    for parts in (3, 4, 5):
+        result = Partitioner(index, imbalance=0.25).partition(parts)
+        assert result.num_parts == parts
+        area = np.bincount(result.assignment, minlength=parts).astype(float)
+        assert area.sum() == index.num_cells
+        assert np.all(np.abs(area / area.mean() - 1.0) <= 0.25 + 1e-9)
+        boxes = result.bboxes()
+        covered = np.sum((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]))
+        assert np.isclose(covered, index.core_width * index.core_height)
+        # 每个cell的中心都落在所属区域内
+        cx, cy = index.cell_centers()
+        own = boxes[result.assignment]
+        assert np.all((cx >= own[:, 0]) & (cx <= own[:, 2]) & (cy >= own[:, 1]) & (cy <= own[:, 3]))
+
+
+def test_single_part():
+    index = make_grid_design()
+    result = Partitioner(index).partition(1)
+    assert result.num_parts == 1
+    assert not result.assignment.any() and len(result.cut_nets) == 0
+
+
+def test_core_origin_and_snapping():
+    origin = (1.08, 1.35)
+    index = make_grid_design(size=8, origin=origin)
+    # 0.5不整除origin，按0对齐时切线会偏离row/site
+    result = Partitioner(index, imbalance=0.25, row_height=0.5, site_width=0.5).partition(4)
+    boxes = result.bboxes()
+    assert np.isclose(boxes[:, 0].min(), origin[0]) and np.isclose(boxes[:, 1].min(), origin[1])
+    assert np.isclose(boxes[:, 2].max(), origin[0] + 16.0) and np.isclose(boxes[:, 3].max(), origin[1] + 16.0)
+    covered = np.sum((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]))
+    assert np.isclose(covered, 16.0 * 16.0)
+    for axis in (0, 1):
+        steps = (boxes[:, [axis, axis + 2]] - origin[axis]) / 0.5
+        np.testing.assert_allclose(steps, np.round(steps), atol=1e-9)
+    cx, cy = index.cell_centers()
+    own = boxes[result.assignment]
+    assert np.all((cx >= own[:, 0]) & (cx <= own[:, 2]) & (cy >= own[:, 1]) & (cy <= own[:, 3]))
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+PlacementChecker: 与缓存中已摆放cell的重叠、core原点不为(0, 0)时的截断/对齐/合法化；
+place_cells不带validate时未知cell也不发送给EDA
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bulk_place import PlacementBatch
+from design_index import DesignIndex
+from placement_check import FLAG_CLIPPED, FLAG_LEGALIZED, FLAG_OVERLAP, PlacementChecker
+from plugin_data import Cell, Design
+
+
+def make_index(cells, core_x=0.0, core_y=0.0, core_width=10.0, core_height=2.0) -> DesignIndex:
+    """cells: [(name, x, y, width, place_status)]，row高度1.0"""
+    design = Design()
+    design.core_x, design.core_y = core_x, core_y
+    design.core_width, design.core_height = core_width, core_height
+    for name, x, y, width, status in cells:
+        design.cells[name] = Cell(name, x, y, width, 1.0, 'R0', place_status=status)
+    return DesignIndex(design)
+
+
+def test_overlap_with_placed_cell_outside_batch():
+    index = make_index([('c0', 0.0, 0.0, 1.0, 'placed'), ('c1', 5.0, 0.0, 1.0, 'placed'),
+                        ('c2', 3.0, 1.0, 1.0, 'placed')])
+    report = PlacementChecker(index).check(PlacementBatch(['c0'], [3.0], [1.0]))
+    assert not report.ok
+    assert report.flags[0] & FLAG_OVERLAP
+
+
+def test_moved_cell_frees_its_old_position():
+    # c2移走后c0可以放到c2原来的位置
+    index = make_index([('c0', 0.0, 0.0, 1.0, 'placed'), ('c2', 3.0, 1.0, 1.0, 'placed')])
+    report = PlacementChecker(index).check(PlacementBatch(['c0', 'c2'], [3.0, 6.0], [1.0, 1.0]))
+    assert report.ok
+
+
+def test_unplaced_cells_are_not_obstacles():
+    index = make_index([('c0', 0.0, 0.0, 1.0, 'placed'), ('c2', 3.0, 1.0, 1.0, 'unplaced')])
+    assert PlacementChecker(index).check(PlacementBatch(['c0'], [3.0], [1.0])).ok
+
+
+def test_core_origin_offset():
+    index = make_index([('c0', 100.0, 50.0, 1.0, 'placed'), ('c1', 104.0, 51.0, 1.0, 'placed')],
+                       core_x=100.0, core_y=50.0)
+    checker = PlacementChecker(index, site_width=0.5)
+    # core内的合法位置不被截断或移动
+    report = checker.check(PlacementBatch(['c0'], [102.5], [51.0]))
+    assert report.ok
+    assert report.flags[0] & FLAG_CLIPPED == 0
+    assert report.batch.x[0] == 102.5 and report.batch.y[0] == 51.0
+    # 越界的坐标截断到core内，并对齐到从core左下角起算的row/site
+    report = checker.check(PlacementBatch(['c0'], [99.0], [49.3]))
+    assert report.flags[0] & FLAG_CLIPPED
+    assert report.batch.x[0] == 100.0 and report.batch.y[0] == 50.0
+    report = checker.check(PlacementBatch(['c0'], [101.26], [50.6]))
+    np.testing.assert_allclose([report.batch.x[0], report.batch.y[0]], [101.5, 51.0])
+
+
+def test_legalize_with_core_origin():
+    index = make_index([('a', 100.0, 50.0, 2.0, 'placed'), ('b', 103.0, 50.0, 2.0, 'placed')],
+                       core_x=100.0, core_y=50.0, core_width=4.0, core_height=1.0)
+    report = PlacementChecker(index).check(PlacementBatch(['a', 'b'], [101.0, 101.5], [50.0, 50.0]),
+                                           legalize=True)
+    assert report.ok
+    assert report.flags[1] & FLAG_LEGALIZED
+    np.testing.assert_allclose(sorted(report.batch.x), [100.0, 102.0])
+
+
+def test_place_cells_does_not_send_unknown_cells(edx_tmp, monkeypatch):
+    import main
+
+    tool = main.Leapr_Tool()
+    monkeypatch.setitem(main.eda_tools._tools, 'leapr', tool)
+    sent = []
+
+    def send_placement(batch):
+        sent.append(list(batch.cell_names))
+        return {'placed': len(batch), 'failed': []}
+
+    monkeypatch.setattr(tool, '_send_placement', send_placement)
+    design = Design()
+    design.core_width, design.core_height = 10.0, 2.0
+    for name in ('c0', 'c1'):
+        design.cells[name] = Cell(name, 0.0, 0.0, 1.0, 1.0, 'R0', place_status='unplaced')
+    tool._set_design(design)
+    etag = tool._placement_log.etag
+    response = main.app.test_client().post('/leapr/place_cells', json={
+        'cell_name': ['c0', 'ghost', 'c1', 'ghost2'], 'x': [1.0, 2.0, 3.0, 4.0], 'y': [0.0, 0.0, 1.0, 1.0]})
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['placed'] == 2 and data['unknown'] == 2 and data['failed'] == ['ghost', 'ghost2']
+    assert sent == [['c0', 'c1']]
+    index = tool.get_design_index()
+    np.testing.assert_allclose(index.x, [1.0, 3.0])
+    assert tool._placement_log.changes_since(etag).tolist() == [0, 1]
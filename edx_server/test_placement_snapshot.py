@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+PlacementLog按ETag返回之后变化的cell，以及/design的增量同步和304
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from binary_codec import decode_arrays
+from bulk_place import PlacementBatch
+from placement_snapshot import PlacementLog
+from plugin_data import Cell, Design
+
+
+def test_changes_since():
+    log = PlacementLog(max_entries=3)
+    start = log.etag
+    log.record([5, 1])
+    middle = log.etag
+    log.record([1, 3])
+    assert log.changes_since(start).tolist() == [1, 3, 5]
+    assert log.changes_since(f'"{middle}"').tolist() == [1, 3]
+    assert log.changes_since(log.etag).tolist() == []
+    # 其他epoch、格式错误或晚于当前seq的ETag只能全量同步
+    for etag in (None, '', 'other-0', f'{log.epoch}-x', f'{log.epoch}-9'):
+        assert log.changes_since(etag) is None
+    # 超出保留次数后最早的ETag失效
+    log.record([0])
+    log.record([2])
+    assert log.changes_since(start) is None
+    assert log.changes_since(middle).tolist() == [0, 1, 2, 3]
+    log.reset()
+    assert log.changes_since(middle) is None and log.etag == f'{log.epoch}-0'
+
+
+def test_cell_limit():
+    log = PlacementLog(max_cells=4)
+    start = log.etag
+    log.record([0, 1, 2])
+    middle = log.etag
+    log.record([3, 4])
+    assert log.changes_since(start) is None and log.changes_since(middle).tolist() == [3, 4]
+    # 单次变化超过上限时不保留
+    log.record(np.arange(10))
+    assert log.changes_since(middle) is None and log.changes_since(log.etag).tolist() == []
+
+
+def test_design_delta_and_304(edx_tmp, monkeypatch):
+    import main
+
+    tool = main.Leapr_Tool()
+    monkeypatch.setitem(main.eda_tools._tools, 'leapr', tool)
+    monkeypatch.setattr(tool, '_send_placement', lambda batch: {'placed': len(batch), 'failed': []})
+    design = Design()
+    design.core_width = design.core_height = 10.0
+    for i in range(4):
+        design.cells[f'c{i}'] = Cell(f'c{i}', float(i), 0.0, 1.0, 1.0, 'R0', 'placed')
+    tool._set_design(design)
+    client = main.app.test_client()
+
+    full = client.get('/leapr/design')
+    etag = full.headers['ETag'].strip('"')
+    assert full.status_code == 200 and full.headers['X-Design-Delta'] == '0'
+    assert decode_arrays(full.data)['cell_names'] == ['c0', 'c1', 'c2', 'c3']
+    assert client.get('/leapr/design', headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+
+    tool.place_batch(PlacementBatch(['c2'], [7.0], [8.0]))
+    delta = client.get(f'/leapr/design?since={etag}')
+    assert delta.status_code == 200 and delta.headers['X-Design-Delta'] == '1'
+    assert delta.headers['ETag'] != full.headers['ETag']
+    arrays = decode_arrays(delta.data)
+    assert arrays['cell_id'].tolist() == [2] and arrays['x'].tolist() == [7.0] and arrays['y'].tolist() == [8.0]
+    # 变化超过一半的cell时返回全量
+    tool.place_batch(PlacementBatch(['c0', 'c1', 'c3'], [9.0] * 3, [9.0] * 3))
+    assert client.get(f'/leapr/design?since={etag}').headers['X-Design-Delta'] == '0'
+    # 重新读取网表后旧ETag不能增量
+    latest = client.get('/leapr/design').headers['ETag']
+    tool._set_design(design)
+    assert client.get('/leapr/design', headers={'If-None-Match': latest}).status_code == 200
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+pyc_*命令解析中的owner行，plugin_channel只在owner属于持有通道锁的命令时借用通道，
+以及PluginDaemon按plugin_cmd_done取走命令、写回plugin_msg.txt，单次失败后继续监听
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tcl_sender
+from plugin_daemon import PluginDaemon, parse_plugin_command
+from tcl_sender import plugin_channel
+
+
+def test_parse_owner_line():
+    assert parse_plugin_command('pyc_get_cell "u1/a b"\nowner 12-3\n') == ('pyc_get_cell', ['u1/a b'], '12-3')
+    assert parse_plugin_command('pyc_reset\nowner \n') == ('pyc_reset', [], '')
+    assert parse_plugin_command('pyc_reset') == ('pyc_reset', [], '')
+
+
+def test_borrow_only_for_lock_holder_command():
+    tcl_sender._channel.owner = '12-3'
+    try:
+        # 控制台直接调用(owner为空)或其他命令的token: 照常等锁
+        for owner in ('', '12-2'):
+            with plugin_channel(owner) as borrowed:
+                assert not borrowed
+                assert tcl_sender._channel.lent == 0
+        with plugin_channel('12-3') as borrowed:
+            assert borrowed
+            assert tcl_sender._plugin_state.active
+            assert tcl_sender._channel.lent == 1
+        assert not tcl_sender._plugin_state.active
+        assert tcl_sender._channel.lent == 0
+    finally:
+        tcl_sender._channel.owner = None
+
+
+def test_no_borrow_without_holder():
+    with plugin_channel('12-3') as borrowed:
+        assert not borrowed
+
+
+def send_command(directory, text, timeout=5.0) -> str:
+    """模拟pyc_*: 写plugin_cmd.txt和plugin_cmd_done，等待plugin_msg_done后返回消息"""
+    with open(os.path.join(directory, 'plugin_cmd.txt'), 'w') as f:
+        f.write(text)
+    with open(os.path.join(directory, 'plugin_cmd_done'), 'w') as f:
+        f.write('done')
+    done = os.path.join(directory, 'plugin_msg_done')
+    deadline = time.time() + timeout
+    while not os.path.exists(done):
+        assert time.time() < deadline, 'no reply from plugin daemon'
+        time.sleep(0.01)
+    os.remove(done)
+    with open(os.path.join(directory, 'plugin_msg.txt')) as f:
+        return f.read()
+
+
+def test_daemon_replies_and_survives_errors(tmp_path, monkeypatch):
+    daemon = PluginDaemon(str(tmp_path), rescan_interval=0.05, poll_interval=0.01)
+    daemon.register('pyc_echo', lambda args: [' '.join(args), f'{len(args)} args'])
+    poll = daemon._poll_command
+    failures = []
+
+    def flaky_poll():
+        # 第一轮模拟一次I/O错误
+        if not failures:
+            failures.append(1)
+            raise OSError('transient I/O error')
+        poll()
+
+    monkeypatch.setattr(daemon, '_poll_command', flaky_poll)
+    daemon.start()
+    try:
+        assert send_command(str(tmp_path), 'pyc_echo a "b c"\nowner \n') == 'a b c\n2 args\n'
+        assert send_command(str(tmp_path), 'pyc_missing').startswith("ERROR: unsupported plugin command 'pyc_missing'")
+        info = daemon.info()
+        assert info['running'] and failures == [1]
+        assert info['commands'] == 2 and info['unknown'] == 1 and info['errors'] == 1
+        assert not os.path.exists(tmp_path / 'plugin_cmd_done')
+    finally:
+        daemon.stop()
+    assert not daemon.info()['running']
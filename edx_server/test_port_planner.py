@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+plan_ports: 端口开在net离开区域方向的边上，方向由驱动pin决定，同一条边上的端口按pitch展开
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from design_index import DesignIndex
+from partitioner import PartitionResult, Partitioner, Region, find_cut_nets
+from plugin_data import Cell, Design
+from port_planner import DIRECTIONS, SIDES, plan_ports
+
+
+def make_partition(cells, nets, boxes) -> PartitionResult:
+    """
+    cells: [(name, x, y, region)]，1x1的cell
+    nets: {net: (driver cell, [load cell])}
+    boxes: 每个区域的(x0, y0, x1, y1)
+    """
+    design = Design()
+    design.core_width = max(box[2] for box in boxes)
+    design.core_height = max(box[3] for box in boxes)
+    for name, x, y, _ in cells:
+        design.cells[name] = Cell(name, x, y, 1.0, 1.0, 'R0', 'placed')
+    for net, (driver, loads) in nets.items():
+        design.pin_to_cell[f'{driver}/{net}_Y'] = driver
+        for load in loads:
+            design.pin_to_cell[f'{load}/{net}_A'] = load
+        design.nets[net] = [[f'{load}/{net}_A' for load in loads], [f'{driver}/{net}_Y']]
+    index = DesignIndex(design)
+    assignment = np.array([region for *_, region in cells], dtype=np.int32)
+    regions = [Region(np.flatnonzero(assignment == i), box, 1) for i, box in enumerate(boxes)]
+    return PartitionResult(index, assignment, regions, find_cut_nets(index, assignment), 0.0)
+
+
+def ports_of(plan, net):
+    """{区域: (x, y, 边, 方向)}"""
+    rows = [i for i, name in enumerate(plan.port_names()) if name == net]
+    return {int(plan.region[i]): (round(float(plan.x[i]), 6), round(float(plan.y[i]), 6), SIDES[plan.side[i]],
+                                  DIRECTIONS[plan.direction[i]]) for i in rows}
+
+
+def test_side_and_direction():
+    partition = make_partition(
+        [('a', 1.0, 1.5, 0), ('b', 6.0, 1.5, 1), ('c', 1.0, 3.0, 0), ('d', 1.0, 9.0, 2)],
+        {'n_ab': ('a', ['b']), 'n_cd': ('c', ['d']), 'n_local': ('a', ['c'])},
+        [(0.0, 0.0, 4.0, 4.0), (4.0, 0.0, 8.0, 4.0), (0.0, 4.0, 8.0, 10.0)])
+    plan = plan_ports(partition.index, partition)
+    assert sorted(set(plan.port_names())) == ['n_ab', 'n_cd']
+    # 左右相邻: 端口开在共享的竖边上，y取对侧pin的中心
+    assert ports_of(plan, 'n_ab') == {0: (4.0, 2.0, 'right', 'output'), 1: (4.0, 2.0, 'left', 'input')}
+    # 上下相邻: 端口开在共享的横边上
+    assert ports_of(plan, 'n_cd') == {0: (1.5, 4.0, 'top', 'output'), 2: (1.5, 4.0, 'bottom', 'input')}
+    lines = plan.tcl(1)
+    assert lines == ['create_port -name {n_ab} -direction input', 'place_port -name {n_ab} -x 4.0 -y 2.0 -side left']
+    assert plan.tcl(1, relative=True)[1] == 'place_port -name {n_ab} -x 0.0 -y 2.0 -side left'
+
+
+def test_ports_on_same_edge_spread_by_pitch():
+    nets = {f'n{i}': ('a', [f'b{i}']) for i in range(5)}
+    cells = [('a', 1.0, 1.5, 0)] + [(f'b{i}', 6.0, 1.5, 1) for i in range(5)]
+    partition = make_partition(cells, nets, [(0.0, 0.0, 4.0, 4.0), (4.0, 0.0, 8.0, 4.0)])
+    plan = plan_ports(partition.index, partition, pitch=0.1)
+    assert plan.squeezed_edges == 0
+    for region in (0, 1):
+        y = np.sort(plan.y[plan.region_rows(region)])
+        assert len(y) == 5
+        assert np.all(np.diff(y) >= 0.1 - 1e-9)
+        # 从期望位置开始依次推开
+        np.testing.assert_allclose(y, [2.0, 2.1, 2.2, 2.3, 2.4])
+    # 边长放不下时缩小间距，端口仍在边内
+    plan = plan_ports(partition.index, partition, pitch=2.0)
+    assert plan.squeezed_edges == 2
+    y = np.sort(plan.y[plan.region_rows(0)])
+    assert y.min() >= 0.0 and y.max() <= 4.0
+    np.testing.assert_allclose(np.diff(y), 0.8)
+
+
+def test_core_origin():
+    # 左右两列cell各自用链状net连起来，列间只有一个net；core左下角不在(0, 0)
+    x0, y0 = 1.08, 2.16
+    design = Design()
+    design.core_width, design.core_height = 8.0, 4.0
+    design.core_x, design.core_y = x0, y0
+    for i in range(8):
+        name = f'c{i}'
+        design.cells[name] = Cell(name, x0 + (i // 4) * 4.0 + 1.0, y0 + (i % 4), 1.0, 1.0, 'R0', 'placed')
+        design.pin_to_cell[f'{name}/A'] = name
+        design.pin_to_cell[f'{name}/Y'] = name
+    for i in (0, 1, 2, 4, 5, 6):
+        design.nets[f'chain{i}'] = [[f'c{i + 1}/A'], [f'c{i}/Y']]
+    design.nets['cross'] = [[f'c5/A'], [f'c1/Y']]
+    index = DesignIndex(design)
+    partition = Partitioner(index, imbalance=0.1).partition(2)
+    plan = plan_ports(index, partition)
+    left = int(partition.assignment[index.cell_names.index('c0')])
+    boxes = partition.bboxes()
+    assert np.isclose(boxes[left, 0], x0) and np.isclose(boxes[1 - left, 2], x0 + 8.0)
+    assert np.allclose(boxes[:, 1], y0) and np.allclose(boxes[:, 3], y0 + 4.0)
+    # 端口开在两个区域共享的竖边上，该边在core内
+    edge = round(float(boxes[left, 2]), 6)
+    assert x0 + 1.0 < edge < x0 + 7.0
+    assert ports_of(plan, 'cross') == {left: (edge, round(y0 + 1.5, 6), 'right', 'output'),
+                                       1 - left: (edge, round(y0 + 1.5, 6), 'left', 'input')}
+    assert plan.tcl(left, relative=True)[1] == f'place_port -name {{cross}} -x {round(edge - x0, 4)} -y 1.5 -side right'
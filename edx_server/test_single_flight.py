@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+SingleFlight: 执行期间到达的相同调用共享结果或异常；single_flight装饰器的key包含design版本
+"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from single_flight import SingleFlight
+
+
+def run_concurrently(flights, key, func, count):
+    """count个线程同时调用flights.do(key, func)，等所有调用都加入后返回(结果列表, 线程列表)"""
+    results = [None] * count
+
+    def call(i):
+        try:
+            results[i] = flights.do(key, func)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return results, threads
+
+
+def wait_joined(flights, key, count):
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        with flights._lock:
+            call = flights._calls.get(key)
+            if call is not None and call.shared == count:
+                return
+        time.sleep(0.01)
+    raise AssertionError('joiners did not arrive')
+
+
+def wait_in_flight(flights, count):
+    deadline = time.time() + 5
+    while len(flights.in_flight()) < count and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_concurrent_calls_share_result():
+    flights = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def work():
+        runs.append(1)
+        release.wait(5)
+        return {'value': 42}
+
+    results, threads = run_concurrently(flights, 'k', work, 4)
+    wait_joined(flights, 'k', 3)
+    assert flights.in_flight() == ['k']
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(runs) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    # 所有调用者得到同一个对象
+    assert all(result is results[0][0] for result, _ in results)
+    # 执行结束后key移除，之后的调用重新执行
+    assert flights.in_flight() == []
+    assert flights.do('k', work) == ({'value': 42}, False) and len(runs) == 2
+
+
+def test_error_is_shared():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise RuntimeError('eda failed')
+
+    results, threads = run_concurrently(flights, 'k', fail, 3)
+    wait_joined(flights, 'k', 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert all(isinstance(e, RuntimeError) and str(e) == 'eda failed' for e in results)
+    assert flights.in_flight() == []
+    with pytest.raises(KeyError):
+        flights.do('k', lambda: {}['missing'])
+
+
+def test_decorator_keys_on_design_version():
+    from main import single_flight
+
+    release = threading.Event()
+    runs = []
+
+    class Tool:
+        tool_name = 'test'
+
+        def __init__(self):
+            self._flights = SingleFlight()
+            self.design_version = 1
+
+        @single_flight('get_timing_info')
+        def get_timing_info(self, top_n=10):
+            runs.append((top_n, self.design_version))
+            release.wait(5)
+            return runs[-1]
+
+    tool = Tool()
+    threads = [threading.Thread(target=tool.get_timing_info, kwargs={'top_n': 10}) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    key = ('get_timing_info', (), (('top_n', 10),), 1)
+    wait_joined(tool._flights, key, 1)
+    # design版本或参数不同的调用不与正在执行的调用合并
+    other = [threading.Thread(target=tool.get_timing_info, kwargs={'top_n': 5})]
+    other[0].start()
+    wait_in_flight(tool._flights, 2)
+    tool.design_version = 2
+    other.append(threading.Thread(target=tool.get_timing_info, kwargs={'top_n': 10}))
+    other[1].start()
+    wait_in_flight(tool._flights, 3)
+    assert sorted((dict(k[2])['top_n'], k[3]) for k in tool._flights.in_flight()) == [(5, 1), (10, 1), (10, 2)]
+    release.set()
+    for thread in threads + other:
+        thread.join(5)
+    assert sorted(runs) == [(5, 1), (10, 1), (10, 2)]
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+录制与回放往返: 对fake_leapr录制的TCL事务，ReplayLeapr回放时返回相同的结果和错误；录制文件截断时读到最后一条完整记录
+"""
+import gzip
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tcl_recorder
+from config import DEFAULT_CONFIG
+from fake_leapr import FakeLeapr, SyntheticDesign
+from tcl_replay import RecordedSession, ReplayLeapr
+from tcl_sender import TCLSender
+
+COMMANDS = [['report_timing -max_paths 3'], ['puts ok', 'no_such_command'], ['report_timing -max_paths 1']]
+
+
+def send_all(eda, edx_tmp):
+    """依次发送COMMANDS，返回[(结果行, EDA是否执行成功)]"""
+    sender = TCLSender()
+    with DEFAULT_CONFIG.override('edx_tmp', edx_tmp + os.sep), eda:
+        results = []
+        for commands in COMMANDS:
+            lines = sender.send_tcl(commands)
+            results.append((lines, sender.last_status.ok))
+    return results
+
+
+def test_record_and_replay_round_trip(tmp_path):
+    path = str(tmp_path / 'session.edxrec')
+    recorder = tcl_recorder.start_recording(path)
+    try:
+        recorded = send_all(FakeLeapr(str(tmp_path / 'live'), SyntheticDesign(50), 0.01), str(tmp_path / 'live'))
+        recorder.record_http('POST', '/leapr/place_cells', 'application/json', b'{"cells": []}', True, 200, 0.5,
+                             'place_cells')
+    finally:
+        tcl_recorder.stop_recording()
+    assert recorder.records == 4
+    assert [ok for _, ok in recorded] == [True, False, True] and len(recorded[0][0]) > len(recorded[2][0]) > 0
+
+    session = RecordedSession(path, str(tmp_path / 'blobs'))
+    assert session.meta['version'] == tcl_recorder.FORMAT_VERSION
+    assert [record['commands'] for record in session.tcl] == COMMANDS
+    assert 'server_result.txt' in session.tcl[0]['outputs']
+    assert 'no_such_command' in session.tcl[1]['status']['error']
+    http = session.http[0]
+    with open(session.blob_path(http['body']), 'rb') as f:
+        assert f.read() == b'{"cells": []}'
+    assert http['endpoint'] == 'place_cells' and http['status'] == 200
+
+    replay = ReplayLeapr(str(tmp_path / 'replay'), session, 0.01, speed=0)
+    assert send_all(replay, str(tmp_path / 'replay')) == recorded
+    assert replay.matched == 3 and replay.unmatched == 0
+
+
+def test_truncated_recording(tmp_path):
+    path = str(tmp_path / 'session.edxrec')
+    recorder = tcl_recorder.TclRecorder(path)
+    recorder.record_http('GET', '/healthz', None, b'', True, 200, 0.01, 'healthz')
+    recorder.record_http('POST', '/leapr/tcl', 'text/plain', b'x' * 1000, True, 200, 0.01, 'execute_tcl')
+    recorder.close()
+    with gzip.open(path, 'rb') as f:
+        data = f.read()
+    # 去掉第二个请求体的后半部分
+    truncated = str(tmp_path / 'truncated.edxrec')
+    with gzip.open(truncated, 'wb') as f:
+        f.write(data[:data.index(b'x' * 500)])
+    records = list(tcl_recorder.read_recording(truncated, str(tmp_path / 'blobs')))
+    assert [record['type'] for record in records] == ['meta', 'http']
+    assert os.listdir(tmp_path / 'blobs') == []
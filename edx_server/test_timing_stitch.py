@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+TimingStitcher: launch/through/capture段按端口拼接后的arrival与slack，以及全局topN的顺序
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from plugin_data import STA, TimingPath
+from timing_stitch import stitch_timing
+
+
+def make_path(start, end, points, required=0.0) -> TimingPath:
+    """points: [(pin, incr)]，累计延时按incr依次相加"""
+    tp = TimingPath()
+    tp.start_point, tp.end_point = start, end
+    delay, path = 0.0, []
+    for pin, incr in points:
+        delay += incr
+        path.append((pin, incr, delay))
+    tp.path = path
+    tp.data_arrival_time = delay
+    tp.data_required_time = required
+    tp.slack = required - delay
+    return tp
+
+
+def make_sta(*paths) -> STA:
+    sta = STA()
+    sta.timing_paths.extend(paths)
+    return sta
+
+
+def test_launch_capture_slack():
+    partitions = {
+        'A': make_sta(make_path('regA/CK', 'P', [('regA/Q', 0.1), ('u1/Y', 0.2), ('P', 0.05)])),
+        # 端口P处的arrival为0.02，端口之后的延时为0.4
+        'B': make_sta(make_path('P', 'regB/D', [('P', 0.02), ('u2/Y', 0.3), ('regB/D', 0.1)], required=1.0)),
+    }
+    paths = stitch_timing(partitions).timing_paths
+    assert len(paths) == 1
+    path = paths[0]
+    assert path.data_arrival_time == pytest.approx(0.75)
+    assert path.slack == pytest.approx(0.25)
+    assert path.partitions == ['A', 'B'] and path.ports == ['P']
+    assert [pin for pin, _, _ in path.path] == ['regA/Q', 'u1/Y', 'P', 'u2/Y', 'regB/D']
+    assert path.path[-1][2] == pytest.approx(0.75)
+
+
+def test_through_segment():
+    partitions = {
+        'A': make_sta(make_path('regX/CK', 'P1', [('regX/Q', 0.1), ('P1', 0.1)])),
+        'C': make_sta(make_path('P1', 'P2', [('P1', 0.0), ('c/Y', 0.3), ('P2', 0.0)])),
+        'B': make_sta(make_path('P2', 'regY/D', [('P2', 0.05), ('regY/D', 0.2)], required=1.0)),
+    }
+    paths = stitch_timing(partitions).timing_paths
+    assert len(paths) == 1
+    assert paths[0].partitions == ['A', 'C', 'B'] and paths[0].ports == ['P1', 'P2']
+    assert paths[0].slack == pytest.approx(0.3)
+    assert stitch_timing(partitions, max_hops=0).timing_paths == []
+
+
+def test_topn_worst_first():
+    partitions = {
+        'A': make_sta(make_path('r1/CK', 'P', [('P', 0.35)]), make_path('r2/CK', 'P', [('P', 0.5)])),
+        'B': make_sta(make_path('P', 'r3/D', [('P', 0.0), ('r3/D', 0.4)], required=1.0),
+                      make_path('P', 'r4/D', [('P', 0.0), ('r4/D', 0.1)], required=1.0)),
+    }
+    paths = stitch_timing(partitions).timing_paths
+    assert [round(tp.slack, 6) for tp in paths] == [0.1, 0.25, 0.4, 0.55]
+    assert (paths[0].start_point, paths[0].end_point) == ('r2/CK', 'r3/D')
+    worst = stitch_timing(partitions, topn=1).timing_paths
+    assert len(worst) == 1 and worst[0].slack == pytest.approx(0.1)
+
+
+def test_port_map_aligns_names():
+    partitions = {
+        'A': make_sta(make_path('regA/CK', 'out_p', [('out_p', 0.3)])),
+        'B': make_sta(make_path('in_p', 'regB/D', [('in_p', 0.0), ('regB/D', 0.2)], required=1.0)),
+    }
+    assert stitch_timing(partitions).timing_paths == []
+    paths = stitch_timing(partitions, port_map={'A': {'out_p': 'net1'}, 'B': {'in_p': 'net1'}}).timing_paths
+    assert len(paths) == 1 and paths[0].slack == pytest.approx(0.5)
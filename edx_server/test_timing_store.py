@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+TimingStore: 起点/终点/cell的CSR索引查询、module前缀查询和单条路径还原
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from plugin_data import STA, TimingPath
+from timing_store import TimingStore
+
+
+def make_path(start, end, pins, slack) -> TimingPath:
+    tp = TimingPath()
+    tp.start_point, tp.end_point = start, end
+    tp.path_group, tp.scenario, tp.path_type = 'clk', 'func', 'max'
+    tp.path = [(pin, 0.1, 0.1 * (i + 1)) for i, pin in enumerate(pins)]
+    tp.data_arrival_time = 0.1 * len(pins)
+    tp.data_required_time = tp.data_arrival_time + slack
+    tp.slack = slack
+    return tp
+
+
+@pytest.fixture
+def store() -> TimingStore:
+    sta = STA()
+    sta.timing_paths.extend([
+        make_path('top/a/r1/CK', 'top/b/r2/D', ['top/a/r1/Q', 'top/a/u1/Y', 'top/b/r2/D'], -0.2),
+        # top/ab与top/a有相同的字符串前缀，但不属于module top/a
+        make_path('top/a/r1/CK', 'top/ab/r3/D', ['top/a/r1/Q', 'top/ab/u2/Y', 'top/ab/r3/D'], 0.1),
+        make_path('top/b/r2/CK', 'top/b/r4/D', ['top/b/r2/Q', 'top/b/r4/D'], -0.5),
+    ])
+    return TimingStore(sta)
+
+
+def test_start_end_queries(store):
+    assert store.paths_from('top/a/r1/CK').tolist() == [0, 1]
+    assert store.paths_to('top/b/r2/D').tolist() == [0]
+    assert store.paths_from('top/x/CK').tolist() == []
+
+
+def test_cell_csr(store):
+    # 终点pin和路径点都在top/b/r2上，同一条路径只计一次；结果按slack从小到大
+    assert store.paths_through_cell('top/b/r2').tolist() == [2, 0]
+    assert store.paths_through_cell('top/a/r1').tolist() == [0, 1]
+    assert store.paths_through_cell('top/none').tolist() == []
+    counts = np.diff(store._cell_ptr)
+    assert counts.sum() == len(store._cell_paths)
+    assert counts[store.cell_ids['top/a/u1']] == 1
+    assert store.cell_worst_slack[store.cell_ids['top/a/r1']] == pytest.approx(-0.2)
+    assert store.worst_cells(1) == [('top/b/r2', pytest.approx(-0.5))]
+
+
+def test_module_queries(store):
+    names = sorted(store.cell_names[c] for c in store.module_cells('top/a'))
+    assert names == ['top/a/r1', 'top/a/u1']
+    assert store.paths_through_module('top/a').tolist() == [0, 1]
+    assert store.paths_through_module('top/a/').tolist() == [0, 1]
+    assert store.paths_through_module('top/ab').tolist() == [1]
+    assert store.paths_through_module('top/b').tolist() == [2, 0]
+    assert store.paths_through_module('top/c').tolist() == []
+
+
+def test_summary_and_round_trip(store):
+    summary = store.summary()
+    assert summary['path_count'] == 3 and summary['violating_paths'] == 2
+    assert summary['wns'] == pytest.approx(-0.5) and summary['tns'] == pytest.approx(-0.7)
+    assert store.worst_paths(2).tolist() == [2, 0]
+    tp = store.get_path(1)
+    assert (tp.start_point, tp.end_point, tp.path_group, tp.scenario) == ('top/a/r1/CK', 'top/ab/r3/D', 'clk', 'func')
+    assert [pin for pin, _, _ in tp.path] == ['top/a/r1/Q', 'top/ab/u2/Y', 'top/ab/r3/D']
+    assert tp.slack == pytest.approx(0.1)
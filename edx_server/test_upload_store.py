@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+UploadStore: 重启后续传、offset不一致、按内容去重、解压时不能写到工作目录之外
+"""
+import gzip
+import hashlib
+import io
+import os
+import sys
+import tarfile
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from upload_store import OffsetMismatch, UploadStore, safe_file_name
+
+DATA = bytes(range(256)) * 40
+DATA_SHA = hashlib.sha256(DATA).hexdigest()
+
+
+def test_resume_after_restart(tmp_path):
+    store = UploadStore(str(tmp_path / 'uploads'))
+    session = store.create_session('netlist.txt', len(DATA), DATA_SHA)
+    session_id = session['session_id']
+    assert session['offset'] == 0 and not session['exists']
+    assert store.write_chunk(session_id, 0, io.BytesIO(DATA[:4000]))['offset'] == 4000
+
+    # 新实例模拟服务重启: 增量sha256丢失，续传时由已收到的数据重新计算
+    store = UploadStore(str(tmp_path / 'uploads'))
+    assert store.session_info(session_id)['offset'] == 4000
+    result = store.write_chunk(session_id, 4000, io.BytesIO(DATA[4000:]))
+    assert result['complete'] and result['sha256'] == DATA_SHA and not result['deduplicated']
+    with open(store.object_path(DATA_SHA), 'rb') as f:
+        assert f.read() == DATA
+    with pytest.raises(KeyError):
+        store.session_info(session_id)
+
+
+def test_offset_mismatch(tmp_path):
+    store = UploadStore(str(tmp_path))
+    session_id = store.create_session('a.bin', len(DATA))['session_id']
+    store.write_chunk(session_id, 0, io.BytesIO(DATA[:100]))
+    with pytest.raises(OffsetMismatch) as error:
+        store.write_chunk(session_id, 50, io.BytesIO(DATA[50:]))
+    assert error.value.offset == 100
+    # length限制本次写入的字节数，超过size的部分不写
+    assert store.write_chunk(session_id, 100, io.BytesIO(DATA[100:]), length=10)['offset'] == 110
+    assert store.write_chunk(session_id, 110, io.BytesIO(DATA[110:] + b'extra'))['complete']
+
+
+def test_sha_mismatch_discards_session(tmp_path):
+    store = UploadStore(str(tmp_path))
+    session_id = store.create_session('a.bin', 4, '0' * 64)['session_id']
+    with pytest.raises(ValueError):
+        store.write_chunk(session_id, 0, io.BytesIO(b'abcd'))
+    with pytest.raises(KeyError):
+        store.session_info(session_id)
+    assert not store.has('0' * 64)
+
+
+def test_deduplication(tmp_path):
+    store = UploadStore(str(tmp_path / 'uploads'))
+    assert not store.ingest_stream(io.BytesIO(DATA))['deduplicated']
+    assert store.ingest_stream(io.BytesIO(DATA), DATA_SHA)['deduplicated']
+    with pytest.raises(ValueError):
+        store.ingest_stream(io.BytesIO(DATA), '1' * 64)
+    # 已有相同内容时不创建会话
+    assert store.create_session('copy.bin', len(DATA), DATA_SHA)['exists']
+    work = tmp_path / 'work'
+    first = store.materialize(DATA_SHA, str(work), 'a.bin')
+    second = store.materialize(DATA_SHA, str(work), 'a.bin')
+    assert first['file_size'] == len(DATA) and second['files'] == first['files']
+    assert sorted(os.listdir(work)) == ['a.bin']
+
+
+def test_gzip_decompression(tmp_path):
+    store = UploadStore(str(tmp_path / 'uploads'))
+    sha = store.ingest_stream(io.BytesIO(gzip.compress(DATA)))['sha256']
+    result = store.materialize(sha, str(tmp_path / 'work'), 'netlist.txt.gz', decompress=True)
+    assert result['file_path'] == str(tmp_path / 'work' / 'netlist.txt')
+    with open(result['file_path'], 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_tar_traversal_is_skipped(tmp_path):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        for name in ('good/a.txt', '../escape.txt', '/abs.txt'):
+            info = tarfile.TarInfo(name)
+            info.size = 3
+            tar.addfile(info, io.BytesIO(b'abc'))
+        link = tarfile.TarInfo('good/link')
+        link.type, link.linkname = tarfile.SYMTYPE, '/etc/passwd'
+        tar.addfile(link)
+    store = UploadStore(str(tmp_path / 'uploads'))
+    sha = store.ingest_stream(io.BytesIO(buffer.getvalue()))['sha256']
+    work = tmp_path / 'work'
+    result = store.materialize(sha, str(work), 'bundle.tar.gz', decompress=True)
+    assert result['files'] == [os.path.realpath(work / 'good' / 'a.txt')]
+    assert not (tmp_path / 'escape.txt').exists()
+    assert not os.path.lexists(work / 'good' / 'link')
+    assert sorted(os.listdir(work)) == ['good']
+
+
+def test_safe_file_name():
+    assert safe_file_name('../../etc/passwd') == 'passwd'
+    assert safe_file_name('dir\\sub\\a.tcl') == 'a.tcl'
+    for name in ('', '..', 'a/..'):
+        with pytest.raises(ValueError):
+            safe_file_name(name)
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+'''
+跨SubAPR时序拼接引擎
+多个Leapr实例(SubAPR)分别报告自己的时序路径，路径在SubAPR边界端口处断开。
+这里按端口名建立哈希索引，把 launch段(寄存器->输出端口)、through段(输入端口->输出端口)
+和 capture段(输入端口->寄存器) 拼接成完整路径，重新计算arrival/required/slack，
+并返回全局最差的topN条拼接路径。
+
+复杂度说明:
+- 每个端口只保留arrival最大的topN个launch候选，through段传播时候选数不会膨胀
+- 每个端口的capture段按margin(required - 端口之后的延时)排序，同样只保留topN
+- 全局topN通过堆做k路有序归并，不会对launch x capture做笛卡尔积
+'''
+import heapq
+import itertools
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from plugin_data import STA, TimingPath
+
+logger = logging.getLogger(__name__)
+
+
+class StitchedTimingPath(TimingPath):
+    """
+    跨SubAPR拼接得到的时序路径，额外记录经过的partition和边界端口
+    """
+    def __init__(self):
+        super().__init__()
+        self._partitions: List[str] = []
+        self._ports: List[str] = []
+
+    @property
+    def partitions(self) -> List[str]:
+        return self._partitions
+
+    @partitions.setter
+    def partitions(self, partitions: List[str]):
+        self._partitions = partitions
+
+    @property
+    def ports(self) -> List[str]:
+        return self._ports
+
+    @ports.setter
+    def ports(self, ports: List[str]):
+        self._ports = ports
+
+    def to_dict(self):
+        """将对象转换为字典"""
+        data = super().to_dict()
+        data['partitions'] = self._partitions
+        data['ports'] = self._ports
+        return data
+
+
+class TimingStitcher:
+    """
+    按端口名拼接多个SubAPR的STA结果
+
+    :param topn: 返回的最差路径数量
+    :param max_hops: 最多经过的through段数量(穿过中间SubAPR的次数)
+    :param port_map: {partition: {本地端口名: 全局端口名}}，端口名不一致时用于对齐，默认按原名匹配
+    """
+    def __init__(self, topn=100, max_hops=4, port_map: Optional[Dict[str, Dict[str, str]]] = None):
+        self.topn = max(int(topn), 1)
+        self.max_hops = max(int(max_hops), 0)
+        self.port_map = port_map or {}
+        # 端口在路径中的位置和arrival，按id(path)缓存
+        self._offsets: Dict[int, Tuple[int, float]] = {}
+        # 堆中arrival相同时的比较依据，避免比较TimingPath对象
+        self._seq = itertools.count()
+
+    def _port_offset(self, tp: TimingPath) -> Tuple[int, float]:
+        """
+        返回(端口之后第一个点的下标, 端口处的arrival)
+        起点端口不在路径点中时，用第一个点的arrival减去其incr近似
+        """
+        cached = self._offsets.get(id(tp))
+        if cached is not None:
+            return cached
+        offset = (0, 0.0)
+        for idx, (pin, incr, delay) in enumerate(tp.path):
+            if pin == tp.start_point:
+                offset = (idx + 1, delay)
+                break
+        else:
+            if tp.path:
+                offset = (0, tp.path[0][2] - tp.path[0][1])
+        self._offsets[id(tp)] = offset
+        return offset
+
+    def _push_candidate(self, heap: list, arrival: float, chain: tuple):
+        # 小根堆只保留arrival最大的topn个候选
+        item = (arrival, next(self._seq), chain)
+        if len(heap) < self.topn:
+            heapq.heappush(heap, item)
+        elif arrival > heap[0][0]:
+            heapq.heapreplace(heap, item)
+
+    def stitch(self, partitions: Dict[str, STA]) -> STA:
+        """
+        拼接各partition的时序路径
+        :param partitions: {partition名: STA}
+        :return: 只包含拼接路径的STA，按slack从小到大排序
+        """
+        self._offsets.clear()
+        # 1. 建立哈希索引: 端口名 -> 从该端口出发的路径; 端口名 -> 以该端口结束路径所在的partition
+        #    每条路径的起止端口名只计算一次
+        segments: List[Tuple[str, TimingPath, str, str]] = []
+        start_index: Dict[str, List[Tuple[str, TimingPath, str]]] = defaultdict(list)
+        start_partitions: Dict[str, set] = defaultdict(set)
+        end_partitions: Dict[str, set] = defaultdict(set)
+        for partition, sta in partitions.items():
+            local_map = self.port_map.get(partition)
+            for tp in sta.timing_paths:
+                start_key, end_key = tp.start_point, tp.end_point
+                if local_map:
+                    start_key = local_map.get(start_key, start_key)
+                    end_key = local_map.get(end_key, end_key)
+                segments.append((partition, tp, start_key, end_key))
+                start_index[start_key].append((partition, tp, end_key))
+                start_partitions[start_key].add(partition)
+                end_partitions[end_key].add(partition)
+
+        def is_input_port(partition, key):
+            owners = end_partitions.get(key)
+            return owners is not None and (len(owners) > 1 or partition not in owners)
+
+        def is_output_port(partition, key):
+            owners = start_partitions.get(key)
+            return owners is not None and (len(owners) > 1 or partition not in owners)
+
+        # 2. launch段: 起点在partition内部，终点是边界端口
+        frontier: Dict[str, list] = defaultdict(list)
+        for partition, tp, start_key, end_key in segments:
+            if is_input_port(partition, start_key) or not is_output_port(partition, end_key):
+                continue
+            self._push_candidate(frontier[end_key], tp.data_arrival_time, ((partition, tp, end_key),))
+
+        # 3. through段: 沿输入端口->输出端口传播，每个端口始终只保留topn个候选
+        arrivals: Dict[str, list] = defaultdict(list)
+        for key, heap in frontier.items():
+            arrivals[key].extend(heap)
+        for _ in range(self.max_hops):
+            next_frontier: Dict[str, list] = defaultdict(list)
+            for key, candidates in frontier.items():
+                for partition, tp, end_key in start_index.get(key, ()):
+                    if not is_output_port(partition, end_key):
+                        continue
+                    _, port_arrival = self._port_offset(tp)
+                    through_delay = tp.data_arrival_time - port_arrival
+                    for arrival, _, chain in candidates:
+                        if chain[-1][0] == partition:
+                            continue
+                        self._push_candidate(next_frontier[end_key], arrival + through_delay,
+                                             chain + ((partition, tp, end_key),))
+            if not next_frontier:
+                break
+            for key, heap in next_frontier.items():
+                for arrival, _, chain in heap:
+                    self._push_candidate(arrivals[key], arrival, chain)
+            frontier = next_frontier
+
+        # 4. capture段: 每个端口按arrival降序、margin升序，堆上做k路归并得到全局最差topn
+        heap = []
+        per_port = {}
+        for key, candidates in arrivals.items():
+            launches = sorted(candidates, key=lambda item: -item[0])
+            captures = []
+            for partition, tp, end_key in start_index.get(key, ()):
+                if is_output_port(partition, end_key):
+                    continue
+                _, port_arrival = self._port_offset(tp)
+                margin = tp.data_required_time - (tp.data_arrival_time - port_arrival)
+                captures.append((margin, next(self._seq), partition, tp))
+            if not captures:
+                continue
+            captures = heapq.nsmallest(self.topn, captures)
+            per_port[key] = (launches, captures)
+            heap.append((captures[0][0] - launches[0][0], key, 0, 0))
+        heapq.heapify(heap)
+
+        stitched = STA()
+        while heap and len(stitched.timing_paths) < self.topn:
+            slack, key, i, j = heapq.heappop(heap)
+            launches, captures = per_port[key]
+            if j + 1 < len(captures):
+                heapq.heappush(heap, (captures[j + 1][0] - launches[i][0], key, i, j + 1))
+            if j == 0 and i + 1 < len(launches):
+                heapq.heappush(heap, (captures[0][0] - launches[i + 1][0], key, i + 1, 0))
+            chain = launches[i][2]
+            capture_partition, capture_tp = captures[j][2], captures[j][3]
+            if chain[-1][0] == capture_partition:
+                continue
+            stitched.timing_paths.append(self._build_path(chain, capture_partition, capture_tp))
+
+        logger.info(f"stitched {len(stitched.timing_paths)} paths from {len(segments)} segments "
+                    f"of {len(partitions)} partitions, {len(per_port)} matched ports")
+        return stitched
+
+    def _build_path(self, chain: tuple, capture_partition: str,
+                    capture_tp: TimingPath) -> StitchedTimingPath:
+        """只对最终输出的路径拼接pin序列，并把后续段的累计延时平移到前一段的端口arrival上"""
+        launch_partition, launch_tp, _ = chain[0]
+        points = list(launch_tp.path)
+        base = launch_tp.data_arrival_time
+        for partition, tp, _ in chain[1:] + ((capture_partition, capture_tp, None),):
+            first_idx, port_arrival = self._port_offset(tp)
+            points.extend((pin, incr, base + delay - port_arrival) for pin, incr, delay in tp.path[first_idx:])
+            base = base + tp.data_arrival_time - port_arrival
+
+        path = StitchedTimingPath()
+        path.start_point = launch_tp.start_point
+        path.end_point = capture_tp.end_point
+        path.scenario = launch_tp.scenario
+        path.path_group = capture_tp.path_group
+        path.path_type = capture_tp.path_type
+        path.path = points
+        path.data_arrival_time = base
+        path.data_required_time = capture_tp.data_required_time
+        path.slack = capture_tp.data_required_time - base
+        path.partitions = [partition for partition, _, _ in chain] + [capture_partition]
+        path.ports = [key for _, _, key in chain]
+        return path
+
+
+def stitch_timing(partitions: Dict[str, STA], topn=100, max_hops=4,
+                  port_map: Optional[Dict[str, Dict[str, str]]] = None) -> STA:
+    """库函数入口，见TimingStitcher"""
+    return TimingStitcher(topn, max_hops, port_map).stitch(partitions)
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+'''
+列式时序路径存储
+STA.timing_paths 是TimingPath对象列表，每条路径又是(pin, incr, delay)元组列表，按起点/终点/cell查询只能全量扫描。
+这里把路径转成列式数组:
+- 路径级: start_id/end_id/slack/required/arrival/path_group_id 等定长数组
+- 路径点级: point_ptr(CSR偏移) + point_pin/point_incr/point_delay/point_cell
+并预先建立 起点、终点、cell 三个CSR索引，以及按名字排序的cell表用于module(层次前缀)查询。
+构建之后的查询都是numpy切片/归约，不再遍历Python对象。
+'''
+import bisect
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from plugin_data import STA, TimingPath
+
+logger = logging.getLogger(__name__)
+
+
+def _build_csr(keys: np.ndarray, num_keys: int) -> Tuple[np.ndarray, np.ndarray]:
+    """按key分组，返回(按key排序后的原下标, 每个key的起止偏移)"""
+    order = np.argsort(keys, kind='stable')
+    ptr = np.zeros(num_keys + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=num_keys), out=ptr[1:])
+    return order, ptr
+
+
+class TimingStore:
+    """
+    由STA构建的列式时序存储
+    :param sta: 时序结果
+    :param pin_to_cell: Design.pin_to_cell，用于pin到cell的映射；缺省时按最后一个'/'截断pin名得到cell名
+    :param cells: Design.cells，用于识别本身就是cell名的起点/终点
+    """
+    def __init__(self, sta: STA, pin_to_cell: Optional[Dict[str, str]] = None, cells: Optional[Dict] = None):
+        pin_to_cell = pin_to_cell or {}
+        cells = cells or {}
+        self.pin_names: List[str] = []
+        self.pin_ids: Dict[str, int] = {}
+        self.cell_names: List[str] = []
+        self.cell_ids: Dict[str, int] = {}
+        self.path_groups: List[str] = []
+        self.scenarios: List[str] = []
+        pin_cell: List[int] = []
+        group_ids: Dict[str, int] = {}
+        scenario_ids: Dict[str, int] = {}
+
+        def intern_pin(name):
+            pin_id = self.pin_ids.get(name)
+            if pin_id is None:
+                pin_id = len(self.pin_names)
+                self.pin_ids[name] = pin_id
+                self.pin_names.append(name)
+                cell_name = pin_to_cell.get(name)
+                if cell_name is None:
+                    cell_name = name if name in cells or '/' not in name else name.rsplit('/', 1)[0]
+                cell_id = self.cell_ids.get(cell_name)
+                if cell_id is None:
+                    cell_id = len(self.cell_names)
+                    self.cell_ids[cell_name] = cell_id
+                    self.cell_names.append(cell_name)
+                pin_cell.append(cell_id)
+            return pin_id
+
+        def intern(table, ids, name):
+            value = ids.get(name)
+            if value is None:
+                value = len(table)
+                ids[name] = value
+                table.append(name)
+            return value
+
+        paths = sta.timing_paths
+        num_paths = len(paths)
+        self.start_id = np.empty(num_paths, dtype=np.int32)
+        self.end_id = np.empty(num_paths, dtype=np.int32)
+        self.path_group_id = np.empty(num_paths, dtype=np.int16)
+        self.scenario_id = np.empty(num_paths, dtype=np.int16)
+        self.slack = np.empty(num_paths, dtype=np.float64)
+        self.required = np.empty(num_paths, dtype=np.float64)
+        self.arrival = np.empty(num_paths, dtype=np.float64)
+        self.path_types: List[str] = []
+        lengths = np.empty(num_paths, dtype=np.int64)
+        point_pin: List[int] = []
+        point_incr: List[float] = []
+        point_delay: List[float] = []
+        for idx, tp in enumerate(paths):
+            self.start_id[idx] = intern_pin(tp.start_point)
+            self.end_id[idx] = intern_pin(tp.end_point)
+            self.path_group_id[idx] = intern(self.path_groups, group_ids, tp.path_group)
+            self.scenario_id[idx] = intern(self.scenarios, scenario_ids, tp.scenario)
+            self.slack[idx] = tp.slack
+            self.required[idx] = tp.data_required_time
+            self.arrival[idx] = tp.data_arrival_time
+            self.path_types.append(tp.path_type)
+            lengths[idx] = len(tp.path)
+            for pin, incr, delay in tp.path:
+                point_pin.append(intern_pin(pin))
+                point_incr.append(incr)
+                point_delay.append(delay)
+
+        self.point_ptr = np.zeros(num_paths + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.point_ptr[1:])
+        self.point_pin = np.asarray(point_pin, dtype=np.int32)
+        self.point_incr = np.asarray(point_incr, dtype=np.float64)
+        self.point_delay = np.asarray(point_delay, dtype=np.float64)
+        self.pin_cell = np.asarray(pin_cell, dtype=np.int32)
+        self.point_cell = self.pin_cell[self.point_pin]
+        self._build_indexes(lengths)
+        logger.info(f"timing store built: {num_paths} paths, {len(self.point_pin)} points, "
+                    f"{len(self.pin_names)} pins, {len(self.cell_names)} cells")
+
+    def _build_indexes(self, lengths: np.ndarray):
+        num_pins = len(self.pin_names)
+        num_cells = len(self.cell_names)
+        num_paths = len(self.slack)
+        self._start_order, self._start_ptr = _build_csr(self.start_id, num_pins)
+        self._end_order, self._end_ptr = _build_csr(self.end_id, num_pins)
+
+        # cell -> 经过该cell的路径(去重)，起点/终点所在cell也计入
+        point_path = np.repeat(np.arange(num_paths, dtype=np.int64), lengths)
+        pair_cell = np.concatenate([self.point_cell, self.pin_cell[self.start_id], self.pin_cell[self.end_id]])
+        pair_path = np.concatenate([point_path, np.arange(num_paths), np.arange(num_paths)])
+        pair_key = np.unique(pair_cell.astype(np.int64) * max(num_paths, 1) + pair_path)
+        self._cell_paths = (pair_key % max(num_paths, 1)).astype(np.int64)
+        pair_cell = (pair_key // max(num_paths, 1)).astype(np.int64)
+        self._cell_ptr = np.zeros(num_cells + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pair_cell, minlength=num_cells), out=self._cell_ptr[1:])
+
+        # 每个cell上的最差slack，cell按_cell_ptr分段做reduceat
+        self.cell_worst_slack = np.full(num_cells, np.inf)
+        non_empty = np.flatnonzero(np.diff(self._cell_ptr) > 0)
+        if len(non_empty) > 0:
+            self.cell_worst_slack[non_empty] = np.minimum.reduceat(self.slack[self._cell_paths],
+                                                                   self._cell_ptr[non_empty])
+
+        # module查询: cell名排序后，同一层次前缀的cell是连续区间
+        self._sorted_cell_ids = sorted(range(num_cells), key=self.cell_names.__getitem__)
+        self._sorted_cell_names = [self.cell_names[i] for i in self._sorted_cell_ids]
+
+    def __len__(self):
+        return len(self.slack)
+
+    def _sort_by_slack(self, path_ids: np.ndarray) -> np.ndarray:
+        return path_ids[np.argsort(self.slack[path_ids], kind='stable')]
+
+    def paths_from(self, start_point: str) -> np.ndarray:
+        """起点为start_point的路径id，按slack从小到大"""
+        pin_id = self.pin_ids.get(start_point)
+        if pin_id is None:
+            return np.empty(0, dtype=np.int64)
+        return self._sort_by_slack(self._start_order[self._start_ptr[pin_id]:self._start_ptr[pin_id + 1]])
+
+    def paths_to(self, end_point: str) -> np.ndarray:
+        """终点为end_point的路径id，按slack从小到大"""
+        pin_id = self.pin_ids.get(end_point)
+        if pin_id is None:
+            return np.empty(0, dtype=np.int64)
+        return self._sort_by_slack(self._end_order[self._end_ptr[pin_id]:self._end_ptr[pin_id + 1]])
+
+    def paths_through_cell(self, cell_name: str) -> np.ndarray:
+        """经过cell_name(含起点/终点在该cell上)的路径id，按slack从小到大"""
+        cell_id = self.cell_ids.get(cell_name)
+        if cell_id is None:
+            return np.empty(0, dtype=np.int64)
+        return self._sort_by_slack(self._cell_paths[self._cell_ptr[cell_id]:self._cell_ptr[cell_id + 1]])
+
+    def module_cells(self, module: str) -> np.ndarray:
+        """层次module下的所有cell id；'/'的下一个字符是'0'，前缀区间为[module/, module0)"""
+        module = module.rstrip('/')
+        lo = bisect.bisect_left(self._sorted_cell_names, module + '/')
+        hi = bisect.bisect_left(self._sorted_cell_names, module + '0', lo)
+        return np.asarray(self._sorted_cell_ids[lo:hi], dtype=np.int64)
+
+    def paths_through_module(self, module: str) -> np.ndarray:
+        """经过module内任一cell的路径id，按slack从小到大"""
+        cell_ids = self.module_cells(module)
+        if len(cell_ids) == 0:
+            return np.empty(0, dtype=np.int64)
+        slices = [self._cell_paths[self._cell_ptr[c]:self._cell_ptr[c + 1]] for c in cell_ids]
+        return self._sort_by_slack(np.unique(np.concatenate(slices)))
+
+    def worst_cells(self, limit=100) -> List[Tuple[str, float]]:
+        """slack最差的limit个cell及其最差slack"""
+        valid = np.flatnonzero(np.isfinite(self.cell_worst_slack))
+        order = valid[np.argsort(self.cell_worst_slack[valid], kind='stable')[:limit]]
+        return [(self.cell_names[c], float(self.cell_worst_slack[c])) for c in order]
+
+    def worst_paths(self, limit=100) -> np.ndarray:
+        return np.argsort(self.slack, kind='stable')[:limit]
+
+    def slack_histogram(self, bins=20, path_ids: Optional[np.ndarray] = None, value_range=None) -> dict:
+        """slack直方图，path_ids为空时统计全部路径"""
+        slack = self.slack if path_ids is None else self.slack[path_ids]
+        if len(slack) == 0:
+            return {'counts': [], 'edges': []}
+        counts, edges = np.histogram(slack, bins=bins, range=value_range)
+        return {'counts': counts.tolist(), 'edges': edges.tolist()}
+
+    def summary(self) -> dict:
+        violating = self.slack < 0
+        return {
+            'path_count': len(self.slack),
+            'point_count': len(self.point_pin),
+            'cell_count': len(self.cell_names),
+            'wns': float(self.slack.min()) if len(self.slack) else 0.0,
+            'tns': float(self.slack[violating].sum()),
+            'violating_paths': int(violating.sum()),
+        }
+
+    def get_path(self, path_id: int) -> TimingPath:
+        """把单条路径还原成TimingPath"""
+        tp = TimingPath()
+        tp.start_point = self.pin_names[self.start_id[path_id]]
+        tp.end_point = self.pin_names[self.end_id[path_id]]
+        tp.scenario = self.scenarios[self.scenario_id[path_id]]
+        tp.path_group = self.path_groups[self.path_group_id[path_id]]
+        tp.path_type = self.path_types[path_id]
+        lo, hi = self.point_ptr[path_id], self.point_ptr[path_id + 1]
+        tp.path = [(self.pin_names[pin], float(incr), float(delay)) for pin, incr, delay in
+                   zip(self.point_pin[lo:hi], self.point_incr[lo:hi], self.point_delay[lo:hi])]
+        tp.data_required_time = float(self.required[path_id])
+        tp.data_arrival_time = float(self.arrival[path_id])
+        tp.slack = float(self.slack[path_id])
+        return tp
+
+    def to_sta(self, path_ids) -> STA:
+        sta = STA()
+        sta.timing_paths = [self.get_path(int(path_id)) for path_id in path_ids]
+        return sta
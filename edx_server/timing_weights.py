@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+'''
+时序驱动布局使用的net权重和cell criticality
+路径criticality: crit = clip((slack_target - slack) / (slack_target - WNS), 0, 1)，WNS不小于slack_target时全为0
+cell/net criticality取经过它的所有路径criticality的最大值，net权重 = 1 + alpha * crit ^ exponent。
+每次有新的时序结果时做增量更新: crit = smoothing * 旧值 + (1 - smoothing) * 本次值，
+未出现在本次报告中的net/cell逐步衰减，避免权重在迭代之间剧烈跳变。
+'''
+import logging
+
+import numpy as np
+
+from design_index import DesignIndex
+from timing_store import TimingStore
+
+logger = logging.getLogger(__name__)
+
+
+class TimingWeights:
+    """
+    :param design_index: Design的列式视图
+    :param alpha: 权重最大增量
+    :param exponent: criticality的指数，越大越只关注最差的路径
+    :param smoothing: 增量更新时旧值的保留比例
+    :param slack_target: slack高于该值的路径不认为是critical
+    """
+    def __init__(self, design_index: DesignIndex, alpha=4.0, exponent=2.0, smoothing=0.5, slack_target=0.0):
+        self.index = design_index
+        self.alpha = float(alpha)
+        self.exponent = float(exponent)
+        self.smoothing = float(smoothing)
+        self.slack_target = float(slack_target)
+        self.cell_criticality = np.zeros(design_index.num_cells, dtype=np.float32)
+        self.net_criticality = np.zeros(design_index.num_nets, dtype=np.float32)
+        self.net_weight = np.ones(design_index.num_nets, dtype=np.float32)
+        self.update_count = 0
+
+    def path_criticality(self, store: TimingStore) -> np.ndarray:
+        if len(store) == 0:
+            return np.zeros(0, dtype=np.float64)
+        wns = store.slack.min()
+        if wns >= self.slack_target:
+            return np.zeros(len(store), dtype=np.float64)
+        return np.clip((self.slack_target - store.slack) / (self.slack_target - wns), 0.0, 1.0)
+
+    def update(self, store: TimingStore):
+        """用一次新的时序结果增量更新criticality和net权重"""
+        index = self.index
+        # store的pin表 -> design的pin id，只对store中出现过的pin做一次字典查找
+        pin_map = np.fromiter((index.pin_ids.get(name, -1) for name in store.pin_names),
+                              dtype=np.int64, count=len(store.pin_names))
+        point_crit = np.repeat(self.path_criticality(store), np.diff(store.point_ptr))
+        point_pin = pin_map[store.point_pin]
+        known = point_pin >= 0
+        point_pin, point_crit = point_pin[known], point_crit[known]
+
+        cell_current = np.zeros(index.num_cells, dtype=np.float32)
+        point_cell = index.pin_cell[point_pin]
+        on_cell = point_cell >= 0
+        np.maximum.at(cell_current, point_cell[on_cell], point_crit[on_cell])
+
+        net_current = np.zeros(index.num_nets, dtype=np.float32)
+        point_net = index.pin_net[point_pin]
+        on_net = point_net >= 0
+        np.maximum.at(net_current, point_net[on_net], point_crit[on_net])
+
+        if self.update_count == 0:
+            self.cell_criticality = cell_current
+            self.net_criticality = net_current
+        else:
+            keep = np.float32(self.smoothing)
+            self.cell_criticality = keep * self.cell_criticality + (1 - keep) * cell_current
+            self.net_criticality = keep * self.net_criticality + (1 - keep) * net_current
+        self.net_weight = (1.0 + self.alpha * np.power(self.net_criticality, self.exponent)).astype(np.float32)
+        self.update_count += 1
+        logger.info(f"timing weights updated ({self.update_count}): "
+                    f"{int(np.count_nonzero(self.net_criticality))} critical nets, "
+                    f"{int(np.count_nonzero(self.cell_criticality))} critical cells")
+
+    def to_arrays(self, with_names=False) -> dict:
+        """二进制返回用的数组，顺序与Design.cells/Design.nets一致"""
+        arrays = {
+            'net_weight': self.net_weight,
+            'net_criticality': self.net_criticality,
+            'cell_criticality': self.cell_criticality,
+            'update_count': np.int64(self.update_count),
+        }
+        if with_names:
+            arrays['cell_names'] = self.index.cell_names
+            arrays['net_names'] = self.index.net_names
+        return arrays
+
+    def to_dict(self):
+        """JSON返回只包含非默认值的稀疏部分"""
+        nets = np.flatnonzero(self.net_criticality > 0)
+        cells = np.flatnonzero(self.cell_criticality > 0)
+        return {
+            'update_count': self.update_count,
+            'net_weights': {self.index.net_names[i]: float(self.net_weight[i]) for i in nets},
+            'cell_criticality': {self.index.cell_names[i]: float(self.cell_criticality[i]) for i in cells},
+        }
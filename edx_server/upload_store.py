@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+'''
+上传文件存储
+1. 内容寻址: 文件按sha256存为 uploads/objects/<前2位>/<sha256>，相同内容只存一份；
+   客户端先报告sha256，已存在时直接放到EDA工作目录，不必再传
+2. 可续传: 大文件先创建会话，再按offset分块PUT，每块边写边更新sha256(不需要在内存中缓存整块)；
+   会话元数据和已收到的数据保存在 uploads/sessions 下，连接断开或服务重启后查询offset继续上传，
+   重启后第一次续传时重新计算已收到部分的sha256
+3. 收齐后校验sha256再移入objects，放到工作目录时默认用硬链接(对象文件只读)，
+   可选按后缀透明解压: .gz/.bz2/.xz 解出单个文件，.tar/.tar.gz/.tgz/.tar.bz2/.tar.xz 解包到工作目录
+'''
+import bz2
+import gzip
+import hashlib
+import json
+import logging
+import lzma
+import os
+import shutil
+import stat
+import tarfile
+import threading
+import uuid
+from typing import BinaryIO, Optional
+
+logger = logging.getLogger(__name__)
+
+# 从请求流读取/写文件的块大小
+IO_BLOCK = 1 << 20
+DEFAULT_CHUNK_SIZE = 64 << 20
+
+_STREAM_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+_TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+
+class OffsetMismatch(ValueError):
+    """分块的offset与服务端已收到的字节数不一致，客户端应从offset处继续"""
+    def __init__(self, offset: int, message: str):
+        super().__init__(message)
+        self.offset = offset
+
+
+def safe_file_name(name: str) -> str:
+    """只保留文件名部分，不允许通过../或绝对路径写到工作目录之外"""
+    base = os.path.basename((name or '').replace('\\', '/')).strip()
+    if base in ('', '.', '..'):
+        raise ValueError(f"invalid file name: {name!r}")
+    return base
+
+
+def _valid_sha256(value: Optional[str]) -> Optional[str]:
+    if value is None or value == '':
+        return None
+    value = value.strip().lower()
+    if len(value) != 64 or any(ch not in '0123456789abcdef' for ch in value):
+        raise ValueError(f"invalid sha256: {value!r}")
+    return value
+
+
+def copy_stream(stream: BinaryIO, target: BinaryIO, digest, limit: Optional[int] = None) -> int:
+    """把stream写入target并更新digest，limit为最多读取的字节数，返回写入字节数"""
+    written = 0
+    while limit is None or written < limit:
+        block = stream.read(IO_BLOCK if limit is None else min(IO_BLOCK, limit - written))
+        if not block:
+            break
+        target.write(block)
+        digest.update(block)
+        written += len(block)
+    return written
+
+
+class UploadStore:
+    """
+    :param root: 存储目录，一般为EDX_TMP/uploads
+    :param chunk_size: 建议客户端使用的分块大小
+    """
+    def __init__(self, root: str, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = int(chunk_size)
+        self.objects_dir = os.path.join(root, 'objects')
+        self.sessions_dir = os.path.join(root, 'sessions')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.sessions_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._session_locks = {}
+        # 会话的增量sha256，重启后丢失，续传时由已收到的数据重新计算
+        self._digests = {}
+
+    # ---- 对象 ----
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def has(self, sha256: str) -> bool:
+        return os.path.exists(self.object_path(_valid_sha256(sha256)))
+
+    def _commit_object(self, temp_path: str, sha256: str) -> bool:
+        """临时文件移入objects，已存在相同内容时丢弃临时文件，返回是否为新对象"""
+        path = self.object_path(sha256)
+        if os.path.exists(path):
+            os.remove(temp_path)
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.chmod(temp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(temp_path, path)
+        return True
+
+    def ingest_stream(self, stream: BinaryIO, expected_sha256: Optional[str] = None) -> dict:
+        """一次性上传: 边读边算sha256，校验后存为对象"""
+        expected_sha256 = _valid_sha256(expected_sha256)
+        temp_path = os.path.join(self.sessions_dir, f'{uuid.uuid4().hex}.ingest')
+        digest = hashlib.sha256()
+        try:
+            with open(temp_path, 'wb') as f:
+                size = copy_stream(stream, f, digest)
+            sha256 = digest.hexdigest()
+            if expected_sha256 and sha256 != expected_sha256:
+                raise ValueError(f"sha256 mismatch: expected {expected_sha256}, received {sha256}")
+            created = self._commit_object(temp_path, sha256)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return {'sha256': sha256, 'size': size, 'deduplicated': not created}
+
+    # ---- 可续传会话 ----
+    def _meta_path(self, session_id: str) -> str:
+        return os.path.join(self.sessions_dir, f'{session_id}.json')
+
+    def _part_path(self, session_id: str) -> str:
+        return os.path.join(self.sessions_dir, f'{session_id}.part')
+
+    def _session_lock(self, session_id: str) -> threading.Lock:
+        with self._lock:
+            return self._session_locks.setdefault(session_id, threading.Lock())
+
+    def _load_meta(self, session_id: str) -> dict:
+        if not session_id or any(ch not in '0123456789abcdef' for ch in session_id):
+            raise KeyError(session_id)
+        try:
+            with open(self._meta_path(session_id), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(session_id)
+
+    def create_session(self, name: str, size: int, sha256: Optional[str] = None, decompress=False) -> dict:
+        """
+        创建上传会话；sha256对应的对象已存在时不创建会话，返回 {"exists": True, ...}
+        """
+        name = safe_file_name(name)
+        size = int(size)
+        if size < 0:
+            raise ValueError(f"invalid size: {size}")
+        sha256 = _valid_sha256(sha256)
+        if sha256 and os.path.exists(self.object_path(sha256)):
+            return {'exists': True, 'sha256': sha256, 'name': name, 'size': os.path.getsize(self.object_path(sha256))}
+        session_id = uuid.uuid4().hex
+        meta = {'session_id': session_id, 'name': name, 'size': size, 'sha256': sha256,
+                'decompress': bool(decompress)}
+        open(self._part_path(session_id), 'wb').close()
+        with open(self._meta_path(session_id), 'w') as f:
+            json.dump(meta, f)
+        self._digests[session_id] = hashlib.sha256()
+        logger.info(f"upload session {session_id} created: {name}, {size} bytes")
+        return dict(meta, exists=False, offset=0, chunk_size=self.chunk_size)
+
+    def session_info(self, session_id: str) -> dict:
+        meta = self._load_meta(session_id)
+        return dict(meta, offset=os.path.getsize(self._part_path(session_id)), chunk_size=self.chunk_size)
+
+    def write_chunk(self, session_id: str, offset: int, stream: BinaryIO, length: Optional[int] = None) -> dict:
+        """
+        在offset处追加一块数据，offset必须等于已收到的字节数(否则抛OffsetMismatch)
+        收齐后校验sha256并存为对象，返回值中complete为True
+        """
+        with self._session_lock(session_id):
+            meta = self._load_meta(session_id)
+            part_path = self._part_path(session_id)
+            received = os.path.getsize(part_path)
+            if int(offset) != received:
+                raise OffsetMismatch(received, f"offset {offset} does not match received bytes {received}")
+            digest = self._digests.get(session_id)
+            if digest is None:
+                digest = hashlib.sha256()
+                with open(part_path, 'rb') as f:
+                    copy_stream(f, _NullWriter(), digest)
+                self._digests[session_id] = digest
+            remaining = meta['size'] - received
+            limit = remaining if length is None else min(int(length), remaining)
+            with open(part_path, 'ab') as f:
+                written = copy_stream(stream, f, digest, limit)
+            received += written
+            result = dict(meta, offset=received, complete=False)
+            if received < meta['size']:
+                return result
+            sha256 = digest.hexdigest()
+            self._digests.pop(session_id, None)
+            os.remove(self._meta_path(session_id))
+            if meta['sha256'] and sha256 != meta['sha256']:
+                os.remove(part_path)
+                raise ValueError(f"sha256 mismatch: expected {meta['sha256']}, received {sha256}, session discarded")
+            created = self._commit_object(part_path, sha256)
+            logger.info(f"upload session {session_id} complete: {meta['name']}, sha256 {sha256}")
+            result.update(complete=True, sha256=sha256, deduplicated=not created)
+            return result
+
+    def abort_session(self, session_id: str):
+        with self._session_lock(session_id):
+            self._load_meta(session_id)
+            for path in (self._meta_path(session_id), self._part_path(session_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._digests.pop(session_id, None)
+
+    # ---- 放到工作目录 ----
+    def materialize(self, sha256: str, target_dir: str, name: str, decompress=False) -> dict:
+        """
+        把对象放到target_dir/name；decompress时按name的后缀解压
+        :return: {"file_path": 主文件路径, "files": 生成的文件列表, "file_size": 主文件大小}
+        """
+        source = self.object_path(_valid_sha256(sha256))
+        if not os.path.exists(source):
+            raise KeyError(sha256)
+        name = safe_file_name(name)
+        os.makedirs(target_dir, exist_ok=True)
+        lower = name.lower()
+        if decompress and lower.endswith(_TAR_SUFFIXES):
+            return self._extract_tar(source, target_dir)
+        suffix = os.path.splitext(lower)[1]
+        if decompress and suffix in _STREAM_OPENERS:
+            target = os.path.join(target_dir, name[:-len(suffix)])
+            temp = target + '.uploading'
+            with _STREAM_OPENERS[suffix](source, 'rb') as src, open(temp, 'wb') as dst:
+                shutil.copyfileobj(src, dst, IO_BLOCK)
+            os.replace(temp, target)
+        else:
+            target = os.path.join(target_dir, name)
+            temp = target + '.uploading'
+            if os.path.exists(temp):
+                os.remove(temp)
+            try:
+                os.link(source, temp)
+            except OSError:
+                shutil.copyfile(source, temp)
+            os.replace(temp, target)
+            # target已经是同一对象的硬链接时rename什么都不做，temp仍然存在
+            if os.path.exists(temp):
+                os.remove(temp)
+        return {'file_path': target, 'files': [target], 'file_size': os.path.getsize(target)}
+
+    def _extract_tar(self, source: str, target_dir: str) -> dict:
+        target_root = os.path.realpath(target_dir)
+        files = []
+        with tarfile.open(source, 'r:*') as tar:
+            members = []
+            for member in tar.getmembers():
+                path = os.path.realpath(os.path.join(target_root, member.name))
+                if not (member.isfile() or member.isdir()) or os.path.commonpath([target_root, path]) != target_root:
+                    logger.warning(f"skip unsafe tar member: {member.name}")
+                    continue
+                members.append(member)
+                if member.isfile():
+                    files.append(path)
+            tar.extractall(target_root, members=members)
+        return {'file_path': target_root, 'files': files, 'file_size': sum(os.path.getsize(f) for f in files)}
+
+
+class _NullWriter:
+    """只算sha256不写文件"""
+    def write(self, block):
+        return len(block)